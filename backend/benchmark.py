@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+API benchmark: drives the real create_app() in-process through a weighted
+mix of user scenarios and reports throughput, p50/p95/p99 latency and SQL
+queries per request for every endpoint.
+
+    python benchmark.py                                   # in-memory SQLite, default mix
+    python benchmark.py --requests 5000 --mix browse=60,book=10,chat=20,review=5,admin=5
+    python benchmark.py --database-url sqlite:////tmp/bench.db --concurrency 4
+    python benchmark.py --save-baseline benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json   # exit 1 on regression
+
+Budgets in benchmarks/budgets.json are absolute p95 limits (ms) per endpoint;
+baselines catch relative regressions between commits.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+BENCH_DIR = os.path.join(os.path.dirname(__file__), 'benchmarks')
+DEFAULT_BUDGETS = os.path.join(BENCH_DIR, 'budgets.json')
+DEFAULT_MIX = {'browse': 40, 'search': 10, 'view_runner': 15, 'book': 10, 'chat': 15, 'review': 5, 'admin': 5}
+CITY = ('Springfield', 39.7817, -89.6501)
+WORDS = ['grocery', 'delivery', 'cleaning', 'pet', 'moving', 'errands', 'shopping', 'garden']
+
+
+class Recorder:
+    """Per-endpoint latency and query-count samples"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)   # endpoint -> [(seconds, queries)]
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def count_query(self, *args, **kwargs):
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+
+    def request(self, client, method, url, **kwargs):
+        self.local.queries = 0
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        endpoint = response.headers.get('X-Bench-Endpoint', f'{method} {url}')
+        with self.lock:
+            if not getattr(self.local, 'warmup', False):
+                self.samples[endpoint].append((elapsed, self.local.queries))
+                self.statuses[endpoint][response.status_code] += 1
+        return response
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def prepare(app, runners, clients, seed):
+    """Bulk-load a benchmark fixture and return ids and auth headers"""
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from src.models.user import db, User, UserRole, Runner, Service, Booking, runner_services
+    from src.search import rebuild_index
+
+    rng = random.Random(seed)
+    password_hash = generate_password_hash('password123')   # One hash shared by every fixture user
+    now = datetime.utcnow()
+
+    with app.app_context():
+        start_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        user_rows = []
+        for i in range(runners + clients + 1):
+            user_rows.append({
+                'username': f'bench{start_id + i}', 'email': f'bench{start_id + i}@example.com',
+                'password_hash': password_hash, 'first_name': rng.choice(['Alex', 'Sam', 'Jo', 'Kim', 'Lee']),
+                'last_name': rng.choice(WORDS).title(), 'role': UserRole.RUNNER if i < runners else UserRole.USER,
+                'is_active': True, 'created_at': now
+            })
+        user_rows[-1]['role'] = UserRole.ADMIN
+        db.session.execute(insert(User), user_rows)
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.id >= start_id).order_by(User.id)]
+        runner_user_ids, client_ids, admin_id = user_ids[:runners], user_ids[runners:-1], user_ids[-1]
+
+        db.session.execute(insert(Runner), [{
+            'user_id': user_id, 'bio': f'{rng.choice(WORDS)} and {rng.choice(WORDS)} help',
+            'hourly_rate': round(rng.uniform(12, 60), 2), 'city': CITY[0], 'country': 'USA',
+            'latitude': CITY[1] + rng.gauss(0, 0.05), 'longitude': CITY[2] + rng.gauss(0, 0.05),
+            'is_available': True, 'is_verified': rng.random() < 0.5, 'rating': round(rng.uniform(3, 5), 1),
+            'total_reviews': rng.randint(0, 50), 'total_bookings': rng.randint(0, 100), 'created_at': now
+        } for user_id in runner_user_ids])
+        runner_ids = [row[0] for row in db.session.query(Runner.id).filter(Runner.user_id.in_(runner_user_ids))]
+        runner_user = dict(db.session.query(Runner.id, Runner.user_id).filter(Runner.id.in_(runner_ids)).all())
+
+        service_ids = [row[0] for row in db.session.query(Service.id)]
+        db.session.execute(insert(runner_services), [
+            {'runner_id': runner_id, 'service_id': service_id}
+            for runner_id in runner_ids for service_id in rng.sample(service_ids, min(3, len(service_ids)))
+        ])
+
+        # Completed bookings feed the review scenario; accepted ones the chat scenario
+        booking_rows = []
+        for status, count in (('completed', clients * 2), ('accepted', clients)):
+            for _ in range(count):
+                runner_id = rng.choice(runner_ids)
+                scheduled = now - timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+                booking_rows.append({
+                    'user_id': rng.choice(client_ids), 'runner_id': runner_id, 'service_id': rng.choice(service_ids),
+                    'title': f'{rng.choice(WORDS).title()} run', 'status': status,
+                    'scheduled_date': scheduled, 'end_date': scheduled + timedelta(hours=1),
+                    'estimated_hours': 1, 'hourly_rate': 20.0, 'total_amount': 20.0, 'created_at': now,
+                    'version': 1
+                })
+        db.session.execute(insert(Booking), booking_rows)
+        bookings = db.session.query(Booking.id, Booking.user_id, Booking.runner_id, Booking.status)\
+            .filter(Booking.user_id.in_(client_ids)).all()
+        rebuild_index()
+        db.session.commit()
+
+        headers = {user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+                   for user_id in client_ids + [admin_id]}
+
+    return {
+        'rng': rng,
+        'runner_ids': runner_ids,
+        'runner_user': runner_user,
+        'client_ids': client_ids,
+        'admin_id': admin_id,
+        'service_ids': service_ids,
+        'headers': headers,
+        'chat_bookings': [b for b in bookings if b.status == 'accepted'],
+        'review_bookings': [b for b in bookings if b.status == 'completed'],
+        'lock': threading.Lock(),
+    }
+
+
+# Scenarios: each performs the requests of one user action
+def scenario_browse(ctx, rec, client):
+    rng = ctx['rng']
+    params = f"page={rng.randint(1, 5)}&per_page=12"
+    if rng.random() < 0.3:
+        params += f"&service_id={rng.choice(ctx['service_ids'])}"
+    if rng.random() < 0.3:
+        params += '&min_rating=4'
+    rec.request(client, 'GET', f'/api/runners?{params}')
+
+
+def scenario_search(ctx, rec, client):
+    rec.request(client, 'GET', f"/api/runners?q={ctx['rng'].choice(WORDS)}")
+
+
+def scenario_view_runner(ctx, rec, client):
+    runner_id = ctx['rng'].choice(ctx['runner_ids'])
+    rec.request(client, 'GET', f'/api/runners/{runner_id}')
+    rec.request(client, 'GET', f"/api/reviews?reviewee_id={ctx['runner_user'][runner_id]}")
+
+
+def scenario_book(ctx, rec, client):
+    rng = ctx['rng']
+    user_id = rng.choice(ctx['client_ids'])
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(days=rng.randint(1, 60),
+                                                                                     hours=rng.randint(0, 23))
+    rec.request(client, 'POST', '/api/bookings', headers=ctx['headers'][user_id], json={
+        'runner_id': rng.choice(ctx['runner_ids']), 'service_id': rng.choice(ctx['service_ids']),
+        'title': 'Benchmark errand', 'scheduled_date': start.isoformat(), 'estimated_hours': 1
+    })
+    rec.request(client, 'GET', '/api/bookings', headers=ctx['headers'][user_id])
+
+
+def scenario_chat(ctx, rec, client):
+    booking = ctx['rng'].choice(ctx['chat_bookings'])
+    headers = ctx['headers'][booking.user_id]
+    rec.request(client, 'POST', f'/api/bookings/{booking.id}/messages', headers=headers,
+                json={'message': 'On my way, see you soon'})
+    rec.request(client, 'GET', f'/api/bookings/{booking.id}/messages', headers=headers)
+
+
+def scenario_review(ctx, rec, client):
+    with ctx['lock']:
+        booking = ctx['review_bookings'].pop() if ctx['review_bookings'] else None
+    if booking is None:
+        return scenario_browse(ctx, rec, client)
+    rec.request(client, 'POST', '/api/reviews', headers=ctx['headers'][booking.user_id], json={
+        'booking_id': booking.id, 'reviewee_id': ctx['runner_user'][booking.runner_id],
+        'rating': ctx['rng'].randint(3, 5), 'comment': 'Quick and friendly'
+    })
+
+
+def scenario_admin(ctx, rec, client):
+    headers = ctx['headers'][ctx['admin_id']]
+    rec.request(client, 'GET', '/api/admin/dashboard/stats', headers=headers)
+    rec.request(client, 'GET', '/api/admin/bookings?per_page=20', headers=headers)
+
+
+SCENARIOS = {
+    'browse': scenario_browse,
+    'search': scenario_search,
+    'view_runner': scenario_view_runner,
+    'book': scenario_book,
+    'chat': scenario_chat,
+    'review': scenario_review,
+    'admin': scenario_admin,
+}
+
+
+def run(app, ctx, mix, iterations, warmup, concurrency):
+    from sqlalchemy import event
+    from src.models.user import db
+
+    rec = Recorder()
+    router = app.extensions.get('db_router')
+    with app.app_context():
+        # Reads may run on separate read-only engines or replicas (see src/db_routing.py)
+        engines = [db.engine] + (router.readers + router.replicas if router else [])
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', rec.count_query)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    def worker(count, is_warmup):
+        rec.local.warmup = is_warmup
+        rng = random.Random(ctx['rng'].random())
+        with app.test_client() as client:
+            for _ in range(count):
+                SCENARIOS[rng.choices(names, weights)[0]](ctx, rec, client)
+
+    try:
+        worker(warmup, True)
+        threads = [threading.Thread(target=worker, args=(iterations // concurrency, False))
+                   for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', rec.count_query)
+
+    endpoints = {}
+    for endpoint, samples in sorted(rec.samples.items()):
+        latencies = [seconds * 1000 for seconds, _ in samples]
+        endpoints[endpoint] = {
+            'count': len(samples),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries': round(statistics.fmean(queries for _, queries in samples), 1),
+            'errors': sum(count for status, count in rec.statuses[endpoint].items() if status >= 500),
+            'statuses': {str(status): count for status, count in sorted(rec.statuses[endpoint].items())}
+        }
+    total = sum(stats['count'] for stats in endpoints.values())
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'endpoints': endpoints
+    }
+
+
+def compare(results, baseline, budgets, threshold, min_delta_ms):
+    """Return a list of human-readable regressions"""
+    problems = []
+    for endpoint, stats in results['endpoints'].items():
+        budget = budgets.get(endpoint)
+        if budget is not None and stats['p95_ms'] > budget:
+            problems.append(f'{endpoint}: p95 {stats["p95_ms"]}ms over budget {budget}ms')
+        if stats['errors']:
+            problems.append(f'{endpoint}: {stats["errors"]} server errors')
+
+        before = (baseline or {}).get('endpoints', {}).get(endpoint)
+        if not before:
+            continue
+        delta = stats['p95_ms'] - before['p95_ms']
+        if delta > min_delta_ms and stats['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            problems.append(f'{endpoint}: p95 {before["p95_ms"]}ms -> {stats["p95_ms"]}ms')
+        if stats['queries'] > before['queries'] + 0.5:
+            problems.append(f'{endpoint}: queries/request {before["queries"]} -> {stats["queries"]}')
+    return problems
+
+
+def print_report(results, baseline=None):
+    before = (baseline or {}).get('endpoints', {})
+    print(f"\n{results['requests']} requests in {results['seconds']}s "
+          f"({results['throughput_rps']} req/s)\n")
+    print(f"{'endpoint':<48} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'qry':>6} {'5xx':>4}  vs baseline p95")
+    for endpoint, stats in results['endpoints'].items():
+        change = ''
+        if endpoint in before and before[endpoint]['p95_ms']:
+            change = f"{(stats['p95_ms'] / before[endpoint]['p95_ms'] - 1) * 100:+.0f}%"
+        print(f"{endpoint:<48} {stats['count']:>6} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+              f"{stats['p99_ms']:>8} {stats['queries']:>6} {stats['errors']:>4}  {change}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='Scenario iterations to measure')
+    parser.add_argument('--warmup', type=int, default=100, help='Unmeasured iterations first')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='Weights, e.g. browse=50,chat=20')
+    parser.add_argument('--runners', type=int, default=300, help='Fixture runners to create')
+    parser.add_argument('--clients', type=int, default=200, help='Fixture clients to create')
+    parser.add_argument('--skip-fixture', action='store_true', help='Use existing data (e.g. a generated dataset)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Benchmark against this database instead of in-memory SQLite')
+    parser.add_argument('--concurrency', type=int, default=1, help='Threads (file or server databases only)')
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--save-baseline', help='Write results as the baseline JSON here')
+    parser.add_argument('--baseline', help='Compare against this baseline JSON')
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS, help='p95 budgets JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative p95 increase')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='Ignore p95 increases smaller than this')
+    args = parser.parse_args(argv)
+
+    config_name = 'testing'
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+        config_name = 'production'
+    elif args.concurrency > 1:
+        parser.error('--concurrency needs --database-url (in-memory SQLite shares one connection)')
+
+    from src.main import create_app
+    app, _ = create_app(config_name)
+    app.extensions['load_shedder'].rate_limits = {}   # Measure handlers, not 429s
+
+    @app.after_request
+    def tag_endpoint(response):
+        from flask import request
+        rule = request.url_rule.rule if request.url_rule else request.path
+        response.headers['X-Bench-Endpoint'] = f'{request.method} {rule}'
+        return response
+
+    if args.skip_fixture:
+        ctx = load_context(app, args.seed)
+    else:
+        ctx = prepare(app, args.runners, args.clients, args.seed)
+    results = run(app, ctx, args.mix, args.requests, args.warmup, args.concurrency)
+    results.update({'commit': git_commit(), 'created_at': datetime.utcnow().isoformat(),
+                    'settings': {'requests': args.requests, 'mix': args.mix, 'runners': args.runners,
+                                 'clients': args.clients, 'seed': args.seed, 'concurrency': args.concurrency}})
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    budgets = {}
+    if args.budgets and os.path.exists(args.budgets):
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+
+    print_report(results, baseline)
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f'\nResults written to {path}')
+
+    problems = compare(results, baseline, budgets, args.threshold, args.min_delta_ms)
+    if problems:
+        print('\nRegressions:')
+        for problem in problems:
+            print(f'  - {problem}')
+        return 1
+    return 0
+
+
+def load_context(app, seed):
+    """Scenario context from whatever data is already in the database"""
+    from flask_jwt_extended import create_access_token
+    from src.models.user import db, User, UserRole, Runner, Service, Booking
+
+    with app.app_context():
+        runner_user = dict(db.session.query(Runner.id, Runner.user_id).limit(5000).all())
+        client_ids = [row[0] for row in db.session.query(User.id).filter(User.role == UserRole.USER).limit(2000)]
+        admin = User.query.filter_by(role=UserRole.ADMIN).first()
+        bookings = db.session.query(Booking.id, Booking.user_id, Booking.runner_id, Booking.status)\
+            .filter(Booking.user_id.in_(client_ids), Booking.runner_id.in_(list(runner_user)),
+                    Booking.status.in_(('accepted', 'completed'))).limit(20000).all()
+        headers = {user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+                   for user_id in client_ids + [admin.id]}
+        service_ids = [row[0] for row in db.session.query(Service.id)]
+
+    return {
+        'rng': random.Random(seed),
+        'runner_ids': list(runner_user),
+        'runner_user': runner_user,
+        'client_ids': client_ids,
+        'admin_id': admin.id,
+        'service_ids': service_ids,
+        'headers': headers,
+        'chat_bookings': [b for b in bookings if b.status == 'accepted'],
+        'review_bookings': [b for b in bookings if b.status == 'completed'],
+        'lock': threading.Lock(),
+    }
+
+
+def git_commit():
+    try:
+        import subprocess
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__) or '.',
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,3 +7,6 @@ pip install -r requirements.txt
 # Simple database initialization without complex imports
 echo "Database initialization will be handled by the application startup"
 
+
+# Precompress the frontend build (.gz/.br) so it can be served without on-the-fly compression
+python -m src.static_assets src/static
@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+"""
+Socket.IO load harness for the chat server in src/chat.py.
+
+Starts one or more local server processes, connects thousands of simulated
+clients (each an authenticated user in a booking_<id> room, two per room),
+sends messages at a Poisson rate and marks them read, then reports connect
+time, end-to-end delivery latency percentiles, dropped events and server
+memory per connection.
+
+    python chat_load.py --clients 2000 --rate 0.2 --duration 60
+    python chat_load.py --clients 4000 --servers 2               # cross-process fan-out
+    python chat_load.py --clients 20000 --ramp-step 1000         # find the per-node connection ceiling
+
+With more than one server the processes share events through a message
+queue, like production with REDIS_URL. Unless --redis-url is given, a local
+stand-in (RedisStandIn, the pub/sub and basic key subset of the Redis
+protocol) is started so the real RedisManager code path runs without a
+Redis server.
+Requires the aiohttp (async client) and redis (client library) packages.
+
+Room members are placed on different servers, so with --servers > 1 every
+message crosses the queue. Latency is measured from the sender's emit to
+each member's new_message event (message_batch with --protocol 2, the
+default), on one clock.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmark import percentile
+
+MARKER = 'load:'   # Prefix of harness messages: load:<client>:<seq>:<perf_counter>
+
+
+def _read_line(stream):
+    line = stream.readline()
+    if not line:
+        raise EOFError
+    return line[:-2]
+
+
+def _encode(value, kind=b'*'):
+    """RESP encoding; kind b'>' makes an array a RESP3 push (pub/sub) frame, b'%' a map"""
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, (list, tuple)):
+        count = len(value) // 2 if kind == b'%' else len(value)
+        return kind + b'%d\r\n' % count + b''.join(_encode(item) for item in value)
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels = set()
+        self.push = b'*'   # Becomes b'>' once a client negotiates RESP3 with HELLO
+
+    def send(self, data):
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def read_command(self):
+        line = _read_line(self.rfile)
+        if not line.startswith(b'*'):
+            return line.split()   # Inline command, e.g. from telnet
+        command = []
+        for _ in range(int(line[1:])):
+            length = int(_read_line(self.rfile)[1:])
+            command.append(self.rfile.read(length + 2)[:-2])
+        return command
+
+    def handle(self):
+        server = self.server
+        try:
+            while True:
+                command = self.read_command()
+                if not command:
+                    continue
+                name = command[0].upper()
+                if name == b'PUBLISH':
+                    self.send(_encode(server.publish(command[1], command[2])))
+                elif name in (b'SUBSCRIBE', b'UNSUBSCRIBE'):
+                    for channel in command[1:] or list(self.channels):
+                        if name == b'SUBSCRIBE':
+                            self.channels.add(channel)
+                            server.subscribe(channel, self)
+                        else:
+                            self.channels.discard(channel)
+                            server.unsubscribe(channel, self)
+                        self.send(_encode([name.lower(), channel, len(self.channels)], self.push))
+                elif name == b'HELLO':
+                    protocol = int(command[1]) if len(command) > 1 else 2
+                    self.push = b'>' if protocol == 3 else b'*'
+                    info = [b'server', b'redis', b'version', b'7.0.0', b'proto', protocol, b'mode', b'standalone']
+                    self.send(_encode(info, b'%' if protocol == 3 else b'*'))
+                elif name in server.KEY_COMMANDS:
+                    reply = server.run(name, command[1:])
+                    if reply is None:
+                        reply = b'_\r\n' if self.push == b'>' else b'$-1\r\n'   # Null
+                    self.send(reply)
+                elif name == b'PING':
+                    self.send(_encode([b'pong', b''], self.push) if self.channels else b'+PONG\r\n')
+                elif name in (b'CLIENT', b'SELECT', b'AUTH'):
+                    self.send(b'+OK\r\n')
+                else:
+                    self.send(b'-ERR unknown command ' + name + b'\r\n')
+        except (EOFError, ConnectionError, ValueError):
+            pass
+        finally:
+            for channel in self.channels:
+                server.unsubscribe(channel, self)
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """
+    Local server speaking a subset of the Redis protocol: pub/sub (enough for
+    socketio.RedisManager) and the string/set/hash commands the response cache
+    and presence store use.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    KEY_COMMANDS = (b'GET', b'SET', b'DEL', b'EXISTS', b'INCR', b'INCRBY', b'SADD', b'SMEMBERS', b'EXPIRE',
+                    b'HSET', b'HDEL', b'HVALS')
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _RedisHandler)
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+        self.published = 0
+        self.data = {}
+        self.expires = {}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.port}/0'
+
+    def subscribe(self, channel, handler):
+        with self.lock:
+            self.subscribers[channel].add(handler)
+
+    def unsubscribe(self, channel, handler):
+        with self.lock:
+            self.subscribers[channel].discard(handler)
+
+    def publish(self, channel, data):
+        with self.lock:
+            self.published += 1
+            handlers = list(self.subscribers[channel])
+        frames = {}
+        delivered = 0
+        for handler in handlers:
+            if handler.push not in frames:
+                frames[handler.push] = _encode([b'message', channel, data], handler.push)
+            try:
+                handler.send(frames[handler.push])
+                delivered += 1
+            except OSError:
+                self.unsubscribe(channel, handler)
+        return delivered
+
+    def _live(self, key):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def run(self, name, args):
+        """Execute a key command and return the encoded reply, None for a null reply"""
+        with self.lock:
+            if name == b'GET':
+                value = self._live(args[0])
+                return None if value is None else _encode(value)
+            if name == b'SET':
+                options = [option.upper() for option in args[2:]]
+                if b'NX' in options and self._live(args[0]) is not None:
+                    return None
+                self.data[args[0]] = args[1]
+                self.expires.pop(args[0], None)
+                if b'EX' in options:
+                    self.expires[args[0]] = time.time() + int(args[2 + options.index(b'EX') + 1])
+                if b'PX' in options:
+                    self.expires[args[0]] = time.time() + int(args[2 + options.index(b'PX') + 1]) / 1000
+                return b'+OK\r\n'
+            if name == b'EXISTS':
+                return _encode(sum(self._live(key) is not None for key in args))
+            if name == b'DEL':
+                deleted = sum(self._live(key) is not None for key in args)
+                for key in args:
+                    self.data.pop(key, None)
+                    self.expires.pop(key, None)
+                return _encode(deleted)
+            if name in (b'INCR', b'INCRBY'):
+                value = int(self._live(args[0]) or 0) + (int(args[1]) if len(args) > 1 else 1)
+                self.data[args[0]] = b'%d' % value
+                return _encode(value)
+            if name == b'SADD':
+                members = self._live(args[0])
+                if members is None:
+                    members = self.data[args[0]] = set()
+                added = len(set(args[1:]) - members)
+                members.update(args[1:])
+                return _encode(added)
+            if name == b'SMEMBERS':
+                return _encode(sorted(self._live(args[0]) or ()))
+            if name == b'HSET':
+                fields = self._live(args[0])
+                if fields is None:
+                    fields = self.data[args[0]] = {}
+                pairs = dict(zip(args[1::2], args[2::2]))
+                added = len(set(pairs) - set(fields))
+                fields.update(pairs)
+                return _encode(added)
+            if name == b'HDEL':
+                fields = self._live(args[0]) or {}
+                deleted = sum(fields.pop(field, None) is not None for field in args[1:])
+                if not fields:
+                    self.data.pop(args[0], None)
+                    self.expires.pop(args[0], None)
+                return _encode(deleted)
+            if name == b'HVALS':
+                return _encode(list((self._live(args[0]) or {}).values()))
+            if name == b'EXPIRE':
+                if self._live(args[0]) is None:
+                    return _encode(0)
+                self.expires[args[0]] = time.time() + int(args[1])
+                return _encode(1)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def raise_fd_limit():
+    """Thousands of sockets need more than the usual 1024 descriptors"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 1 << 20, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def process_rss_kb(pid):
+    """Resident memory of a process in KB (Linux only, else None)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port):
+    """Server process entry point: the production app on socketio.run, as `python src/main.py` runs it"""
+    import logging
+    raise_fd_limit()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from src.main import app, socketio
+    socketio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True)
+
+
+class ServerPool:
+    """Local chat server processes sharing one database and, optionally, a message queue"""
+
+    def __init__(self, count, database_url, redis_url, command, log_path):
+        self.count = count
+        self.env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=database_url,
+                        RATE_LIMIT_STORAGE_URL='memory://')
+        self.env.pop('REDIS_URL', None)
+        if redis_url:
+            self.env['REDIS_URL'] = redis_url
+        self.command = command
+        self.log = open(log_path, 'w')
+        self.log_path = log_path
+        self.processes = []
+        self.ports = []
+
+    def start(self, timeout=60):
+        # One at a time so startup work (create_all, seeding) never races on the database
+        for _ in range(self.count):
+            port = free_port()
+            if self.command:
+                argv = shlex.split(self.command.format(port=port))
+            else:
+                argv = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+            process = subprocess.Popen(argv, env=self.env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stdout=subprocess.DEVNULL, stderr=self.log)
+            self.processes.append(process)
+            self.ports.append(port)
+            self._wait(process, port, timeout)
+        return self
+
+    def _wait(self, process, port, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                self.log.flush()
+                with open(self.log_path) as f:
+                    raise RuntimeError(f'Chat server exited during startup:\n{f.read()[-2000:]}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f'Chat server on port {port} did not start within {timeout}s')
+
+    @property
+    def urls(self):
+        return [f'http://127.0.0.1:{port}' for port in self.ports]
+
+    def rss_kb(self):
+        return [process_rss_kb(process.pid) for process in self.processes]
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.log.close()
+
+
+class Stats:
+    def __init__(self):
+        self.connect_ms = []
+        self.connect_failures = 0
+        self.latency_ms = []
+        self.room_members = Counter()   # booking_id -> joined clients
+        self.sent = 0
+        self.expected = 0
+        self.delivered = 0
+        self.rejected = 0
+        self.reads_requested = 0
+        self.reads_acked = 0
+        self.disconnects = 0
+        self.errors = Counter()
+
+
+class SimClient:
+    """One simulated browser tab: a user connected to one booking chat room"""
+
+    def __init__(self, index, url, user_id, token, booking_id, stats, protocol=2):
+        import socketio
+        self.index = index
+        self.url = url
+        self.user_id = str(user_id)
+        self.token = token
+        self.booking_id = booking_id
+        self.stats = stats
+        self.chatting = False
+        self.closing = False
+        self.read_ratio = 1.0
+        self.protocol = protocol
+        self.sio = socketio.AsyncClient(reconnection=False)
+        for event in ('connected', 'joined_chat', 'new_message', 'message_batch', 'messages_marked_read', 'error',
+                      'disconnect'):
+            self.sio.on(event, getattr(self, f'on_{event}'))
+
+    async def on_connected(self, data):
+        if not self.authenticated.done():
+            self.authenticated.set_result(True)
+
+    async def on_joined_chat(self, data):
+        if not self.joined.done():
+            self.joined.set_result(True)
+
+    async def on_error(self, data):
+        message = str((data or {}).get('message'))[:80]
+        self.stats.errors[message] += 1
+        for waiter in (self.authenticated, self.joined):
+            if not waiter.done():
+                waiter.set_exception(RuntimeError(message))
+                return
+        if self.chatting:
+            # A refused send (e.g. rate limited) was never going to be delivered
+            self.stats.rejected += 1
+            self.stats.expected -= self.stats.room_members[self.booking_id]
+
+    async def on_new_message(self, data):
+        await self.received([(data.get('sender_id'), data.get('message') or '')])
+
+    async def on_message_batch(self, data):
+        # Rows are [id, sender_id, message, created_at_ms, is_read]
+        await self.received([(row[1], row[2]) for row in data.get('messages') or ()])
+
+    async def received(self, messages):
+        others = False
+        for sender_id, text in messages:
+            if not text.startswith(MARKER):
+                continue
+            self.stats.latency_ms.append((time.perf_counter() - float(text.rsplit(':', 1)[1])) * 1000)
+            self.stats.delivered += 1
+            others = others or str(sender_id) != self.user_id
+        # One read receipt covers every message in the frame
+        if others and self.chatting and random.random() < self.read_ratio:
+            self.stats.reads_requested += 1
+            await self.sio.emit('mark_messages_read', {'token': self.token, 'booking_id': self.booking_id})
+
+    async def on_messages_marked_read(self, data):
+        self.stats.reads_acked += 1
+
+    async def on_disconnect(self, *args):
+        if not self.closing:
+            self.stats.disconnects += 1
+
+    async def connect(self, timeout):
+        loop = asyncio.get_running_loop()
+        self.authenticated, self.joined = loop.create_future(), loop.create_future()
+        start = time.perf_counter()
+        try:
+            await self.sio.connect(self.url, auth={'token': self.token, 'protocol': self.protocol},
+                                   transports=['websocket'],
+                                   wait_timeout=timeout)
+            await asyncio.wait_for(self.authenticated, timeout)
+            self.stats.connect_ms.append((time.perf_counter() - start) * 1000)
+            await self.sio.emit('join_chat', {'token': self.token, 'booking_id': self.booking_id})
+            await asyncio.wait_for(self.joined, timeout)
+        except Exception as e:
+            self.stats.connect_failures += 1
+            self.stats.errors[f'connect: {type(e).__name__}'] += 1
+            await self.close()
+            return False
+        self.stats.room_members[self.booking_id] += 1
+        return True
+
+    async def chat(self, rate, until, rng):
+        """Send messages with exponential gaps (a Poisson process) until the deadline"""
+        self.chatting = True
+        seq = 0
+        while True:
+            await asyncio.sleep(rng.expovariate(rate))
+            if time.perf_counter() >= until or not self.sio.connected:
+                return
+            seq += 1
+            self.stats.sent += 1
+            self.stats.expected += self.stats.room_members[self.booking_id]
+            text = f'{MARKER}{self.index}:{seq}:{time.perf_counter():.6f}'
+            await self.sio.emit('send_message', {'token': self.token, 'booking_id': self.booking_id, 'message': text})
+
+    async def close(self):
+        self.closing = True
+        try:
+            await self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def load_sessions(database_url, rooms):
+    """(booking_id, client user, runner user) for `rooms` bookings, plus a token per user"""
+    from flask_jwt_extended import JWTManager, create_access_token
+    from generate_dataset import make_app
+    from src.models.user import db, Booking, Runner
+
+    app = make_app(database_url)
+    JWTManager(app)
+    with app.app_context():
+        sessions = db.session.query(Booking.id, Booking.user_id, Runner.user_id)\
+            .join(Runner, Runner.id == Booking.runner_id).order_by(Booking.id.desc()).limit(rooms).all()
+        user_ids = {user_id for session in sessions for user_id in session[1:]}
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in user_ids}
+    return [tuple(session) for session in sessions], tokens
+
+
+def summarize(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    return {'p50': round(percentile(values, 50), 2), 'p95': round(percentile(values, 95), 2),
+            'p99': round(percentile(values, 99), 2), 'max': round(max(values), 2)}
+
+
+async def ramp(clients, stats, pool, step, concurrency, timeout, max_connect_ms):
+    """Connect clients in waves; stop at the first wave that fails or gets too slow"""
+    limit = asyncio.Semaphore(concurrency)
+    connected, waves = [], []
+
+    async def connect(client):
+        async with limit:
+            return await client.connect(timeout)
+
+    for start in range(0, len(clients), step):
+        wave = clients[start:start + step]
+        first_sample = len(stats.connect_ms)
+        results = await asyncio.gather(*(connect(client) for client in wave))
+        connected += [client for client, ok in zip(wave, results) if ok]
+        wave_ms = stats.connect_ms[first_sample:]
+        failures = len(wave) - sum(results)
+        record = {'connected': len(connected), 'failures': failures,
+                  'p95_connect_ms': round(percentile(wave_ms, 95), 2) if wave_ms else None,
+                  'server_rss_mb': [round(kb / 1024, 1) if kb else None for kb in pool.rss_kb()]}
+        record['saturated'] = failures > 0.01 * len(wave) or bool(wave_ms and record['p95_connect_ms'] > max_connect_ms)
+        waves.append(record)
+        print(f"  {record['connected']:>7,} connected  {failures:>5} failed  "
+              f"p95 connect {record['p95_connect_ms']} ms  rss {record['server_rss_mb']} MB", flush=True)
+        if record['saturated']:
+            break
+    return connected, waves
+
+
+async def run_load(args, sessions, tokens, pool):
+    stats = Stats()
+    urls = pool.urls
+    clients = []
+    for i in range(args.clients):
+        booking_id, client_user, runner_user = sessions[(i // 2) % len(sessions)]
+        user_id = client_user if i % 2 == 0 else runner_user
+        # Consecutive clients share a room and land on different servers
+        client = SimClient(i, urls[i % len(urls)], user_id, tokens[user_id], booking_id, stats, args.protocol)
+        client.read_ratio = args.read_ratio
+        clients.append(client)
+
+    baseline_kb = pool.rss_kb()
+    print(f"Connecting {args.clients:,} clients to {len(urls)} server(s)...", flush=True)
+    connected, waves = await ramp(clients, stats, pool, args.ramp_step or args.clients, args.connect_concurrency,
+                                  args.connect_timeout, args.max_connect_ms)
+
+    per_server = Counter(urls.index(client.url) for client in connected)
+    per_connection = [(after - before) / per_server[i] for i, (before, after)
+                      in enumerate(zip(baseline_kb, pool.rss_kb())) if before and after and per_server[i]]
+
+    print(f"Chatting for {args.duration}s at {args.rate} msg/s per client...", flush=True)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    until = started + args.duration
+    await asyncio.gather(*(client.chat(args.rate, until, random.Random(rng.random())) for client in connected))
+    await asyncio.sleep(args.drain)   # Let in-flight deliveries arrive
+    elapsed = time.perf_counter() - started
+    for client in connected:
+        client.chatting = False
+    await asyncio.gather(*(client.close() for client in connected))
+
+    saturated = waves[-1]['saturated']
+    healthy = waves[-2]['connected'] if saturated and len(waves) > 1 else (0 if saturated else len(connected))
+    return {
+        'clients': args.clients,
+        'connected': len(connected),
+        'servers': len(urls),
+        'connect_ms': summarize(stats.connect_ms),
+        'connect_failures': stats.connect_failures,
+        'messages': {
+            'sent': stats.sent,
+            'rejected': stats.rejected,
+            'expected_deliveries': stats.expected,
+            'delivered': stats.delivered,
+            'dropped': max(0, stats.expected - stats.delivered),
+            'deliveries_per_second': round(stats.delivered / elapsed, 1) if elapsed else None,
+        },
+        'latency_ms': summarize(stats.latency_ms),
+        'reads': {'requested': stats.reads_requested, 'acknowledged': stats.reads_acked},
+        'unexpected_disconnects': stats.disconnects,
+        'errors': dict(stats.errors.most_common(10)),
+        'memory_kb_per_connection': round(sum(per_connection) / len(per_connection), 1) if per_connection else None,
+        'ramp': waves,
+        'ceiling_per_node': healthy // len(urls) if saturated else None,
+    }
+
+
+def print_report(results):
+    print(f"\n{results['connected']:,}/{results['clients']:,} clients connected to {results['servers']} server(s) "
+          f"({results['connect_failures']} failed)")
+    print(f"{'':<24} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, key in (('connect (ms)', 'connect_ms'), ('delivery latency (ms)', 'latency_ms')):
+        stats = results[key]
+        print(f"{name:<24} {stats['p50']!s:>9} {stats['p95']!s:>9} {stats['p99']!s:>9} {stats['max']!s:>9}")
+    messages = results['messages']
+    print(f"\nmessages sent {messages['sent']:,}, rejected {messages['rejected']:,}, "
+          f"delivered {messages['delivered']:,}/{messages['expected_deliveries']:,} "
+          f"({messages['deliveries_per_second']}/s), dropped {messages['dropped']:,}")
+    print(f"reads acknowledged {results['reads']['acknowledged']:,}/{results['reads']['requested']:,}, "
+          f"unexpected disconnects {results['unexpected_disconnects']}")
+    print(f"server memory per connection: {results['memory_kb_per_connection']} KB")
+    if results['ceiling_per_node'] == 0:
+        step = results['settings']['ramp_step'] or results['clients']
+        print(f"connection ceiling: below {step // results['servers']:,} per node "
+              f"(first wave saturated; try a smaller --ramp-step)")
+    elif results['ceiling_per_node'] is not None:
+        print(f"connection ceiling: ~{results['ceiling_per_node']:,} per node")
+    elif len(results['ramp']) > 1:
+        print(f"connection ceiling: not reached at {results['connected']:,} clients")
+    for message, count in results['errors'].items():
+        print(f"  error x{count}: {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000, help='Simulated clients (two per booking room)')
+    parser.add_argument('--servers', type=int, default=1, help='Server processes (>1 uses a message queue)')
+    parser.add_argument('--rate', type=float, default=0.1, help='Messages per second per client')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of chatting after the ramp')
+    parser.add_argument('--drain', type=float, default=2, help='Seconds to wait for in-flight deliveries')
+    parser.add_argument('--protocol', type=int, default=2, choices=(1, 2),
+                        help='Chat payload protocol: 1 = one new_message per message, 2 = compact batches')
+    parser.add_argument('--read-ratio', type=float, default=1.0, help='Share of received messages marked read')
+    parser.add_argument('--ramp-step', type=int, help='Connect in waves of this size, stopping when saturated')
+    parser.add_argument('--max-connect-ms', type=float, default=5000,
+                        help='Wave p95 connect time that counts as saturated')
+    parser.add_argument('--connect-concurrency', type=int, default=200, help='Connection attempts in flight')
+    parser.add_argument('--connect-timeout', type=float, default=15)
+    parser.add_argument('--database-url', help='Use this existing dataset instead of a generated temporary one')
+    parser.add_argument('--redis-url', help='Real Redis for the message queue instead of the local stand-in')
+    parser.add_argument('--server-command', help='Server command line with {port}, e.g. a gunicorn invocation')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        return serve(args.serve)
+    try:
+        import aiohttp  # noqa: F401  (socketio.AsyncClient transport)
+    except ImportError:
+        parser.error('the load harness needs aiohttp: pip install aiohttp')
+
+    raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix='chat-load-')
+    rooms = (args.clients + 1) // 2
+    database_url = args.database_url
+    if not database_url:
+        import generate_dataset
+        database_url = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+        runners = max(2, rooms // 5)
+        print(f"Generating fixture with {rooms:,} booking rooms...", flush=True)
+        generate_dataset.main(['--database-url', database_url, '--users', str(runners + rooms + 1),
+                               '--runners', str(runners), '--bookings', str(rooms), '--messages-per-booking', '0',
+                               '--seed', str(args.seed), '--skip-search-index'])
+    sessions, tokens = load_sessions(database_url, rooms)
+
+    broker = None
+    redis_url = args.redis_url
+    if args.servers > 1 and not redis_url:
+        broker = RedisStandIn().start()
+        redis_url = broker.url
+    pool = ServerPool(args.servers, database_url, redis_url, args.server_command, os.path.join(workdir, 'servers.log'))
+    try:
+        pool.start()
+        results = asyncio.run(run_load(args, sessions, tokens, pool))
+    except Exception:
+        print(f'Server logs kept in {workdir}', file=sys.stderr)
+        raise
+    finally:
+        pool.stop()
+        if broker:
+            broker.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    results['message_queue'] = ('local stand-in' if broker else redis_url) if args.servers > 1 else None
+    results['settings'] = {key: value for key, value in vars(args).items() if key != 'serve'}
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic dataset generator for load testing and query tuning.
+
+Writes users, runners, runner services, bookings, reviews and chat messages
+in bulk (executemany on SQLite, COPY on PostgreSQL) with one precomputed
+password hash, explicit ids and realistic distributions:
+
+  * runners cluster around weighted US cities; popular runners get most work
+  * sign-ups grow over time; bookings peak on Friday/Saturday evenings
+  * past bookings are mostly completed, future ones pending/accepted
+  * ratings skew high; chat volume per booking is geometric
+
+The same --seed and sizes always produce the same rows.
+
+    python generate_dataset.py --database-url sqlite:////tmp/urban.db --scale small
+    python generate_dataset.py --database-url postgresql://... --scale production
+    python generate_dataset.py --database-url sqlite:////tmp/urban.db --users 50000 --bookings 200000
+
+Every user's password is "password123". Then benchmark with:
+    python benchmark.py --database-url sqlite:////tmp/urban.db --skip-fixture
+"""
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from bisect import bisect
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+SCALES = {
+    #             users      runners  bookings    reviews/completed  messages/booking
+    'small':      (10_000,   1_000,   50_000,     0.35,              2.0),
+    'medium':     (100_000,  10_000,  1_000_000,  0.35,              2.0),
+    'production': (1_000_000, 100_000, 10_000_000, 0.35,             3.0),
+}
+
+# (city, state, latitude, longitude, timezone, weight)
+CITIES = [
+    ('New York', 'NY', 40.7128, -74.0060, 'America/New_York', 19),
+    ('Los Angeles', 'CA', 34.0522, -118.2437, 'America/Los_Angeles', 13),
+    ('Chicago', 'IL', 41.8781, -87.6298, 'America/Chicago', 9),
+    ('Houston', 'TX', 29.7604, -95.3698, 'America/Chicago', 7),
+    ('Phoenix', 'AZ', 33.4484, -112.0740, 'America/Phoenix', 5),
+    ('Philadelphia', 'PA', 39.9526, -75.1652, 'America/New_York', 6),
+    ('San Antonio', 'TX', 29.4241, -98.4936, 'America/Chicago', 3),
+    ('San Diego', 'CA', 32.7157, -117.1611, 'America/Los_Angeles', 3),
+    ('Dallas', 'TX', 32.7767, -96.7970, 'America/Chicago', 7),
+    ('Austin', 'TX', 30.2672, -97.7431, 'America/Chicago', 3),
+    ('Seattle', 'WA', 47.6062, -122.3321, 'America/Los_Angeles', 4),
+    ('Denver', 'CO', 39.7392, -104.9903, 'America/Denver', 3),
+    ('Boston', 'MA', 42.3601, -71.0589, 'America/New_York', 5),
+    ('Atlanta', 'GA', 33.7490, -84.3880, 'America/New_York', 6),
+    ('Miami', 'FL', 25.7617, -80.1918, 'America/New_York', 6),
+    ('Springfield', 'IL', 39.7817, -89.6501, 'America/Chicago', 1),
+]
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Maria',
+               'Wei', 'Aisha', 'Mohammed', 'Priya', 'Kenji', 'Olga', 'Tunde', 'Sofia', 'Liam', 'Noah']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Lee',
+              'Nguyen', 'Patel', 'Kim', 'Okafor', 'Cohen', 'Ivanova', 'Tanaka', 'Silva', 'Murphy', 'Khan']
+BIO_PHRASES = ['Reliable and punctual', 'Own car and insurance', 'Happy to help with errands', 'Pet lover',
+               'Experienced mover', 'Grocery runs in under an hour', 'Friendly and careful', 'Available evenings',
+               'Handy with furniture assembly', 'Background checked', 'Fluent in Spanish', 'Great with seniors']
+TASKS = ['Grocery run', 'Pharmacy pickup', 'Dog walk', 'Dry cleaning', 'Package return', 'Furniture assembly',
+         'Apartment cleaning', 'Move boxes', 'Queue for tickets', 'Deliver documents', 'Farmers market', 'Plant care']
+MESSAGES = ['On my way!', 'Running 10 minutes late, sorry', 'Is the side door OK?', 'Thanks so much!',
+            'Which brand do you prefer?', 'All done, photos attached', 'Can we move it an hour later?',
+            'Here now', 'Receipt is on the counter', 'Sounds good', 'Could you grab milk too?', 'See you soon']
+COMMENTS = ['Fantastic, will book again', 'Quick and friendly', 'Great communication', 'Did exactly what I asked',
+            'A bit late but good work', 'Careful with my things', 'Not what I expected', 'Super helpful', None, None]
+
+# Relative demand by weekday (Mon..Sun) and hour of day
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.85, 0.9, 1.4, 1.6, 1.1]
+HOUR_WEIGHTS = [0.05, 0.02, 0.01, 0.01, 0.02, 0.1, 0.4, 0.8, 1.0, 1.1, 1.2, 1.2,
+                1.3, 1.2, 1.1, 1.1, 1.3, 1.6, 1.9, 1.8, 1.4, 0.9, 0.4, 0.15]
+RATING_WEIGHTS = [2, 3, 8, 25, 62]   # 1..5 stars
+ESTIMATED_HOURS = [1, 1, 1, 1.5, 2, 2, 3, 4]
+
+
+def password_hash(password, seed):
+    """Werkzeug-compatible scrypt hash with a seed-derived salt, so reruns write identical rows"""
+    salt = hashlib.sha256(f'salt:{seed}'.encode()).hexdigest()[:16]
+    n, r, p = 2 ** 15, 8, 1
+    digest = hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=132 * n * r * p)
+    return f'scrypt:{n}:{r}:{p}${salt}${digest.hex()}'
+
+
+def cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def zipf_weights(n, exponent):
+    return cumulative(1.0 / (rank + 1) ** exponent for rank in range(n))
+
+
+class BulkWriter:
+    """Inserts row tuples through COPY (PostgreSQL) or executemany (everything else)"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.postgres = connection.dialect.name == 'postgresql'
+        self.explicit_ids = set()   # Tables loaded with their own id values
+
+    def _convert(self, rows):
+        """Adapt datetime/bool columns for the driver, converting column-wise"""
+        if self.postgres:
+            converters = {datetime: lambda v: v.isoformat(' '), bool: lambda v: 't' if v else 'f'}
+        else:
+            # SQLAlchemy's SQLite storage format, so ORM comparisons still match
+            converters = {datetime: lambda v: v.isoformat(' ', 'microseconds'), bool: int}
+        columns = [list(column) for column in zip(*rows)]
+        for column in columns:
+            sample = next((v for v in column if v is not None), None)
+            convert = converters.get(type(sample))
+            if convert:
+                column[:] = [None if v is None else convert(v) for v in column]
+        return list(zip(*columns))
+
+    def write(self, table, columns, rows):
+        if not rows:
+            return
+        rows = self._convert(rows)
+        if 'id' in columns:
+            self.explicit_ids.add(table)
+        if self.postgres:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor = self.connection.connection.dbapi_connection.cursor()
+            cursor.copy_expert(f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.close()
+        else:
+            sql = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+            self.connection.exec_driver_sql(sql, rows)
+
+    def sync_sequences(self):
+        """Move PostgreSQL id sequences past the loaded ids, or the app's next INSERT collides with them"""
+        if not self.postgres:
+            return
+        for table in sorted(self.explicit_ids):
+            quoted = f'"{table}"'
+            self.connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{quoted}', 'id'), MAX(id)) FROM {quoted}")
+        self.connection.commit()
+
+
+class Generator:
+    def __init__(self, connection, args):
+        self.connection = connection
+        self.writer = BulkWriter(connection)
+        self.args = args
+        self.seed = args.seed
+        self.anchor = datetime.fromisoformat(args.anchor)
+        self.batch_size = args.batch_size
+
+    def rng(self, name):
+        # Independent stream per table so changing one size does not reshuffle the others
+        return random.Random(f'{self.seed}:{name}')
+
+    def next_id(self, table):
+        return (self.connection.exec_driver_sql(f'SELECT MAX(id) FROM "{table}"').scalar() or 0) + 1
+
+    def flush(self, table, columns, rows, counter):
+        self.writer.write(table, columns, rows)
+        self.connection.commit()
+        counter[table] = counter.get(table, 0) + len(rows)
+        rows.clear()
+
+    def users(self, counter):
+        from src.models.user import UserRole
+
+        rng = self.rng('users')
+        hashed = password_hash('password123', self.seed)
+        start = self.next_id('user')
+        total, runners = self.args.users, self.args.runners
+        span = timedelta(days=3 * 365)
+        columns = ('id', 'username', 'email', 'password_hash', 'first_name', 'last_name', 'phone', 'role',
+                   'is_active', 'is_verified', 'email_verified', 'two_factor_enabled', 'created_at', 'updated_at')
+        rows = []
+        for i in range(total):
+            user_id = start + i
+            if i < runners:
+                role = UserRole.RUNNER
+            elif i == total - 1:
+                role = UserRole.ADMIN
+            else:
+                role = UserRole.USER
+            # sqrt skews sign-ups toward the recent past (growing user base)
+            created = self.anchor - span * (1 - math.sqrt(rng.random()))
+            rows.append((user_id, f'user{user_id}', f'user{user_id}@example.com', hashed,
+                         rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f'555-{rng.randint(1000000, 9999999)}',
+                         role.name, True, rng.random() < 0.6, rng.random() < 0.8, False, created, created))
+            if len(rows) >= self.batch_size:
+                self.flush('user', columns, rows, counter)
+        self.flush('user', columns, rows, counter)
+        self.runner_user_ids = list(range(start, start + runners))
+        self.client_ids = list(range(start + runners, start + total - 1))
+
+    def runners(self, counter):
+        rng = self.rng('runners')
+        start = self.next_id('runner')
+        city_weights = cumulative(city[5] for city in CITIES)
+        service_ids = [row[0] for row in self.connection.exec_driver_sql('SELECT id FROM service ORDER BY id')]
+        service_weights = zipf_weights(len(service_ids), 0.7)
+
+        self.runner_city, self.runner_rate = [], []
+        columns = ('id', 'user_id', 'bio', 'hourly_rate', 'city', 'state', 'country', 'latitude', 'longitude',
+                   'is_available', 'timezone', 'is_verified', 'rating', 'total_reviews', 'total_bookings',
+                   'created_at', 'updated_at')
+        rows, links = [], []
+        for i, user_id in enumerate(self.runner_user_ids):
+            runner_id = start + i
+            city_index = bisect(city_weights, rng.random() * city_weights[-1])
+            city, state, lat, lon, zone, _ = CITIES[city_index]
+            rate = round(min(150.0, max(12.0, rng.lognormvariate(math.log(25), 0.35))), 2)
+            created = self.anchor - timedelta(days=rng.randint(0, 3 * 365))
+            rows.append((runner_id, user_id, '. '.join(rng.sample(BIO_PHRASES, 2)) + '.', rate, city, state, 'USA',
+                         lat + rng.gauss(0, 0.08), lon + rng.gauss(0, 0.08), rng.random() < 0.85, zone,
+                         rng.random() < 0.5, 0.0, 0, 0, created, created))
+            for service_id in {service_ids[bisect(service_weights, rng.random() * service_weights[-1])]
+                               for _ in range(rng.randint(1, 4))}:
+                links.append((runner_id, service_id))
+            self.runner_city.append(city_index)
+            self.runner_rate.append(rate)
+            if len(rows) >= self.batch_size:
+                self.flush('runner', columns, rows, counter)
+                self.flush('runner_services', ('runner_id', 'service_id'), links, counter)
+        self.flush('runner', columns, rows, counter)
+        self.flush('runner_services', ('runner_id', 'service_id'), links, counter)
+        self.runner_ids = list(range(start, start + len(self.runner_user_ids)))
+        self.service_ids = service_ids
+
+    def bookings(self, counter):
+        """Bookings with their reviews and chat messages, generated in one streaming pass"""
+        rng = self.rng('bookings')
+        booking_id, review_id, message_id = self.next_id('booking'), self.next_id('review'), self.next_id('chat_message')
+        runner_weights = zipf_weights(len(self.runner_ids), 0.8)
+        runner_order = list(range(len(self.runner_ids)))
+        random.Random(f'{self.seed}:popularity').shuffle(runner_order)   # Popularity independent of id
+        client_weights = zipf_weights(len(self.client_ids), 0.5)
+        hour_weights = cumulative(HOUR_WEIGHTS)
+        max_weekday = max(WEEKDAY_WEIGHTS)
+        history, future = timedelta(days=2 * 365), timedelta(days=30)
+        review_rate, messages_per_booking = self.args.review_rate, self.args.messages_per_booking
+        continue_chat = messages_per_booking / (1 + messages_per_booking)   # Geometric with this mean
+
+        booking_columns = ('id', 'user_id', 'runner_id', 'service_id', 'title', 'description', 'location',
+                           'latitude', 'longitude', 'scheduled_date', 'end_date', 'estimated_hours', 'hourly_rate',
+                           'total_amount', 'status', 'payment_status', 'version', 'created_at', 'updated_at',
+                           'completed_at')
+        review_columns = ('id', 'booking_id', 'reviewer_id', 'reviewee_id', 'rating', 'comment', 'is_flagged',
+                          'is_approved', 'created_at', 'updated_at')
+        message_columns = ('id', 'booking_id', 'sender_id', 'receiver_id', 'message', 'message_type', 'is_read',
+                           'created_at')
+        bookings, reviews, messages = [], [], []
+
+        for _ in range(self.args.bookings):
+            runner_index = runner_order[bisect(runner_weights, rng.random() * runner_weights[-1])]
+            runner_id, runner_user = self.runner_ids[runner_index], self.runner_user_ids[runner_index]
+            client_id = self.client_ids[bisect(client_weights, rng.random() * client_weights[-1])]
+            _, _, lat, lon, _, _ = CITIES[self.runner_city[runner_index]]
+
+            # Weekly seasonality by rejection, time of day by weighted choice, growth via sqrt
+            while True:
+                day = self.anchor + future - (history + future) * (1 - math.sqrt(rng.random()))
+                if rng.random() * max_weekday < WEEKDAY_WEIGHTS[day.weekday()]:
+                    break
+            hour = bisect(hour_weights, rng.random() * hour_weights[-1])
+            scheduled = day.replace(hour=hour, minute=rng.choice((0, 15, 30, 45)), second=0, microsecond=0)
+            hours = rng.choice(ESTIMATED_HOURS)
+            end = scheduled + timedelta(hours=hours)
+            created = scheduled - timedelta(minutes=rng.randint(30, 7 * 24 * 60))
+
+            if end < self.anchor:
+                roll = rng.random()
+                status = 'completed' if roll < 0.82 else 'cancelled' if roll < 0.93 else 'declined'
+            else:
+                status = 'accepted' if rng.random() < 0.6 else 'pending'
+            completed_at = end if status == 'completed' else None
+            rate = self.runner_rate[runner_index]
+            bookings.append((booking_id, client_id, runner_id, rng.choice(self.service_ids), rng.choice(TASKS), None,
+                             None, lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.05), scheduled, end, hours, rate,
+                             round(rate * hours, 2), status, 'paid' if status == 'completed' else 'pending',
+                             1, created, completed_at or created, completed_at))
+
+            if status == 'completed' and rng.random() < review_rate:
+                rating = bisect(cumulative(RATING_WEIGHTS), rng.random() * 100) + 1
+                reviewed = end + timedelta(hours=rng.randint(1, 96))
+                reviews.append((review_id, booking_id, client_id, runner_user, rating, rng.choice(COMMENTS),
+                                rng.random() < 0.01, True, reviewed, reviewed))
+                review_id += 1
+
+            if status != 'declined':
+                sent = created
+                sender, receiver = client_id, runner_user
+                while rng.random() < continue_chat:
+                    sent = sent + (end - sent) * rng.random() * 0.3
+                    messages.append((message_id, booking_id, sender, receiver, rng.choice(MESSAGES), 'text',
+                                     sent < self.anchor, sent))
+                    message_id += 1
+                    if rng.random() < 0.7:
+                        sender, receiver = receiver, sender
+
+            booking_id += 1
+            if len(bookings) >= self.batch_size:
+                self.flush('booking', booking_columns, bookings, counter)
+                self.flush('review', review_columns, reviews, counter)
+                self.flush('chat_message', message_columns, messages, counter)
+                self.progress(counter)
+        self.flush('booking', booking_columns, bookings, counter)
+        self.flush('review', review_columns, reviews, counter)
+        self.flush('chat_message', message_columns, messages, counter)
+
+    def aggregates(self):
+        """Denormalized runner counters, computed set-based after the load"""
+        self.connection.exec_driver_sql("""
+            UPDATE runner SET total_bookings = agg.n
+            FROM (SELECT runner_id, COUNT(*) AS n FROM booking WHERE status = 'completed' GROUP BY runner_id) AS agg
+            WHERE agg.runner_id = runner.id
+        """)
+        self.connection.exec_driver_sql("""
+            UPDATE runner SET rating = agg.rating, total_reviews = agg.n
+            FROM (SELECT reviewee_id, ROUND(AVG(rating), 1) AS rating, COUNT(*) AS n
+                  FROM review WHERE is_approved GROUP BY reviewee_id) AS agg
+            WHERE agg.reviewee_id = runner.user_id
+        """)
+        self.connection.commit()
+
+    def progress(self, counter):
+        elapsed = time.perf_counter() - self.started
+        done = counter.get('booking', 0)
+        print(f"  bookings {done:,}/{self.args.bookings:,} "
+              f"({done / elapsed:,.0f}/s, reviews {counter.get('review', 0):,}, "
+              f"messages {counter.get('chat_message', 0):,})", flush=True)
+
+    def run(self):
+        counter = {}
+        self.started = time.perf_counter()
+        for step in (self.users, self.runners, self.bookings):
+            step_start = time.perf_counter()
+            step(counter)
+            print(f"{step.__name__}: done in {time.perf_counter() - step_start:.1f}s", flush=True)
+        self.aggregates()
+        self.writer.sync_sequences()
+        return counter
+
+
+def make_app(database_url):
+    """Minimal app bound to the target database (no seeding, no blueprints)"""
+    from flask import Flask
+    from src.config import config
+    from src.models.user import db
+
+    app = Flask(__name__)
+    app.config.from_object(config['production'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int, help='Total users (runners included)')
+    parser.add_argument('--runners', type=int)
+    parser.add_argument('--bookings', type=int)
+    parser.add_argument('--review-rate', type=float, help='Share of completed bookings that get a review')
+    parser.add_argument('--messages-per-booking', type=float, help='Mean chat messages per booking')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', default='2026-01-01', help='"Now" for the dataset; fixed for reproducibility')
+    parser.add_argument('--batch-size', type=int, default=20_000)
+    parser.add_argument('--skip-search-index', action='store_true', help='Do not rebuild the full-text index')
+    args = parser.parse_args(argv)
+
+    users, runners, bookings, review_rate, messages = SCALES[args.scale]
+    args.users = args.users or users
+    args.runners = args.runners or runners
+    args.bookings = args.bookings if args.bookings is not None else bookings
+    args.review_rate = args.review_rate if args.review_rate is not None else review_rate
+    args.messages_per_booking = args.messages_per_booking if args.messages_per_booking is not None else messages
+    if args.runners >= args.users:
+        parser.error('--users must be larger than --runners')
+
+    from src.models.user import db
+    from src.seed_data import seed_services
+    from src.search import get_backend, init_search, rebuild_index
+
+    app = make_app(args.database_url)
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        init_search(app)
+        seed_services()
+        with db.engine.connect() as connection:
+            if connection.dialect.name == 'sqlite':
+                # Durability is irrelevant while loading a throwaway dataset
+                connection.exec_driver_sql('PRAGMA synchronous = OFF')
+                connection.exec_driver_sql('PRAGMA cache_size = -262144')
+            counter = Generator(connection, args).run()
+        if not args.skip_search_index and get_backend(db.session.connection()):
+            rebuild_index()
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('ANALYZE')
+            connection.commit()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counter.values())
+    print(f"\nLoaded {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    for table, count in counter.items():
+        print(f"  {table:<16} {count:>12,}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -108,6 +108,15 @@ def migrate_database():
         
         # Commit changes
         conn.commit()
+        
+        # Columns and indexes added to the models since (the same upgrade runs at app startup)
+        from sqlalchemy import create_engine
+        from src.models.user import db
+        from src.schema import upgrade_schema
+        engine = create_engine(f'sqlite:///{db_path}')
+        db.metadata.create_all(engine)   # New tables, as at app startup
+        for name in upgrade_schema(engine, db.metadata):
+            print(f"✓ Added {name}")
         print("✓ Database migration completed successfully!")
         
         return True
@@ -0,0 +1,157 @@
+"""
+Weekly runner schedules stored as compact slot bitmaps.
+
+A week is 672 fifteen-minute slots (bit 0 = Monday 00:00 in the runner's
+timezone), packed little-endian into 84 bytes on Runner.availability_bitmap.
+Checking whether a runner is free for a window is then one AND against a
+precomputed mask, so thousands of candidates can be filtered per request
+with a handful of batched queries for exceptions and bookings.
+"""
+import math
+from datetime import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from src.models.user import db, AvailabilityException, Booking, ACTIVE_STATUS_CLAUSE
+from src.scheduling import booking_window
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+BITMAP_BYTES = SLOTS_PER_WEEK // 8
+FULL_WEEK = (1 << SLOTS_PER_WEEK) - 1
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Keep IN (...) lists well under database bind parameter limits
+QUERY_CHUNK_SIZE = 500
+
+
+def get_zone(name):
+    """Return the ZoneInfo for name, falling back to UTC for unknown zones"""
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def _parse_slot(value):
+    hours, minutes = (int(part) for part in value.split(':'))
+    total = hours * 60 + minutes
+    if total % SLOT_MINUTES or not 0 <= total <= 24 * 60:
+        raise ValueError(f'Times must be HH:MM on a {SLOT_MINUTES}-minute boundary: {value}')
+    return total // SLOT_MINUTES
+
+
+def _format_slot(slot):
+    minutes = slot * SLOT_MINUTES
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def encode_schedule(weekly):
+    """Encode {'monday': [['09:00', '17:00'], ...], ...} into a bitmap"""
+    bits = 0
+    for day, ranges in weekly.items():
+        if day not in WEEKDAYS:
+            raise ValueError(f'Unknown weekday: {day}')
+        offset = WEEKDAYS.index(day) * SLOTS_PER_DAY
+        for start, end in ranges:
+            first, last = _parse_slot(start), _parse_slot(end)
+            if last <= first:
+                raise ValueError(f'Range end must be after start: {start}-{end}')
+            bits |= ((1 << (last - first)) - 1) << (offset + first)
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def decode_schedule(bitmap):
+    """Decode a bitmap back into per-day ['HH:MM', 'HH:MM'] ranges"""
+    bits = int.from_bytes(bitmap, 'little') if bitmap else 0
+    weekly = {}
+    for index, day in enumerate(WEEKDAYS):
+        day_bits = (bits >> (index * SLOTS_PER_DAY)) & ((1 << SLOTS_PER_DAY) - 1)
+        ranges = []
+        slot = 0
+        while slot < SLOTS_PER_DAY:
+            if day_bits >> slot & 1:
+                start = slot
+                while slot < SLOTS_PER_DAY and day_bits >> slot & 1:
+                    slot += 1
+                ranges.append([_format_slot(start), _format_slot(slot)])
+            else:
+                slot += 1
+        weekly[day] = ranges
+    return weekly
+
+
+def window_mask(local_start, hours):
+    """Bit mask of the weekly slots covered by a window starting at local_start"""
+    minute_of_week = local_start.weekday() * 24 * 60 + local_start.hour * 60 + local_start.minute
+    first = minute_of_week // SLOT_MINUTES
+    last = math.ceil((minute_of_week + float(hours) * 60) / SLOT_MINUTES)
+    count = last - first
+    if count >= SLOTS_PER_WEEK:
+        return FULL_WEEK
+    mask = ((1 << count) - 1) << first
+    # Windows running past Sunday midnight wrap around to Monday
+    return (mask | (mask >> SLOTS_PER_WEEK)) & FULL_WEEK
+
+
+def _chunks(items, size=QUERY_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def filter_available(candidates, start, hours):
+    """
+    Return the ids of candidates free for `hours` starting at `start`.
+
+    candidates is an ordered iterable of (runner_id, availability_bitmap, timezone)
+    rows; the result keeps that order.
+    """
+    start, end = booking_window(start, hours)
+    utc_start = start.replace(tzinfo=timezone.utc)
+    masks = {}
+    on_schedule = {}
+    order = []
+
+    for runner_id, bitmap, tz_name in candidates:
+        order.append(runner_id)
+        if not bitmap:
+            # No declared schedule: available whenever is_available is set
+            on_schedule[runner_id] = True
+            continue
+        mask = masks.get(tz_name)
+        if mask is None:
+            mask = masks[tz_name] = window_mask(utc_start.astimezone(get_zone(tz_name)), hours)
+        on_schedule[runner_id] = int.from_bytes(bitmap, 'little') & mask == mask
+
+    # Exceptions override the weekly schedule in both directions
+    for chunk in _chunks(order):
+        exceptions = db.session.query(
+            AvailabilityException.runner_id,
+            AvailabilityException.start_date,
+            AvailabilityException.end_date,
+            AvailabilityException.is_available
+        ).filter(
+            AvailabilityException.runner_id.in_(chunk),
+            AvailabilityException.start_date < end,
+            AvailabilityException.end_date > start
+        ).all()
+        time_off = set()
+        for runner_id, exc_start, exc_end, is_available in exceptions:
+            if not is_available:
+                time_off.add(runner_id)
+            elif exc_start <= start and exc_end >= end:
+                on_schedule[runner_id] = True
+        for runner_id in time_off:
+            on_schedule[runner_id] = False
+
+    available = [runner_id for runner_id in order if on_schedule[runner_id]]
+
+    # Finally drop anyone already booked during the window
+    booked = set()
+    for chunk in _chunks(available):
+        booked.update(runner_id for (runner_id,) in db.session.query(Booking.runner_id).filter(
+            Booking.runner_id.in_(chunk),
+            ACTIVE_STATUS_CLAUSE,
+            Booking.scheduled_date < end,
+            Booking.end_date > start
+        ).distinct())
+    return [runner_id for runner_id in available if runner_id not in booked]
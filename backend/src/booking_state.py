@@ -0,0 +1,89 @@
+"""
+Booking state machine.
+
+Transitions are applied with a single conditional UPDATE that only matches
+when the booking is still in the expected status and version, so concurrent
+or repeated requests cannot both succeed. Side effects on counters are
+enqueued as jobs in the same transaction, and every transition is appended
+to booking_event.
+"""
+from datetime import datetime
+from sqlalchemy import update
+from src.jobs import enqueue
+from src.models.user import db, Booking, BookingEvent
+from src.response_cache import booking_tags, invalidate
+
+# Allowed next statuses for each status; declined, completed and cancelled are final
+TRANSITIONS = {
+    'pending': {'accepted', 'declined', 'cancelled'},
+    'accepted': {'in_progress', 'cancelled'},
+    'in_progress': {'completed', 'cancelled'},
+    'declined': set(),
+    'completed': set(),
+    'cancelled': set(),
+}
+
+# Who may move a booking into each status
+RUNNER_ONLY_STATUSES = {'accepted', 'declined', 'in_progress', 'completed'}
+EITHER_PARTY_STATUSES = {'cancelled'}
+
+
+class InvalidTransition(Exception):
+    """The requested status cannot follow the booking's current status"""
+
+
+class TransitionConflict(Exception):
+    """The booking changed since it was read (status or version no longer match)"""
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def record_event(booking_id, from_status, to_status, version, actor_id=None):
+    db.session.add(BookingEvent(
+        booking_id=booking_id,
+        actor_id=actor_id,
+        from_status=from_status,
+        to_status=to_status,
+        version=version
+    ))
+
+
+def transition(booking_id, expected_status, expected_version, new_status, actor_id=None):
+    """
+    Move a booking from expected_status to new_status if it is still at expected_version.
+
+    Runs inside the caller's transaction; the caller commits. Raises
+    InvalidTransition for illegal moves and TransitionConflict when another
+    request got there first.
+    """
+    if not can_transition(expected_status, new_status):
+        raise InvalidTransition(f'Cannot change booking from {expected_status} to {new_status}')
+
+    now = datetime.utcnow()
+    values = {'status': new_status, 'version': Booking.version + 1, 'updated_at': now}
+    if new_status == 'completed':
+        values['completed_at'] = now
+
+    updated = db.session.execute(
+        update(Booking)
+        .where(Booking.id == booking_id,
+               Booking.status == expected_status,
+               Booking.version == expected_version)
+        .values(**values)
+        .returning(Booking.runner_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(updated) != 1:
+        raise TransitionConflict('Booking was modified by another request')
+    # Bypasses the ORM, so the cache hook does not see it
+    invalidate(*booking_tags([updated[0].runner_id]))
+
+    if new_status == 'completed':
+        # Counted and credited to the ledger by the job worker; the jobs commit or roll back with this transition
+        enqueue('count_completed_bookings', {'booking_id': booking_id})
+        enqueue('record_earnings', {'booking_id': booking_id})
+
+    record_event(booking_id, expected_status, new_status, expected_version + 1, actor_id)
+    return expected_version + 1
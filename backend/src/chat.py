@@ -1,6 +1,11 @@
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask import request, session
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask_jwt_extended import decode_token # No need for jwt_required, get_jwt_identity here directly
-from src.models.user import db, ChatMessage, User
+from src.models.user import db, ChatMessage, User, Booking
+from src.load_shedding import check_rate_limit
+from src.presence import RoomCoalescer
+from src.chat_protocol import (LEGACY, COMPACT, SUPPORTED, negotiate, protocol_room, message_row,
+                               history_payload, batch_payload)
 from datetime import datetime
 import json
 import os # Import os to use os.getenv for REDIS_URL
@@ -17,11 +22,41 @@ def init_socketio(app):
         cors_allowed_origins=app.config['CORS_ORIGINS'],
         message_queue=os.getenv("REDIS_URL") # Ensure REDIS_URL is set in Render environment variables
     )
+    presence = app.extensions['presence']
+    
+    def flush_room_activity(room, updates):
+        """Send the merged typing and presence changes for one room"""
+        booking_id = int(room.split('_', 1)[1])
+        typing = {user_id: value for (kind, user_id), value in updates.items() if kind == 'typing'}
+        online = {user_id: value for (kind, user_id), value in updates.items() if kind == 'presence'}
+        if typing:
+            socketio.emit('typing', {'booking_id': booking_id, 'typing': typing,
+                                     'expires_in': app.config['TYPING_TIMEOUT']}, room=room)
+        if online:
+            socketio.emit('presence', {'booking_id': booking_id, 'users': online}, room=room)
+    
+    # Typing and presence changes reach each room at most once per interval
+    room_activity = RoomCoalescer(app.config['SOCKET_ACTIVITY_INTERVAL'], flush_room_activity,
+                                  socketio.start_background_task, socketio.sleep)
+    
+    def flush_room_messages(room, updates):
+        """Send the messages of one emit tick: one frame for compact clients, one event each for legacy ones"""
+        booking_id = int(room.split('_', 1)[1])
+        socketio.emit('message_batch', batch_payload(booking_id, [row for row, _ in updates.values()]),
+                      room=protocol_room(room, COMPACT))
+        for _, message_data in sorted(updates.values(), key=lambda update: update[0][0]):
+            socketio.emit('new_message', message_data, room=protocol_room(room, LEGACY))
+    
+    # The first message after a quiet tick goes out at once; a burst shares frames
+    room_messages = RoomCoalescer(app.config['SOCKET_EMIT_TICK'], flush_room_messages,
+                                  socketio.start_background_task, socketio.sleep)
     
     @socketio.on('connect')
     def on_connect(auth):
         """Handles new client connections, including JWT authentication."""
         print('Client connected')
+        # Payload format for this connection, see src/chat_protocol.py
+        protocol = session['protocol'] = negotiate((auth or {}).get('protocol'))
         
         # Authenticate user
         if auth and 'token' in auth:
@@ -30,7 +65,12 @@ def init_socketio(app):
                 user_id = decoded_token['sub']
                 user = User.query.get(user_id) # Ensure this is within an app context if db operations are needed
                 if user:
-                    emit('connected', {'status': 'authenticated', 'user_id': user_id})
+                    presence.connect(user.id, request.sid)
+                    if not presence.heartbeat_started:
+                        presence.heartbeat_started = True
+                        socketio.start_background_task(presence.heartbeat, socketio.sleep)
+                    emit('connected', {'status': 'authenticated', 'user_id': user_id, 'protocol': protocol,
+                                       'protocols': list(SUPPORTED)})
                 else:
                     emit('error', {'message': 'User not found'})
             except Exception as e:
@@ -44,6 +84,11 @@ def init_socketio(app):
     def on_disconnect():
         """Handles client disconnections."""
         print('Client disconnected')
+        user_id, went_offline = presence.disconnect(request.sid)
+        if went_offline:
+            for room in rooms():
+                if room.startswith('booking_') and ':' not in room:   # Not the protocol sub-rooms
+                    room_activity.submit(room, ('presence', user_id), False)
     
     @socketio.on('join_chat')
     def on_join_chat(data):
@@ -63,9 +108,11 @@ def init_socketio(app):
                 emit('error', {'message': 'Booking ID required'})
                 return
                 
-            # Join room for this booking
+            # Join room for this booking, and its sub-room for this connection's payload format
+            protocol = session.get('protocol', LEGACY)
             room = f"booking_{booking_id}"
             join_room(room)
+            join_room(protocol_room(room, protocol))
             
             # Load recent messages for the booking
             # It's good practice to ensure this runs within an application context
@@ -73,26 +120,23 @@ def init_socketio(app):
                 messages = ChatMessage.query.filter_by(booking_id=booking_id)\
                     .order_by(ChatMessage.created_at.desc())\
                     .limit(50).all()
-            
-            message_list = []
-            for msg in reversed(messages): # Reverse to show oldest first
-                # Ensure sender is loaded for sender_name
-                sender_name = "Unknown User"
-                if msg.sender:
-                    sender_name = f"{msg.sender.first_name} {msg.sender.last_name}"
-
-                message_list.append({
-                    'id': msg.id,
-                    'sender_id': msg.sender_id,
-                    'sender_name': sender_name,
-                    'message': msg.message,
-                    'created_at': msg.created_at.isoformat(),
-                    'is_read': msg.is_read
-                })
+                booking = Booking.query.get(booking_id)
+                users = [booking.user, booking.runner.user] if booking else []
+                # Reverse to show oldest first
+                history = history_payload(list(reversed(messages)), protocol, users)
+                participants = [user.id for user in users]
                 
-            emit('chat_history', {'messages': message_list}, room=room) # Emit to the joining user
+            emit('chat_history', history) # Emit to the joining user only
             emit('joined_chat', {'booking_id': booking_id, 'room': room})
             
+            # Tell the joiner who else is online, and the room that the joiner is
+            others = [participant for participant in participants if participant != int(user_id)]
+            if others:
+                emit('presence', {'booking_id': int(booking_id), 'users': {
+                    other: online for other, (online, _) in presence.lookup(others).items()
+                }})
+            room_activity.submit(room, ('presence', int(user_id)), True)
+            
         except Exception as e:
             print(f"Error joining chat: {e}") # Log the error
             emit('error', {'message': str(e)})
@@ -104,6 +148,7 @@ def init_socketio(app):
         if booking_id:
             room = f"booking_{booking_id}"
             leave_room(room)
+            leave_room(protocol_room(room, session.get('protocol', LEGACY)))
             emit('left_chat', {'booking_id': booking_id})
     
     @socketio.on('send_message')
@@ -132,36 +177,62 @@ def init_socketio(app):
             if not booking_id or not message_text:
                 emit('error', {'message': 'Booking ID and message are required'})
                 return
+            
+            retry_after = check_rate_limit('chat_send', user_id)
+            if retry_after:
+                emit('error', {'message': 'Too many messages, please slow down', 'retry_after': retry_after})
+                return
                 
             # Save message to database within app context
             with app.app_context():
+                booking = Booking.query.get(booking_id)
+                if not booking:
+                    emit('error', {'message': 'Booking not found'})
+                    return
+                # Receiver is the other person in the booking
+                receiver_id = booking.runner.user_id if booking.user_id == int(user_id) else booking.user_id
                 message = ChatMessage(
                     booking_id=booking_id,
                     sender_id=user_id,
+                    receiver_id=receiver_id,
                     message=message_text,
                     created_at=datetime.utcnow()
                 )
                 
                 db.session.add(message)
                 db.session.commit()
+                
+                # Build the payload while the message is still bound to this context's session
+                message_data = {
+                    'id': message.id,
+                    'sender_id': user_id,
+                    'sender_name': f"{user.first_name} {user.last_name}", # Use the loaded user's name
+                    'message': message_text,
+                    'created_at': message.created_at.isoformat(),
+                    'booking_id': booking_id
+                }
+                row = message_row(message)
             
-            # Broadcast message to room
+            # Broadcast message to room with the other messages of this tick
             room = f"booking_{booking_id}"
-            message_data = {
-                'id': message.id,
-                'sender_id': user_id,
-                'sender_name': f"{user.first_name} {user.last_name}", # Use the loaded user's name
-                'message': message_text,
-                'created_at': message.created_at.isoformat(),
-                'booking_id': booking_id
-            }
-            
-            socketio.emit('new_message', message_data, room=room)
+            room_messages.submit(room, ('message', row[0]), (row, message_data))
             
         except Exception as e:
             print(f"Error sending message: {e}") # Log the error
             emit('error', {'message': str(e)})
     
+    @socketio.on('typing')
+    def on_typing(data):
+        """Relays typing state to the room, merged per room and rate limited per user."""
+        user_id = presence.user_for(request.sid)
+        booking_id = data.get('booking_id')
+        room = f"booking_{booking_id}"
+        if user_id is None or not booking_id or room not in rooms():
+            return
+        if check_rate_limit('typing', user_id):
+            return   # Dropped quietly; the next keystroke will resend it
+        room_activity.submit(room, ('typing', user_id), bool(data.get('typing', True)))
+    
     @socketio.on('mark_messages_read')
     def on_mark_messages_read(data):
         """Handles marking messages as read for a specific user in a booking."""
@@ -0,0 +1,73 @@
+"""
+Chat event payloads by client protocol version.
+
+Clients ask for a protocol in the connect auth ({'token': ..., 'protocol': 2})
+and the server answers with the one it will use in the `connected` event.
+Clients that do not ask get protocol 1.
+
+Protocol 1 sends one `new_message` event per message, with the sender's name,
+an ISO timestamp and the booking id. Protocol 2 sends the participants' names
+once in `chat_history`; after that, every message sent to the room within one
+emit tick arrives in a single `message_batch` event, each message a row:
+
+    [id, sender_id, message, created_at (ms since the epoch, UTC), is_read (0/1)]
+
+Each protocol has its own sub-room of the booking room, so every client gets
+frames in the format it asked for.
+"""
+from datetime import timezone
+
+LEGACY = 1
+COMPACT = 2
+SUPPORTED = (LEGACY, COMPACT)
+
+
+def negotiate(requested):
+    """Return the newest supported protocol not above the one the client asked for"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return LEGACY
+    return max([version for version in SUPPORTED if version <= requested], default=LEGACY)
+
+
+def protocol_room(room, protocol):
+    return f'{room}:v{protocol}'
+
+
+def epoch_ms(timestamp):
+    """Milliseconds since the epoch for a naive UTC datetime"""
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def full_name(user):
+    return f'{user.first_name} {user.last_name}' if user else 'Unknown User'
+
+
+def message_row(message):
+    return [message.id, message.sender_id, message.message, epoch_ms(message.created_at), int(bool(message.is_read))]
+
+
+def message_dict(message, sender_name):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'sender_name': sender_name,
+        'message': message.message,
+        'created_at': message.created_at.isoformat(),
+        'is_read': message.is_read,
+    }
+
+
+def history_payload(messages, protocol, participants=()):
+    """chat_history for messages in oldest-first order; participants are the booking's users"""
+    if protocol >= COMPACT:
+        users = {user.id: full_name(user) for user in participants if user}
+        for message in messages:
+            users.setdefault(message.sender_id, full_name(message.sender))
+        return {'users': users, 'messages': [message_row(message) for message in messages]}
+    return {'messages': [message_dict(message, full_name(message.sender)) for message in messages]}
+
+
+def batch_payload(booking_id, rows):
+    return {'booking_id': booking_id, 'messages': sorted(rows)}
@@ -13,6 +13,25 @@ class Config:
     SQLALCHEMY_DATABASE_URI = database_url or f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite tuning for file databases (see src/db_routing.py); applied to every new connection
+    SQLITE_TUNING_ENABLED = os.environ.get('SQLITE_TUNING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',     # Readers and the writer no longer block each other
+        'busy_timeout': 10000,     # Wait up to 10s for a lock instead of failing with "database is locked"
+        'synchronous': 'NORMAL',   # fsync at checkpoints only; durable across crashes in WAL mode
+        'mmap_size': 268435456,    # 256 MB of the file memory-mapped for reads
+        'cache_size': -65536       # 64 MB page cache per connection
+    }
+    SQLITE_READ_WRITE_SPLIT = os.environ.get('SQLITE_READ_WRITE_SPLIT', 'false').lower() in ['true', 'on', '1']
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE') or 8)  # Read-only connections per process
+    SQLITE_WRITE_QUEUE_TIMEOUT = 30  # Seconds a transaction may wait for the single writer connection
+    
+    # Read replicas: reads while serving GET requests go here (comma-separated DATABASE_REPLICA_URLS)
+    SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri.strip()]
+    DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG') or 5.0)  # Seconds behind before a replica is skipped
+    DATABASE_REPLICA_CHECK_INTERVAL = 1.0  # Seconds between heartbeat/lag checks per process
+    DATABASE_STICKY_SECONDS = 5.0  # After a write, that user's reads stay on the primary this long
+    
     # JWT Configuration - Use the same secret key as the main app
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
@@ -22,6 +41,12 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Resumable upload chunk size; must stay below MAX_CONTENT_LENGTH
+    UPLOAD_MAX_FILE_SIZE = 100 * 1024 * 1024  # Whole-file limit for chunked uploads
+    IMAGE_CACHE_FOLDER = None  # Defaults to UPLOAD_FOLDER/derived
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+    IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS') or 2)  # 0 renders in the request thread
+    IMAGE_QUALITY = 80
     
     # CORS Configuration - IMPORTANT: Specific origins required when supports_credentials=True
     # These are default development origins. ProductionConfig will override for production.
@@ -34,16 +59,94 @@ class Config:
         'http://127.0.0.1:5174',
     ]
     
+    # Runner Matching
+    MATCHING_SNAPSHOT_TTL = 60  # Seconds before the columnar runner snapshot is rebuilt
+    MATCHING_WEIGHTS = {
+        'distance': 0.35,
+        'rating': 0.25,
+        'reviews': 0.1,
+        'price': 0.15,
+        'history': 0.15
+    }
+    
+    # Full-text search (FTS5 on SQLite, tsvector/GIN on PostgreSQL)
+    SEARCH_MAX_RESULTS = 1000  # Ranked matches considered before filtering and pagination
+    
+    # Background job queue (run workers with: flask --app src.main jobs worker)
+    JOBS_BATCH_SIZE = int(os.environ.get('JOBS_BATCH_SIZE') or 100)  # Jobs claimed per poll
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL') or 1.0)  # Idle sleep in seconds
+    JOBS_VISIBILITY_TIMEOUT = 300  # Running jobs older than this are assumed orphaned and requeued
+    JOBS_RETRY_BASE_DELAY = 5  # First retry after ~5s, doubling up to the max
+    JOBS_RETRY_MAX_DELAY = 3600
+    
+    # Earnings ledger and payouts (run batches with: flask --app src.main ledger payout)
+    PLATFORM_FEE_RATE = float(os.environ.get('PLATFORM_FEE_RATE') or 0.10)  # Share of each booking kept by the platform
+    PAYOUT_MINIMUM = float(os.environ.get('PAYOUT_MINIMUM') or 10.0)  # Smaller balances roll over to the next batch
+    PAYOUT_SETTLE_SECONDS = 60  # Entries younger than this wait for the next batch
+    
     # Pagination
     POSTS_PER_PAGE = 20
     RUNNERS_PER_PAGE = 12
     
-    # Email Configuration (for future use)
+    # Email Configuration (delivered by the job worker, see src/mail.py)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'Urban Assist <no-reply@urbanassist.app>'
+    MAIL_DIGEST_WINDOW = int(os.environ.get('MAIL_DIGEST_WINDOW') or 120)  # Seconds of events merged per recipient
+    MAIL_POOL_SIZE = 4        # Persistent SMTP connections per worker process
+    MAIL_POOL_MAX_IDLE = 60   # Idle seconds before a pooled connection is re-checked with NOOP
+    MAIL_TIMEOUT = 10
+    MAIL_MAX_ATTEMPTS = 5
+    
+    # Load Shedding & Rate Limiting
+    # Concurrency limits are per worker process; token buckets are shared
+    # across workers when RATE_LIMIT_STORAGE_URL points at Redis.
+    LOAD_SHEDDING_ENABLED = os.environ.get('LOAD_SHEDDING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    LOAD_SHEDDING_CLASSES = {
+        'admin': {'limit': 2, 'priority': 3},    # Heavy aggregates
+        'auth': {'limit': 4, 'priority': 2},     # Password hashing
+        'search': {'limit': 8, 'priority': 1},   # Runner search
+        'default': {'limit': 32, 'priority': 0}  # Cheap lookups
+    }
+    LOAD_SHEDDING_LIMIT = 32          # Requests in flight across all classes; class limits cap each class's share
+    LOAD_SHEDDING_TARGET_WAIT = 0.5   # Shed new arrivals once average queue time exceeds this (seconds; / (1 + priority))
+    LOAD_SHEDDING_QUEUE_TIMEOUT = 2.0 # Give up on a queued request after this long (seconds)
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL') or os.environ.get('REDIS_URL') or 'memory://'
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto are trusted;
+    # without this every client has the proxy's address and per-IP limits become global
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS') or 0)
+    RATE_LIMITS = {
+        'login': {'capacity': 5, 'refill_rate': 5 / 60.0},       # 5 attempts per minute per (IP, account)
+        'login_ip': {'capacity': 30, 'refill_rate': 30 / 60.0},  # 30 attempts per minute per IP, any account
+        'chat_send': {'capacity': 20, 'refill_rate': 1.0},       # Bursts of 20, then 1 per second
+        'typing': {'capacity': 5, 'refill_rate': 1.0}            # Typing updates beyond this are dropped
+    }
+    
+    # Presence & Typing (see src/presence.py)
+    # 'memory://' tracks sockets per process; point PRESENCE_STORAGE_URL at the Redis server behind
+    # the Socket.IO message queue so every worker sees every user.
+    PRESENCE_STORAGE_URL = os.environ.get('PRESENCE_STORAGE_URL') or os.environ.get('REDIS_URL') or 'memory://'
+    PRESENCE_TTL = 90  # Seconds a socket counts as online without a heartbeat (workers refresh every third)
+    SOCKET_ACTIVITY_INTERVAL = 1.0  # Typing and presence events reach a room at most once per interval
+    TYPING_TIMEOUT = 6  # Clients drop a typing indicator that has not been refreshed for this long
+    SOCKET_EMIT_TICK = 0.05  # Messages sent to a room within one tick share a frame
+    
+    # Response Cache
+    # Public GET responses (runner search and profiles, reviews) are cached by URL and
+    # dropped by entity tag when a write commits. 'memory://' keeps a per-process LRU;
+    # point RESPONSE_CACHE_URL at Redis to share entries and invalidations across workers.
+    # With 'memory://' and more than one web worker (WEB_CONCURRENCY, which gunicorn also
+    # reads) the cache is turned off: a worker would keep serving what another invalidated.
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL') or os.environ.get('REDIS_URL') or 'memory://'
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Body bytes kept by the in-process LRU
+    RESPONSE_CACHE_TTL = 60  # Seconds; bounds staleness for writes other workers cannot see
+    RESPONSE_CACHE_STALE_TTL = 300  # Expired entries are still served this long while one request refreshes
+    RESPONSE_CACHE_LOCK_TIMEOUT = 10  # Seconds one filler may hold a key before others compute it too
     
     @staticmethod
     def init_app(app):
@@ -55,6 +158,12 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     
+    # One writer connection plus read-only connections when running on a SQLite file (edge/staging)
+    SQLITE_READ_WRITE_SPLIT = os.environ.get('SQLITE_READ_WRITE_SPLIT', 'true').lower() in ['true', 'on', '1']
+    
+    # Render terminates TLS in one proxy in front of the app
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS') or 1)
+    
     # Production-specific settings
     # IMPORTANT: Explicitly set the frontend URL(s) for production
     # Replace 'https://urban-assist-frontend.onrender.com' with your actual frontend URL
@@ -78,6 +187,10 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATE_LIMIT_STORAGE_URL = 'memory://'
+    RESPONSE_CACHE_URL = 'memory://'
+    PRESENCE_STORAGE_URL = 'memory://'
+    TRUSTED_PROXY_HOPS = 1
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,313 @@
+"""
+Database engine setup and read/write routing.
+
+SQLite file databases get per-connection pragmas (WAL, busy_timeout,
+synchronous=NORMAL, mmap and page cache sizes from SQLITE_PRAGMAS). With
+SQLITE_READ_WRITE_SPLIT, each process funnels writes through a single
+writer connection (transactions queue for it in-process and start with
+BEGIN IMMEDIATE, so they wait on busy_timeout across processes instead of
+failing on lock upgrades) while reads go to a pool of query_only connections
+that WAL lets run alongside the writer.
+
+With SQLALCHEMY_REPLICA_URIS, reads made while serving GET/HEAD requests go
+to a read replica (one per transaction, round-robin). A replica is skipped
+while its copy of the replica_heartbeat row, which every app process
+refreshes on the primary from a background thread (never from the request
+that happens to run the lag check), is more than DATABASE_REPLICA_MAX_LAG
+seconds old.
+After a request writes, the same user's reads stay on the primary for
+DATABASE_STICKY_SECONDS (read-your-writes): tracked per JWT identity in this
+process, and returned as a deadline in the X-DB-Primary-Until response header
+(and a short-lived cookie, for same-site clients) that the client sends back,
+so other workers honour it too, on public GETs without a token as well.
+Requests that fill a shared cache call read_from_primary() first, so a
+lagging replica's rows are never stored for every later reader.
+
+Routing happens in RoutingSession.get_bind: SELECTs go to a replica or
+reader unless the session is flushing, has already written in the current
+transaction or the statement locks rows. Anything else, including raw
+session.connection() use, goes to the primary (writer).
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, literal, select, text
+from sqlalchemy.engine import make_url
+
+# Pragmas that cannot be set on read-only connections
+WRITER_ONLY_PRAGMAS = ('journal_mode',)
+
+# Unix time until which the client's reads must stay on the primary
+STICKY_HEADER = 'X-DB-Primary-Until'
+STICKY_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+        and 'mode=memory' not in str(url)
+
+
+def apply_pragmas(engine, pragmas, begin_immediate=False):
+    """Run PRAGMA statements on every new DBAPI connection of `engine`"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+        if begin_immediate:
+            # Let SQLAlchemy's begin event issue BEGIN instead of pysqlite's deferred one
+            dbapi_connection.isolation_level = None
+
+    if begin_immediate:
+        @event.listens_for(engine, 'begin')
+        def begin(connection):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def _identity():
+    """JWT identity of the current request, if it has been verified"""
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+class DatabaseRouter:
+    """The writer engine, same-database readers and lag-checked replicas"""
+
+    def __init__(self, writer, readers=(), replicas=(), max_lag=5.0, check_interval=1.0, sticky_seconds=5.0):
+        self.writer = writer
+        self.readers = list(readers)
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.lag = {}               # replica engine -> seconds behind, None if unreachable
+        self.sticky = {}            # JWT identity -> Unix time until which reads use the primary
+        self._next_reader = itertools.cycle(self.readers) if self.readers else None
+        self._next_replica = itertools.count()
+        self._healthy = []
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._beat_lock = threading.Lock()
+
+    def reader(self):
+        return next(self._next_reader)
+
+    # Replica health
+
+    def check_replicas(self):
+        """Read each replica's heartbeat, then start refreshing the primary's"""
+        now = time.time()
+        healthy = []
+        for engine in self.replicas:
+            try:
+                with engine.connect() as connection:
+                    beat = connection.execute(text('SELECT beat_at FROM replica_heartbeat WHERE id = 1')).scalar()
+                self.lag[engine] = now - beat if beat is not None else None
+            except Exception:
+                self.lag[engine] = None
+            if self.lag[engine] is not None and self.lag[engine] <= self.max_lag:
+                healthy.append(engine)
+        self._healthy = healthy
+        self._checked_at = now
+        self.beat_in_background(now)
+
+    def beat_in_background(self, now=None):
+        """
+        Refresh the primary's heartbeat on its own thread, at most one at a time.
+
+        Lag checks run inside GET requests; writing from there would make the
+        request wait for the writer (up to the write queue timeout on a busy
+        SQLite split).
+        """
+        if not self._beat_lock.acquire(blocking=False):
+            return
+        thread = threading.Thread(target=self._beat_and_release, args=(now,), daemon=True)
+        try:
+            thread.start()
+        except Exception:
+            self._beat_lock.release()
+            raise
+
+    def _beat_and_release(self, now):
+        try:
+            self.beat(now)
+        except Exception:
+            logger.exception('Replica heartbeat failed')
+        finally:
+            self._beat_lock.release()
+
+    def beat(self, now=None):
+        with self.writer.begin() as connection:
+            params = {'now': now or time.time()}
+            if not connection.execute(text('UPDATE replica_heartbeat SET beat_at = :now WHERE id = 1'),
+                                      params).rowcount:
+                connection.execute(text('INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, :now)'), params)
+
+    def healthy_replicas(self):
+        if time.time() - self._checked_at >= self.check_interval and self._check_lock.acquire(blocking=False):
+            # One thread re-checks; the others keep using the previous result
+            try:
+                self.check_replicas()
+            except Exception:
+                current_app.logger.exception('Replica lag check failed')
+                self._healthy, self._checked_at = [], time.time()
+            finally:
+                self._check_lock.release()
+        return self._healthy
+
+    # Read-your-writes stickiness
+
+    def is_sticky(self):
+        now = time.time()
+        for value in (request.headers.get(STICKY_HEADER), request.cookies.get(STICKY_COOKIE)):
+            try:
+                # Deadlines further out than one sticky period were not issued by us
+                if now < float(value or 0) <= now + self.sticky_seconds + 1:
+                    return True
+            except ValueError:
+                pass
+        identity = _identity()
+        return identity is not None and self.sticky.get(identity, 0) > now
+
+    def remember_writes(self, response):
+        """after_request hook: keep this user's reads on the primary for a while after a write"""
+        if g.get('db_wrote'):
+            until = time.time() + self.sticky_seconds
+            identity = _identity()
+            if identity is not None:
+                if len(self.sticky) > 10000:
+                    now = time.time()
+                    self.sticky = {key: value for key, value in self.sticky.items() if value > now}
+                self.sticky[identity] = until
+            response.headers[STICKY_HEADER] = f'{until:.3f}'
+            response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=int(self.sticky_seconds) + 1,
+                                httponly=True, samesite='Lax', secure=request.is_secure)
+        return response
+
+    def replica_for(self, session):
+        """Replica for this session's current transaction, or None to stay off replicas"""
+        if not self.replicas or not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if g.get('db_read_primary'):
+            return None
+        if 'replica' not in session.info:
+            healthy = self.healthy_replicas()
+            replica = None
+            if healthy and not self.is_sticky():
+                replica = healthy[next(self._next_replica) % len(healthy)]
+            session.info['replica'] = replica
+        return session.info['replica']
+
+
+def get_router():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('db_router')
+
+
+def read_from_primary(session):
+    """Keep the rest of this request's reads off replicas, including the current transaction's"""
+    if has_request_context():
+        g.db_read_primary = True
+    session.info.pop('replica', None)
+
+
+def _is_read(clause):
+    return clause is not None and getattr(clause, 'is_select', False) \
+        and getattr(clause, '_for_update_arg', None) is None
+
+
+def read_connection(session):
+    """Connection for read-only raw SQL: a replica or reader, unless the session has already written"""
+    return session.connection(bind_arguments={'bind': session.get_bind(clause=select(literal(1)))})
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        writer = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        router = get_router()
+        if bind is not None or router is None or writer is not router.writer:
+            return writer
+        if not (router.readers or router.replicas):
+            return writer
+        if self._flushing or self.info.get('wrote') or not _is_read(clause):
+            self.info['wrote'] = True   # Later reads in this transaction must see the write
+            if has_request_context():
+                g.db_wrote = True
+            return writer
+        replica = router.replica_for(self)
+        if replica is not None:
+            return replica
+        return router.reader() if router.readers else writer
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
+        session.info.pop('replica', None)
+
+
+def sqlite_engine_options(app):
+    """Engine options for the writer; a single connection when reads are split off"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if not (is_sqlite_file(url) and app.config.get('SQLITE_TUNING_ENABLED') and app.config.get('SQLITE_READ_WRITE_SPLIT')):
+        return {}
+    return {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': app.config['SQLITE_WRITE_QUEUE_TIMEOUT']}
+
+
+def create_replica_engine(app, uri):
+    if uri.startswith('postgres://'):
+        uri = uri.replace('postgres://', 'postgresql://', 1)
+    options = {key: value for key, value in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items()
+               if key in ('pool_pre_ping', 'pool_recycle', 'connect_args')}
+    engine = create_engine(uri, **options)
+    if is_sqlite_file(engine.url) and app.config.get('SQLITE_TUNING_ENABLED'):
+        pragmas = app.config['SQLITE_PRAGMAS']
+        read_pragmas = {name: value for name, value in pragmas.items() if name not in WRITER_ONLY_PRAGMAS}
+        apply_pragmas(engine, {**read_pragmas, 'query_only': 'ON'})
+    return engine
+
+
+def init_database(app, db):
+    """db.init_app plus SQLite tuning, the read/write split and read replicas"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), **sqlite_engine_options(app)
+    }
+    db.init_app(app)
+    with app.app_context():
+        writer = db.engine
+    readers = []
+
+    if is_sqlite_file(writer.url) and app.config.get('SQLITE_TUNING_ENABLED'):
+        pragmas = app.config['SQLITE_PRAGMAS']
+        split = bool(app.config.get('SQLITE_READ_WRITE_SPLIT'))
+        apply_pragmas(writer, pragmas, begin_immediate=split)
+        writer.connect().close()   # journal_mode=WAL persists in the file; set it before any reader opens
+        if split:
+            reader = create_engine(writer.url, pool_size=app.config['SQLITE_READ_POOL_SIZE'], max_overflow=0,
+                                   pool_timeout=app.config['SQLITE_WRITE_QUEUE_TIMEOUT'])
+            read_pragmas = {name: value for name, value in pragmas.items() if name not in WRITER_ONLY_PRAGMAS}
+            apply_pragmas(reader, {**read_pragmas, 'query_only': 'ON'})
+            readers.append(reader)
+
+    replicas = [create_replica_engine(app, uri) for uri in app.config.get('SQLALCHEMY_REPLICA_URIS') or []]
+    router = DatabaseRouter(writer, readers, replicas,
+                            max_lag=app.config.get('DATABASE_REPLICA_MAX_LAG', 5.0),
+                            check_interval=app.config.get('DATABASE_REPLICA_CHECK_INTERVAL', 1.0),
+                            sticky_seconds=app.config.get('DATABASE_STICKY_SECONDS', 5.0))
+    if replicas:
+        app.after_request(router.remember_writes)
+    app.extensions['db_router'] = router
+    return router
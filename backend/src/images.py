@@ -0,0 +1,192 @@
+"""
+Resized image variants of uploaded files.
+
+Variants are rendered from the content-addressed original on first request
+in a process pool (Pillow holds the GIL while resampling), written to
+IMAGE_CACHE_FOLDER and then served as static files. Concurrent requests for
+the same missing variant share one render. The cache is kept under
+IMAGE_CACHE_MAX_BYTES by evicting least recently used files; hits refresh a
+file's mtime, which serves as its LRU timestamp.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+# Bump when variant specs change so cached renders are not reused
+VARIANTS_VERSION = 1
+
+VARIANTS = {
+    'thumb': {'size': (96, 96), 'crop': True},     # Avatars in lists, chat headers, navbar
+    'card': {'size': (320, 320), 'crop': True},    # Runner cards and profile headers
+    'full': {'size': (1280, 1280), 'crop': False}, # Lightbox / full view, aspect preserved
+}
+# Upload extensions that can be rendered, with the type they are served as
+IMAGE_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif'}
+SOURCE_TYPES = set(IMAGE_TYPES.values())
+CONTENT_TYPE = 'image/webp'
+
+FILES_PREFIX = '/api/files/'
+
+
+def variant_urls(image_url):
+    """Variant URLs for an uploaded image URL, or None for external/legacy images and other files.
+
+    The URLs carry VARIANTS_VERSION, so browsers holding an immutable copy
+    fetch the new render after the specs change.
+    """
+    if not image_url or not image_url.startswith(FILES_PREFIX):
+        return None
+    sha256, _, extension = image_url[len(FILES_PREFIX):].partition('.')
+    if extension.lower() not in IMAGE_TYPES:
+        return None
+    return {name: f'/api/images/{sha256}/{name}?v={VARIANTS_VERSION}' for name in VARIANTS}
+
+
+def render_variant(source_path, target_path, size, crop, quality):
+    """Resize and re-encode one image; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if crop:
+            image = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            image.thumbnail(size, Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('P', 'LA', 'PA') else 'RGB')
+        temp_path = f'{target_path}.{os.getpid()}.tmp'
+        image.save(temp_path, 'WEBP', quality=quality, method=4)
+    os.replace(temp_path, target_path)
+    return os.path.getsize(target_path)
+
+
+class DerivativeCache:
+    def __init__(self, folder, max_bytes, workers=2, quality=80):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.quality = quality
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._total = None
+
+    def path(self, sha256, variant):
+        return os.path.join(self.folder, sha256[:2], f'{sha256}-{variant}-v{VARIANTS_VERSION}.webp')
+
+    def _pool(self):
+        if self._executor is None:
+            # Created on first use so forked web workers each get their own pool
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _submit(self, args):
+        # Caller holds the lock
+        try:
+            executor = self._pool()
+            return executor, executor.submit(render_variant, *args)
+        except BrokenProcessPool:
+            self._executor = None
+            executor = self._pool()
+            return executor, executor.submit(render_variant, *args)
+
+    def _replace_pool(self, executor):
+        """Drop a pool whose worker died, so the next render starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def get(self, sha256, source_path, variant):
+        """Path of the rendered variant, rendering it first if it is not cached"""
+        path = self.path(sha256, variant)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        args = (source_path, path, VARIANTS[variant]['size'], VARIANTS[variant]['crop'], self.quality)
+        if not self.workers:
+            size = render_variant(*args)
+            with self._lock:
+                self._account(size)
+            return path
+
+        # A killed worker (e.g. out of memory) breaks the pool and fails every
+        # render in flight; those are retried once on a new pool
+        for attempt in range(2):
+            with self._lock:
+                pending = self._pending.get(path)
+                owner = pending is None
+                if owner:
+                    pending = self._pending[path] = self._submit(args)
+            executor, future = pending
+            try:
+                size = future.result()
+                break
+            except BrokenProcessPool:
+                self._replace_pool(executor)
+                if attempt:
+                    raise
+            finally:
+                if owner:
+                    with self._lock:
+                        self._pending.pop(path, None)
+        if owner:
+            with self._lock:
+                self._account(size)
+        return path
+
+    def _account(self, size):
+        # Caller holds the lock
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        else:
+            self._total += size
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        """Delete least recently used variants until the cache is at 90% of its budget"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total = total
+
+
+def get_cache():
+    cache = current_app.extensions.get('image_cache')
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions['image_cache'] = DerivativeCache(
+            config.get('IMAGE_CACHE_FOLDER') or os.path.join(config['UPLOAD_FOLDER'], 'derived'),
+            config['IMAGE_CACHE_MAX_BYTES'],
+            workers=config['IMAGE_PROCESS_WORKERS'],
+            quality=config['IMAGE_QUALITY']
+        )
+    return cache
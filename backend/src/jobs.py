@@ -0,0 +1,306 @@
+"""
+Durable background job queue stored in the application database.
+
+Request handlers call enqueue() inside their own transaction, so a job exists
+if and only if the write that caused it commits. Worker processes claim
+ready jobs with one UPDATE ... RETURNING over a FOR UPDATE SKIP LOCKED
+subquery (on SQLite, where writers are serialized anyway, the lock clause is
+dropped), run them, and mark them done in the same transaction as the
+handler's own writes. Tasks registered with batch=True receive all claimed
+payloads of that task at once; a batch handler whose side effects cannot be
+rolled back (sent email) raises PartialBatchError so that only the payloads
+it did not finish are retried.
+
+Run a worker with:  flask --app src.main jobs worker
+"""
+import os
+import random
+import signal
+import socket
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+
+from src.models.user import db, Job
+
+Task = namedtuple('Task', 'name func batch max_attempts queue')
+
+TASKS = {}
+
+
+class PartialBatchError(Exception):
+    """Raised by a batch handler that failed after the payloads at indexes `done` already took effect"""
+
+    def __init__(self, done, error):
+        super().__init__(f'{type(error).__name__}: {error}')
+        self.done = set(done)
+
+
+def task(name, batch=False, max_attempts=5, queue='default'):
+    """Register a job handler. Batch handlers take a list of payloads, others a single payload."""
+    def decorator(func):
+        TASKS[name] = Task(name, func, batch, max_attempts, queue)
+        return func
+    return decorator
+
+
+def enqueue(task_name, payload=None, delay=0):
+    """Add a job to the current transaction; it becomes visible to workers when the caller commits"""
+    if task_name not in TASKS:
+        raise ValueError(f'Unknown task: {task_name}')
+    spec = TASKS[task_name]
+    job = Job(
+        queue=spec.queue,
+        task=task_name,
+        payload=payload or {},
+        max_attempts=spec.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker_id, queues=('default',), limit=100):
+    """Atomically mark up to `limit` ready jobs as running for this worker and return them"""
+    now = datetime.utcnow()
+    ready = select(Job.id).where(
+        Job.queue.in_(queues),
+        Job.status == 'queued',
+        Job.run_at <= now
+    ).order_by(Job.run_at, Job.id).limit(limit).with_for_update(skip_locked=True)
+
+    rows = db.session.execute(
+        update(Job)
+        .where(Job.id.in_(ready), Job.status == 'queued')
+        .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.task, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _mark_done(job_ids):
+    db.session.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids))
+        .values(status='done', finished_at=datetime.utcnow(), locked_by=None, last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at JOBS_RETRY_MAX_DELAY"""
+    base = current_app.config.get('JOBS_RETRY_BASE_DELAY', 5)
+    cap = current_app.config.get('JOBS_RETRY_MAX_DELAY', 3600)
+    return min(cap, base * 2 ** max(attempts - 1, 0)) * random.uniform(0.5, 1.0)
+
+
+def _mark_failed(rows, error):
+    now = datetime.utcnow()
+    for row in rows:
+        values = {'locked_by': None, 'last_error': error[:2000]}
+        if row.attempts >= row.max_attempts:
+            values.update(status='failed', finished_at=now)
+        else:
+            values.update(status='queued', run_at=now + timedelta(seconds=retry_delay(row.attempts)))
+        db.session.execute(
+            update(Job).where(Job.id == row.id).values(**values).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def _run(spec, rows):
+    """Run handler + completion in one transaction; on error roll back and schedule retries"""
+    try:
+        if spec.batch:
+            spec.func([row.payload for row in rows])
+        else:
+            spec.func(rows[0].payload)
+        _mark_done([row.id for row in rows])
+        db.session.commit()
+        return True
+    except PartialBatchError as e:
+        db.session.rollback()
+        current_app.logger.exception('Job batch %s partly failed', [row.id for row in rows])
+        # Running the finished payloads again would repeat their effects; back off the rest
+        _mark_done([row.id for index, row in enumerate(rows) if index in e.done])
+        _mark_failed([row for index, row in enumerate(rows) if index not in e.done], str(e))
+        return False
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Job %s failed', [row.id for row in rows])
+        if spec.batch and len(rows) > 1:
+            # Retry members one by one so a single bad payload cannot hold back the batch
+            return all([_run(spec, [row]) for row in rows])
+        _mark_failed(rows, f'{type(e).__name__}: {e}')
+        return False
+
+
+def process(rows):
+    """Run claimed jobs, grouping batchable tasks into a single handler call"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.task, []).append(row)
+    for task_name, group in groups.items():
+        spec = TASKS.get(task_name)
+        if spec is None:
+            _mark_failed([row._replace(attempts=row.max_attempts) for row in group], f'Unknown task: {task_name}')
+        elif spec.batch:
+            _run(spec, group)
+        else:
+            for row in group:
+                _run(spec, [row])
+
+
+def reap_stale(timeout):
+    """Requeue jobs whose worker died mid-run (locked longer than `timeout` seconds).
+
+    A job that already used its last attempt is failed instead, so a payload
+    that keeps killing workers stops being handed out.
+    """
+    now = datetime.utcnow()
+    stale = (Job.status == 'running', Job.locked_at < now - timedelta(seconds=timeout))
+    failed = db.session.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status='failed', locked_by=None, finished_at=now,
+                last_error='Worker stopped responding on the last attempt')
+        .execution_options(synchronize_session=False)
+    )
+    requeued = db.session.execute(
+        update(Job)
+        .where(*stale)
+        .values(status='queued', locked_by=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return failed.rowcount + requeued.rowcount
+
+
+def run_pending(worker_id=None, queues=('default',), batch_size=100):
+    """Process ready jobs until none are left; returns how many were claimed"""
+    worker_id = worker_id or default_worker_id()
+    total = 0
+    while True:
+        rows = claim(worker_id, queues, batch_size)
+        if not rows:
+            return total
+        total += len(rows)
+        process(rows)
+
+
+def run_worker(queues=('default',), batch_size=None, poll_interval=None):
+    """Poll for jobs until SIGINT/SIGTERM; must run inside an app context"""
+    config = current_app.config
+    batch_size = batch_size or config.get('JOBS_BATCH_SIZE', 100)
+    poll_interval = poll_interval or config.get('JOBS_POLL_INTERVAL', 1.0)
+    visibility_timeout = config.get('JOBS_VISIBILITY_TIMEOUT', 300)
+    worker_id = default_worker_id()
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Job worker {worker_id} started (queues: {', '.join(queues)})")
+    last_reap = 0
+    while not stopping:
+        if time.monotonic() - last_reap > visibility_timeout / 2:
+            reaped = reap_stale(visibility_timeout)
+            if reaped:
+                print(f"Requeued {reaped} stale jobs")
+            last_reap = time.monotonic()
+        rows = claim(worker_id, queues, batch_size)
+        if rows:
+            process(rows)
+        else:
+            db.session.remove()
+            time.sleep(poll_interval)
+    print(f"Job worker {worker_id} stopped")
+
+
+# Command line interface: flask --app src.main jobs <command>
+jobs_cli = AppGroup('jobs', help='Inspect and run the background job queue.')
+
+
+@jobs_cli.command('worker')
+@click.option('--queue', 'queues', multiple=True, default=['default'], help='Queue(s) to consume.')
+@click.option('--batch-size', type=int, default=None, help='Jobs claimed per poll.')
+@click.option('--poll-interval', type=float, default=None, help='Seconds to sleep when idle.')
+def worker_command(queues, batch_size, poll_interval):
+    """Run a worker process until interrupted."""
+    run_worker(tuple(queues), batch_size, poll_interval)
+
+
+@jobs_cli.command('drain')
+@click.option('--queue', 'queues', multiple=True, default=['default'], help='Queue(s) to drain.')
+def drain_command(queues):
+    """Process every ready job, then exit."""
+    count = run_pending(queues=tuple(queues))
+    click.echo(f'Processed {count} jobs')
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Show job counts by task and status."""
+    rows = db.session.query(Job.task, Job.status, func.count(Job.id), func.min(Job.run_at))\
+        .group_by(Job.task, Job.status).order_by(Job.task, Job.status).all()
+    if not rows:
+        click.echo('No jobs')
+    for task_name, status, count, oldest in rows:
+        click.echo(f'{task_name:<30} {status:<10} {count:>8}  oldest run_at {oldest.isoformat() if oldest else "-"}')
+
+
+@jobs_cli.command('list')
+@click.option('--status', default='failed', help='Status to list (queued, running, done, failed).')
+@click.option('--limit', type=int, default=20)
+def list_command(status, limit):
+    """List recent jobs with the given status."""
+    jobs = Job.query.filter_by(status=status).order_by(Job.id.desc()).limit(limit).all()
+    for job in jobs:
+        click.echo(f'#{job.id} {job.task} attempts={job.attempts}/{job.max_attempts} '
+                   f'run_at={job.run_at.isoformat()} error={job.last_error or "-"}')
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+@click.option('--all-failed', is_flag=True, help='Requeue every failed job.')
+def retry_command(job_ids, all_failed):
+    """Requeue failed jobs immediately."""
+    query = Job.query.filter(Job.status == 'failed')
+    if not all_failed:
+        if not job_ids:
+            raise click.UsageError('Pass job ids or --all-failed')
+        query = query.filter(Job.id.in_(job_ids))
+    count = query.update({'status': 'queued', 'attempts': 0, 'run_at': datetime.utcnow(), 'finished_at': None},
+                         synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Requeued {count} jobs')
+
+
+@jobs_cli.command('purge')
+@click.option('--days', type=int, default=7, help='Delete finished jobs older than this.')
+def purge_command(days):
+    """Delete completed jobs older than --days."""
+    count = Job.query.filter(Job.status == 'done', Job.finished_at < datetime.utcnow() - timedelta(days=days))\
+        .delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {count} jobs')
+
+
+def init_jobs(app):
+    """Register job handlers and the `flask jobs` commands"""
+    import src.tasks  # noqa: F401  (registers handlers with @task)
+    app.cli.add_command(jobs_cli)
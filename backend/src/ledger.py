@@ -0,0 +1,254 @@
+"""
+Runner earnings ledger and payout batches.
+
+Every movement of a runner's money is one append-only LedgerEntry: an
+earning and the platform fee when a booking completes, a refund and the
+returned fee when a payment is refunded, and a payout when a batch pays
+the runner. Entries carry a unique reference, so writing the same event
+twice is a no-op.
+
+Payout batches never re-read history. Each batch sums only the entries
+added since the previous batch's checkpoint (one GROUP BY over an id
+range), adds them to the stored per-runner RunnerBalance, pays out
+balances above the minimum and records the new checkpoint. Payout
+entries are applied to the balance by the batch that writes them and are
+skipped when later batches sum their window.
+
+Run a batch with:  flask --app src.main ledger payout
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select, update
+
+from src.models.user import db, Booking, LedgerEntry, Payment, Payout, PayoutBatch, RunnerBalance
+
+PERIODS = ('day', 'week', 'month')
+
+
+def _money(value):
+    return round(float(value or 0), 2)
+
+
+def _fee(amount):
+    return _money(amount * current_app.config.get('PLATFORM_FEE_RATE', 0.0))
+
+
+def append_entries(entries):
+    """Insert ledger entries whose reference is not already recorded; returns how many were added"""
+    if not entries:
+        return 0
+    existing = set(db.session.execute(
+        select(LedgerEntry.reference).where(LedgerEntry.reference.in_([entry['reference'] for entry in entries]))
+    ).scalars())
+    new = [entry for entry in entries if entry['reference'] not in existing]
+    if new:
+        db.session.execute(insert(LedgerEntry), new)
+    return len(new)
+
+
+def record_booking_earnings(booking_ids):
+    """Credit the runner and charge the platform fee for each completed booking"""
+    rows = db.session.execute(
+        select(Booking.id, Booking.runner_id, Booking.total_amount)
+        .where(Booking.id.in_(list(booking_ids)), Booking.status == 'completed')
+    ).all()
+    entries = []
+    for booking_id, runner_id, amount in rows:
+        entries.append({'runner_id': runner_id, 'booking_id': booking_id, 'entry_type': 'earning',
+                        'amount': _money(amount), 'reference': f'booking:{booking_id}:earning'})
+        fee = _fee(amount)
+        if fee:
+            entries.append({'runner_id': runner_id, 'booking_id': booking_id, 'entry_type': 'fee',
+                            'amount': -fee, 'reference': f'booking:{booking_id}:fee'})
+    return append_entries(entries)
+
+
+def settle_payment(payment_id, status, transaction_id=None):
+    """
+    Move a pending or completed payment to `status` and write its ledger
+    entries in the caller's transaction. Returns the payment, or None when
+    it was not in a state that allows the change.
+    """
+    allowed_from = {'completed': ('pending',), 'failed': ('pending',), 'refunded': ('completed',)}
+    if status not in allowed_from:
+        raise ValueError('status must be one of completed, failed, refunded')
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if transaction_id:
+        values['transaction_id'] = transaction_id
+    result = db.session.execute(
+        update(Payment)
+        .where(Payment.id == payment_id, Payment.status.in_(allowed_from[status]))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+
+    payment = db.session.get(Payment, payment_id)
+    db.session.refresh(payment)
+    if status == 'refunded':
+        runner_id = payment.booking.runner_id
+        amount = _money(payment.amount)
+        entries = [{'runner_id': runner_id, 'booking_id': payment.booking_id, 'payment_id': payment.id,
+                    'entry_type': 'refund', 'amount': -amount, 'reference': f'payment:{payment.id}:refund'}]
+        fee = _fee(amount)
+        if fee:
+            # The platform gives its share back too
+            entries.append({'runner_id': runner_id, 'booking_id': payment.booking_id, 'payment_id': payment.id,
+                            'entry_type': 'fee', 'amount': fee, 'reference': f'payment:{payment.id}:fee'})
+        append_entries(entries)
+    return payment
+
+
+def last_checkpoint():
+    """Id of the last ledger entry folded into RunnerBalance (0 before the first batch)"""
+    return db.session.execute(
+        select(PayoutBatch.through_entry_id).order_by(PayoutBatch.id.desc()).limit(1)
+    ).scalar() or 0
+
+
+def run_payout_batch(minimum=None, settle_seconds=None, now=None):
+    """
+    Fold new ledger entries into runner balances and pay out balances of at
+    least `minimum`. Runs in the caller's transaction; two batches started
+    from the same checkpoint cannot both commit (unique from_entry_id).
+
+    Returns None without writing anything when no new entries have settled,
+    so the checkpoint always moves forward.
+    """
+    config = current_app.config
+    minimum = config.get('PAYOUT_MINIMUM', 0.0) if minimum is None else minimum
+    settle_seconds = config.get('PAYOUT_SETTLE_SECONDS', 0) if settle_seconds is None else settle_seconds
+    now = now or datetime.utcnow()
+
+    checkpoint = last_checkpoint()
+    # Entries younger than the settle window may still have earlier ids uncommitted in other transactions
+    through = db.session.execute(
+        select(func.max(LedgerEntry.id))
+        .where(LedgerEntry.id > checkpoint, LedgerEntry.created_at <= now - timedelta(seconds=settle_seconds))
+    ).scalar() or checkpoint
+    if through == checkpoint:
+        return None
+
+    batch = PayoutBatch(from_entry_id=checkpoint, through_entry_id=through, created_at=now)
+    db.session.add(batch)
+    db.session.flush()
+
+    deltas = dict(db.session.execute(
+        select(LedgerEntry.runner_id, func.sum(LedgerEntry.amount))
+        .where(LedgerEntry.id > checkpoint, LedgerEntry.id <= through, LedgerEntry.entry_type != 'payout')
+        .group_by(LedgerEntry.runner_id)
+    ).all())
+    balances = {balance.runner_id: balance for balance in
+                RunnerBalance.query.filter(RunnerBalance.runner_id.in_(list(deltas))).all()} if deltas else {}
+    for runner_id, delta in deltas.items():
+        balance = balances.get(runner_id)
+        if balance is None:
+            balance = balances[runner_id] = RunnerBalance(runner_id=runner_id, balance=0.0)
+            db.session.add(balance)
+        balance.balance = _money(balance.balance + delta)
+        balance.updated_at = now
+
+    payable = RunnerBalance.query.filter(RunnerBalance.balance >= max(minimum, 0.01)).all()
+    payouts = [Payout(batch_id=batch.id, runner_id=balance.runner_id, amount=balance.balance, created_at=now)
+               for balance in payable]
+    db.session.add_all(payouts)
+    db.session.flush()
+    append_entries([{'runner_id': payout.runner_id, 'payout_id': payout.id, 'entry_type': 'payout',
+                     'amount': -payout.amount, 'reference': f'payout:{payout.id}', 'created_at': now}
+                    for payout in payouts])
+    for balance in payable:
+        balance.balance = 0.0
+        balance.updated_at = now
+
+    batch.runner_count = len(payouts)
+    batch.total_amount = _money(sum(payout.amount for payout in payouts))
+    return batch
+
+
+def _period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _shift(start, period, count):
+    """The period start `count` periods before `start`"""
+    if period == 'month':
+        month = start.year * 12 + start.month - 1 - count
+        return date(month // 12, month % 12 + 1, 1)
+    return start - timedelta(days=count * (7 if period == 'week' else 1))
+
+
+def runner_earnings(runner_id, period='month', periods=6, today=None):
+    """Balance and per-period totals by entry type for the runner's last `periods` periods"""
+    today = today or datetime.utcnow().date()
+    first = _shift(_period_start(today, period), period, periods - 1)
+
+    # One GROUP BY per day answered from the (runner_id, created_at, entry_type, amount) index
+    day = func.date(LedgerEntry.created_at)
+    rows = db.session.execute(
+        select(day, LedgerEntry.entry_type, func.sum(LedgerEntry.amount))
+        .where(LedgerEntry.runner_id == runner_id, LedgerEntry.created_at >= datetime.combine(first, datetime.min.time()))
+        .group_by(day, LedgerEntry.entry_type)
+    ).all()
+    buckets = defaultdict(lambda: defaultdict(float))
+    for day_value, entry_type, amount in rows:
+        if isinstance(day_value, str):
+            day_value = date.fromisoformat(day_value)
+        buckets[_period_start(day_value, period)][entry_type] += amount
+
+    breakdown = []
+    for index in range(periods):
+        start = _shift(first, period, -index)
+        totals = buckets.get(start, {})
+        breakdown.append({
+            'period_start': start.isoformat(),
+            'earnings': _money(totals.get('earning')),
+            'fees': _money(totals.get('fee')),
+            'refunds': _money(totals.get('refund')),
+            'payouts': _money(totals.get('payout')),
+            'net': _money(sum(amount for entry_type, amount in totals.items() if entry_type != 'payout'))
+        })
+
+    settled = db.session.execute(
+        select(RunnerBalance.balance).where(RunnerBalance.runner_id == runner_id)
+    ).scalar() or 0.0
+    unsettled = db.session.execute(
+        select(func.sum(LedgerEntry.amount))
+        .where(LedgerEntry.runner_id == runner_id, LedgerEntry.id > last_checkpoint(),
+               LedgerEntry.entry_type != 'payout')
+    ).scalar() or 0.0
+    return {
+        'period': period,
+        'balance': _money(settled + unsettled),
+        'breakdown': breakdown
+    }
+
+
+# Command line interface: flask --app src.main ledger <command>
+ledger_cli = AppGroup('ledger', help='Runner earnings ledger and payouts.')
+
+
+@ledger_cli.command('payout')
+@click.option('--minimum', type=float, default=None, help='Smallest balance paid out (default PAYOUT_MINIMUM).')
+def payout_command(minimum):
+    """Fold new ledger entries into balances and create payouts."""
+    batch = run_payout_batch(minimum=minimum)
+    if batch is None:
+        click.echo('No new settled ledger entries since the last batch')
+        return
+    db.session.commit()
+    click.echo(f'Batch #{batch.id}: entries {batch.from_entry_id + 1}..{batch.through_entry_id}, '
+               f'{batch.runner_count} payouts totalling {batch.total_amount:.2f}')
+
+
+def init_ledger(app):
+    """Register the `flask ledger` commands"""
+    app.cli.add_command(ledger_cli)
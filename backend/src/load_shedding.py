@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, g, jsonify, request
+
+# Requests are grouped into classes (Config.LOAD_SHEDDING_CLASSES) so that
+# expensive endpoints cannot starve cheap ones. All classes share one pool of
+# LOAD_SHEDDING_LIMIT slots and one queue: lower priority numbers are admitted
+# first when slots free up, and are the last to be shed as queueing grows.
+
+# Endpoint (or blueprint) name -> route class. Anything not listed is 'default'.
+ROUTE_CLASS_BY_ENDPOINT = {
+    'admin': 'admin',
+    'user.login': 'auth',
+    'user.register': 'auth',
+    'user.change_password': 'auth',
+    'user.get_runners': 'search',
+}
+
+
+class MemoryStore:
+    """In-process token bucket store. Used for tests and single-worker setups."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        """Take `cost` tokens from the bucket; return seconds to wait (0 if allowed)."""
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated) * refill_rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / refill_rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisStore:
+    """Token bucket store shared by all workers through Redis."""
+
+    # Refill and consume atomically on the server so workers never race.
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local now = tonumber(ARGV[4])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis  # Only required when a shared store is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        wait = self._script(keys=[self.prefix + key],
+                            args=[capacity, refill_rate, cost, time.time()])
+        return float(wait)
+
+    def reset(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_store(url):
+    """Create a rate limit store from a URL ('memory://' or 'redis://...')."""
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported rate limit storage URL: {url}')
+
+
+class PriorityLimiter:
+    """
+    Concurrency limiter shared by every route class.
+
+    `limit` slots are shared and `class_limits` caps how many of them one
+    class may hold. Waiters of all classes form one queue and are admitted in
+    priority order. The time spent waiting is tracked as a moving average so
+    overload can be detected before a request joins the queue at all; the
+    lower a class's priority, the smaller the average wait it is shed at.
+    """
+
+    def __init__(self, limit, max_queue=None, target_wait=0.5, smoothing=0.2, class_limits=None):
+        self.limit = limit
+        self.max_queue = max_queue if max_queue is not None else limit * 4
+        self.target_wait = target_wait
+        self.smoothing = smoothing
+        self.class_limits = dict(class_limits or {})
+        self.active = 0
+        self.active_by_class = defaultdict(int)
+        self.avg_wait = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self):
+        """Number of requests queued for a slot"""
+        with self._cond:
+            return len(self._waiters)
+
+    def _record_wait(self, waited):
+        self.avg_wait += self.smoothing * (waited - self.avg_wait)
+
+    def _has_room(self, route_class):
+        return self.active < self.limit and \
+            self.active_by_class[route_class] < self.class_limits.get(route_class, self.limit)
+
+    def _next_waiter(self):
+        """Best-ranked waiter whose class has room, or None; caller holds the condition"""
+        return next((entry for entry in sorted(self._waiters) if self._has_room(entry[2])), None)
+
+    def _shed_wait(self, priority):
+        """Average wait above which arrivals of this priority are turned away"""
+        return self.target_wait / (1 + max(priority, 0))
+
+    def _take(self, route_class):
+        self.active += 1
+        self.active_by_class[route_class] += 1
+
+    def acquire(self, priority, timeout, route_class='default'):
+        """Return (admitted, retry_after_seconds)."""
+        with self._cond:
+            if self._has_room(route_class) and self._next_waiter() is None:
+                self._take(route_class)
+                self._record_wait(0.0)
+                return True, 0
+
+            # Shed early: the queue is full or recent waits already exceed this priority's target
+            if len(self._waiters) >= self.max_queue or self.avg_wait > self._shed_wait(priority):
+                return False, max(self.avg_wait, timeout)
+
+            entry = (priority, next(self._counter), route_class)
+            heapq.heappush(self._waiters, entry)
+            started = time.monotonic()
+            deadline = started + timeout
+            try:
+                while self._next_waiter() != entry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._record_wait(timeout)
+                        return False, max(self.avg_wait, timeout)
+                    self._cond.wait(remaining)
+                self._take(route_class)
+                self._record_wait(time.monotonic() - started)
+                return True, 0
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def release(self, route_class='default'):
+        with self._cond:
+            self.active = max(0, self.active - 1)
+            self.active_by_class[route_class] = max(0, self.active_by_class[route_class] - 1)
+            self._cond.notify_all()
+
+
+class LoadShedder:
+    """Per-route-class admission control plus per-user token bucket rate limits."""
+
+    def __init__(self, app=None):
+        self.limiter = None
+        self.priorities = {}
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        classes = app.config.get('LOAD_SHEDDING_CLASSES', {})
+        max_queue = app.config.get('LOAD_SHEDDING_MAX_QUEUE')
+        target_wait = app.config.get('LOAD_SHEDDING_TARGET_WAIT', 0.5)
+        self.timeout = app.config.get('LOAD_SHEDDING_QUEUE_TIMEOUT', 2.0)
+        self.rate_limits = app.config.get('RATE_LIMITS', {})
+        self.store = create_store(app.config.get('RATE_LIMIT_STORAGE_URL'))
+        if classes:
+            limit = app.config.get('LOAD_SHEDDING_LIMIT') or max(settings['limit'] for settings in classes.values())
+            self.limiter = PriorityLimiter(limit, max_queue, target_wait,
+                                           class_limits={name: settings['limit'] for name, settings in classes.items()})
+            self.priorities = {name: settings.get('priority', 0) for name, settings in classes.items()}
+
+        app.extensions['load_shedder'] = self
+        if app.config.get('LOAD_SHEDDING_ENABLED', True):
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    def route_class(self, endpoint):
+        if not endpoint:
+            return 'default'
+        if endpoint in ROUTE_CLASS_BY_ENDPOINT:
+            return ROUTE_CLASS_BY_ENDPOINT[endpoint]
+        blueprint = endpoint.rsplit('.', 1)[0]
+        return ROUTE_CLASS_BY_ENDPOINT.get(blueprint, 'default')
+
+    def _admit(self):
+        if not request.path.startswith('/api/'):
+            return None
+        route_class = self.route_class(request.endpoint)
+        if route_class not in self.priorities:
+            route_class = 'default'
+        if self.limiter is None or route_class not in self.priorities:
+            return None
+
+        admitted, retry_after = self.limiter.acquire(self.priorities[route_class], self.timeout, route_class)
+        if not admitted:
+            response = jsonify({'error': 'Server is busy, please retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+        g.load_shedding_class = route_class
+        return None
+
+    def _release(self, exc=None):
+        route_class = g.pop('load_shedding_class', None)
+        if route_class is not None:
+            self.limiter.release(route_class)
+
+    def check(self, name, key):
+        """Consume one token from the named rate limit for key; return seconds to wait (0 if allowed)."""
+        settings = self.rate_limits.get(name)
+        if not settings:
+            return 0
+        return self.store.consume(f'{name}:{key}', settings['capacity'], settings['refill_rate'])
+
+
+def check_rate_limit(name, key):
+    """Rate limit helper for route and Socket.IO handlers running in an app context."""
+    shedder = current_app.extensions.get('load_shedder')
+    if shedder is None:
+        return 0
+    return shedder.check(name, key)
+
+
+def rate_limited_response(retry_after):
+    """Build the 429 response returned when a per-user rate limit is exceeded."""
+    response = jsonify({'error': 'Too many requests, please slow down'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
@@ -0,0 +1,391 @@
+"""
+Outbound email.
+
+Events are queued as `send_email` jobs whose run_at is rounded up to the end
+of the current MAIL_DIGEST_WINDOW, so everything a user triggers within one
+window becomes due together and is claimed as one batch. The batch handler
+renders one message per recipient (a digest when there are several events)
+and delivers them in parallel over a small pool of persistent SMTP
+connections instead of a connect/login/quit round trip per email.
+
+For local testing run `flask --app src.main mail sink` and point MAIL_SERVER
+at it (MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 MAIL_USE_TLS=false).
+"""
+import email
+import queue
+import smtplib
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+import click
+import jinja2
+from flask import current_app
+from flask.cli import AppGroup
+
+from src.jobs import PartialBatchError, enqueue, retry_delay
+from src.models.user import User
+
+# Plain-text templates: (subject, body)
+TEMPLATES = {
+    'booking_created': (
+        'New booking request: {{ title }}',
+        'You have a new booking request "{{ title }}" scheduled for {{ scheduled_date }}.'
+    ),
+    'booking_status': (
+        'Booking {{ status }}: {{ title }}',
+        'Your booking "{{ title }}" is now {{ status }}.'
+    ),
+    'review_prompt': (
+        'How did "{{ title }}" go?',
+        'Your booking "{{ title }}" is complete. Leave a review to help other customers choose their runner.'
+    ),
+}
+DIGEST_SUBJECT = 'You have {{ count }} updates from Urban Assist'
+GREETING = 'Hi {{ first_name }},\n\n'
+SIGNATURE = '\n\n-- \nUrban Assist'
+
+_jinja = jinja2.Environment(autoescape=False, undefined=jinja2.StrictUndefined)
+
+
+def render(template, context):
+    return _jinja.from_string(template).render(**context)
+
+
+def queue_email(user_id, template, **context):
+    """Queue a templated email; events for the same user within the digest window are merged"""
+    if template not in TEMPLATES:
+        raise ValueError(f'Unknown email template: {template}')
+    window = current_app.config.get('MAIL_DIGEST_WINDOW', 0)
+    delay = window - (time.time() % window) if window else 0
+    return enqueue('send_email', {'user_id': user_id, 'template': template, 'context': context}, delay=delay)
+
+
+def build_message(user, events):
+    """Render one message for a user from one or more queued events"""
+    parts = [(render(TEMPLATES[e['template']][0], e['context']), render(TEMPLATES[e['template']][1], e['context']))
+             for e in events]
+    if len(parts) == 1:
+        subject, body = parts[0]
+    else:
+        subject = render(DIGEST_SUBJECT, {'count': len(parts)})
+        body = '\n\n'.join(f'* {part_subject}\n  {part_body}' for part_subject, part_body in parts)
+
+    message = EmailMessage()
+    message['From'] = current_app.config.get('MAIL_DEFAULT_SENDER')
+    message['To'] = user.email
+    message['Subject'] = subject
+    message.set_content(render(GREETING, {'first_name': user.first_name}) + body + SIGNATURE)
+    return message
+
+
+class MailMetrics:
+    """Per-process delivery counters and a rolling latency window"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.sent = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._latencies.append(seconds)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            elapsed = time.monotonic() - self.started
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'per_second': round(self.sent / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95)
+        }
+
+
+metrics = MailMetrics()
+
+
+class SMTPPool:
+    """
+    Bounded pool of logged-in SMTP connections.
+
+    Connections are reused LIFO so the warmest one is picked first; one that
+    has been idle longer than max_idle is checked with NOOP before reuse, and
+    a connection the server dropped is replaced once transparently.
+    """
+
+    def __init__(self, host, port, use_tls=True, username=None, password=None, size=4, timeout=10, max_idle=60):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password)
+        return conn
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.max_idle:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(conn)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+            except smtplib.SMTPResponseException:
+                # The server rejected this message; the session itself is still usable
+                conn.rset()
+                self._idle.put((conn, time.monotonic()))
+                raise
+            except Exception:
+                self._discard(conn)
+                raise
+            self._idle.put((conn, time.monotonic()))
+
+    def send(self, message):
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    conn.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool for the current MAIL_* settings"""
+    config = current_app.config
+    key = (config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_USE_TLS'], config.get('MAIL_USERNAME'))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SMTPPool(
+                config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_USE_TLS'],
+                config.get('MAIL_USERNAME'), config.get('MAIL_PASSWORD'),
+                size=config.get('MAIL_POOL_SIZE', 4),
+                timeout=config.get('MAIL_TIMEOUT', 10),
+                max_idle=config.get('MAIL_POOL_MAX_IDLE', 60)
+            )
+        return _pools[key]
+
+
+def _send(pool, message):
+    start = time.monotonic()
+    try:
+        pool.send(message)
+        metrics.record(time.monotonic() - start, True)
+        return None
+    except Exception as e:
+        # Any failure, so one bad message cannot stop the others' results from being collected
+        metrics.record(time.monotonic() - start, False)
+        return e
+
+
+def deliver_batch(payloads):
+    """
+    Job handler body: one message per recipient, sent concurrently; failed recipients are requeued.
+
+    Once messages have gone out, an error raises PartialBatchError naming the
+    payloads that were delivered, so a retry never emails their recipients again.
+    """
+    config = current_app.config
+    if not config.get('MAIL_SERVER'):
+        current_app.logger.info('MAIL_SERVER not set; dropping %d email events', len(payloads))
+        return
+
+    by_user = {}
+    for index, payload in enumerate(payloads):
+        by_user.setdefault(payload['user_id'], []).append(index)
+    users = User.query.filter(User.id.in_(by_user.keys())).all()
+    batch = [(user, build_message(user, [payloads[index] for index in by_user[user.id]]))
+             for user in users if user.email]
+    if not batch:
+        return
+
+    pool = get_pool()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(pool.size, len(batch))) as executor:
+        errors = list(executor.map(lambda item: _send(pool, item[1]), batch))
+    current_app.logger.info('Sent %d of %d emails in %.2fs %s', errors.count(None), len(batch),
+                            time.monotonic() - start, metrics.snapshot())
+
+    # Requeue only the recipients that failed so nobody else gets a duplicate
+    failed = {index for (user, _), error in zip(batch, errors) if error is not None for index in by_user[user.id]}
+    try:
+        max_attempts = config.get('MAIL_MAX_ATTEMPTS', 5)
+        for (user, _), error in zip(batch, errors):
+            if error is None:
+                continue
+            for index in by_user[user.id]:
+                payload = payloads[index]
+                attempt = payload.get('attempt', 1)
+                if attempt >= max_attempts:
+                    current_app.logger.error('Giving up on email to user %s: %s', user.id, error)
+                    continue
+                enqueue('send_email', dict(payload, attempt=attempt + 1), delay=retry_delay(attempt))
+    except Exception as e:
+        raise PartialBatchError(set(range(len(payloads))) - failed, e) from e
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages from smtplib"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 urban-assist sink')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b'.\n', b''):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.messages.append(email.message_from_bytes(b''.join(lines)))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Local SMTP server that keeps every received message in .messages"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=1025):
+        super().__init__((host, port), _SinkHandler)
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# Command line interface: flask --app src.main mail <command>
+mail_cli = AppGroup('mail', help='Outbound email tools.')
+
+
+@mail_cli.command('sink')
+@click.option('--port', type=int, default=1025)
+def sink_command(port):
+    """Run a local SMTP sink that prints received messages."""
+    sink = SMTPSink(port=port).start()
+    click.echo(f'SMTP sink listening on 127.0.0.1:{sink.port} (Ctrl+C to stop)')
+    seen = 0
+    try:
+        while True:
+            for message in sink.messages[seen:]:
+                click.echo(f"--- To: {message['To']}  Subject: {message['Subject']}")
+                click.echo(message.get_payload())
+            seen = len(sink.messages)
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+@mail_cli.command('send-test')
+@click.argument('address')
+def send_test_command(address):
+    """Send one message through the configured SMTP server."""
+    message = EmailMessage()
+    message['From'] = current_app.config.get('MAIL_DEFAULT_SENDER')
+    message['To'] = address
+    message['Subject'] = 'Urban Assist test email'
+    message.set_content('SMTP settings are working.')
+    get_pool().send(message)
+    click.echo(f'Sent to {address}')
+
+
+def init_mail(app):
+    """Register the `flask mail` commands"""
+    app.cli.add_command(mail_cli)
@@ -1,8 +1,9 @@
 import os
 import sys
-from flask import Flask, send_from_directory, request
+from flask import Flask, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Ensure the parent directory of 'src' is in the Python path
 # This helps with absolute imports like 'src.models.user'
@@ -10,12 +11,24 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pa
 
 # Import your extensions and blueprints
 from src.models.user import db
+from src.db_routing import STICKY_HEADER, init_database
 from src.routes.user import user_bp
 from src.routes.booking import booking_bp
 from src.routes.review import review_bp
 from src.routes.admin import admin_bp
+from src.routes.upload import upload_bp
 from src.config import config # Your configuration object
 from src.chat import init_socketio # Your Socket.IO initialization function
+from src.load_shedding import LoadShedder
+from src.response_cache import ResponseCache
+from src.presence import Presence
+from src.search import init_search
+from src.message_search import init_message_search
+from src.static_assets import StaticAssets
+from src.jobs import init_jobs
+from src.mail import init_mail
+from src.ledger import init_ledger
+from src.schema import upgrade_schema
 
 def create_app(config_name=None):
     """
@@ -37,6 +50,11 @@ def create_app(config_name=None):
     # Initialize Flask app
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
     app.config.from_object(config[config_name])
+    
+    # Client address and scheme from the reverse proxy (rate limits key on request.remote_addr)
+    hops = app.config.get('TRUSTED_PROXY_HOPS')
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
 
     # --- NEW: Configure SQLAlchemy Engine Options for Connection Pooling ---
     # This helps prevent 'SSL SYSCALL error: EOF detected' by managing database connections.
@@ -48,16 +66,27 @@ def create_app(config_name=None):
     }
     # --- END NEW ---
     
-    # Initialize extensions
-    db.init_app(app)
+    # Initialize extensions (SQLite files also get tuned pragmas and the read/write split)
+    init_database(app, db)
+    
+    # Shared cache for public GET responses, invalidated by entity tags on commit
+    ResponseCache(app)
+    
+    # Per-route-class concurrency limits and per-user rate limits.
+    # Registered before the logging middleware so shed requests stay cheap.
+    LoadShedder(app)
     
     # Configure CORS for HTTP requests
     # The 'origins' are read from app.config['CORS_ORIGINS']
     # Ensure CORS_ORIGINS is correctly set in your src/config.py for production
-    CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
+    # The SPA echoes X-DB-Primary-Until back so its reads after a write skip lagging replicas
+    CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True, expose_headers=[STICKY_HEADER])
     
     jwt = JWTManager(app)
     
+    # Who is online (shared across workers when PRESENCE_STORAGE_URL points at Redis)
+    Presence(app)
+    
     # Initialize Socket.io
     # Ensure init_socketio also uses app.config['CORS_ORIGINS'] for its cors_allowed_origins
     socketio = init_socketio(app)
@@ -95,12 +124,26 @@ def create_app(config_name=None):
     app.register_blueprint(booking_bp, url_prefix='/api')
     app.register_blueprint(review_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(upload_bp, url_prefix='/api')
+    
+    # Background job handlers and the `flask jobs` CLI
+    init_jobs(app)
+    init_mail(app)
+    init_ledger(app)
     
     # Create database tables within the application context
     # This ensures tables are created when the app starts.
     # For production, consider using Flask-Migrate (Alembic) for migrations.
     with app.app_context():
         db.create_all()
+        # Columns and indexes added to tables that already existed (create_all skips those)
+        upgrade_schema(db.engine, db.metadata)
+    
+    # Full-text search index lives outside the ORM models (FTS5 / tsvector tables)
+    init_search(app)
+    init_message_search(app)
+    
+    with app.app_context():
         # Optional: Seed database if it's empty.
         # It's generally better to have seeding as a separate command or a conditional check
         # to prevent re-seeding on every app restart in production.
@@ -116,27 +159,17 @@ def create_app(config_name=None):
             print(f"Database seeding warning: {e}")
 
     # Route for serving static files (e.g., your React/Vue/Angular frontend build)
+    # The build is indexed once here; requests are answered from memory without stat calls.
+    static_assets = StaticAssets(app)
+
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve(path):
         """
         Serves static files from the 'static' folder, primarily for single-page applications.
-        If a specific file is requested, it serves that file. Otherwise, it serves index.html.
+        Known files are served (precompressed when possible); anything else gets index.html.
         """
-        static_folder_path = app.static_folder
-        if static_folder_path is None:
-            return "Static folder not configured", 404
-
-        # Check if the requested path corresponds to an existing file in the static folder
-        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-            return send_from_directory(static_folder_path, path)
-        else:
-            # Otherwise, serve the main index.html for SPA routing
-            index_path = os.path.join(static_folder_path, 'index.html')
-            if os.path.exists(index_path):
-                return send_from_directory(static_folder_path, 'index.html')
-            else:
-                return "index.html not found in static folder", 404
+        return static_assets.serve(path)
     
     return app, socketio
 
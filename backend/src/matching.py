@@ -0,0 +1,210 @@
+"""
+Runner matching and ranking for booking requests.
+
+Runner features are loaded into a columnar NumPy snapshot (one query for
+runners, one for their services) that is reused until it expires, and every
+candidate is scored with array operations instead of per-row Python.
+"""
+import threading
+import time
+from datetime import timezone
+
+import numpy as np
+from flask import current_app
+
+from src.config import Config
+from src.models.user import db, User, Runner, runner_services
+from src.availability import BITMAP_BYTES, window_mask, get_zone, filter_available
+from src.scheduling import booking_window
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class RunnerSnapshot:
+    """Columnar copy of the runner features used for scoring"""
+
+    def __init__(self, rows, service_rows):
+        count = len(rows)
+        self.size = count
+        self.runner_ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=count)
+        self.user_ids = np.fromiter((row.user_id for row in rows), dtype=np.int64, count=count)
+        self.latitude = np.fromiter((np.nan if row.latitude is None else row.latitude for row in rows),
+                                    dtype=np.float64, count=count)
+        self.longitude = np.fromiter((np.nan if row.longitude is None else row.longitude for row in rows),
+                                     dtype=np.float64, count=count)
+        self.rating = np.fromiter((row.rating or 0.0 for row in rows), dtype=np.float64, count=count)
+        self.total_reviews = np.fromiter((row.total_reviews or 0 for row in rows), dtype=np.float64, count=count)
+        self.total_bookings = np.fromiter((row.total_bookings or 0 for row in rows), dtype=np.float64, count=count)
+        self.hourly_rate = np.fromiter((row.hourly_rate or 0.0 for row in rows), dtype=np.float64, count=count)
+        self.is_available = np.fromiter((bool(row.is_available) for row in rows), dtype=bool, count=count)
+
+        # Weekly schedule bitmaps as an (n, 84) byte matrix; runners without one are free any time
+        self.has_schedule = np.fromiter((row.availability_bitmap is not None for row in rows), dtype=bool, count=count)
+        self.bitmaps = np.zeros((count, BITMAP_BYTES), dtype=np.uint8)
+        for index in np.flatnonzero(self.has_schedule):
+            self.bitmaps[index] = np.frombuffer(rows[index].availability_bitmap, dtype=np.uint8)
+        timezones = [row.timezone or 'UTC' for row in rows]
+        self.timezone_names, self.timezone_codes = np.unique(np.array(timezones, dtype=object), return_inverse=True)
+
+        # Service id -> positions of the runners offering it
+        position = {runner_id: index for index, runner_id in enumerate(self.runner_ids.tolist())}
+        members = {}
+        for runner_id, service_id in service_rows:
+            if runner_id in position:
+                members.setdefault(service_id, []).append(position[runner_id])
+        self.service_members = {service_id: np.array(indexes, dtype=np.int64) for service_id, indexes in members.items()}
+
+        self.log_max_reviews = np.log1p(self.total_reviews.max()) if count else 0.0
+        self.log_max_bookings = np.log1p(self.total_bookings.max()) if count else 0.0
+        self.mean_rating = float(self.rating[self.total_reviews > 0].mean()) if (self.total_reviews > 0).any() else 0.0
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def load(cls):
+        rows = db.session.query(
+            Runner.id, Runner.user_id, Runner.latitude, Runner.longitude, Runner.rating,
+            Runner.total_reviews, Runner.total_bookings, Runner.hourly_rate, Runner.is_available,
+            Runner.availability_bitmap, Runner.timezone
+        ).join(User, User.id == Runner.user_id).filter(User.is_active == True).all()
+        service_rows = db.session.query(runner_services.c.runner_id, runner_services.c.service_id).all()
+        return cls(rows, service_rows)
+
+    def available_mask(self, start, hours):
+        """Boolean mask of runners whose weekly schedule covers the window"""
+        utc_start = start.replace(tzinfo=timezone.utc)
+        covered = ~self.has_schedule
+        for code, tz_name in enumerate(self.timezone_names):
+            in_zone = (self.timezone_codes == code) & self.has_schedule
+            if not in_zone.any():
+                continue
+            mask = window_mask(utc_start.astimezone(get_zone(tz_name)), hours)
+            mask_bytes = np.frombuffer(mask.to_bytes(BITMAP_BYTES, 'little'), dtype=np.uint8)
+            fits = ((self.bitmaps[in_zone] & mask_bytes) == mask_bytes).all(axis=1)
+            covered[np.flatnonzero(in_zone)[fits]] = True
+        return covered
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Return the cached runner snapshot, rebuilding it once it is older than MATCHING_SNAPSHOT_TTL"""
+    global _snapshot
+    ttl = current_app.config.get('MATCHING_SNAPSHOT_TTL', 60)
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - snapshot.built_at < ttl:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or time.monotonic() - _snapshot.built_at >= ttl:
+            _snapshot = RunnerSnapshot.load()
+        return _snapshot
+
+
+def invalidate_snapshot():
+    global _snapshot
+    _snapshot = None
+
+
+def haversine_km(lat, lon, latitudes, longitudes):
+    """Great-circle distance from one point to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def score_runners(snapshot, service_id=None, latitude=None, longitude=None, start=None, hours=1.0,
+                  budget=None, max_distance_km=None, weights=None, distance_scale_km=10.0, prior_reviews=5):
+    """
+    Score every runner in the snapshot.
+
+    Returns (scores, distances) where runners that fail a hard constraint
+    (service, schedule, budget, distance, availability flag) score -inf.
+    """
+    weights = weights if weights is not None else Config.MATCHING_WEIGHTS
+    eligible = snapshot.is_available.copy()
+
+    if service_id is not None:
+        offers = np.zeros(snapshot.size, dtype=bool)
+        offers[snapshot.service_members.get(service_id, np.empty(0, dtype=np.int64))] = True
+        eligible &= offers
+
+    if start is not None:
+        eligible &= snapshot.available_mask(start, hours)
+
+    # Budget is for the whole booking, so compare it against rate * hours
+    price_score = np.zeros(snapshot.size)
+    if budget:
+        cost = snapshot.hourly_rate * hours
+        eligible &= cost <= budget
+        price_score = np.clip(1.0 - cost / budget, 0.0, 1.0)
+    elif snapshot.size:
+        max_rate = snapshot.hourly_rate.max() or 1.0
+        price_score = 1.0 - snapshot.hourly_rate / max_rate
+
+    distances = np.full(snapshot.size, np.nan)
+    distance_score = np.zeros(snapshot.size)
+    if latitude is not None and longitude is not None:
+        distances = haversine_km(latitude, longitude, snapshot.latitude, snapshot.longitude)
+        distance_score = np.where(np.isnan(distances), 0.0, np.exp(-np.nan_to_num(distances) / distance_scale_km))
+        if max_distance_km is not None:
+            eligible &= ~np.isnan(distances) & (np.nan_to_num(distances, nan=np.inf) <= max_distance_km)
+
+    # Shrink ratings with few reviews towards the platform mean
+    shrunk_rating = (snapshot.rating * snapshot.total_reviews + snapshot.mean_rating * prior_reviews) \
+        / (snapshot.total_reviews + prior_reviews)
+    rating_score = shrunk_rating / 5.0
+    reviews_score = np.log1p(snapshot.total_reviews) / snapshot.log_max_reviews if snapshot.log_max_reviews else 0.0
+    history_score = np.log1p(snapshot.total_bookings) / snapshot.log_max_bookings if snapshot.log_max_bookings else 0.0
+
+    scores = (weights.get('distance', 0) * distance_score
+              + weights.get('rating', 0) * rating_score
+              + weights.get('reviews', 0) * reviews_score
+              + weights.get('price', 0) * price_score
+              + weights.get('history', 0) * history_score)
+    scores = np.where(eligible, scores, -np.inf)
+    return scores, distances
+
+
+def top_k(scores, k):
+    """Indexes of the k best finite scores, best first"""
+    finite = np.isfinite(scores)
+    count = int(finite.sum())
+    if count == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    k = min(k, count)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def match_runners(service_id=None, latitude=None, longitude=None, start=None, hours=1.0,
+                  budget=None, max_distance_km=None, limit=10):
+    """
+    Rank runners for a booking request.
+
+    Returns a list of {'runner_id', 'score', 'distance_km'} dicts, best first.
+    When a start time is given, the shortlist is also checked against
+    exceptions and existing bookings before it is returned.
+    """
+    snapshot = get_snapshot()
+    if start is not None:
+        start, _ = booking_window(start, hours)
+    scores, distances = score_runners(
+        snapshot, service_id=service_id, latitude=latitude, longitude=longitude, start=start,
+        hours=hours, budget=budget, max_distance_km=max_distance_km,
+        weights=current_app.config['MATCHING_WEIGHTS']
+    )
+
+    # Over-fetch so runners dropped for bookings or time off can be replaced
+    shortlist = top_k(scores, limit * 4 if start is not None else limit)
+    runner_ids = snapshot.runner_ids[shortlist].tolist()
+    if start is not None:
+        free = set(filter_available([(runner_id, None, None) for runner_id in runner_ids], start, hours))
+        shortlist = [index for index, runner_id in zip(shortlist.tolist(), runner_ids) if runner_id in free][:limit]
+
+    return [{
+        'runner_id': int(snapshot.runner_ids[index]),
+        'score': round(float(scores[index]), 4),
+        'distance_km': None if np.isnan(distances[index]) else round(float(distances[index]), 2)
+    } for index in shortlist]
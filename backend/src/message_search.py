@@ -0,0 +1,265 @@
+"""
+Full-text search over chat messages, limited to the caller's conversations.
+
+Each indexed message also carries its sender and receiver as participant
+tokens, so restricting results to the caller's bookings is part of the index
+lookup rather than a filter over every match. SQLite keeps messages in an
+FTS5 table keyed by rowid = message id and ranks with bm25; Postgres keeps a
+tsvector plus a participant array under one GIN index and ranks with
+ts_rank.
+
+Sending a message only queues an `index_chat_messages` job (from session
+flush hooks); the worker indexes the whole batch at once.
+"""
+import base64
+import html
+import json
+import re
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from src.models.user import db, ChatMessage
+from src.db_routing import get_router, read_connection
+from src.jobs import enqueue
+
+# Highlight markers, swapped for <mark> after the snippet has been HTML-escaped
+START, STOP = '\ue000', '\ue001'
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by message search"""
+
+
+def _terms(query):
+    return re.findall(r'\w+', (query or '').lower())[:16]
+
+
+def _ids(message_ids):
+    params = {f'id{i}': message_id for i, message_id in enumerate(message_ids)}
+    return params, ', '.join(f':{key}' for key in params)
+
+
+class SQLiteMessageSearch:
+    """FTS5 backend; participants are tokens such as u12 in an unranked column"""
+
+    name = 'sqlite'
+
+    def create(self, connection):
+        connection.execute(text("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chat_search_index USING fts5(
+                message, participants, booking_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """))
+
+    def is_empty(self, connection):
+        return connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM chat_search_index)")).scalar()
+
+    _select = """
+        SELECT id, message, 'u' || sender_id || ' u' || receiver_id, booking_id FROM chat_message
+    """
+
+    def reindex(self, connection, message_ids):
+        params, placeholders = _ids(message_ids)
+        connection.execute(text(f"DELETE FROM chat_search_index WHERE rowid IN ({placeholders})"), params)
+        connection.execute(text(
+            "INSERT INTO chat_search_index (rowid, message, participants, booking_id) "
+            + self._select + f" WHERE id IN ({placeholders})"
+        ), params)
+
+    def rebuild(self, connection):
+        connection.execute(text("DELETE FROM chat_search_index"))
+        connection.execute(text(
+            "INSERT INTO chat_search_index (rowid, message, participants, booking_id) " + self._select
+        ))
+
+    def search(self, connection, query, user_id, booking_id, after, limit):
+        prefixes = ' '.join('"%s"*' % term for term in _terms(query))
+        params = {'match': f'message : ({prefixes}) AND participants : "u{int(user_id)}"', 'limit': limit,
+                  'start': START, 'stop': STOP}
+        conditions = []
+        if booking_id is not None:
+            conditions.append('booking_id = :booking_id')
+            params['booking_id'] = booking_id
+        if after:
+            conditions.append('(score > :after_score OR (score = :after_score AND id > :after_id))')
+            params.update(after_score=after[0], after_id=after[1])
+        rows = connection.execute(text(f"""
+            SELECT id, score, snippet FROM (
+                SELECT rowid AS id, CAST(booking_id AS INTEGER) AS booking_id,
+                       bm25(chat_search_index, 1.0, 0.0) AS score,
+                       snippet(chat_search_index, 0, :start, :stop, '…', 16) AS snippet
+                FROM chat_search_index WHERE chat_search_index MATCH :match
+            )
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY score, id
+            LIMIT :limit
+        """), params).all()
+        # bm25 is lower-is-better; report higher-is-better like ts_rank
+        return [(row[0], row[1], -row[1], row[2]) for row in rows]
+
+
+class PostgresMessageSearch:
+    """tsvector backend; (document, participants) share one multicolumn GIN index"""
+
+    name = 'postgresql'
+
+    def create(self, connection):
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS chat_search_document (
+                message_id INTEGER PRIMARY KEY,
+                booking_id INTEGER NOT NULL,
+                participants INTEGER[] NOT NULL,
+                document TSVECTOR NOT NULL
+            )
+        """))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_chat_search_document_gin "
+            "ON chat_search_document USING GIN (document, participants)"
+        ))
+
+    def is_empty(self, connection):
+        return connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM chat_search_document)")).scalar()
+
+    def _upsert(self, where):
+        return f"""
+            INSERT INTO chat_search_document (message_id, booking_id, participants, document)
+            SELECT id, booking_id, ARRAY[sender_id, receiver_id], to_tsvector('simple', message)
+            FROM chat_message
+            {where}
+            ON CONFLICT (message_id) DO UPDATE
+            SET participants = EXCLUDED.participants, document = EXCLUDED.document
+        """
+
+    def reindex(self, connection, message_ids):
+        connection.execute(text(
+            "DELETE FROM chat_search_document d WHERE d.message_id = ANY(:ids) "
+            "AND NOT EXISTS (SELECT 1 FROM chat_message m WHERE m.id = d.message_id)"
+        ), {'ids': list(message_ids)})
+        connection.execute(text(self._upsert("WHERE id = ANY(:ids)")), {'ids': list(message_ids)})
+
+    def rebuild(self, connection):
+        connection.execute(text("TRUNCATE chat_search_document"))
+        connection.execute(text(self._upsert("")))
+
+    def search(self, connection, query, user_id, booking_id, after, limit):
+        params = {'query': ' & '.join(f'{term}:*' for term in _terms(query)), 'user_ids': [int(user_id)],
+                  'limit': limit, 'options': f'StartSel={START}, StopSel={STOP}, MaxWords=16, MinWords=4'}
+        conditions = []
+        if booking_id is not None:
+            conditions.append('r.booking_id = :booking_id')
+            params['booking_id'] = booking_id
+        if after:
+            conditions.append('(r.score < :after_score OR (r.score = :after_score AND r.message_id > :after_id))')
+            params.update(after_score=after[0], after_id=after[1])
+        rows = connection.execute(text(f"""
+            WITH ranked AS (
+                SELECT message_id, booking_id, ts_rank(document, query) AS score
+                FROM chat_search_document, to_tsquery('simple', :query) query
+                WHERE document @@ query AND participants @> CAST(:user_ids AS INTEGER[])
+            )
+            SELECT r.message_id, r.score, ts_headline('simple', m.message, to_tsquery('simple', :query), :options)
+            FROM ranked r JOIN chat_message m ON m.id = r.message_id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY r.score DESC, r.message_id
+            LIMIT :limit
+        """), params).all()
+        return [(row[0], row[1], row[1], row[2]) for row in rows]
+
+
+BACKENDS = {
+    'sqlite': SQLiteMessageSearch(),
+    'postgresql': PostgresMessageSearch(),
+}
+
+# Engines whose message search tables exist
+_indexed_engines = set()
+
+
+def get_backend(connection):
+    if connection.engine.url.render_as_string() not in _indexed_engines:
+        return None
+    return BACKENDS.get(connection.dialect.name)
+
+
+def init_message_search(app):
+    """Create the message search index for the app's database and backfill it if empty"""
+    with app.app_context():
+        connection = db.session.connection()
+        backend = BACKENDS.get(connection.dialect.name)
+        if backend is None:
+            app.logger.warning('Message search is not supported on %s', connection.dialect.name)
+            return
+        backend.create(connection)
+        _indexed_engines.add(connection.engine.url.render_as_string())
+        # Replicas are copies of the primary, message search tables included
+        router = get_router()
+        for replica in (router.replicas if router else []):
+            _indexed_engines.add(replica.url.render_as_string())
+        if backend.is_empty(connection):
+            backend.rebuild(connection)
+        db.session.commit()
+
+
+def index_messages(message_ids):
+    """Bring the index entries for these messages up to date (deleted messages are dropped)"""
+    message_ids = sorted(set(message_ids))
+    connection = db.session.connection()
+    backend = get_backend(connection)
+    if backend is None or not message_ids:
+        return
+    backend.reindex(connection, message_ids)
+
+
+def encode_cursor(order_key, message_id):
+    raw = json.dumps([order_key, message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        order_key, message_id = json.loads(raw)
+        return float(order_key), int(message_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap the matched terms in <mark>"""
+    return html.escape(snippet or '').replace(START, '<mark>').replace(STOP, '</mark>')
+
+
+def search_messages(query, user_id, booking_id=None, cursor=None, limit=20):
+    """
+    Return ([(message_id, score, highlighted_snippet)], next_cursor) for messages
+    the user sent or received, best match first.
+    """
+    if not _terms(query):
+        return [], None
+    connection = read_connection(db.session)
+    backend = get_backend(connection)
+    if backend is None:
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+    rows = backend.search(connection, query, user_id, booking_id, after, limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return [(message_id, score, highlight(snippet)) for message_id, _, score, snippet in rows[:limit]], next_cursor
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_messages(session, flush_context):
+    """Note new, edited and deleted messages; ids are known once the flush has run"""
+    message_ids = [obj.id for obj in session.new if isinstance(obj, ChatMessage)]
+    message_ids += [obj.id for obj in session.dirty if isinstance(obj, ChatMessage)
+                    and inspect(obj).attrs.message.history.has_changes()]
+    message_ids += [obj.id for obj in session.deleted if isinstance(obj, ChatMessage)]
+    if message_ids:
+        session.info.setdefault('index_messages', []).extend(message_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _queue_message_indexing(session, flush_context):
+    """Queue one index job per flush; it commits or rolls back with the messages"""
+    message_ids = session.info.pop('index_messages', None)
+    if message_ids and get_backend(session.connection()) is not None:
+        enqueue('index_chat_messages', {'message_ids': message_ids})
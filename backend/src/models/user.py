@@ -1,9 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
+from src.images import variant_urls
+from src.db_routing import RoutingSession
 import enum
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Booking statuses that occupy a runner's time; only these take part in conflict checks
+ACTIVE_BOOKING_STATUSES = ('pending', 'accepted', 'in_progress')
+# The same filter spelled out rather than bound, so SQLite can match the partial indexes on active bookings
+ACTIVE_STATUS_CLAUSE = db.text('booking.status IN (%s)' % ', '.join(f"'{status}'" for status in ACTIVE_BOOKING_STATUSES))
 
 class UserRole(enum.Enum):
     USER = 'user'
@@ -74,6 +82,7 @@ class User(db.Model):
             'last_name': self.last_name,
             'phone': self.phone,
             'profile_image': self.profile_image,
+            'profile_image_variants': variant_urls(self.profile_image),
             'role': self.role.value if self.role else 'user',
             'is_active': self.is_active,
             'is_verified': self.is_verified,
@@ -86,7 +95,7 @@ class User(db.Model):
 
 class Runner(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     bio = db.Column(db.Text)
     hourly_rate = db.Column(db.Float, nullable=False)
     city = db.Column(db.String(100), nullable=False)
@@ -95,6 +104,8 @@ class Runner(db.Model):
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     is_available = db.Column(db.Boolean, default=True)
+    availability_bitmap = db.Column(db.LargeBinary)  # Weekly schedule, one bit per 15-minute slot (NULL = any time)
+    timezone = db.Column(db.String(50), default='UTC')  # Timezone the weekly schedule is expressed in
     is_verified = db.Column(db.Boolean, default=False)
     rating = db.Column(db.Float, default=0.0)
     total_reviews = db.Column(db.Integer, default=0)
@@ -123,6 +134,7 @@ class Runner(db.Model):
             'latitude': self.latitude,
             'longitude': self.longitude,
             'is_available': self.is_available,
+            'timezone': self.timezone or 'UTC',
             'is_verified': self.is_verified,
             'rating': self.rating,
             'total_reviews': self.total_reviews,
@@ -132,6 +144,37 @@ class Runner(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class AvailabilityException(db.Model):
+    """One-off change to a runner's weekly schedule (time off, or extra hours)"""
+    id = db.Column(db.Integer, primary_key=True)
+    runner_id = db.Column(db.Integer, db.ForeignKey('runner.id'), nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)  # UTC
+    end_date = db.Column(db.DateTime, nullable=False)  # UTC
+    is_available = db.Column(db.Boolean, default=False)  # False = time off, True = available outside the schedule
+    reason = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    runner = db.relationship('Runner', backref=db.backref('availability_exceptions', lazy='dynamic'))
+
+    __table_args__ = (
+        db.Index('ix_availability_exception_window', 'runner_id', 'start_date', 'end_date'),
+    )
+
+    def __repr__(self):
+        return f'<AvailabilityException {self.runner_id} {self.start_date}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'runner_id': self.runner_id,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'is_available': self.is_available,
+            'reason': self.reason,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class Service(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -166,20 +209,44 @@ class Booking(db.Model):
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     scheduled_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime)  # scheduled_date + estimated_hours, kept in sync on flush
     estimated_hours = db.Column(db.Float, nullable=False)
     hourly_rate = db.Column(db.Float, nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, accepted, declined, in_progress, completed, cancelled
     payment_status = db.Column(db.String(20), default='pending')  # pending, paid, refunded
     notes = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Optimistic concurrency token
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
+    counted_at = db.Column(db.DateTime)  # Set when added to runner.total_bookings, so replays don't count twice
     
     # Relationships
     service = db.relationship('Service', backref='bookings')
     chat_messages = db.relationship('ChatMessage', backref='booking', lazy='dynamic')
 
+    # Per-runner interval index over active bookings, used for conflict detection
+    __table_args__ = (
+        db.Index(
+            'ix_booking_runner_window', 'runner_id', 'scheduled_date', 'end_date',
+            sqlite_where=db.text("status IN ('pending', 'accepted', 'in_progress')"),
+            postgresql_where=db.text("status IN ('pending', 'accepted', 'in_progress')")
+        ),
+        # Dashboard: upcoming active bookings per client, in date order
+        db.Index(
+            'ix_booking_user_upcoming', 'user_id', 'scheduled_date',
+            sqlite_where=db.text("status IN ('pending', 'accepted', 'in_progress')"),
+            postgresql_where=db.text("status IN ('pending', 'accepted', 'in_progress')")
+        ),
+        # Dashboard: per-status counts and totals answered from the index alone
+        db.Index('ix_booking_user_status', 'user_id', 'status', 'total_amount'),
+        db.Index('ix_booking_runner_status', 'runner_id', 'status', 'total_amount'),
+    )
+
+    # ORM updates also check and bump the version, so stale writes fail instead of overwriting
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Booking {self.title}>'
 
@@ -198,17 +265,54 @@ class Booking(db.Model):
             'latitude': self.latitude,
             'longitude': self.longitude,
             'scheduled_date': self.scheduled_date.isoformat() if self.scheduled_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
             'estimated_hours': self.estimated_hours,
             'hourly_rate': self.hourly_rate,
             'total_amount': self.total_amount,
             'status': self.status,
             'payment_status': self.payment_status,
             'notes': self.notes,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+@event.listens_for(Booking, 'before_insert')
+@event.listens_for(Booking, 'before_update')
+def sync_booking_end_date(mapper, connection, booking):
+    """Keep the indexed end_date column in step with scheduled_date and estimated_hours"""
+    if booking.scheduled_date is not None and booking.estimated_hours is not None:
+        booking.end_date = booking.scheduled_date + timedelta(hours=float(booking.estimated_hours))
+
+class BookingEvent(db.Model):
+    """Append-only history of booking status transitions"""
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    from_status = db.Column(db.String(20))  # NULL for the creation event
+    to_status = db.Column(db.String(20), nullable=False)
+    version = db.Column(db.Integer, nullable=False)  # Booking version after the transition
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_booking_event_booking', 'booking_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<BookingEvent {self.booking_id} {self.from_status}->{self.to_status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'booking_id': self.booking_id,
+            'actor_id': self.actor_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'version': self.version,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
@@ -224,6 +328,17 @@ class Review(db.Model):
     # Relationships
     booking = db.relationship('Booking', backref='reviews')
 
+    __table_args__ = (
+        # Aggregates per reviewee only look at approved reviews
+        db.Index('ix_review_reviewee_approved', 'reviewee_id', 'is_approved'),
+        # Moderation queue: small partial index over flagged reviews only
+        db.Index(
+            'ix_review_flagged_queue', 'created_at', 'id',
+            sqlite_where=db.text('is_flagged = 1'),
+            postgresql_where=db.text('is_flagged')
+        ),
+    )
+
     def __repr__(self):
         return f'<Review {self.rating} stars>'
 
@@ -254,6 +369,15 @@ class ChatMessage(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Unread counts: small partial index over unread messages only
+        db.Index(
+            'ix_chat_message_unread', 'receiver_id',
+            sqlite_where=db.text('is_read = 0'),
+            postgresql_where=db.text('NOT is_read')
+        ),
+    )
+
     def __repr__(self):
         return f'<ChatMessage {self.id}>'
 
@@ -280,8 +404,18 @@ class Notification(db.Model):
     notification_type = db.Column(db.String(50), nullable=False)  # booking, chat, review, system
     related_id = db.Column(db.Integer)  # ID of related booking, message, etc.
     is_read = db.Column(db.Boolean, default=False)
+    dedupe_key = db.Column(db.String(32))  # Set by the queueing code; a replayed job inserts nothing
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index(
+            'ix_notification_unread', 'user_id',
+            sqlite_where=db.text('is_read = 0'),
+            postgresql_where=db.text('NOT is_read')
+        ),
+        db.Index('ix_notification_dedupe_key', 'dedupe_key', unique=True),
+    )
+
     def __repr__(self):
         return f'<Notification {self.title}>'
 
@@ -328,3 +462,193 @@ class Payment(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+class LedgerEntry(db.Model):
+    """Append-only movement of a runner's money (see src/ledger.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    runner_id = db.Column(db.Integer, db.ForeignKey('runner.id'), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'))
+    payment_id = db.Column(db.Integer, db.ForeignKey('payment.id'))
+    payout_id = db.Column(db.Integer, db.ForeignKey('payout.id'))
+    entry_type = db.Column(db.String(20), nullable=False)  # earning, fee, refund, payout
+    amount = db.Column(db.Float, nullable=False)  # Positive credits the runner, negative debits
+    currency = db.Column(db.String(3), default='USD')
+    reference = db.Column(db.String(100), unique=True, nullable=False)  # e.g. booking:12:earning; one entry per event
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Per-runner period totals answered from the index alone
+        db.Index('ix_ledger_entry_runner_created', 'runner_id', 'created_at', 'entry_type', 'amount'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id} {self.entry_type} {self.amount}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'runner_id': self.runner_id,
+            'booking_id': self.booking_id,
+            'payment_id': self.payment_id,
+            'payout_id': self.payout_id,
+            'entry_type': self.entry_type,
+            'amount': self.amount,
+            'currency': self.currency,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class RunnerBalance(db.Model):
+    """Runner balance as of the last payout batch checkpoint"""
+    runner_id = db.Column(db.Integer, db.ForeignKey('runner.id'), primary_key=True)
+    balance = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RunnerBalance {self.runner_id} {self.balance}>'
+
+class PayoutBatch(db.Model):
+    """One payout run; folds ledger entries (from_entry_id, through_entry_id] into balances"""
+    id = db.Column(db.Integer, primary_key=True)
+    from_entry_id = db.Column(db.Integer, unique=True, nullable=False)  # Unique: one batch per checkpoint
+    through_entry_id = db.Column(db.Integer, nullable=False)
+    runner_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    payouts = db.relationship('Payout', backref='batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<PayoutBatch {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'from_entry_id': self.from_entry_id,
+            'through_entry_id': self.through_entry_id,
+            'runner_count': self.runner_count,
+            'total_amount': self.total_amount,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Payout(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('payout_batch.id'), nullable=False)
+    runner_id = db.Column(db.Integer, db.ForeignKey('runner.id'), nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, paid, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Payout {self.id} {self.amount}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'batch_id': self.batch_id,
+            'runner_id': self.runner_id,
+            'amount': self.amount,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class ReplicaHeartbeat(db.Model):
+    """Single row refreshed on the primary; a replica's copy shows how far behind it is (see src/db_routing.py)"""
+    __tablename__ = 'replica_heartbeat'
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.Float, nullable=False)  # Unix time of the last refresh
+
+class Job(db.Model):
+    """Durable background job, claimed by worker processes (see src/jobs.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Claim order for ready jobs
+        db.Index('ix_job_ready', 'queue', 'status', 'run_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.task} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'queue': self.queue,
+            'task': self.task,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'locked_by': self.locked_by,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class StoredFile(db.Model):
+    """Content-addressed file on disk; identical uploads share one row and one copy"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    extension = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.sha256[:12]}>'
+
+    @property
+    def url(self):
+        return f'/api/files/{self.sha256}.{self.extension}'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'content_type': self.content_type,
+            'url': self.url,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Upload(db.Model):
+    """Resumable upload in progress; chunks are appended at `received` until it reaches `size`"""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, complete
+    file_id = db.Column(db.Integer, db.ForeignKey('stored_file.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    file = db.relationship('StoredFile')
+
+    def __repr__(self):
+        return f'<Upload {self.id} {self.received}/{self.size}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'size': self.size,
+            'offset': self.received,
+            'status': self.status,
+            'file': self.file.to_dict() if self.file else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,253 @@
+"""
+Online presence and throttled room activity for the chat sockets.
+
+Each worker keeps its own sockets in memory (sid -> user) and records them in
+a presence store: per user, the socket ids and when each stops counting as
+online, plus when the user was last seen. With 'memory://' the store is
+per-process; point PRESENCE_STORAGE_URL at the Redis server behind the
+Socket.IO message queue and every worker sees every user. Workers refresh
+their sockets on a heartbeat, so sockets of a worker that died without
+disconnecting them simply expire.
+
+Typing and presence changes are not emitted one by one: RoomCoalescer merges
+the updates for a room and sends them at most once per interval.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+
+
+class MemoryPresenceStore:
+    """In-process presence store. Used for tests and single-worker setups."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._sockets = defaultdict(dict)   # user_id -> {sid: expires_at}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def _online(self, user_id, now):
+        return any(expires > now for expires in self._sockets.get(user_id, {}).values())
+
+    def connect(self, user_id, sid, ttl):
+        """Record a socket; return True if the user was offline until now"""
+        with self._lock:
+            now = self.clock()
+            was_online = self._online(user_id, now)
+            self._sockets[user_id][sid] = now + ttl
+            self._last_seen[user_id] = now
+            return not was_online
+
+    def disconnect(self, user_id, sid):
+        """Forget a socket; return True if the user has no sockets left"""
+        with self._lock:
+            now = self.clock()
+            sockets = self._sockets.get(user_id, {})
+            sockets.pop(sid, None)
+            self._last_seen[user_id] = now
+            if not self._online(user_id, now):
+                self._sockets.pop(user_id, None)
+                return True
+            return False
+
+    def refresh(self, sockets, ttl):
+        """Extend {user_id: [sid, ...]} for another ttl seconds"""
+        with self._lock:
+            now = self.clock()
+            for user_id, sids in sockets.items():
+                for sid in sids:
+                    self._sockets[user_id][sid] = now + ttl
+                self._last_seen[user_id] = now
+
+    def lookup(self, user_ids):
+        """Return {user_id: (online, last_seen)}; last_seen is None for users never seen"""
+        with self._lock:
+            now = self.clock()
+            return {user_id: (self._online(user_id, now), self._last_seen.get(user_id)) for user_id in user_ids}
+
+
+class RedisPresenceStore:
+    """
+    Presence shared by all workers through Redis: a hash per user of socket id
+    -> expiry, and a last-seen timestamp per user. Batch lookups are one
+    pipelined round trip.
+    """
+
+    LAST_SEEN_TTL = 30 * 24 * 3600
+
+    def __init__(self, url, prefix='presence:', clock=time.time):
+        import redis  # Only required when a shared store is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.clock = clock
+
+    def _sockets_key(self, user_id):
+        return f'{self.prefix}sockets:{user_id}'
+
+    def _seen_key(self, user_id):
+        return f'{self.prefix}seen:{user_id}'
+
+    @staticmethod
+    def _online(expiries, now):
+        return any(float(expires) > now for expires in expiries or ())
+
+    def connect(self, user_id, sid, ttl):
+        now = self.clock()
+        key = self._sockets_key(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hvals(key)
+        pipe.hset(key, sid, now + ttl)
+        pipe.expire(key, int(ttl) + 1)
+        pipe.set(self._seen_key(user_id), now, ex=self.LAST_SEEN_TTL)
+        expiries = pipe.execute()[0]
+        return not self._online(expiries, now)
+
+    def disconnect(self, user_id, sid):
+        now = self.clock()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hdel(self._sockets_key(user_id), sid)
+        pipe.hvals(self._sockets_key(user_id))
+        pipe.set(self._seen_key(user_id), now, ex=self.LAST_SEEN_TTL)
+        return not self._online(pipe.execute()[1], now)
+
+    def refresh(self, sockets, ttl):
+        if not sockets:
+            return
+        now = self.clock()
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, sids in sockets.items():
+            pipe.hset(self._sockets_key(user_id), mapping={sid: now + ttl for sid in sids})
+            pipe.expire(self._sockets_key(user_id), int(ttl) + 1)
+            pipe.set(self._seen_key(user_id), now, ex=self.LAST_SEEN_TTL)
+        pipe.execute()
+
+    def lookup(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        now = self.clock()
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hvals(self._sockets_key(user_id))
+            pipe.get(self._seen_key(user_id))
+        replies = pipe.execute()
+        return {
+            user_id: (self._online(replies[2 * index], now),
+                      float(replies[2 * index + 1]) if replies[2 * index + 1] is not None else None)
+            for index, user_id in enumerate(user_ids)
+        }
+
+
+def create_store(url):
+    """Create a presence store from a URL ('memory://' or 'redis://...')."""
+    if not url or url.startswith('memory://'):
+        return MemoryPresenceStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisPresenceStore(url)
+    raise ValueError(f'Unsupported presence storage URL: {url}')
+
+
+class Presence:
+    """Socket registry for this worker on top of a shared presence store."""
+
+    def __init__(self, app=None):
+        self.store = None
+        self.ttl = 90
+        self._sockets = {}   # sid -> user_id, sockets connected to this worker
+        self._lock = threading.Lock()
+        self.heartbeat_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = create_store(app.config.get('PRESENCE_STORAGE_URL', 'memory://'))
+        self.ttl = app.config.get('PRESENCE_TTL', 90)
+        app.extensions['presence'] = self
+
+    def connect(self, user_id, sid):
+        """Register a socket; return True if the user just came online"""
+        with self._lock:
+            self._sockets[sid] = user_id
+        return self.store.connect(user_id, sid, self.ttl)
+
+    def disconnect(self, sid):
+        """Unregister a socket; return (user_id, went_offline), or (None, False) for unknown sockets"""
+        with self._lock:
+            user_id = self._sockets.pop(sid, None)
+        if user_id is None:
+            return None, False
+        return user_id, self.store.disconnect(user_id, sid)
+
+    def user_for(self, sid):
+        return self._sockets.get(sid)
+
+    def refresh(self):
+        """Heartbeat: keep this worker's sockets online for another ttl"""
+        sockets = defaultdict(list)
+        with self._lock:
+            for sid, user_id in self._sockets.items():
+                sockets[user_id].append(sid)
+        self.store.refresh(sockets, self.ttl)
+
+    def heartbeat(self, sleep):
+        """Run refresh() every third of the ttl; start with socketio.start_background_task"""
+        while True:
+            sleep(self.ttl / 3)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Presence heartbeat failed: {e}")
+
+    def lookup(self, user_ids):
+        return self.store.lookup(user_ids)
+
+
+def get_presence():
+    return current_app.extensions.get('presence')
+
+
+class RoomCoalescer:
+    """
+    Merge per-room updates and hand them to `flush(room, updates)` at most once
+    per `interval` seconds per room. The first update after a quiet period
+    goes out immediately; later ones within the interval are merged (last
+    value per key wins) and sent when it ends.
+    """
+
+    MAX_IDLE_ROOMS = 1024
+
+    def __init__(self, interval, flush, spawn, sleep, clock=time.monotonic):
+        self.interval = interval
+        self.flush = flush
+        self.spawn = spawn
+        self.sleep = sleep
+        self.clock = clock
+        self._pending = {}
+        self._last_flush = {}
+        self._lock = threading.Lock()
+
+    def submit(self, room, key, value):
+        with self._lock:
+            pending = self._pending.get(room)
+            if pending is not None:
+                pending[key] = value
+                return
+            self._pending[room] = {key: value}
+            wait = self._last_flush.get(room, float('-inf')) + self.interval - self.clock()
+        self.spawn(self._flush_later, room, max(wait, 0))
+
+    def _flush_later(self, room, wait):
+        if wait:
+            self.sleep(wait)
+        with self._lock:
+            updates = self._pending.pop(room, None)
+            now = self._last_flush[room] = self.clock()
+            if len(self._last_flush) > self.MAX_IDLE_ROOMS:
+                # Rooms quiet for a whole interval no longer need their timestamp
+                for other in [other for other, flushed in self._last_flush.items() if flushed < now - self.interval]:
+                    del self._last_flush[other]
+        if updates:
+            self.flush(room, updates)
@@ -0,0 +1,37 @@
+from sqlalchemy import func, update
+from src.models.user import db, Runner, Review
+from src.response_cache import invalidate, listed_runner_tags
+
+
+def refresh_runner_ratings(user_ids):
+    """
+    Recompute rating and total_reviews for the runners of the given users.
+
+    Uses one GROUP BY over approved reviews joined into a single UPDATE ... FROM,
+    so a bulk moderation action costs the same two statements whether it touched
+    one runner or thousands. Runners left without approved reviews reset to 0.
+    """
+    user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+    if not user_ids:
+        return
+
+    aggregates = db.session.query(
+        Runner.id.label('runner_id'),
+        func.coalesce(func.round(func.avg(Review.rating), 1), 0.0).label('rating'),
+        func.count(Review.id).label('total_reviews')
+    ).outerjoin(
+        Review, (Review.reviewee_id == Runner.user_id) & (Review.is_approved == True)
+    ).filter(
+        Runner.user_id.in_(user_ids)
+    ).group_by(Runner.id).subquery()
+
+    db.session.execute(
+        update(Runner)
+        .where(Runner.id == aggregates.c.runner_id)
+        .values(rating=aggregates.c.rating, total_reviews=aggregates.c.total_reviews)
+        .execution_options(synchronize_session=False)
+    )
+    # Loaded Runner objects still hold the old values
+    db.session.expire_all()
+    # Ratings decide list order, so every list these runners can appear in is affected
+    invalidate(*listed_runner_tags(db.session.connection(), Runner.user_id.in_(user_ids)))
@@ -0,0 +1,447 @@
+"""
+Shared cache for public GET responses, invalidated by entity tags.
+
+Views wrapped in @cached_response are looked up by endpoint plus normalized
+arguments; on a miss the view runs and names the entities its response
+contains with cache_tags() (runner:<id>, user:<id>, service:<id>, ...), plus
+a membership tag for the set it lists (runners, runners:city:<name>,
+reviewee:<id>, runners:available, ...). Writes are turned into tags by a session after_flush hook, the same
+way the search index is kept fresh, and the matching entries are dropped
+once the transaction commits. Bulk UPDATEs that bypass the ORM call
+invalidate() themselves.
+
+Concurrent misses are coalesced (src/single_flight.py within a process, a
+fill lock in the backend across workers) and expired entries are served
+stale while one request refreshes them. Fills read from the primary even
+when replicas are configured (see src/db_routing.py).
+
+Backends: 'memory://' is a per-process LRU bounded by RESPONSE_CACHE_MAX_BYTES
+(invalidations only reach the process that made the write, other workers
+catch up after RESPONSE_CACHE_TTL, so outside tests it is only used with a
+single web worker); a redis:// URL shares entries and invalidations between
+all workers. Runner city filters match substrings, so a list for a partial
+city name only sees a runner newly added in a matching city after the TTL.
+"""
+import functools
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import current_app, g, has_app_context, make_response, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.db_routing import read_from_primary
+from src.models.user import db, User, Runner, Review, Service, Booking, AvailabilityException, runner_services
+from src.single_flight import SingleFlight
+
+# Runner fields that decide which lists a runner appears in, and where
+LISTED_RUNNER_FIELDS = ('user_id', 'bio', 'hourly_rate', 'city', 'is_available', 'availability_bitmap',
+                        'timezone', 'rating', 'total_reviews', 'services')
+# User fields that runner lists filter or search on
+LISTED_USER_FIELDS = ('first_name', 'last_name', 'username', 'is_active')
+# Booking fields that decide when its runner is busy
+SCHEDULE_BOOKING_FIELDS = ('runner_id', 'status', 'scheduled_date', 'end_date', 'estimated_hours')
+# Membership tag of runner lists filtered by available_at; any booking or
+# exception can move a runner in or out of them, not just the listed runners
+AVAILABILITY_TAG = 'runners:available'
+
+
+class MemoryCache:
+    """In-process LRU bounded by total body size, with a tag -> keys index"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, clock=time.time):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.size = 0
+        self._entries = OrderedDict()   # key -> (body, tags, fresh_until, expires_at)
+        self._tags = {}
+        self._locks = {}                # key -> lock expiry
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (body, fresh_until) or None; past fresh_until the entry is stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= self.clock():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[2]
+
+    def set(self, key, body, tags, ttl, stale_ttl=0):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            now = self.clock()
+            self._entries[key] = (body, frozenset(tags), now + ttl, now + ttl + stale_ttl)
+            self.size += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[0])
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def generation(self):
+        return self._generation
+
+    def lock(self, key, timeout):
+        """Take the fill lock for key unless someone holds it; expires after `timeout` seconds"""
+        with self._lock:
+            now = self.clock()
+            if self._locks.get(key, 0) > now:
+                return False
+            self._locks[key] = now + timeout
+            return True
+
+    def unlock(self, key):
+        with self._lock:
+            self._locks.pop(key, None)
+
+    def locked(self, key):
+        return self._locks.get(key, 0) > self.clock()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+
+class RedisCache:
+    """Cache shared by all workers: a string per entry and a set of keys per tag"""
+
+    def __init__(self, url, prefix='respcache:'):
+        import redis  # Only required when a shared store is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        fresh_until, _, body = value.partition(b'\n')
+        return body, float(fresh_until)
+
+    def set(self, key, body, tags, ttl, stale_ttl=0):
+        expires = math.ceil(ttl + stale_ttl)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, b'%.3f\n' % (time.time() + ttl) + body, ex=expires)
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, self.prefix + key)
+            pipe.expire(self.prefix + 'tag:' + tag, expires)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [self.prefix + 'tag:' + tag for tag in tags]
+        pipe = self.client.pipeline(transaction=False)
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*pipe.execute()) if tag_keys else set()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(self.prefix + 'generation')
+        if keys or tag_keys:
+            pipe.delete(*keys, *tag_keys)
+        pipe.execute()
+
+    def generation(self):
+        return int(self.client.get(self.prefix + 'generation') or 0)
+
+    def lock(self, key, timeout):
+        # Plain DEL on unlock: a holder that overran `timeout` may release a successor's lock,
+        # which only costs one duplicate fill
+        return bool(self.client.set(self.prefix + 'lock:' + key, b'1', nx=True, px=int(timeout * 1000)))
+
+    def unlock(self, key):
+        self.client.delete(self.prefix + 'lock:' + key)
+
+    def locked(self, key):
+        return bool(self.client.exists(self.prefix + 'lock:' + key))
+
+    def clear(self):
+        self.client.incr(self.prefix + 'generation')
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            if not key.endswith(b'generation'):
+                self.client.delete(key)
+
+
+def create_cache(url, max_bytes=64 * 1024 * 1024):
+    """Create a response cache backend from a URL ('memory://' or 'redis://...')."""
+    if not url or url.startswith('memory://'):
+        return MemoryCache(max_bytes)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url)
+    raise ValueError(f'Unsupported response cache URL: {url}')
+
+
+class ResponseCache:
+    """Holds the configured backend; registered as app.extensions['response_cache']"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.flight = SingleFlight()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        url = app.config.get('RESPONSE_CACHE_URL')
+        if self.enabled and (not url or url.startswith('memory://')) and not app.testing \
+                and app.config.get('WEB_CONCURRENCY', 1) > 1:
+            app.logger.warning('Response cache disabled: memory:// is per process and WEB_CONCURRENCY is %s; '
+                               'set RESPONSE_CACHE_URL or REDIS_URL to a shared Redis', app.config['WEB_CONCURRENCY'])
+            self.enabled = False
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        self.stale_ttl = app.config.get('RESPONSE_CACHE_STALE_TTL', 300)
+        self.lock_timeout = app.config.get('RESPONSE_CACHE_LOCK_TIMEOUT', 10)
+        self.backend = create_cache(url,
+                                    app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        app.extensions['response_cache'] = self
+
+    def fill(self, key, view, args, kwargs, wait=True):
+        """
+        Run the view as the only filler of key across workers and store the result.
+
+        If another worker holds the fill lock, wait for its entry (or, with
+        wait=False, return None so the caller can serve its stale copy).
+        """
+        try:
+            locked = self.backend.lock(key, self.lock_timeout)
+        except Exception:
+            current_app.logger.exception('Response cache lock failed')
+            locked = False
+        else:
+            if not locked:
+                if not wait:
+                    return None
+                body = self._wait_for(key)
+                if body is not None:
+                    return _cached(body, 'HIT')
+        try:
+            return self._render(key, view, args, kwargs)
+        finally:
+            if locked:
+                self.backend.unlock(key)
+
+    def _wait_for(self, key):
+        """Poll for the entry another worker is filling; None if it gives up or times out"""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = self.backend.get(key)
+            if entry is not None and entry[1] > time.time():
+                return entry[0]
+            if not self.backend.locked(key):
+                return None
+        return None
+
+    def _render(self, key, view, args, kwargs):
+        try:
+            generation = self.backend.generation()
+        except Exception:
+            current_app.logger.exception('Response cache lookup failed')
+            return make_response(view(*args, **kwargs))
+        g.cache_tags = set()
+        # A replica may still hold rows from before the last invalidation; don't store those for everyone
+        read_from_primary(db.session)
+        response = make_response(view(*args, **kwargs))
+        response.headers['X-Cache'] = 'MISS'
+        # Skip the store if anything was invalidated while the view ran: it may have read older rows
+        if response.status_code == 200 and g.cache_tags:
+            try:
+                if self.backend.generation() == generation:
+                    self.backend.set(key, response.get_data(), g.cache_tags, self.ttl, self.stale_ttl)
+            except Exception:
+                current_app.logger.exception('Response cache store failed')
+        return response
+
+
+def get_cache():
+    if not has_app_context():
+        return None
+    cache = current_app.extensions.get('response_cache')
+    return cache if cache is not None and cache.enabled else None
+
+
+def cache_key():
+    """Endpoint, path arguments and sorted query string of the current request"""
+    arguments = urlencode(sorted(request.view_args.items()) + sorted(request.args.items(multi=True)))
+    return f'{request.endpoint}:{hashlib.sha1(arguments.encode()).hexdigest()}'
+
+
+def _cached(body, state):
+    response = current_app.response_class(body, mimetype='application/json')
+    response.headers['X-Cache'] = state
+    return response
+
+
+def cached_response(view):
+    """
+    Serve a public GET view from the response cache; only tagged 200 responses are stored.
+
+    Concurrent misses for one key run the view once per process (and, with a
+    shared backend, once across workers); the others get its response. Expired
+    entries are served for up to RESPONSE_CACHE_STALE_TTL more seconds while a
+    single request refreshes them.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_cache()
+        if cache is None or request.method != 'GET':
+            return view(*args, **kwargs)
+        key = cache_key()
+        try:
+            entry = cache.backend.get(key)
+        except Exception:
+            current_app.logger.exception('Response cache lookup failed')
+            return view(*args, **kwargs)
+
+        fill = functools.partial(cache.fill, key, view, args, kwargs)
+        if entry is not None:
+            body, fresh_until = entry
+            if fresh_until > time.time():
+                return _cached(body, 'HIT')
+            started, response = cache.flight.try_do(key, functools.partial(fill, wait=False))
+            if started and response is not None:
+                return response
+            return _cached(body, 'STALE')
+
+        response, shared = cache.flight.do(key, fill, timeout=cache.lock_timeout)
+        if shared:
+            response = current_app.response_class(response.get_data(), status=response.status_code,
+                                                  mimetype=response.mimetype)
+            response.headers['X-Cache'] = 'COALESCED'
+        return response
+    return wrapper
+
+
+def cache_tags(*tags):
+    """Name entities (or listed sets) the current cached response depends on"""
+    if 'cache_tags' in g:
+        g.cache_tags.update(tags)
+
+
+def city_tag(city):
+    """Membership tag of runner lists filtered by this city"""
+    return f"runners:city:{(city or '').strip().lower()}"
+
+
+def runner_tags(runner):
+    """Tags for a serialized runner: itself, its user and its services"""
+    return [f'runner:{runner.id}', f'user:{runner.user_id}', *(f'service:{service.id}' for service in runner.services)]
+
+
+def booking_tags(runner_ids):
+    """Tags to drop when bookings of these runners are added, moved or change status"""
+    return [AVAILABILITY_TAG, *(f'runner:{runner_id}' for runner_id in runner_ids if runner_id)]
+
+
+def review_tags(review):
+    return [f'review:{review.id}', f'user:{review.reviewer_id}', f'user:{review.reviewee_id}']
+
+
+def listed_runner_tags(connection, condition):
+    """Tags of every list the runners matching `condition` can appear in, plus the runners themselves"""
+    tags = {'runners'}
+    rows = connection.execute(select(Runner.id, Runner.user_id, Runner.city).where(condition)).all()
+    for runner_id, user_id, city in rows:
+        tags.update((f'runner:{runner_id}', f'user:{user_id}', city_tag(city)))
+    if rows:
+        services = connection.execute(select(runner_services.c.service_id).distinct().where(
+            runner_services.c.runner_id.in_([row[0] for row in rows])))
+        tags.update(f'runners:service:{service_id}' for service_id, in services)
+    return tags
+
+
+def invalidate(*tags):
+    """Drop cached responses with any of these tags once the current transaction commits"""
+    db.session.info.setdefault('cache_invalidations', set()).update(tags)
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _history(obj, field):
+    history = inspect(obj).attrs[field].history
+    return list(history.added) + list(history.deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    """Turn the rows written by this flush into cache tags, sent after commit"""
+    if get_cache() is None:
+        return
+    tags, listed_runners, listed_users = set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Runner):
+            tags.update((f'runner:{obj.id}', f'user:{obj.user_id}'))
+            if obj in session.new or obj in session.deleted or _changed(obj, LISTED_RUNNER_FIELDS):
+                listed_runners.add(obj.id)
+                tags.update(city_tag(city) for city in [obj.city] + _history(obj, 'city'))
+                tags.update(f'runners:service:{service.id}' for service in _history(obj, 'services'))
+        elif isinstance(obj, User):
+            tags.add(f'user:{obj.id}')
+            if obj in session.dirty and _changed(obj, LISTED_USER_FIELDS):
+                listed_users.add(obj.id)
+        elif isinstance(obj, Review):
+            tags.update(('reviews', f'review:{obj.id}', f'reviewee:{obj.reviewee_id}',
+                         f'reviewer:{obj.reviewer_id}', f'booking:{obj.booking_id}'))
+        elif isinstance(obj, Service):
+            tags.add(f'service:{obj.id}')
+        elif isinstance(obj, AvailabilityException):
+            tags.update((f'runner:{obj.runner_id}', AVAILABILITY_TAG))
+        elif isinstance(obj, Booking):
+            if obj in session.dirty and not _changed(obj, SCHEDULE_BOOKING_FIELDS):
+                continue
+            tags.update(booking_tags({obj.runner_id, *_history(obj, 'runner_id')}))
+    if listed_runners or listed_users:
+        tags.update(listed_runner_tags(session.connection(),
+                                       Runner.id.in_(listed_runners) | Runner.user_id.in_(listed_users)))
+    if tags:
+        session.info.setdefault('cache_invalidations', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_invalidations(session):
+    tags = session.info.pop('cache_invalidations', None)
+    cache = get_cache()
+    if tags and cache is not None:
+        try:
+            cache.backend.invalidate(sorted(tags))
+        except Exception:
+            current_app.logger.exception('Response cache invalidation failed')
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_invalidations(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('cache_invalidations', None)
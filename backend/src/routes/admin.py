@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User, Runner, Booking, Review, Service
+from src.models.user import db, User, UserRole, Runner, Booking, Review, Service, Payment, PayoutBatch
 from datetime import datetime, timedelta
+import math
 from sqlalchemy import func, desc
+from sqlalchemy.exc import IntegrityError
+from src.search import search_users, count_users, rank_order
+from src.ratings import refresh_runner_ratings
+from src.response_cache import invalidate
+from src.ledger import run_payout_batch, settle_payment
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -11,12 +17,23 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
-        if not user or user.role != 'admin':
+        if not user or user.role != UserRole.ADMIN:
             return {'error': 'Admin access required'}, 403
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def moderator_required(f):
+    """Decorator to check if user is a moderator or admin"""
+    def decorated_function(*args, **kwargs):
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user or user.role not in (UserRole.ADMIN, UserRole.MODERATOR):
+            return {'error': 'Moderator access required'}, 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @jwt_required()
 @admin_required
@@ -76,26 +93,35 @@ def get_dashboard_stats():
 def get_all_users():
     """Get all users with pagination"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
         role = request.args.get('role')
         search = request.args.get('search')
         
-        query = User.query
-        
+        # Roles are accepted by name or value ('RUNNER' or 'runner')
         if role:
-            query = query.filter_by(role=role)
+            try:
+                role = UserRole[role.upper()]
+            except KeyError:
+                return {'error': f'Unknown role: {role}'}, 400
         
+        # Ranked prefix search over names and emails via the full-text index; the
+        # role filter and the page are applied inside the search query itself
         if search:
-            query = query.filter(
-                (User.first_name.contains(search)) |
-                (User.last_name.contains(search)) |
-                (User.email.contains(search))
-            )
-        
-        users = query.order_by(desc(User.created_at)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            total = count_users(search, include_email=True, role=role or None)
+            matches = search_users(search, include_email=True, limit=per_page, offset=(page - 1) * per_page,
+                                   role=role or None)
+            user_ids = [user_id for user_id, _ in matches]
+            items = User.query.filter(User.id.in_(user_ids)).order_by(rank_order(User.id, user_ids)).all() \
+                if user_ids else []
+            pagination = {'page': page, 'pages': math.ceil(total / per_page), 'per_page': per_page, 'total': total}
+        else:
+            query = User.query
+            if role:
+                query = query.filter_by(role=role)
+            users = query.order_by(desc(User.created_at)).paginate(page=page, per_page=per_page, error_out=False)
+            items = users.items
+            pagination = {'page': users.page, 'pages': users.pages, 'per_page': users.per_page, 'total': users.total}
         
         return jsonify({
             'users': [{
@@ -103,17 +129,12 @@ def get_all_users():
                 'first_name': user.first_name,
                 'last_name': user.last_name,
                 'email': user.email,
-                'role': user.role,
+                'role': user.role.value if user.role else 'user',
                 'is_active': user.is_active,
                 'created_at': user.created_at.isoformat(),
                 'last_login': user.last_login.isoformat() if user.last_login else None
-            } for user in users.items],
-            'pagination': {
-                'page': users.page,
-                'pages': users.pages,
-                'per_page': users.per_page,
-                'total': users.total
-            }
+            } for user in items],
+            'pagination': pagination
         })
     except Exception as e:
         return {'error': str(e)}, 500
@@ -261,11 +282,112 @@ def delete_review(review_id):
     """Delete a review"""
     try:
         review = Review.query.get_or_404(review_id)
+        reviewee_id = review.reviewee_id
         db.session.delete(review)
+        db.session.flush()
+        refresh_runner_ratings([reviewee_id])
         db.session.commit()
         
         return jsonify({'message': 'Review deleted successfully'})
     except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+@admin_bp.route('/reviews/flagged', methods=['GET'])
+@jwt_required()
+@moderator_required
+def get_flagged_reviews():
+    """Moderation queue of flagged reviews, newest first, keyset-paginated"""
+    try:
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        cursor = request.args.get('cursor')
+        
+        # Served from the partial index on flagged reviews (created_at, id)
+        query = Review.query.filter(Review.is_flagged == True)
+        if cursor:
+            try:
+                created_at, review_id = cursor.rsplit('_', 1)
+                created_at, review_id = datetime.fromisoformat(created_at), int(review_id)
+            except ValueError:
+                return {'error': 'Invalid cursor'}, 400
+            query = query.filter(
+                (Review.created_at < created_at) |
+                ((Review.created_at == created_at) & (Review.id < review_id))
+            )
+        
+        reviews = query.order_by(desc(Review.created_at), desc(Review.id)).limit(per_page + 1).all()
+        has_more = len(reviews) > per_page
+        reviews = reviews[:per_page]
+        
+        return jsonify({
+            'reviews': [{
+                'id': review.id,
+                'booking_id': review.booking_id,
+                'reviewer_id': review.reviewer_id,
+                'reviewee_id': review.reviewee_id,
+                'rating': review.rating,
+                'comment': review.comment,
+                'is_approved': review.is_approved,
+                'created_at': review.created_at.isoformat()
+            } for review in reviews],
+            'next_cursor': f'{reviews[-1].created_at.isoformat()}_{reviews[-1].id}' if has_more else None
+        })
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@admin_bp.route('/reviews/bulk', methods=['POST'])
+@jwt_required()
+@moderator_required
+def bulk_moderate_reviews():
+    """Approve, hide, flag, unflag or delete many reviews in one transaction"""
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        review_ids = data.get('review_ids') or []
+        
+        actions = {
+            'approve': {'is_approved': True, 'is_flagged': False},
+            'hide': {'is_approved': False, 'is_flagged': False},
+            'flag': {'is_flagged': True},
+            'unflag': {'is_flagged': False},
+        }
+        if action not in actions and action != 'delete':
+            return {'error': 'action must be one of approve, hide, flag, unflag, delete'}, 400
+        if not review_ids or not all(isinstance(review_id, int) for review_id in review_ids):
+            return {'error': 'review_ids must be a non-empty list of ids'}, 400
+        if len(review_ids) > 5000:
+            return {'error': 'At most 5000 reviews per request'}, 400
+        
+        # Runners whose aggregates may change
+        rows = db.session.query(Review.reviewee_id, Review.reviewer_id, Review.booking_id)\
+            .filter(Review.id.in_(review_ids)).all()
+        reviewee_ids = list({row.reviewee_id for row in rows})
+        
+        # Bulk statements bypass the ORM, so name the cached responses they affect
+        invalidate('reviews', *(f'review:{review_id}' for review_id in review_ids), *(
+            tag for row in rows for tag in
+            (f'reviewee:{row.reviewee_id}', f'reviewer:{row.reviewer_id}', f'booking:{row.booking_id}')))
+        
+        query = Review.query.filter(Review.id.in_(review_ids))
+        if action == 'delete':
+            affected = query.delete(synchronize_session=False)
+        else:
+            values = dict(actions[action], updated_at=datetime.utcnow())
+            affected = query.update(values, synchronize_session=False)
+        
+        if action in ('approve', 'hide', 'delete'):
+            refresh_runner_ratings(reviewee_ids)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'{affected} reviews updated',
+            'action': action,
+            'affected': affected,
+            'runners_updated': len(reviewee_ids) if action in ('approve', 'hide', 'delete') else 0
+        })
+    except Exception as e:
+        db.session.rollback()
         return {'error': str(e)}, 500
 
 @admin_bp.route('/services', methods=['GET'])
@@ -337,3 +459,63 @@ def toggle_service_status(service_id):
     except Exception as e:
         return {'error': str(e)}, 500
 
+@admin_bp.route('/payments/<int:payment_id>/settle', methods=['POST'])
+@jwt_required()
+@admin_required
+def settle_payment_status(payment_id):
+    """Record a payment as completed, failed or refunded; refunds are debited from the runner's ledger"""
+    try:
+        data = request.get_json() or {}
+        if not db.session.get(Payment, payment_id):
+            return {'error': 'Payment not found'}, 404
+        try:
+            payment = settle_payment(payment_id, data.get('status'), data.get('transaction_id'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if payment is None:
+            db.session.rollback()
+            return {'error': f"Payment cannot be marked {data.get('status')} from its current status"}, 409
+        db.session.commit()
+        return jsonify({'payment': payment.to_dict()})
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+@admin_bp.route('/payouts', methods=['POST'])
+@jwt_required()
+@admin_required
+def create_payout_batch():
+    """Run a payout batch over ledger entries added since the last one"""
+    try:
+        data = request.get_json(silent=True) or {}
+        batch = run_payout_batch(minimum=data.get('minimum'))
+        if batch is None:
+            return jsonify({'batch': None, 'message': 'No new settled ledger entries since the last batch'}), 200
+        db.session.commit()
+        return jsonify({'batch': batch.to_dict()}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return {'error': 'Another payout batch is already running'}, 409
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+@admin_bp.route('/payouts', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_payout_batches():
+    """List payout batches, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        batches = PayoutBatch.query.order_by(PayoutBatch.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return jsonify({
+            'batches': [batch.to_dict() for batch in batches.items],
+            'total': batches.total,
+            'pages': batches.pages,
+            'current_page': page
+        })
+    except Exception as e:
+        return {'error': str(e)}, 500
@@ -1,10 +1,50 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User, Runner, Service, Booking, Review, ChatMessage, db
+from src.models.user import (User, Runner, Service, Booking, BookingEvent, Review, ChatMessage, Notification, db,
+                             ACTIVE_BOOKING_STATUSES, ACTIVE_STATUS_CLAUSE)
+from src.load_shedding import check_rate_limit, rate_limited_response
+from src.scheduling import booking_window, find_conflict, lock_runner_schedule, next_free_slot
+from src.matching import match_runners
+from src.booking_state import (TRANSITIONS, RUNNER_ONLY_STATUSES, EITHER_PARTY_STATUSES,
+                               InvalidTransition, TransitionConflict, transition, record_event)
+from src.tasks import queue_notification
+from src.mail import queue_email
+from src.message_search import InvalidCursor, search_messages
+from src.search import rank_order
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 
 booking_bp = Blueprint('booking', __name__)
 
+def conflict_response(runner_id, conflict, scheduled_date, estimated_hours, exclude_booking_id=None):
+    """Build the 409 response for a booking window that overlaps an existing booking"""
+    next_slot = next_free_slot(runner_id, scheduled_date, estimated_hours, exclude_booking_id)
+    return jsonify({
+        'error': 'Runner is already booked for this time',
+        'conflicting_booking_id': conflict.id,
+        'conflict_start': conflict.scheduled_date.isoformat(),
+        'conflict_end': conflict.end_date.isoformat(),
+        'next_available': next_slot.isoformat()
+    }), 409
+
+def notify_new_booking(booking, runner):
+    """Queue a notification for the runner about a new booking request"""
+    queue_notification(runner.user_id, 'New booking request', f'You have a new booking request: {booking.title}',
+                       notification_type='booking', related_id=booking.id)
+    queue_email(runner.user_id, 'booking_created', title=booking.title,
+                scheduled_date=booking.scheduled_date.strftime('%a %d %b %Y %H:%M'))
+
+def notify_status_change(booking, new_status, recipient_id):
+    """Queue in-app and email notifications for the other party of a status change"""
+    label = new_status.replace('_', ' ')
+    queue_notification(recipient_id, f'Booking {label}', f'"{booking.title}" is now {label}.',
+                       notification_type='booking', related_id=booking.id)
+    queue_email(recipient_id, 'booking_status', title=booking.title, status=label)
+    if new_status == 'completed':
+        queue_email(booking.user_id, 'review_prompt', title=booking.title)
+
 # Booking Routes
 @booking_bp.route('/bookings', methods=['POST'])
 @jwt_required()
@@ -43,6 +83,13 @@ def create_booking():
         estimated_hours = float(data['estimated_hours'])
         total_amount = estimated_hours * runner.hourly_rate
         
+        # Reject windows that overlap one of the runner's active bookings
+        scheduled_date, end_date = booking_window(scheduled_date, estimated_hours)
+        lock_runner_schedule(runner.id)
+        conflict = find_conflict(runner.id, scheduled_date, end_date)
+        if conflict:
+            return conflict_response(runner.id, conflict, scheduled_date, estimated_hours)
+        
         # Create booking
         booking = Booking(
             user_id=user_id,
@@ -61,6 +108,9 @@ def create_booking():
         )
         
         db.session.add(booking)
+        db.session.flush()
+        record_event(booking.id, None, booking.status, booking.version, actor_id=user_id)
+        notify_new_booking(booking, runner)
         db.session.commit()
         
         return jsonify({
@@ -72,6 +122,123 @@ def create_booking():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def parse_number(data, field, cast=float, minimum=None, maximum=None):
+    """Return data[field] as a number (None if absent), raising ValueError with a client-facing message"""
+    value = data.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = cast(value)
+        if cast is int and number != float(value):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number' if cast is float else f'{field} must be an integer')
+    if number != number or (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValueError(f'{field} is out of range')
+    return number
+
+@booking_bp.route('/bookings/match', methods=['POST'])
+@jwt_required(optional=True)
+def match_booking_runners():
+    try:
+        data = request.json or {}
+        
+        try:
+            limit = min(parse_number(data, 'limit', int, minimum=1) or 10, 50)
+            estimated_hours = parse_number(data, 'estimated_hours', minimum=0)
+            estimated_hours = 1.0 if estimated_hours is None else estimated_hours
+            if estimated_hours <= 0:
+                raise ValueError('estimated_hours must be positive')
+            service_id = parse_number(data, 'service_id', int, minimum=1)
+            budget = parse_number(data, 'budget', minimum=0)
+            max_distance_km = parse_number(data, 'max_distance_km', minimum=0)
+            latitude = parse_number(data, 'latitude', minimum=-90, maximum=90)
+            longitude = parse_number(data, 'longitude', minimum=-180, maximum=180)
+            if (latitude is None) != (longitude is None):
+                raise ValueError('latitude and longitude must be given together')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        scheduled_date = None
+        if data.get('scheduled_date'):
+            try:
+                scheduled_date = datetime.fromisoformat(data['scheduled_date'].replace('Z', '+00:00'))
+            except (AttributeError, ValueError):
+                return jsonify({'error': 'Invalid date format. Use ISO format.'}), 400
+        
+        auto_dispatch = bool(data.get('auto_dispatch'))
+        if auto_dispatch:
+            if not get_jwt_identity():
+                return jsonify({'error': 'Authorization token is required'}), 401
+            for field in ['service_id', 'title', 'scheduled_date']:
+                if not data.get(field):
+                    return jsonify({'error': f'{field} is required for auto_dispatch'}), 400
+            if not db.session.get(Service, service_id):
+                return jsonify({'error': 'Service not found'}), 404
+        
+        matches = match_runners(
+            service_id=service_id,
+            latitude=latitude,
+            longitude=longitude,
+            start=scheduled_date,
+            hours=estimated_hours,
+            budget=budget,
+            max_distance_km=max_distance_km,
+            limit=limit
+        )
+        
+        runner_ids = [match['runner_id'] for match in matches]
+        runners = {runner.id: runner for runner in Runner.query.filter(Runner.id.in_(runner_ids)).all()} if runner_ids else {}
+        
+        booking = None
+        if auto_dispatch:
+            start, end = booking_window(scheduled_date, estimated_hours)
+            user_id = int(get_jwt_identity())
+            # Take the best runner that is still available and has no overlapping booking
+            for match in matches:
+                runner = runners.get(match['runner_id'])
+                if not runner or not runner.is_available or runner.user_id == user_id:
+                    continue
+                lock_runner_schedule(runner.id)
+                if find_conflict(runner.id, start, end):
+                    continue
+                booking = Booking(
+                    user_id=user_id,
+                    runner_id=runner.id,
+                    service_id=service_id,
+                    title=data['title'],
+                    description=data.get('description', ''),
+                    location=data.get('location'),
+                    latitude=latitude,
+                    longitude=longitude,
+                    scheduled_date=start,
+                    estimated_hours=estimated_hours,
+                    hourly_rate=runner.hourly_rate,
+                    total_amount=estimated_hours * runner.hourly_rate,
+                    notes=data.get('notes', '')
+                )
+                db.session.add(booking)
+                db.session.flush()
+                record_event(booking.id, None, booking.status, booking.version, actor_id=user_id)
+                notify_new_booking(booking, runner)
+                db.session.commit()
+                break
+            
+            if booking is None:
+                return jsonify({'error': 'No available runner matches this request'}), 404
+        
+        return jsonify({
+            'matches': [dict(match, runner=runners[match['runner_id']].to_dict())
+                        for match in matches if match['runner_id'] in runners],
+            'booking': booking.to_dict() if booking else None
+        }), 201 if booking else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @booking_bp.route('/bookings', methods=['GET'])
 @jwt_required()
 def get_bookings():
@@ -114,6 +281,88 @@ def get_bookings():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@booking_bp.route('/dashboard/summary', methods=['GET'])
+@jwt_required()
+def get_dashboard_summary():
+    """Booking counts by status, upcoming bookings, totals and unread counts for one dashboard"""
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        as_runner = request.args.get('as_runner', 'false').lower() == 'true'
+        upcoming_limit = min(max(request.args.get('upcoming_limit', 5, type=int), 1), 20)
+
+        if as_runner:
+            runner_id = db.session.execute(select(Runner.id).filter_by(user_id=user_id)).scalar()
+            if runner_id is None:
+                return jsonify({'error': 'Runner profile not found'}), 404
+            owner = Booking.runner_id == runner_id
+            counterpart = joinedload(Booking.user)
+        else:
+            owner = Booking.user_id == user_id
+            counterpart = joinedload(Booking.runner).joinedload(Runner.user)
+
+        # One GROUP BY answered from the (owner, status, total_amount) covering index
+        status_counts = {status: 0 for status in TRANSITIONS}
+        amounts = dict.fromkeys(TRANSITIONS, 0.0)
+        grouped = db.session.execute(
+            select(Booking.status, func.count(), func.coalesce(func.sum(Booking.total_amount), 0.0))
+            .where(owner)
+            .group_by(Booking.status)
+        )
+        for status, count, amount in grouped:
+            status_counts[status] = count
+            amounts[status] = float(amount)
+
+        upcoming = Booking.query.options(counterpart, joinedload(Booking.service))\
+            .filter(owner, ACTIVE_STATUS_CLAUSE, Booking.scheduled_date >= datetime.utcnow())\
+            .order_by(Booking.scheduled_date)\
+            .limit(upcoming_limit)\
+            .all()
+
+        # Both unread counts in one round trip, each from its partial index
+        unread_messages, unread_notifications = db.session.execute(select(
+            select(func.count()).select_from(ChatMessage)
+            .where(ChatMessage.receiver_id == user_id, ChatMessage.is_read == False).scalar_subquery(),
+            select(func.count()).select_from(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read == False).scalar_subquery()
+        )).one()
+
+        def compact(booking):
+            other = booking.user if as_runner else booking.runner.user
+            return {
+                'id': booking.id,
+                'title': booking.title,
+                'status': booking.status,
+                'scheduled_date': booking.scheduled_date.isoformat(),
+                'end_date': booking.end_date.isoformat() if booking.end_date else None,
+                'location': booking.location,
+                'total_amount': booking.total_amount,
+                'service_name': booking.service.name if booking.service else None,
+                'counterpart': {
+                    'id': other.id,
+                    'first_name': other.first_name,
+                    'last_name': other.last_name,
+                    'profile_image': other.profile_image
+                } if other else None
+            }
+
+        totals = {
+            'completed': round(amounts['completed'], 2),
+            'pending': round(sum(amounts[status] for status in ACTIVE_BOOKING_STATUSES), 2)
+        }
+        return jsonify({
+            'role': 'runner' if as_runner else 'client',
+            'status_counts': status_counts,
+            'total_bookings': sum(status_counts.values()),
+            'upcoming': [compact(booking) for booking in upcoming],
+            'earnings' if as_runner else 'spend': totals,
+            'unread_messages': unread_messages,
+            'unread_notifications': unread_notifications
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @booking_bp.route('/bookings/<int:booking_id>', methods=['GET'])
 @jwt_required()
 def get_booking(booking_id):
@@ -134,11 +383,10 @@ def get_booking(booking_id):
 
 @booking_bp.route('/bookings/<int:booking_id>/status', methods=['PUT'])
 @jwt_required()
-def update_booking_status():
+def update_booking_status(booking_id):
     try:
         current_user_id = get_jwt_identity()
         user_id = int(current_user_id)
-        booking_id = request.view_args['booking_id']
         booking = Booking.query.get_or_404(booking_id)
         data = request.json
         
@@ -146,38 +394,45 @@ def update_booking_status():
             return jsonify({'error': 'Status is required'}), 400
         
         new_status = data['status']
-        valid_statuses = ['pending', 'accepted', 'declined', 'in_progress', 'completed', 'cancelled']
         
-        if new_status not in valid_statuses:
+        if new_status not in TRANSITIONS:
             return jsonify({'error': 'Invalid status'}), 400
         
         # Check permissions based on status change
         runner = Runner.query.filter_by(user_id=user_id).first()
+        is_runner = runner is not None and booking.runner_id == runner.id
         
-        if new_status in ['accepted', 'declined', 'in_progress']:
-            # Only runner can accept, decline, or start booking
-            if not runner or booking.runner_id != runner.id:
-                return jsonify({'error': 'Only the runner can update this status'}), 403
-        elif new_status in ['cancelled']:
-            # Both user and runner can cancel
-            if booking.user_id != user_id and (not runner or booking.runner_id != runner.id):
-                return jsonify({'error': 'Access denied'}), 403
-        elif new_status == 'completed':
-            # Both can mark as completed, but let's allow runner to do it
-            if not runner or booking.runner_id != runner.id:
-                return jsonify({'error': 'Only the runner can mark booking as completed'}), 403
-        
-        # Update status
-        booking.status = new_status
-        booking.updated_at = datetime.utcnow()
+        if new_status in RUNNER_ONLY_STATUSES and not is_runner:
+            return jsonify({'error': 'Only the runner can update this status'}), 403
+        if new_status in EITHER_PARTY_STATUSES and booking.user_id != user_id and not is_runner:
+            return jsonify({'error': 'Access denied'}), 403
         
-        if new_status == 'completed':
-            booking.completed_at = datetime.utcnow()
-            # Update runner stats
-            if runner:
-                runner.total_bookings += 1
+        # Repeated taps (e.g. "complete" sent twice on a flaky connection) are a no-op
+        if booking.status == new_status:
+            return jsonify({
+                'message': f'Booking is already {new_status}',
+                'booking': booking.to_dict()
+            }), 200
         
+        # Clients may send the version they last saw; otherwise use the one just read
+        try:
+            expected_version = int(data.get('version', booking.version))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'version must be an integer'}), 400
+        
+        try:
+            transition(booking.id, booking.status, expected_version, new_status, actor_id=user_id)
+        except InvalidTransition as e:
+            return jsonify({'error': str(e)}), 400
+        except TransitionConflict as e:
+            db.session.rollback()
+            current = db.session.get(Booking, booking_id, populate_existing=True)
+            return jsonify({'error': str(e), 'booking': current.to_dict()}), 409
+        
+        # Tell the other party; delivered by the job worker after this commits
+        notify_status_change(booking, new_status, booking.user_id if is_runner else booking.runner.user_id)
         db.session.commit()
+        booking = db.session.get(Booking, booking_id, populate_existing=True)
         
         return jsonify({
             'message': f'Booking status updated to {new_status}',
@@ -188,9 +443,31 @@ def update_booking_status():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@booking_bp.route('/bookings/<int:booking_id>/events', methods=['GET'])
+@jwt_required()
+def get_booking_events(booking_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        booking = Booking.query.get_or_404(booking_id)
+        
+        # Check if user has access to this booking
+        runner = Runner.query.filter_by(user_id=user_id).first()
+        if booking.user_id != user_id and (not runner or booking.runner_id != runner.id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        events = BookingEvent.query.filter_by(booking_id=booking_id).order_by(BookingEvent.id.asc()).all()
+        
+        return jsonify({
+            'events': [event.to_dict() for event in events]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @booking_bp.route('/bookings/<int:booking_id>', methods=['PUT'])
 @jwt_required()
-def update_booking():
+def update_booking(booking_id):
     try:
         current_user_id = get_jwt_identity()
         user_id = int(current_user_id)
@@ -206,6 +483,15 @@ def update_booking():
         
         data = request.json
         
+        # Reject edits made against an older copy of the booking
+        if 'version' in data:
+            try:
+                version = int(data['version'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'version must be an integer'}), 400
+            if version != booking.version:
+                return jsonify({'error': 'Booking was modified by another request', 'booking': booking.to_dict()}), 409
+        
         # Update allowed fields
         if 'title' in data:
             booking.title = data['title']
@@ -232,6 +518,17 @@ def update_booking():
             booking.estimated_hours = float(data['estimated_hours'])
             booking.total_amount = booking.estimated_hours * booking.hourly_rate
         
+        # Rescheduling must not overlap the runner's other bookings
+        if 'scheduled_date' in data or 'estimated_hours' in data:
+            booking.scheduled_date, booking.end_date = booking_window(booking.scheduled_date, booking.estimated_hours)
+            with db.session.no_autoflush:
+                lock_runner_schedule(booking.runner_id)
+                conflict = find_conflict(booking.runner_id, booking.scheduled_date, booking.end_date, booking.id)
+            if conflict:
+                db.session.rollback()
+                return conflict_response(booking.runner_id, conflict, booking.scheduled_date,
+                                         booking.estimated_hours, booking.id)
+        
         booking.updated_at = datetime.utcnow()
         db.session.commit()
         
@@ -240,6 +537,10 @@ def update_booking():
             'booking': booking.to_dict()
         }), 200
         
+    except StaleDataError:
+        # The version check on the UPDATE failed: a status change landed first
+        db.session.rollback()
+        return jsonify({'error': 'Booking was modified by another request'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -268,6 +569,33 @@ def delete_booking():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@booking_bp.route('/runners/<int:runner_id>/next-available', methods=['GET'])
+def get_next_available(runner_id):
+    try:
+        Runner.query.get_or_404(runner_id)
+        duration = request.args.get('duration', 1, type=float)
+        after = request.args.get('after')
+        
+        try:
+            after = datetime.fromisoformat(after.replace('Z', '+00:00')) if after else datetime.utcnow()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use ISO format.'}), 400
+        
+        if duration <= 0:
+            return jsonify({'error': 'duration must be positive'}), 400
+        
+        start = next_free_slot(runner_id, after, duration)
+        _, end = booking_window(start, duration)
+        
+        return jsonify({
+            'runner_id': runner_id,
+            'start': start.isoformat(),
+            'end': end.isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @booking_bp.route('/bookings/<int:booking_id>/messages', methods=['GET'])
 @jwt_required()
 def get_booking_messages(booking_id):
@@ -290,6 +618,51 @@ def get_booking_messages(booking_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@booking_bp.route('/messages/search', methods=['GET'])
+@jwt_required()
+def search_booking_messages():
+    """Ranked full-text search over messages in the caller's bookings, with highlighted snippets"""
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        booking_id = request.args.get('booking_id', type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        
+        try:
+            hits, next_cursor = search_messages(query, user_id, booking_id, request.args.get('cursor'), limit)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        message_ids = [message_id for message_id, _, _ in hits]
+        messages = {message.id: message for message in ChatMessage.query
+                    .options(joinedload(ChatMessage.booking), joinedload(ChatMessage.sender))
+                    .filter(ChatMessage.id.in_(message_ids))
+                    .order_by(rank_order(ChatMessage.id, message_ids))} if message_ids else {}
+        
+        results = []
+        for message_id, score, snippet in hits:
+            message = messages.get(message_id)
+            if message is None:
+                continue   # Deleted since the index was last updated
+            results.append({
+                'id': message.id,
+                'booking_id': message.booking_id,
+                'booking_title': message.booking.title,
+                'sender_id': message.sender_id,
+                'sender_name': f'{message.sender.first_name} {message.sender.last_name}',
+                'created_at': message.created_at.isoformat() if message.created_at else None,
+                'snippet': snippet,
+                'score': round(score, 4)
+            })
+        
+        return jsonify({'results': results, 'next_cursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @booking_bp.route('/bookings/<int:booking_id>/messages', methods=['POST'])
 @jwt_required()
 def send_booking_message(booking_id):
@@ -308,6 +681,10 @@ def send_booking_message(booking_id):
         if not data.get('message'):
             return jsonify({'error': 'Message is required'}), 400
         
+        retry_after = check_rate_limit('chat_send', user_id)
+        if retry_after:
+            return rate_limited_response(retry_after)
+        
         # Determine receiver (the other person in the booking)
         receiver_id = booking.runner.user_id if booking.user_id == user_id else booking.user_id
         
@@ -1,6 +1,8 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User, Runner, Booking, Review, db
+from src.jobs import enqueue
+from src.response_cache import cached_response, cache_tags, review_tags
 from datetime import datetime
 from sqlalchemy import func
 
@@ -36,13 +38,13 @@ def create_review():
         
         # Check if user is part of this booking
         runner = Runner.query.filter_by(user_id=current_user_id).first()
-        if booking.user_id != current_user_id and (not runner or booking.runner_id != runner.id):
+        if booking.user_id != user_id and (not runner or booking.runner_id != runner.id):
             return jsonify({'error': 'Access denied'}), 403
         
         # Check if review already exists for this booking and reviewer
         existing_review = Review.query.filter_by(
             booking_id=data['booking_id'],
-            reviewer_id=current_user_id
+            reviewer_id=user_id
         ).first()
         
         if existing_review:
@@ -55,13 +57,13 @@ def create_review():
             return jsonify({'error': 'Reviewee not found'}), 404
         
         # Ensure reviewee is part of the booking
-        if reviewee_id != booking.user_id and (not runner or reviewee_id != runner.user_id):
+        if reviewee_id not in (booking.user_id, booking.runner.user_id) or reviewee_id == user_id:
             return jsonify({'error': 'Invalid reviewee for this booking'}), 400
         
         # Create review
         review = Review(
             booking_id=data['booking_id'],
-            reviewer_id=current_user_id,
+            reviewer_id=user_id,
             reviewee_id=reviewee_id,
             rating=rating,
             comment=data.get('comment', '')
@@ -69,16 +71,8 @@ def create_review():
         
         db.session.add(review)
         
-        # Update runner rating if reviewee is a runner
-        reviewee_runner = Runner.query.filter_by(user_id=reviewee_id).first()
-        if reviewee_runner:
-            # Calculate new average rating
-            reviews = Review.query.filter_by(reviewee_id=reviewee_id, is_approved=True).all()
-            if reviews:
-                total_rating = sum([r.rating for r in reviews]) + rating
-                total_reviews = len(reviews) + 1
-                reviewee_runner.rating = round(total_rating / total_reviews, 1)
-                reviewee_runner.total_reviews = total_reviews
+        # Runner rating is recomputed by the job worker
+        enqueue('refresh_ratings', {'user_id': reviewee_id})
         
         db.session.commit()
         
@@ -92,6 +86,7 @@ def create_review():
         return jsonify({'error': str(e)}), 500
 
 @review_bp.route('/reviews', methods=['GET'])
+@cached_response
 def get_reviews():
     try:
         page = request.args.get('page', 1, type=int)
@@ -117,9 +112,15 @@ def get_reviews():
         
         query = query.order_by(Review.created_at.desc())
         
+        # Cached lists are dropped when a review that could belong to them changes
+        cache_tags(f'reviewee:{reviewee_id}' if reviewee_id else f'reviewer:{reviewer_id}' if reviewer_id
+                   else f'booking:{booking_id}' if booking_id else 'reviews')
+        
         reviews = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
+        for review in reviews.items:
+            cache_tags(*review_tags(review))
         
         return jsonify({
             'reviews': [review.to_dict() for review in reviews.items],
@@ -147,9 +148,9 @@ def get_review(review_id):
 
 @review_bp.route('/reviews/<int:review_id>', methods=['PUT'])
 @jwt_required()
-def update_review():
+def update_review(review_id):
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         review = Review.query.get_or_404(review_id)
         
         # Only the reviewer can update their review
@@ -172,14 +173,7 @@ def update_review():
         
         # Recalculate runner rating if rating changed
         if 'rating' in data:
-            reviewee_runner = Runner.query.filter_by(user_id=review.reviewee_id).first()
-            if reviewee_runner:
-                # Recalculate average rating
-                reviews = Review.query.filter_by(reviewee_id=review.reviewee_id, is_approved=True).all()
-                if reviews:
-                    total_rating = sum([r.rating for r in reviews])
-                    total_reviews = len(reviews)
-                    reviewee_runner.rating = round(total_rating / total_reviews, 1)
+            enqueue('refresh_ratings', {'user_id': review.reviewee_id})
         
         db.session.commit()
         
@@ -194,33 +188,17 @@ def update_review():
 
 @review_bp.route('/reviews/<int:review_id>', methods=['DELETE'])
 @jwt_required()
-def delete_review():
+def delete_review(review_id):
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         review = Review.query.get_or_404(review_id)
         
         # Only the reviewer can delete their review
         if review.reviewer_id != current_user_id:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Update runner stats before deleting
-        reviewee_runner = Runner.query.filter_by(user_id=review.reviewee_id).first()
-        if reviewee_runner and reviewee_runner.total_reviews > 0:
-            # Recalculate rating without this review
-            other_reviews = Review.query.filter(
-                Review.reviewee_id == review.reviewee_id,
-                Review.id != review.id,
-                Review.is_approved == True
-            ).all()
-            
-            if other_reviews:
-                total_rating = sum([r.rating for r in other_reviews])
-                total_reviews = len(other_reviews)
-                reviewee_runner.rating = round(total_rating / total_reviews, 1)
-                reviewee_runner.total_reviews = total_reviews
-            else:
-                reviewee_runner.rating = 0.0
-                reviewee_runner.total_reviews = 0
+        # Runner stats are recomputed by the job worker once the delete commits
+        enqueue('refresh_ratings', {'user_id': review.reviewee_id})
         
         db.session.delete(review)
         db.session.commit()
@@ -233,7 +211,7 @@ def delete_review():
 
 @review_bp.route('/reviews/<int:review_id>/flag', methods=['POST'])
 @jwt_required()
-def flag_review():
+def flag_review(review_id):
     try:
         review = Review.query.get_or_404(review_id)
         
@@ -250,9 +228,11 @@ def flag_review():
 
 # Statistics Routes
 @review_bp.route('/reviews/stats/<int:user_id>', methods=['GET'])
+@cached_response
 def get_review_stats(user_id):
     try:
         user = User.query.get_or_404(user_id)
+        cache_tags(f'reviewee:{user_id}')
         
         # Get review statistics
         reviews = Review.query.filter_by(reviewee_id=user_id, is_approved=True).all()
@@ -0,0 +1,220 @@
+from flask import Blueprint, jsonify, request, current_app, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, Upload, StoredFile
+from src.storage import (extension_of, content_type_for, object_path, start_partial, partial_lock,
+                         append_chunk, finalize, discard)
+from src.images import VARIANTS, SOURCE_TYPES, CONTENT_TYPE, get_cache
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+import uuid
+
+upload_bp = Blueprint('upload', __name__)
+
+# Content-addressed files never change, so caches may keep them forever
+FILE_MAX_AGE = 365 * 24 * 3600
+
+# Upload Routes
+@upload_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Start a resumable upload; returns the upload id and the chunk size to use"""
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.json or {}
+
+        filename = data.get('filename')
+        if not filename:
+            return jsonify({'error': 'filename is required'}), 400
+        extension = extension_of(filename)
+        if not extension:
+            return jsonify({'error': 'File type not allowed'}), 400
+
+        size = int(data.get('size') or 0)
+        if size <= 0 or size > current_app.config['UPLOAD_MAX_FILE_SIZE']:
+            return jsonify({'error': 'Invalid file size'}), 400
+
+        # Client already knows the hash: skip the transfer if we have the file
+        if data.get('sha256'):
+            stored = StoredFile.query.filter_by(sha256=data['sha256'].lower(), size=size).first()
+            if stored:
+                return jsonify({'upload': None, 'file': stored.to_dict(), 'deduplicated': True}), 200
+
+        upload = Upload(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            filename=filename,
+            content_type=content_type_for(extension),
+            size=size
+        )
+        db.session.add(upload)
+        start_partial(upload.id)
+        db.session.commit()
+
+        return jsonify({
+            'upload': upload.to_dict(),
+            'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    """Current offset of an upload, used to resume after a dropped connection"""
+    try:
+        upload = Upload.query.get_or_404(upload_id)
+        if upload.user_id != int(get_jwt_identity()):
+            return jsonify({'error': 'Access denied'}), 403
+
+        return jsonify({'upload': upload.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def upload_chunk(upload_id):
+    """Append the raw request body at the Upload-Offset header; completes the upload on the last chunk"""
+    try:
+        upload = Upload.query.get_or_404(upload_id)
+        if upload.user_id != int(get_jwt_identity()):
+            return jsonify({'error': 'Access denied'}), 403
+        if upload.status != 'open':
+            return jsonify({'upload': upload.to_dict()}), 200
+
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+        if offset != upload.received:
+            return jsonify({'error': 'Offset mismatch', 'offset': upload.received}), 409
+
+        # Only one request may write to the partial file at a time; a request
+        # that waited behind another re-checks the offset before writing
+        try:
+            with partial_lock(upload.id):
+                upload = db.session.get(Upload, upload_id, populate_existing=True)
+                if upload.status != 'open':
+                    return jsonify({'upload': upload.to_dict()}), 200
+                if offset != upload.received:
+                    return jsonify({'error': 'Offset mismatch', 'offset': upload.received}), 409
+
+                try:
+                    new_offset = append_chunk(upload, offset, request.stream)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+
+                result = db.session.execute(
+                    update(Upload)
+                    .where(Upload.id == upload.id, Upload.received == offset)
+                    .values(received=new_offset, updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    db.session.rollback()
+                    current = db.session.get(Upload, upload_id, populate_existing=True)
+                    return jsonify({'error': 'Offset mismatch', 'offset': current.received}), 409
+                upload.received = new_offset
+
+                if new_offset == upload.size:
+                    stored = finalize(upload, extension_of(upload.filename))
+                    upload.file = stored
+                    upload.status = 'complete'
+                    try:
+                        db.session.commit()
+                    except IntegrityError:
+                        # Same content finished concurrently by another upload; use that row
+                        db.session.rollback()
+                        upload = db.session.get(Upload, upload_id, populate_existing=True)
+                        upload.received = new_offset
+                        upload.file = StoredFile.query.filter_by(sha256=stored.sha256).one()
+                        upload.status = 'complete'
+                        db.session.commit()
+                else:
+                    db.session.commit()
+        except BlockingIOError:
+            return jsonify({'error': 'Another chunk is being written', 'offset': upload.received}), 409
+        except FileNotFoundError:
+            # Finished or cancelled while this request waited
+            upload = db.session.get(Upload, upload_id, populate_existing=True)
+            if upload is None:
+                return jsonify({'error': 'Upload not found'}), 404
+            return jsonify({'upload': upload.to_dict()}), 200
+
+        return jsonify({'upload': upload.to_dict()}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload(upload_id):
+    try:
+        upload = Upload.query.get_or_404(upload_id)
+        if upload.user_id != int(get_jwt_identity()):
+            return jsonify({'error': 'Access denied'}), 403
+
+        if upload.status == 'open':
+            discard(upload.id)
+        db.session.delete(upload)
+        db.session.commit()
+
+        return jsonify({'message': 'Upload cancelled'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/files/<name>', methods=['GET'])
+def get_file(name):
+    """Serve a stored file; supports Range and If-None-Match and may be cached indefinitely"""
+    sha256 = name.split('.', 1)[0].lower()
+    stored = StoredFile.query.filter_by(sha256=sha256).first()
+    if not stored:
+        return jsonify({'error': 'File not found'}), 404
+
+    # Type comes from the stored extension, and anything that is not an image
+    # is downloaded rather than rendered on our origin
+    content_type = content_type_for(stored.extension)
+    is_image = content_type in SOURCE_TYPES
+    response = send_file(
+        object_path(stored.sha256),
+        mimetype=content_type,
+        as_attachment=not is_image,
+        download_name=f'{stored.sha256}.{stored.extension}',
+        conditional=True,
+        etag=stored.sha256,
+        max_age=FILE_MAX_AGE
+    )
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@upload_bp.route('/images/<sha256>/<variant>', methods=['GET'])
+def get_image_variant(sha256, variant):
+    """Resized WebP variant of an uploaded image, rendered on first request and cached on disk"""
+    try:
+        if variant not in VARIANTS:
+            return jsonify({'error': 'Unknown image variant'}), 404
+        stored = StoredFile.query.filter_by(sha256=sha256.lower()).first()
+        if not stored or content_type_for(stored.extension) not in SOURCE_TYPES:
+            return jsonify({'error': 'Image not found'}), 404
+
+        path = get_cache().get(stored.sha256, object_path(stored.sha256), variant)
+
+        response = send_file(path, mimetype=CONTENT_TYPE, conditional=True,
+                             etag=f'{stored.sha256}-{variant}', max_age=FILE_MAX_AGE)
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    except OSError:
+        # Declared as an image but Pillow cannot decode it
+        return jsonify({'error': 'Could not process image'}), 415
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,7 +1,18 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from src.models.user import User, Runner, Service, Booking, Review, ChatMessage, Notification, db
+from src.models.user import (User, Runner, Service, Booking, Review, ChatMessage, Notification, AvailabilityException,
+                             Payout, db)
+from src.load_shedding import check_rate_limit, rate_limited_response
+from src.availability import encode_schedule, decode_schedule, filter_available, get_zone
+from src.scheduling import to_utc_naive
+from src.search import search_users, rank_order
+from src.response_cache import cached_response, cache_tags, city_tag, runner_tags, review_tags, AVAILABILITY_TAG
+from src.ledger import PERIODS, runner_earnings
+from src.presence import get_presence
+from sqlalchemy import case, desc, func, select
+from sqlalchemy.orm import joinedload
 from datetime import datetime
+import math
 import re
 
 user_bp = Blueprint('user', __name__)
@@ -70,6 +81,14 @@ def login():
         if not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Email and password are required'}), 400
         
+        # Throttle attempts before doing any password hashing. Keying the account
+        # limit by IP too means strangers cannot lock someone else out.
+        ip = request.remote_addr or 'unknown'
+        retry_after = check_rate_limit('login_ip', ip) or \
+            check_rate_limit('login', f"{ip}:{data['email'].strip().lower()}")
+        if retry_after:
+            return rate_limited_response(retry_after)
+        
         user = User.query.filter_by(email=data['email']).first()
         
         if not user or not user.check_password(data['password']):
@@ -178,6 +197,7 @@ def update_profile():
 
 # Runner Profile Routes
 @user_bp.route('/runners', methods=['GET'])
+@cached_response
 def get_runners():
     try:
         page = request.args.get('page', 1, type=int)
@@ -187,12 +207,25 @@ def get_runners():
         min_rating = request.args.get('min_rating', type=float)
         max_rate = request.args.get('max_rate', type=float)
         available_only = request.args.get('available_only', 'true').lower() == 'true'
+        available_at = request.args.get('available_at')
+        duration = request.args.get('duration', 1, type=float)
+        search = request.args.get('q')
         
         query = Runner.query.join(User).filter(User.is_active == True)
         
+        # Full-text search over names, bios and services, ordered by relevance
+        runner_ids = None
+        if search:
+            matches = search_users(search, runners_only=True, limit=current_app.config['SEARCH_MAX_RESULTS'])
+            runner_ids = [runner_id for _, runner_id in matches]
+            query = query.filter(Runner.id.in_(runner_ids))
+        
         if city:
             query = query.filter(Runner.city.ilike(f'%{city}%'))
         
+        # Cached lists are dropped when a runner that could belong to them changes
+        cache_tags(city_tag(city) if city else f'runners:service:{service_id}' if service_id else 'runners')
+        
         if service_id:
             query = query.filter(Runner.services.any(Service.id == service_id))
         
@@ -205,12 +238,45 @@ def get_runners():
         if available_only:
             query = query.filter(Runner.is_available == True)
         
-        # Order by rating and total reviews
-        query = query.order_by(Runner.rating.desc(), Runner.total_reviews.desc())
+        # Order by relevance when searching, otherwise by rating and total reviews
+        if runner_ids:
+            query = query.order_by(rank_order(Runner.id, runner_ids))
+        else:
+            query = query.order_by(Runner.rating.desc(), Runner.total_reviews.desc())
+        
+        if available_at:
+            try:
+                start = datetime.fromisoformat(available_at.replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use ISO format.'}), 400
+            
+            if duration <= 0:
+                return jsonify({'error': 'duration must be positive'}), 400
+            cache_tags(AVAILABILITY_TAG)
+            
+            # Check every candidate's schedule bitmap in one pass, then load only the requested page
+            candidates = query.with_entities(Runner.id, Runner.availability_bitmap, Runner.timezone).all()
+            runner_ids = filter_available(candidates, start, duration)
+            page_ids = runner_ids[(page - 1) * per_page:page * per_page]
+            runners_by_id = {
+                runner.id: runner for runner in Runner.query.filter(Runner.id.in_(page_ids)).all()
+            } if page_ids else {}
+            for runner in runners_by_id.values():
+                cache_tags(*runner_tags(runner))
+            
+            return jsonify({
+                'runners': [runners_by_id[runner_id].to_dict() for runner_id in page_ids],
+                'total': len(runner_ids),
+                'pages': math.ceil(len(runner_ids) / per_page) if per_page else 0,
+                'current_page': page,
+                'per_page': per_page
+            }), 200
         
         runners = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
+        for runner in runners.items:
+            cache_tags(*runner_tags(runner))
         
         return jsonify({
             'runners': [runner.to_dict() for runner in runners.items],
@@ -224,9 +290,11 @@ def get_runners():
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/runners/<int:runner_id>', methods=['GET'])
+@cached_response
 def get_runner(runner_id):
     try:
         runner = Runner.query.get_or_404(runner_id)
+        cache_tags(*runner_tags(runner))
         return jsonify(runner.to_dict()), 200
         
     except Exception as e:
@@ -345,6 +413,259 @@ def update_runner_profile():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@user_bp.route('/runners/profile/earnings', methods=['GET'])
+@jwt_required()
+def get_runner_earnings():
+    """Current balance, per-period ledger totals and recent payouts for the signed-in runner"""
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        runner_id = db.session.execute(select(Runner.id).filter_by(user_id=user_id)).scalar()
+        if runner_id is None:
+            return jsonify({'error': 'Runner profile not found'}), 404
+        
+        period = request.args.get('period', 'month')
+        if period not in PERIODS:
+            return jsonify({'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+        periods = min(max(request.args.get('periods', 6, type=int), 1), 60)
+        
+        earnings = runner_earnings(runner_id, period, periods)
+        payouts = Payout.query.filter_by(runner_id=runner_id).order_by(Payout.id.desc()).limit(10).all()
+        earnings['recent_payouts'] = [payout.to_dict() for payout in payouts]
+        return jsonify(earnings), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Runner Availability Routes
+@user_bp.route('/runners/<int:runner_id>/availability', methods=['GET'])
+def get_runner_availability(runner_id):
+    try:
+        runner = Runner.query.get_or_404(runner_id)
+        
+        exceptions = runner.availability_exceptions\
+            .filter(AvailabilityException.end_date > datetime.utcnow())\
+            .order_by(AvailabilityException.start_date.asc())\
+            .limit(50).all()
+        
+        return jsonify({
+            'runner_id': runner.id,
+            'timezone': runner.timezone or 'UTC',
+            'has_schedule': runner.availability_bitmap is not None,
+            'weekly': decode_schedule(runner.availability_bitmap) if runner.availability_bitmap else None,
+            'exceptions': [exception.to_dict() for exception in exceptions]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/runners/<int:runner_id>/overview', methods=['GET'])
+@cached_response
+def get_runner_overview(runner_id):
+    """
+    Everything the runner profile page shows in one response: the profile with
+    services, rating histogram, a page of recent reviews and the availability
+    summary. Three queries: runner + user + services + histogram, the reviews
+    page with reviewers, and upcoming exceptions. Pass next_cursor back as
+    `cursor` to fetch only further reviews.
+    """
+    try:
+        limit = min(max(request.args.get('reviews_limit', 10, type=int), 1), 50)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, review_id = cursor.rsplit('_', 1)
+                created_at, review_id = datetime.fromisoformat(created_at), int(review_id)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        # Star counts over approved reviews, joined onto the runner row
+        histogram = db.session.query(
+            Review.reviewee_id.label('reviewee_id'),
+            *(func.sum(case((Review.rating == stars, 1), else_=0)).label(f'stars_{stars}') for stars in range(1, 6))
+        ).filter(
+            Review.reviewee_id == select(Runner.user_id).where(Runner.id == runner_id).scalar_subquery(),
+            Review.is_approved == True
+        ).group_by(Review.reviewee_id).subquery()
+        
+        row = db.session.query(Runner, *list(histogram.c)[1:])\
+            .options(joinedload(Runner.user), joinedload(Runner.services))\
+            .outerjoin(histogram, histogram.c.reviewee_id == Runner.user_id)\
+            .filter(Runner.id == runner_id).first()
+        if row is None:
+            return jsonify({'error': 'Runner not found'}), 404
+        runner = row[0]
+        distribution = {stars: int(count or 0) for stars, count in zip(range(1, 6), row[1:])}
+        total_reviews = sum(distribution.values())
+        
+        query = Review.query.options(joinedload(Review.reviewer))\
+            .filter(Review.reviewee_id == runner.user_id, Review.is_approved == True)
+        if cursor:
+            query = query.filter(
+                (Review.created_at < created_at) |
+                ((Review.created_at == created_at) & (Review.id < review_id))
+            )
+        reviews = query.order_by(desc(Review.created_at), desc(Review.id)).limit(limit + 1).all()
+        has_more = len(reviews) > limit
+        reviews = reviews[:limit]
+        
+        cache_tags(*runner_tags(runner), f'reviewee:{runner.user_id}')
+        for review in reviews:
+            cache_tags(*review_tags(review))
+        
+        page = {
+            'reviews': [{
+                'id': review.id,
+                'rating': review.rating,
+                'comment': review.comment,
+                'created_at': review.created_at.isoformat() if review.created_at else None,
+                'reviewer': {
+                    'id': review.reviewer.id,
+                    'first_name': review.reviewer.first_name,
+                    'last_name': review.reviewer.last_name,
+                    'profile_image': review.reviewer.profile_image
+                } if review.reviewer else None
+            } for review in reviews],
+            'next_cursor': f'{reviews[-1].created_at.isoformat()}_{reviews[-1].id}' if has_more else None
+        }
+        if cursor:
+            return jsonify(page), 200
+        
+        exceptions = runner.availability_exceptions\
+            .filter(AvailabilityException.end_date > datetime.utcnow())\
+            .order_by(AvailabilityException.start_date.asc())\
+            .limit(5).all()
+        weekly = decode_schedule(runner.availability_bitmap) if runner.availability_bitmap else None
+        
+        return jsonify({
+            'runner': runner.to_dict(),
+            'rating_summary': {
+                'total_reviews': total_reviews,
+                'average_rating': round(sum(stars * count for stars, count in distribution.items()) / total_reviews, 1)
+                                  if total_reviews else 0.0,
+                'rating_distribution': distribution
+            },
+            **page,
+            'availability': {
+                'timezone': runner.timezone or 'UTC',
+                'has_schedule': weekly is not None,
+                'weekly': weekly,
+                'upcoming_exceptions': [exception.to_dict() for exception in exceptions]
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/runners/profile/availability', methods=['PUT'])
+@jwt_required()
+def update_runner_availability():
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        runner = Runner.query.filter_by(user_id=user_id).first()
+        
+        if not runner:
+            return jsonify({'error': 'Runner profile not found'}), 404
+        
+        data = request.json
+        
+        if 'timezone' in data:
+            if get_zone(data['timezone']).key != data['timezone']:
+                return jsonify({'error': 'Unknown timezone'}), 400
+            runner.timezone = data['timezone']
+        
+        # A null schedule means "available any time" (only is_available applies)
+        if 'weekly' in data:
+            try:
+                runner.availability_bitmap = encode_schedule(data['weekly']) if data['weekly'] is not None else None
+            except (ValueError, TypeError, AttributeError) as e:
+                return jsonify({'error': f'Invalid weekly schedule: {e}'}), 400
+        
+        runner.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Availability updated successfully',
+            'timezone': runner.timezone,
+            'weekly': decode_schedule(runner.availability_bitmap) if runner.availability_bitmap else None
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/runners/profile/availability/exceptions', methods=['POST'])
+@jwt_required()
+def create_availability_exception():
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        runner = Runner.query.filter_by(user_id=user_id).first()
+        
+        if not runner:
+            return jsonify({'error': 'Runner profile not found'}), 404
+        
+        data = request.json
+        
+        for field in ['start_date', 'end_date']:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        try:
+            start_date = to_utc_naive(datetime.fromisoformat(data['start_date'].replace('Z', '+00:00')))
+            end_date = to_utc_naive(datetime.fromisoformat(data['end_date'].replace('Z', '+00:00')))
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use ISO format.'}), 400
+        
+        if end_date <= start_date:
+            return jsonify({'error': 'end_date must be after start_date'}), 400
+        
+        exception = AvailabilityException(
+            runner_id=runner.id,
+            start_date=start_date,
+            end_date=end_date,
+            is_available=bool(data.get('is_available', False)),
+            reason=data.get('reason')
+        )
+        
+        db.session.add(exception)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Availability exception created successfully',
+            'exception': exception.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/runners/profile/availability/exceptions/<int:exception_id>', methods=['DELETE'])
+@jwt_required()
+def delete_availability_exception(exception_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user_id = int(current_user_id)
+        runner = Runner.query.filter_by(user_id=user_id).first()
+        
+        if not runner:
+            return jsonify({'error': 'Runner profile not found'}), 404
+        
+        exception = AvailabilityException.query.filter_by(id=exception_id, runner_id=runner.id).first()
+        
+        if not exception:
+            return jsonify({'error': 'Availability exception not found'}), 404
+        
+        db.session.delete(exception)
+        db.session.commit()
+        
+        return jsonify({'message': 'Availability exception deleted successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # Services Routes
 @user_bp.route('/services', methods=['GET'])
 def get_services():
@@ -372,6 +693,49 @@ def get_service_categories():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@user_bp.route('/presence', methods=['GET'])
+@jwt_required(optional=True)
+def get_presence_batch():
+    """Online status for up to 200 users at once, e.g. every runner on a list page"""
+    try:
+        raw_ids = [value for value in (request.args.get('user_ids') or '').split(',') if value.strip()]
+        if not raw_ids:
+            return jsonify({'error': 'user_ids is required'}), 400
+        try:
+            user_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+        except ValueError:
+            return jsonify({'error': 'user_ids must be a comma-separated list of ids'}), 400
+        if len(user_ids) > 200:
+            return jsonify({'error': 'At most 200 user_ids per request'}), 400
+        
+        # Anyone may ask whether runners, whose profiles are public, are online. Last seen
+        # times, and other users' status, are only for the caller's booking counterparts.
+        counterparts = set()
+        current_user_id = get_jwt_identity()
+        if current_user_id is not None:
+            caller_id = int(current_user_id)
+            counterparts = {caller_id} if caller_id in user_ids else set()
+            counterparts.update(user_id for user_id, in db.session.query(Runner.user_id)
+                                .join(Booking, Booking.runner_id == Runner.id)
+                                .filter(Booking.user_id == caller_id, Runner.user_id.in_(user_ids)))
+            counterparts.update(user_id for user_id, in db.session.query(Booking.user_id)
+                                .join(Runner, Booking.runner_id == Runner.id)
+                                .filter(Runner.user_id == caller_id, Booking.user_id.in_(user_ids)))
+        runner_user_ids = {user_id for user_id, in db.session.query(Runner.user_id).filter(
+            Runner.user_id.in_(user_ids))}
+        user_ids = [user_id for user_id in user_ids if user_id in runner_user_ids or user_id in counterparts]
+        presence = {}
+        for user_id, (online, last_seen) in get_presence().lookup(user_ids).items():
+            presence[str(user_id)] = {'online': online}
+            if user_id in counterparts:
+                presence[str(user_id)]['last_seen'] = \
+                    datetime.utcfromtimestamp(last_seen).isoformat() if last_seen else None
+        
+        return jsonify({'presence': presence}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @user_bp.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
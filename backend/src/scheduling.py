@@ -0,0 +1,85 @@
+"""
+Booking window helpers backed by the per-runner interval index on Booking.
+
+Active bookings for a runner never overlap each other (create and reschedule
+both call lock_runner_schedule and then find_conflict in the same
+transaction), so ordered by start they are also ordered by end. That means
+only the last booking starting before a new window ends can overlap it, and
+the check is a single seek on ix_booking_runner_window rather than a scan
+over all of the runner's bookings.
+"""
+from datetime import timedelta, timezone
+from sqlalchemy import select, text
+from src.models.user import db, Booking, Runner, ACTIVE_STATUS_CLAUSE
+
+
+def to_utc_naive(value):
+    """Normalize a datetime to naive UTC, the format bookings are stored in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def booking_window(start, hours):
+    """Return the (start, end) window for a booking starting at `start` lasting `hours`"""
+    start = to_utc_naive(start)
+    return start, start + timedelta(hours=float(hours))
+
+
+def _active_bookings(runner_id, exclude_booking_id=None):
+    query = Booking.query.filter(
+        Booking.runner_id == runner_id,
+        ACTIVE_STATUS_CLAUSE
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+    return query
+
+
+def lock_runner_schedule(runner_id):
+    """
+    Serialize booking writes for one runner until the transaction ends, so two
+    concurrent requests cannot both pass find_conflict. Other databases lock
+    the runner row; SQLite has no row locks, so a no-op write takes the
+    database write lock before the check instead.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        db.session.execute(text('UPDATE runner SET id = id WHERE id = :id'), {'id': runner_id})
+    else:
+        db.session.execute(select(Runner.id).where(Runner.id == runner_id).with_for_update())
+
+
+def find_conflict(runner_id, start, end, exclude_booking_id=None):
+    """Return the active booking overlapping [start, end) for this runner, or None"""
+    candidate = _active_bookings(runner_id, exclude_booking_id)\
+        .filter(Booking.scheduled_date < end)\
+        .order_by(Booking.scheduled_date.desc())\
+        .first()
+    if candidate and candidate.end_date and candidate.end_date > start:
+        return candidate
+    return None
+
+
+def next_free_slot(runner_id, after, hours, exclude_booking_id=None):
+    """Return the earliest start >= `after` where the runner is free for `hours`"""
+    start, end = booking_window(after, hours)
+    duration = end - start
+
+    # A booking that started earlier may still be running at `after`
+    current = find_conflict(runner_id, start, start + timedelta(microseconds=1), exclude_booking_id)
+    if current:
+        start = current.end_date
+
+    # Walk forward through later bookings until a large enough gap appears
+    upcoming = _active_bookings(runner_id, exclude_booking_id)\
+        .filter(Booking.scheduled_date >= start)\
+        .order_by(Booking.scheduled_date.asc())\
+        .with_entities(Booking.scheduled_date, Booking.end_date)\
+        .yield_per(100)
+    for booked_start, booked_end in upcoming:
+        if booked_start - start >= duration:
+            break
+        start = max(start, booked_end)
+    return start
+
@@ -0,0 +1,93 @@
+"""
+In-place schema upgrades for databases created by an older version of the app.
+
+db.create_all() creates missing tables but never changes existing ones, so
+columns and indexes added to existing models would be missing on a deployed
+database and the first query using them would fail. upgrade_schema() runs at
+startup after create_all() and, on SQLite and PostgreSQL alike:
+
+- adds every model column missing from its table, then backfills the ones
+  listed in BACKFILLS;
+- creates every model index that does not exist yet.
+
+On PostgreSQL the upgrade holds an advisory lock, so app and worker processes
+starting together apply it once.
+"""
+from sqlalchemy import inspect, literal, text
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every process of the app
+UPGRADE_LOCK_KEY = 7319004
+
+# SQL run once, right after a column is added, to fill it for existing rows
+BACKFILLS = {
+    ('booking', 'end_date'): {
+        'sqlite': """
+            UPDATE booking
+            SET end_date = datetime(scheduled_date, '+' || CAST(estimated_hours * 3600 AS INTEGER) || ' seconds')
+            WHERE end_date IS NULL
+        """,
+        'postgresql': """
+            UPDATE booking SET end_date = scheduled_date + estimated_hours * INTERVAL '1 hour'
+            WHERE end_date IS NULL
+        """,
+    },
+    # Completed bookings were already counted, unless their count job is still pending
+    ('booking', 'counted_at'): {
+        'sqlite': """
+            UPDATE booking SET counted_at = COALESCE(completed_at, updated_at, CURRENT_TIMESTAMP)
+            WHERE status = 'completed' AND id NOT IN (
+                SELECT json_extract(payload, '$.booking_id') FROM job
+                WHERE task = 'count_completed_bookings' AND status IN ('queued', 'running')
+            )
+        """,
+        'postgresql': """
+            UPDATE booking SET counted_at = COALESCE(completed_at, updated_at, now())
+            WHERE status = 'completed' AND id NOT IN (
+                SELECT (payload->>'booking_id')::integer FROM job
+                WHERE task = 'count_completed_bookings' AND status IN ('queued', 'running')
+            )
+        """,
+    },
+}
+
+
+def column_ddl(column, dialect):
+    """Column definition for ALTER TABLE ... ADD COLUMN, including a scalar default"""
+    ddl = f'{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}'
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f' DEFAULT {value}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    return ddl
+
+
+def upgrade_schema(engine, metadata):
+    """Add missing columns and indexes for every table in `metadata` that exists; returns what was added"""
+    added = []
+    with engine.begin() as connection:
+        dialect = connection.dialect
+        if dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': UPGRADE_LOCK_KEY})
+        inspector = inspect(connection)
+        quote = dialect.identifier_preparer.quote
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                connection.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {column_ddl(column, dialect)}'))
+                backfill = BACKFILLS.get((table.name, column.name), {}).get(dialect.name)
+                if backfill:
+                    connection.execute(text(backfill))
+                added.append(f'{table.name}.{column.name}')
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    added.append(index.name)
+    return added
@@ -0,0 +1,310 @@
+"""
+Full-text search over users and runner profiles.
+
+One document per user holds their name, email, runner bio and the names of
+the services they offer. SQLite keeps it in an FTS5 table keyed by rowid =
+user id and ranks with bm25; Postgres keeps tsvector columns under GIN
+indexes and ranks with ts_rank. Documents are refreshed inside the same
+transaction as the write that changed them, from a session after_flush hook.
+
+Searches can be limited to one user role and paged inside the index query,
+so totals and later pages stay right however many documents match.
+"""
+import re
+from sqlalchemy import case, event, inspect, text
+from sqlalchemy.orm import Session
+from src.models.user import db, User, Runner, Service
+from src.db_routing import get_router, read_connection
+
+# Fields whose changes require a document to be rebuilt
+INDEXED_USER_FIELDS = ('first_name', 'last_name', 'username', 'email')
+INDEXED_RUNNER_FIELDS = ('bio', 'user_id', 'services')
+
+
+def _terms(query):
+    return re.findall(r'\w+', (query or '').lower())[:16]
+
+
+def _role_filter(column, role):
+    """SQL restricting `column` to users with this role (a UserRole); roles are stored by name"""
+    if role is None:
+        return '', {}
+    return f'AND {column} IN (SELECT id FROM "user" WHERE role = :role)', {'role': role.name}
+
+
+class SQLiteSearch:
+    """FTS5 backend; bm25 column weights favour names over services over bio"""
+
+    name = 'sqlite'
+
+    def create(self, connection):
+        connection.execute(text("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                runner_id UNINDEXED, name, email, bio, services,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """))
+
+    def is_empty(self, connection):
+        return connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM search_index)")).scalar()
+
+    def _select(self, where):
+        return f"""
+            SELECT u.id, r.id,
+                   u.first_name || ' ' || u.last_name || ' ' || u.username,
+                   u.email,
+                   COALESCE(r.bio, ''),
+                   COALESCE((SELECT group_concat(s.name, ' ')
+                             FROM runner_services rs JOIN service s ON s.id = rs.service_id
+                             WHERE rs.runner_id = r.id), '')
+            FROM "user" u LEFT JOIN runner r ON r.user_id = u.id
+            {where}
+        """
+
+    def reindex(self, connection, user_ids):
+        params = {f'id{i}': user_id for i, user_id in enumerate(user_ids)}
+        placeholders = ', '.join(f':{key}' for key in params)
+        connection.execute(text(f"DELETE FROM search_index WHERE rowid IN ({placeholders})"), params)
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, runner_id, name, email, bio, services) "
+            + self._select(f"WHERE u.id IN ({placeholders})")
+        ), params)
+
+    def remove(self, connection, user_ids):
+        params = {f'id{i}': user_id for i, user_id in enumerate(user_ids)}
+        placeholders = ', '.join(f':{key}' for key in params)
+        connection.execute(text(f"DELETE FROM search_index WHERE rowid IN ({placeholders})"), params)
+
+    def rebuild(self, connection):
+        connection.execute(text("DELETE FROM search_index"))
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, runner_id, name, email, bio, services) " + self._select("")
+        ))
+
+    def _where(self, terms, runners_only, include_email, role):
+        columns = '{name email bio services}' if include_email else '{name bio services}'
+        prefixes = ' '.join('"%s"*' % term for term in terms)
+        role_sql, params = _role_filter('rowid', role)
+        params['match'] = f'{columns} : ({prefixes})'
+        return f"""
+            WHERE search_index MATCH :match {'AND runner_id IS NOT NULL' if runners_only else ''} {role_sql}
+        """, params
+
+    def search(self, connection, query, runners_only, include_email, limit, offset=0, role=None):
+        terms = _terms(query)
+        if not terms:
+            return []
+        where, params = self._where(terms, runners_only, include_email, role)
+        rows = connection.execute(text(f"""
+            SELECT rowid, runner_id FROM search_index
+            {where}
+            ORDER BY bm25(search_index, 0.0, 10.0, 5.0, 1.0, 3.0), rowid
+            LIMIT :limit OFFSET :offset
+        """), dict(params, limit=limit, offset=offset)).all()
+        return [(row[0], row[1]) for row in rows]
+
+    def count(self, connection, query, runners_only, include_email, role=None):
+        terms = _terms(query)
+        if not terms:
+            return 0
+        where, params = self._where(terms, runners_only, include_email, role)
+        return connection.execute(text(f"SELECT count(*) FROM search_index {where}"), params).scalar()
+
+
+class PostgresSearch:
+    """
+    tsvector backend; `document` is public, `private_document` adds the email.
+    Names, services and emails are indexed with the 'simple' config and bios
+    with 'english' (stemmed), so each query term is looked up both ways.
+    """
+
+    name = 'postgresql'
+
+    def create(self, connection):
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS search_document (
+                user_id INTEGER PRIMARY KEY,
+                runner_id INTEGER,
+                document TSVECTOR NOT NULL,
+                private_document TSVECTOR NOT NULL
+            )
+        """))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_document_gin ON search_document USING GIN (document)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_private_document_gin ON search_document USING GIN (private_document)"
+        ))
+
+    def is_empty(self, connection):
+        return connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM search_document)")).scalar()
+
+    def _upsert(self, where):
+        return f"""
+            INSERT INTO search_document (user_id, runner_id, document, private_document)
+            SELECT id, runner_id, document, document || setweight(to_tsvector('simple', email), 'B')
+            FROM (
+                SELECT u.id, r.id AS runner_id, u.email,
+                       setweight(to_tsvector('simple', u.first_name || ' ' || u.last_name || ' ' || u.username), 'A')
+                       || setweight(to_tsvector('simple', COALESCE((
+                              SELECT string_agg(s.name, ' ')
+                              FROM runner_services rs JOIN service s ON s.id = rs.service_id
+                              WHERE rs.runner_id = r.id), '')), 'B')
+                       || setweight(to_tsvector('english', COALESCE(r.bio, '')), 'C') AS document
+                FROM "user" u LEFT JOIN runner r ON r.user_id = u.id
+                {where}
+            ) docs
+            ON CONFLICT (user_id) DO UPDATE
+            SET runner_id = EXCLUDED.runner_id,
+                document = EXCLUDED.document,
+                private_document = EXCLUDED.private_document
+        """
+
+    def reindex(self, connection, user_ids):
+        connection.execute(text(self._upsert("WHERE u.id = ANY(:ids)")), {'ids': list(user_ids)})
+
+    def remove(self, connection, user_ids):
+        connection.execute(text("DELETE FROM search_document WHERE user_id = ANY(:ids)"), {'ids': list(user_ids)})
+
+    def rebuild(self, connection):
+        connection.execute(text("TRUNCATE search_document"))
+        connection.execute(text(self._upsert("")))
+
+    def _query(self, terms, runners_only, include_email, role):
+        column = 'private_document' if include_email else 'document'
+        # Every term must match, either as a plain prefix or as an English stem prefix
+        tsquery = ' && '.join(f"(to_tsquery('simple', :term{i}) || to_tsquery('english', :term{i}))"
+                              for i in range(len(terms)))
+        role_sql, params = _role_filter('user_id', role)
+        params.update({f'term{i}': f'{term}:*' for i, term in enumerate(terms)})
+        return column, f"""
+            FROM search_document, ({'SELECT ' + tsquery} AS query) q
+            WHERE {column} @@ q.query {'AND runner_id IS NOT NULL' if runners_only else ''} {role_sql}
+        """, params
+
+    def search(self, connection, query, runners_only, include_email, limit, offset=0, role=None):
+        terms = _terms(query)
+        if not terms:
+            return []
+        column, source, params = self._query(terms, runners_only, include_email, role)
+        rows = connection.execute(text(f"""
+            SELECT user_id, runner_id {source}
+            ORDER BY ts_rank({column}, q.query) DESC, user_id
+            LIMIT :limit OFFSET :offset
+        """), dict(params, limit=limit, offset=offset)).all()
+        return [(row[0], row[1]) for row in rows]
+
+    def count(self, connection, query, runners_only, include_email, role=None):
+        terms = _terms(query)
+        if not terms:
+            return 0
+        _, source, params = self._query(terms, runners_only, include_email, role)
+        return connection.execute(text(f"SELECT count(*) {source}"), params).scalar()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearch(),
+    'postgresql': PostgresSearch(),
+}
+
+# Engines whose search tables exist; writes through other engines are not indexed
+_indexed_engines = set()
+
+
+def get_backend(connection):
+    if connection.engine.url.render_as_string() not in _indexed_engines:
+        return None
+    return BACKENDS.get(connection.dialect.name)
+
+
+def init_search(app):
+    """Create the search index for the app's database and backfill it if empty"""
+    with app.app_context():
+        connection = db.session.connection()
+        backend = BACKENDS.get(connection.dialect.name)
+        if backend is None:
+            app.logger.warning('Full-text search is not supported on %s', connection.dialect.name)
+            return
+        backend.create(connection)
+        _indexed_engines.add(connection.engine.url.render_as_string())
+        # Replicas are copies of the primary, search tables included
+        router = get_router()
+        for replica in (router.replicas if router else []):
+            _indexed_engines.add(replica.url.render_as_string())
+        if backend.is_empty(connection):
+            backend.rebuild(connection)
+        db.session.commit()
+
+
+def rebuild_index():
+    """Rebuild every search document (after bulk loads that bypass the ORM)"""
+    connection = db.session.connection()
+    get_backend(connection).rebuild(connection)
+    db.session.commit()
+
+
+def search_users(query, runners_only=False, include_email=False, limit=1000, offset=0, role=None):
+    """Return [(user_id, runner_id)] best match first, optionally only users with `role` (a UserRole)"""
+    connection = read_connection(db.session)
+    backend = get_backend(connection)
+    if backend is None:
+        return []
+    return backend.search(connection, query, runners_only, include_email, limit, offset, role)
+
+
+def count_users(query, runners_only=False, include_email=False, role=None):
+    """Number of users search_users would return without a limit"""
+    connection = read_connection(db.session)
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    return backend.count(connection, query, runners_only, include_email, role)
+
+
+def rank_order(column, ids):
+    """ORDER BY expression that keeps rows in the order of `ids`"""
+    return case({value: position for position, value in enumerate(ids)}, value=column, else_=len(ids))
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_search_index(session, flush_context):
+    """Refresh the documents touched by this flush in the same transaction"""
+    user_ids, removed, service_ids = set(), set(), set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User) and (obj in session.new or _changed(obj, INDEXED_USER_FIELDS)):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Runner) and (obj in session.new or _changed(obj, INDEXED_RUNNER_FIELDS)):
+            user_ids.add(obj.user_id)
+            if obj not in session.new:
+                previous = inspect(obj).attrs.user_id.history.deleted
+                user_ids.update(user_id for user_id in previous if user_id is not None)
+        elif isinstance(obj, Service) and obj not in session.new and _changed(obj, ('name',)):
+            service_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            removed.add(obj.id)
+        elif isinstance(obj, Runner):
+            user_ids.add(obj.user_id)
+    if not (user_ids or removed or service_ids):
+        return
+
+    connection = session.connection()
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    if service_ids:
+        rows = connection.execute(
+            db.select(Runner.user_id).join(Runner.services).where(Service.id.in_(service_ids))
+        )
+        user_ids.update(row[0] for row in rows)
+    user_ids -= removed
+    user_ids.discard(None)
+    if user_ids:
+        backend.reindex(connection, sorted(user_ids))
+    if removed:
+        backend.remove(connection, sorted(removed))
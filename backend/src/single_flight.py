@@ -0,0 +1,67 @@
+"""
+In-process request coalescing.
+
+Concurrent callers asking for the same key share one computation: the
+first runs it, the rest wait and receive its result (or its exception).
+Coordination between worker processes needs a shared lock on top; see
+ResponseCache.fill in src/response_cache.py.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; callers that overlap share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return (result, shared). Callers that wait longer than `timeout` for
+        the running call give up on it and run fn() themselves.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            return self._lead(key, call, fn), False
+        if not call.done.wait(timeout):
+            return fn(), False
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def try_do(self, key, fn):
+        """Run fn() unless a call for key is already in flight; return (started, result)"""
+        with self._lock:
+            if key in self._calls:
+                return False, None
+            call = self._calls[key] = _Call()
+        return True, self._lead(key, call, fn)
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,192 @@
+"""
+Static asset serving for the built frontend.
+
+The static folder is scanned once at startup into an in-memory manifest
+(size, mtime, ETag, content type, precompressed siblings, and the bytes
+themselves for small files), so serving an asset needs no stat call.
+Fingerprinted build output (Vite's assets/name-<hash>.ext) is served with
+immutable one-year caching; index.html and other unhashed files must be
+revalidated, which costs only a 304 thanks to the ETag.
+
+Precompress a build with:  python -m src.static_assets src/static
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from collections import namedtuple
+
+from flask import Response, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+IN_MEMORY_MAX_BYTES = 256 * 1024  # Files up to this size are kept in memory
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'application/wasm')
+SKIP_DIRS = {'uploads'}  # User uploads are served by the upload blueprint
+
+# Vite emits assets/<name>-<8+ char base64url hash>.<ext>
+FINGERPRINT = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.\w+$')
+
+# Preferred first when the client accepts several
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+Variant = namedtuple('Variant', 'path size body')
+Asset = namedtuple('Asset', 'mimetype etag mtime immutable variants')
+
+
+def _variant(path):
+    size = os.path.getsize(path)
+    body = None
+    if size <= IN_MEMORY_MAX_BYTES:
+        with open(path, 'rb') as f:
+            body = f.read()
+    return Variant(path, size, body)
+
+
+def _etag(path):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()[:20]
+
+
+def build_asset(path, rel):
+    """Asset for the file at `path`, served as URL path `rel`"""
+    variants = {None: _variant(path)}
+    for encoding, suffix in ENCODINGS:
+        if os.path.exists(path + suffix):
+            variants[encoding] = _variant(path + suffix)
+    return Asset(
+        mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        etag=_etag(path),
+        mtime=int(os.path.getmtime(path)),
+        immutable=bool(FINGERPRINT.match(rel)),
+        variants=variants
+    )
+
+
+def build_manifest(folder):
+    """Map URL path (relative to the static folder) to an Asset"""
+    manifest = {}
+    if not folder or not os.path.isdir(folder):
+        return manifest
+    for root, dirs, names in os.walk(folder):
+        if root == folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in names:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, folder).replace(os.sep, '/')
+            manifest[rel] = build_asset(path, rel)
+    return manifest
+
+
+def asset_response(asset):
+    """Response for an asset, picking the best precompressed variant the client accepts"""
+    encoding = None
+    for candidate, _ in ENCODINGS:
+        if candidate in asset.variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    variant = asset.variants[encoding]
+
+    if variant.body is not None:
+        response = Response(variant.body, mimetype=asset.mimetype, direct_passthrough=True)
+    else:
+        response = Response(wrap_file(request.environ, open(variant.path, 'rb')),
+                            mimetype=asset.mimetype, direct_passthrough=True)
+    response.content_length = variant.size
+    response.last_modified = asset.mtime
+    # Encoded bodies get their own tag so caches never mix them up
+    response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+    if encoding:
+        response.content_encoding = encoding
+    if len(asset.variants) > 1:
+        response.vary.add('Accept-Encoding')
+
+    if asset.immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+class StaticAssets:
+    """Serves the SPA build from a manifest built at startup"""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.static_folder
+        self.reload_on_miss = app.debug
+        self.manifest = build_manifest(self.folder)
+        app.extensions['static_assets'] = self
+
+    def lookup(self, path):
+        asset = self.manifest.get(path)
+        if asset is None and self.reload_on_miss:
+            # Development: pick up a file added after startup, checking only that path
+            asset = self._load(path)
+        return asset
+
+    def _load(self, path):
+        if not self.folder or path.endswith(('.gz', '.br')) or path.split('/', 1)[0] in SKIP_DIRS:
+            return None
+        full = safe_join(self.folder, path)
+        if full is None or not os.path.isfile(full):
+            return None
+        asset = self.manifest[path] = build_asset(full, path)
+        return asset
+
+    def serve(self, path):
+        """Serve `path` if it is a known file, else index.html for client-side routing"""
+        asset = self.lookup(path) if path else None
+        if asset is None:
+            asset = self.lookup('index.html')
+            if asset is None:
+                return "index.html not found in static folder", 404
+        return asset_response(asset)
+
+
+def precompress(folder, min_size=1024):
+    """Write .gz (and .br when the brotli package is installed) next to compressible files"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    count = 0
+    for root, dirs, names in os.walk(folder):
+        if root == folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in names:
+            path = os.path.join(root, name)
+            mimetype = mimetypes.guess_type(name)[0] or ''
+            if name.endswith(('.gz', '.br')) or not mimetype.startswith(COMPRESSIBLE_TYPES):
+                continue
+            if os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'static')
+    print(f"Precompressed {precompress(target)} files in {target}")
@@ -0,0 +1,145 @@
+"""
+Content-addressed file storage for uploads.
+
+Finished files live at UPLOAD_FOLDER/objects/ab/cd/<sha256>, so a file that
+is uploaded twice is stored once. In-progress uploads are written to
+UPLOAD_FOLDER/partial/<upload id> in fixed-size blocks straight from the
+request stream; the SHA-256 is updated as blocks arrive, and only if a chunk
+lands on a different worker process than the previous one is the partial
+file re-read to rebuild the digest.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+
+from src.images import IMAGE_TYPES
+from src.models.user import db, StoredFile
+
+BLOCK_SIZE = 64 * 1024
+
+# Served content type per allowed extension; the client's claimed type is never trusted
+CONTENT_TYPES = {
+    **IMAGE_TYPES,
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+# upload id -> (bytes hashed, hasher); per process, rebuilt from disk when missing
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def extension_of(filename):
+    """Lower-case extension if it is in ALLOWED_EXTENSIONS, else None"""
+    if '.' not in filename:
+        return None
+    extension = filename.rsplit('.', 1)[1].lower()
+    return extension if extension in current_app.config['ALLOWED_EXTENSIONS'] else None
+
+
+def content_type_for(extension):
+    return CONTENT_TYPES.get(extension, 'application/octet-stream')
+
+
+def object_path(sha256):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'objects', sha256[:2], sha256[2:4], sha256)
+
+
+def partial_path(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'partial', upload_id)
+
+
+def start_partial(upload_id):
+    path = partial_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    with _hashers_lock:
+        _hashers[upload_id] = (0, hashlib.sha256())
+
+
+@contextmanager
+def partial_lock(upload_id):
+    """
+    Hold an exclusive lock on an upload's partial file while a chunk is written.
+
+    The lock is shared by every worker process on the host and released if the
+    process dies. Raises BlockingIOError if another request holds it, or
+    FileNotFoundError if the upload is no longer in progress.
+    """
+    with open(partial_path(upload_id), 'rb') as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        yield
+
+
+def append_chunk(upload, offset, stream):
+    """
+    Write the request body at `offset` without buffering it; returns the new offset.
+
+    Raises ValueError if the chunk would run past the declared upload size.
+    """
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload.id, (None, None))
+    if hashed != offset:
+        hasher = None
+
+    position = offset
+    with open(partial_path(upload.id), 'r+b') as f:
+        f.seek(offset)
+        while True:
+            block = stream.read(BLOCK_SIZE)
+            if not block:
+                break
+            position += len(block)
+            if position > upload.size:
+                raise ValueError('Chunk exceeds declared upload size')
+            f.write(block)
+            if hasher is not None:
+                hasher.update(block)
+        f.truncate(position)
+
+    if hasher is not None:
+        with _hashers_lock:
+            _hashers[upload.id] = (position, hasher)
+    return position
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def finalize(upload, extension):
+    """Move a complete upload into the object store, reusing an identical existing file"""
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload.id, (None, None))
+    path = partial_path(upload.id)
+    sha256 = hasher.hexdigest() if hashed == upload.size else file_digest(path)
+
+    stored = StoredFile.query.filter_by(sha256=sha256).first()
+    if stored:
+        os.remove(path)
+        return stored
+
+    target = object_path(sha256)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    stored = StoredFile(sha256=sha256, size=upload.size, content_type=upload.content_type, extension=extension)
+    db.session.add(stored)
+    return stored
+
+
+def discard(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    try:
+        os.remove(partial_path(upload_id))
+    except FileNotFoundError:
+        pass
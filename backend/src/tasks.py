@@ -0,0 +1,106 @@
+"""
+Background job handlers. Imported by init_jobs() so every worker and web
+process shares the same task registry.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.jobs import enqueue, task
+from src.ledger import record_booking_earnings
+from src.message_search import index_messages
+from src.mail import deliver_batch
+from src.models.user import db, Booking, Notification, Runner
+from src.ratings import refresh_runner_ratings
+from src.response_cache import invalidate
+
+
+@task('refresh_ratings', batch=True)
+def refresh_ratings(payloads):
+    """Recompute runner ratings once for every distinct reviewee in the batch"""
+    refresh_runner_ratings(payload['user_id'] for payload in payloads)
+
+
+@task('count_completed_bookings', batch=True)
+def count_completed_bookings(payloads):
+    """Add completed bookings to runner.total_bookings, one atomic increment per runner.
+
+    Each booking is marked counted in the same transaction, so a job that is
+    retried or reaped after its worker died does not count it again.
+    """
+    booking_ids = [payload['booking_id'] for payload in payloads]
+    rows = db.session.execute(
+        update(Booking)
+        .where(Booking.id.in_(booking_ids), Booking.status == 'completed', Booking.counted_at.is_(None))
+        .values(counted_at=datetime.utcnow())
+        .returning(Booking.runner_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    per_runner = Counter(runner_id for runner_id, in rows)
+    for runner_id, completed in per_runner.items():
+        db.session.execute(
+            update(Runner)
+            .where(Runner.id == runner_id)
+            .values(total_bookings=func.coalesce(Runner.total_bookings, 0) + completed)
+            .execution_options(synchronize_session=False)
+        )
+    invalidate(*(f'runner:{runner_id}' for runner_id in per_runner))
+
+
+@task('record_earnings', batch=True)
+def record_earnings(payloads):
+    """Write earning and fee ledger entries for the batch of completed bookings"""
+    record_booking_earnings(payload['booking_id'] for payload in payloads)
+
+
+@task('index_chat_messages', batch=True)
+def index_chat_messages(payloads):
+    """Add a batch of new or edited chat messages to the full-text index"""
+    index_messages(message_id for payload in payloads for message_id in payload['message_ids'])
+
+
+def queue_notification(user_id, title, message, notification_type='system', related_id=None):
+    """Queue an in-app notification, keyed so that replaying its job cannot insert it twice"""
+    enqueue('send_notifications', {
+        'user_id': user_id,
+        'title': title,
+        'message': message,
+        'notification_type': notification_type,
+        'related_id': related_id,
+        'dedupe_key': uuid.uuid4().hex
+    })
+
+
+@task('send_notifications', batch=True)
+def send_notifications(payloads):
+    """Insert the whole batch of notifications with a single executemany.
+
+    A batch that runs twice (a retry, or a job reaped from a slow worker that
+    then finishes) skips the rows whose dedupe_key is already stored.
+    """
+    dialect = db.session.connection().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        module = postgresql if dialect == 'postgresql' else sqlite
+        statement = module.insert(Notification).on_conflict_do_nothing()
+    else:
+        statement = insert(Notification)
+    db.session.execute(statement, [
+        {
+            'user_id': payload['user_id'],
+            'title': payload['title'],
+            'message': payload['message'],
+            'notification_type': payload.get('notification_type', 'system'),
+            'related_id': payload.get('related_id'),
+            'dedupe_key': payload.get('dedupe_key'),
+        }
+        for payload in payloads
+    ])
+
+
+@task('send_email', batch=True)
+def send_email(payloads):
+    """Render and deliver queued emails, one (digest) message per recipient"""
+    deliver_batch(payloads)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, AvailabilityException
+from src.availability import encode_schedule, decode_schedule, window_mask, filter_available, SLOTS_PER_WEEK
+from datetime import datetime
+from sqlalchemy import event
+
+MONDAY_9AM = datetime(2030, 1, 7, 9, 0)  # 2030-01-07 is a Monday
+
+def test_schedule_roundtrip():
+    weekly = {'monday': [['09:00', '12:00'], ['13:00', '17:30']], 'sunday': [['22:00', '24:00']]}
+    bitmap = encode_schedule(weekly)
+    assert len(bitmap) == 84
+
+    decoded = decode_schedule(bitmap)
+    assert decoded['monday'] == weekly['monday']
+    assert decoded['sunday'] == weekly['sunday']
+    assert decoded['tuesday'] == []
+
+def test_window_mask_wraps_week():
+    # Sunday 23:30 for one hour covers the last two slots and the first two of Monday
+    mask = window_mask(datetime(2030, 1, 13, 23, 30), 1)
+    assert mask == 0b11 | (0b11 << (SLOTS_PER_WEEK - 2))
+
+def make_runner(name, weekly=None, tz='UTC'):
+    user = User(username=name, email=f'{name}@example.com', first_name=name, last_name='Runner')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    runner = Runner(user_id=user.id, hourly_rate=20.0, city='Springfield', country='USA', timezone=tz,
+                    availability_bitmap=encode_schedule(weekly) if weekly else None)
+    db.session.add(runner)
+    db.session.commit()
+    return runner
+
+def test_filter_available():
+    app, _ = create_app('testing')
+    with app.app_context():
+        office_hours = {'monday': [['09:00', '17:00']]}
+        free = make_runner('free', office_hours)
+        evenings = make_runner('evenings', {'monday': [['18:00', '22:00']]})
+        anytime = make_runner('anytime')
+        chicago = make_runner('chicago', office_hours, 'America/Chicago')  # 09:00 CST = 15:00 UTC
+        booked = make_runner('booked', office_hours)
+        off = make_runner('off', office_hours)
+        extra = make_runner('extra', {'tuesday': [['09:00', '17:00']]})
+
+        db.session.add(Booking(user_id=free.user_id, runner_id=booked.id, service_id=1, title='Errand',
+                               scheduled_date=datetime(2030, 1, 7, 10, 0), estimated_hours=1,
+                               hourly_rate=20.0, total_amount=20.0))
+        db.session.add(AvailabilityException(runner_id=off.id, start_date=datetime(2030, 1, 7),
+                                             end_date=datetime(2030, 1, 8)))
+        db.session.add(AvailabilityException(runner_id=extra.id, start_date=datetime(2030, 1, 7, 8),
+                                             end_date=datetime(2030, 1, 7, 12), is_available=True))
+        db.session.commit()
+
+        # Seeded runners have no schedule, so only consider the ones created here
+        candidates = db.session.query(Runner.id, Runner.availability_bitmap, Runner.timezone)\
+            .filter(Runner.city == 'Springfield').order_by(Runner.id).all()
+        captured = []
+        capture = lambda conn, cursor, statement, parameters, *args: captured.append((statement, parameters))
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        result = filter_available(candidates, MONDAY_9AM, 2)
+        event.remove(db.engine, 'before_cursor_execute', capture)
+        assert result == [free.id, anytime.id, extra.id]
+
+        # The booked-runner check seeks the partial index on active booking windows
+        statement, parameters = captured[-1]
+        plan = ' '.join(row[-1] for row in db.session.connection()
+                        .exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all())
+        assert 'ix_booking_runner_window' in plan
+
+        # Evening window in UTC: only the evening runner, the unscheduled one and Chicago office hours match
+        result = filter_available(candidates, datetime(2030, 1, 7, 18, 0), 2)
+        assert result == [evenings.id, anytime.id, chicago.id]
+
+def test_runner_search_available_at():
+    app, _ = create_app('testing')
+    with app.app_context():
+        make_runner('free', {'monday': [['09:00', '17:00']]})
+        make_runner('busy', {'tuesday': [['09:00', '17:00']]})
+
+    with app.test_client() as client:
+        response = client.get('/api/runners?city=Springfield&available_at=2030-01-07T09:00:00Z&duration=2')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total'] == 1
+        assert data['runners'][0]['user']['username'] == 'free'
+
+if __name__ == '__main__':
+    test_schedule_roundtrip()
+    test_window_mask_wraps_week()
+    test_filter_available()
+    test_runner_search_available_at()
+    print("✅ Availability tests passed!")
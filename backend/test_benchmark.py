@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+import random
+import tempfile
+import benchmark
+from sqlalchemy import create_engine
+from src.db_routing import DatabaseRouter
+from src.main import create_app
+from src.models.user import db
+
+def test_benchmark_runs_and_records_baseline():
+    with tempfile.TemporaryDirectory() as folder:
+        baseline = os.path.join(folder, 'baseline.json')
+        code = benchmark.main(['--requests', '40', '--warmup', '5', '--runners', '20', '--clients', '10',
+                               '--save-baseline', baseline, '--budgets', ''])
+        assert code == 0
+        with open(baseline) as f:
+            results = json.load(f)
+        assert results['requests'] > 0
+        runners = results['endpoints']['GET /api/runners']
+        assert runners['p50_ms'] <= runners['p95_ms'] <= runners['p99_ms']
+        assert runners['queries'] > 0
+
+def test_query_counter_removed_from_every_engine():
+    app, _ = create_app('testing')
+    reader, replica = create_engine('sqlite://'), create_engine('sqlite://')
+    with app.app_context():
+        app.extensions['db_router'] = DatabaseRouter(db.engine, readers=[reader], replicas=[replica])
+        benchmark.run(app, {'rng': random.Random(1)}, {'browse': 1}, 0, 0, 1)
+        for engine in (db.engine, reader, replica):
+            assert not engine.dispatch.before_cursor_execute
+
+def test_compare_flags_regressions():
+    baseline = {'endpoints': {'GET /api/runners': {'p95_ms': 10.0, 'queries': 5.0}}}
+    results = {'endpoints': {'GET /api/runners': {'p95_ms': 20.0, 'queries': 9.0, 'errors': 0}}}
+    problems = benchmark.compare(results, baseline, {'GET /api/runners': 15}, threshold=0.2, min_delta_ms=2)
+    assert len(problems) == 3   # over budget, slower p95, more queries
+
+    results['endpoints']['GET /api/runners'].update(p95_ms=11.0, queries=5.0)
+    assert benchmark.compare(results, baseline, {}, threshold=0.2, min_delta_ms=2) == []
+
+if __name__ == '__main__':
+    test_benchmark_runs_and_records_baseline()
+    test_query_counter_removed_from_every_engine()
+    test_compare_flags_regressions()
+    print("✅ Benchmark tests passed!")
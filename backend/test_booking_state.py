@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, BookingEvent, Notification
+from src.booking_state import transition, TransitionConflict, InvalidTransition
+from src.jobs import run_pending
+from flask_jwt_extended import create_access_token
+from datetime import datetime
+import json
+
+def setup_booking():
+    client = User(username='client', email='client@example.com', first_name='Cli', last_name='Ent')
+    runner_user = User(username='runner', email='runner@example.com', first_name='Run', last_name='Ner')
+    for user in (client, runner_user):
+        user.set_password('password123')
+    db.session.add_all([client, runner_user])
+    db.session.commit()
+    runner = Runner(user_id=runner_user.id, hourly_rate=20.0, city='Chicago', country='USA', total_bookings=0)
+    db.session.add(runner)
+    db.session.commit()
+    booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Errand',
+                      scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                      total_amount=20.0)
+    db.session.add(booking)
+    db.session.commit()
+    headers = {
+        'client': {'Authorization': f'Bearer {create_access_token(identity=str(client.id))}'},
+        'runner': {'Authorization': f'Bearer {create_access_token(identity=str(runner_user.id))}'},
+    }
+    return booking.id, runner.id, headers
+
+def test_transition_is_conditional():
+    app, _ = create_app('testing')
+    with app.app_context():
+        booking_id, _, _ = setup_booking()
+
+        assert transition(booking_id, 'pending', 1, 'accepted') == 2
+        db.session.commit()
+
+        # Same expected state again: another request already moved it
+        try:
+            transition(booking_id, 'pending', 1, 'accepted')
+            assert False, 'expected TransitionConflict'
+        except TransitionConflict:
+            db.session.rollback()
+
+        try:
+            transition(booking_id, 'accepted', 2, 'pending')
+            assert False, 'expected InvalidTransition'
+        except InvalidTransition:
+            pass
+
+def test_status_endpoint_counts_completion_once():
+    app, _ = create_app('testing')
+    with app.app_context():
+        booking_id, runner_id, headers = setup_booking()
+
+    with app.test_client() as client:
+        def put_status(status, who='runner', **extra):
+            return client.put(f'/api/bookings/{booking_id}/status', headers=headers[who],
+                              content_type='application/json', data=json.dumps(dict(status=status, **extra)))
+
+        assert put_status('completed').status_code == 400   # pending -> completed is not allowed
+        assert put_status('accepted', who='client').status_code == 403
+        response = put_status('accepted', version='latest')
+        assert response.status_code == 400 and response.get_json() == {'error': 'version must be an integer'}
+        response = client.put(f'/api/bookings/{booking_id}', headers=headers['client'],
+                              content_type='application/json', data=json.dumps({'title': 'New', 'version': None}))
+        assert response.status_code == 400 and response.get_json() == {'error': 'version must be an integer'}
+        assert put_status('accepted', version=1).status_code == 200
+        assert put_status('in_progress', version=1).status_code == 409   # stale version
+        assert put_status('in_progress').status_code == 200
+        assert put_status('completed').status_code == 200
+        response = put_status('completed')   # Double tap
+        assert response.status_code == 200
+        assert response.get_json()['booking']['version'] == 4
+
+        events = client.get(f'/api/bookings/{booking_id}/events', headers=headers['client']).get_json()['events']
+        assert [(e['from_status'], e['to_status']) for e in events] == [
+            ('pending', 'accepted'), ('accepted', 'in_progress'), ('in_progress', 'completed')
+        ]
+
+    with app.app_context():
+        # Counter and notifications are applied by the job worker
+        assert Runner.query.get(runner_id).total_bookings == 0
+        run_pending()
+        assert Runner.query.get(runner_id).total_bookings == 1
+        assert BookingEvent.query.count() == 3
+        assert Notification.query.filter_by(related_id=booking_id).count() == 3
+
+if __name__ == '__main__':
+    test_transition_is_conditional()
+    test_status_endpoint_counts_completion_once()
+    print("✅ Booking state tests passed!")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+import tempfile
+import time
+import redis
+import chat_load
+
+def test_redis_stand_in_pubsub():
+    broker = chat_load.RedisStandIn().start()
+    try:
+        for protocol in (2, 3):
+            client = redis.Redis.from_url(broker.url, protocol=protocol)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe('socketio')
+            time.sleep(0.1)
+            assert client.publish('socketio', b'payload') == 1
+            message = next(pubsub.listen())
+            assert message['channel'] == b'socketio' and message['data'] == b'payload'
+            pubsub.close()
+            client.close()
+    finally:
+        broker.stop()
+
+def run_harness(*extra):
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, 'results.json')
+        code = chat_load.main(['--clients', '6', '--servers', '2', '--duration', '2', '--rate', '1',
+                               '--drain', '1', '--output', output, *extra])
+        assert code == 0
+        with open(output) as f:
+            return json.load(f)
+
+def test_harness_fans_out_across_servers():
+    results = run_harness()
+
+    assert results['connected'] == 6 and results['connect_failures'] == 0
+    assert results['message_queue'] == 'local stand-in'
+    messages = results['messages']
+    assert messages['sent'] > 0
+    assert messages['dropped'] == 0
+    assert messages['delivered'] == messages['expected_deliveries']
+    assert results['latency_ms']['p50'] is not None
+    assert results['reads']['acknowledged'] > 0
+
+def test_harness_legacy_protocol():
+    results = run_harness('--protocol', '1')
+    assert results['settings']['protocol'] == 1
+    assert results['messages']['sent'] > 0
+    assert results['messages']['delivered'] == results['messages']['expected_deliveries']
+
+if __name__ == '__main__':
+    test_redis_stand_in_pubsub()
+    test_harness_fans_out_across_servers()
+    test_harness_legacy_protocol()
+    print("✅ Chat load harness tests passed!")
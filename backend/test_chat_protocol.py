@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, ChatMessage
+from src.chat_protocol import negotiate, epoch_ms
+
+def test_negotiation_falls_back_to_supported_versions():
+    assert negotiate(None) == 1
+    assert negotiate('bogus') == 1
+    assert negotiate(2) == 2
+    assert negotiate('2') == 2
+    assert negotiate(7) == 2   # Newer client, older server
+    assert negotiate(0) == 1
+    assert epoch_ms(datetime(2030, 1, 1)) == 1893456000000
+
+def drain(socket, wait=0.5):
+    """Collect events, including ones emitted by background tasks"""
+    time.sleep(wait)
+    return socket.get_received()
+
+def test_compact_clients_get_batched_rows():
+    app, socketio = create_app('testing')
+    with app.app_context():
+        runner = Runner.query.order_by(Runner.id).first()
+        client_user = User.query.filter(User.id != runner.user_id, ~User.runner_profile.any()).first()
+        booking = Booking(user_id=client_user.id, runner_id=runner.id, service_id=1, title='Pharmacy pickup',
+                          scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                          total_amount=20.0, status='accepted')
+        db.session.add(booking)
+        db.session.commit()
+        db.session.add(ChatMessage(booking_id=booking.id, sender_id=client_user.id, receiver_id=runner.user_id,
+                                   message='Hello', created_at=datetime(2030, 1, 1)))
+        db.session.commit()
+        booking_id, client_id, runner_user_id = booking.id, client_user.id, runner.user_id
+        client_name = f'{client_user.first_name} {client_user.last_name}'
+        client_token = create_access_token(identity=str(client_id))
+        runner_token = create_access_token(identity=str(runner_user_id))
+
+    compact = socketio.test_client(app, auth={'token': runner_token, 'protocol': 2})
+    legacy = socketio.test_client(app, auth={'token': runner_token})
+    sender = socketio.test_client(app, auth={'token': client_token, 'protocol': 2})
+    for socket in (compact, legacy, sender):
+        socket.emit('join_chat', {'token': runner_token, 'booking_id': booking_id})
+
+    events = {event['name']: event['args'][0] for event in drain(compact)}
+    assert events['connected']['protocol'] == 2
+    history = events['chat_history']
+    assert history['users'][str(client_id)] == client_name and str(runner_user_id) in history['users']
+    assert history['messages'] == [[history['messages'][0][0], client_id, 'Hello', 1893456000000, 0]]
+
+    events = {event['name']: event['args'][0] for event in drain(legacy)}
+    assert events['connected']['protocol'] == 1
+    assert events['chat_history']['messages'][0]['sender_name'] == client_name
+    drain(sender)
+
+    for n in range(10):
+        sender.emit('send_message', {'token': client_token, 'booking_id': booking_id, 'message': f'item {n}'})
+
+    # The first message goes out at once; the rest of the burst shares frames
+    batches = [event['args'][0] for event in drain(compact) if event['name'] == 'message_batch']
+    assert 2 <= len(batches) < 10
+    rows = [row for batch in batches for row in batch['messages']]
+    assert [row[2] for row in rows] == [f'item {n}' for n in range(10)]
+    assert all(row[1] == client_id and isinstance(row[3], int) and row[4] == 0 for row in rows)
+    assert {batch['booking_id'] for batch in batches} == {booking_id}
+    assert json.dumps(batches[0]).find('sender_name') == -1
+
+    # Older clients still get one verbose event per message
+    messages = [event['args'][0] for event in drain(legacy) if event['name'] == 'new_message']
+    assert [message['message'] for message in messages] == [f'item {n}' for n in range(10)]
+    assert messages[0]['sender_name'] == client_name and 'T' in messages[0]['created_at']
+    assert not [event for event in drain(compact, 0) if event['name'] == 'new_message']
+
+    for socket in (compact, legacy, sender):
+        socket.disconnect()
+
+if __name__ == '__main__':
+    test_negotiation_falls_back_to_supported_versions()
+    test_compact_clients_get_batched_rows()
+    print("✅ Chat protocol tests passed!")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, ChatMessage, Notification
+
+def setup_bookings():
+    runner = Runner.query.order_by(Runner.id).first()
+    client = User.query.filter(User.id != runner.user_id).order_by(User.id).first()
+    soon = datetime.utcnow() + timedelta(days=1)
+    for offset, (status, amount) in enumerate([('pending', 20.0), ('accepted', 30.0), ('accepted', 10.0),
+                                               ('completed', 40.0), ('completed', 25.0), ('cancelled', 15.0)]):
+        db.session.add(Booking(user_id=client.id, runner_id=runner.id, service_id=1, title=f'Errand {offset}',
+                               scheduled_date=soon + timedelta(hours=offset * 3), estimated_hours=1,
+                               hourly_rate=amount, total_amount=amount, status=status))
+    # Active but already in the past: counted, not upcoming
+    db.session.add(Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Overdue',
+                           scheduled_date=soon - timedelta(days=3), estimated_hours=1,
+                           hourly_rate=5.0, total_amount=5.0, status='pending'))
+    db.session.commit()
+    booking_id = Booking.query.filter_by(user_id=client.id).first().id
+    db.session.add_all([
+        ChatMessage(booking_id=booking_id, sender_id=runner.user_id, receiver_id=client.id, message='On my way'),
+        ChatMessage(booking_id=booking_id, sender_id=runner.user_id, receiver_id=client.id, message='Here', is_read=True),
+        ChatMessage(booking_id=booking_id, sender_id=client.id, receiver_id=runner.user_id, message='Thanks'),
+        Notification(user_id=client.id, title='Booking accepted', message='...', notification_type='booking'),
+        Notification(user_id=client.id, title='Booking pending', message='...', notification_type='booking'),
+    ])
+    db.session.commit()
+    return ({'Authorization': f'Bearer {create_access_token(identity=str(client.id))}'},
+            {'Authorization': f'Bearer {create_access_token(identity=str(runner.user_id))}'},
+            runner.user.first_name)
+
+def test_client_and_runner_summaries():
+    app, _ = create_app('testing')
+    with app.app_context():
+        client_headers, runner_headers, runner_first_name = setup_bookings()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    with app.test_client() as client:
+        response = client.get('/api/dashboard/summary?upcoming_limit=2', headers=client_headers)
+        assert response.status_code == 200
+        assert len(statements) == 3
+        data = response.get_json()
+        assert data['role'] == 'client'
+        assert data['status_counts'] == {'pending': 2, 'accepted': 2, 'declined': 0, 'in_progress': 0,
+                                         'completed': 2, 'cancelled': 1}
+        assert data['total_bookings'] == 7
+        assert [booking['title'] for booking in data['upcoming']] == ['Errand 0', 'Errand 1']
+        assert data['upcoming'][0]['counterpart']['first_name'] == runner_first_name
+        assert data['spend'] == {'completed': 65.0, 'pending': 65.0}
+        assert data['unread_messages'] == 1 and data['unread_notifications'] == 2
+
+        statements.clear()
+        data = client.get('/api/dashboard/summary?as_runner=true', headers=runner_headers).get_json()
+        assert len(statements) == 4
+        assert data['role'] == 'runner' and data['total_bookings'] == 7
+        assert [booking['title'] for booking in data['upcoming']] == ['Errand 0', 'Errand 1', 'Errand 2']
+        assert data['upcoming'][0]['counterpart']['last_name']
+        assert data['earnings'] == {'completed': 65.0, 'pending': 65.0}
+        assert data['unread_messages'] == 1 and data['unread_notifications'] == 0
+
+        assert client.get('/api/dashboard/summary?as_runner=true', headers=client_headers).status_code == 404
+
+def test_summary_queries_stay_on_indexes():
+    app, _ = create_app('testing')
+    with app.app_context():
+        client_headers, runner_headers, _ = setup_bookings()
+        captured = []
+        event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, parameters, *args:
+                     captured.append((statement, parameters)))
+
+        def plans():
+            return [' '.join(row[-1] for row in db.session.connection()
+                             .exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all())
+                    for statement, parameters in list(captured)]
+
+    with app.test_client() as client:
+        client.get('/api/dashboard/summary', headers=client_headers)
+        with app.app_context():
+            grouped, upcoming, unread = plans()
+        assert 'COVERING INDEX ix_booking_user_status' in grouped
+        # Already in scheduled_date order: no sort step
+        assert 'INDEX ix_booking_user_upcoming' in upcoming and 'TEMP B-TREE' not in upcoming
+        assert 'ix_chat_message_unread' in unread and 'ix_notification_unread' in unread
+
+        captured.clear()
+        client.get('/api/dashboard/summary?as_runner=true', headers=runner_headers)
+        with app.app_context():
+            runner, grouped, upcoming, _ = plans()
+        assert 'INDEX ix_runner_user_id' in runner
+        assert 'COVERING INDEX ix_booking_runner_status' in grouped
+        assert 'INDEX ix_booking_runner_window' in upcoming
+
+if __name__ == '__main__':
+    test_client_and_runner_summaries()
+    test_summary_queries_stay_on_indexes()
+    print("✅ Dashboard summary tests passed!")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from flask import Flask, request
+from sqlalchemy import select, text
+from src.config import TestingConfig
+from src.db_routing import STICKY_COOKIE, STICKY_HEADER, init_database, read_connection
+from src.message_search import init_message_search, search_messages
+from src.models.user import db, User
+from src.response_cache import ResponseCache, cache_tags, cached_response
+from src.search import init_search, search_users
+
+def _app(path, split=True):
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SQLITE_TUNING_ENABLED=True,
+                      SQLITE_READ_WRITE_SPLIT=split, SQLITE_READ_POOL_SIZE=2)
+    router = init_database(app, db)
+    with app.app_context():
+        db.create_all()
+    return app, router
+
+def _user(name):
+    return User(username=name, email=f'{name}@example.com', password_hash='x', first_name='Test', last_name='User')
+
+def test_pragmas_and_read_only_readers():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router = _app(os.path.join(folder, 'app.db'))
+        assert len(router.readers) == 1
+        with app.app_context():
+            writer = db.session.connection()
+            assert writer.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            assert writer.exec_driver_sql('PRAGMA synchronous').scalar() == 1   # NORMAL
+            assert writer.exec_driver_sql('PRAGMA busy_timeout').scalar() == 10000
+            db.session.rollback()
+
+            reader = read_connection(db.session)
+            assert reader.engine is router.readers[0]
+            assert reader.exec_driver_sql('PRAGMA query_only').scalar() == 1
+            db.session.rollback()
+
+def test_reads_follow_writes_within_a_transaction():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router = _app(os.path.join(folder, 'app.db'))
+        with app.app_context():
+            assert db.session.get_bind(clause=select(User)) is router.readers[0]
+            assert db.session.get_bind(clause=select(User).with_for_update()) is router.writer
+
+            db.session.add(_user('alice'))
+            db.session.flush()
+            # Uncommitted row is only visible on the writer connection
+            assert db.session.get_bind(clause=select(User)) is router.writer
+            assert User.query.filter_by(username='alice').count() == 1
+            db.session.commit()
+
+            assert db.session.get_bind(clause=select(User)) is router.readers[0]
+            assert User.query.filter_by(username='alice').count() == 1
+
+def test_concurrent_writers_queue_instead_of_failing():
+    with tempfile.TemporaryDirectory() as folder:
+        app, _ = _app(os.path.join(folder, 'app.db'))
+        errors = []
+
+        def writer(worker):
+            with app.app_context():
+                try:
+                    for i in range(15):
+                        User.query.count()
+                        db.session.add(_user(f'w{worker}_{i}'))
+                        db.session.commit()
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        with app.app_context():
+            assert db.session.execute(text('SELECT COUNT(*) FROM user')).scalar() == 90
+
+def test_memory_database_is_left_alone():
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    router = init_database(app, db)
+    assert router.readers == []
+
+def _replica_app(folder):
+    """An app instance (another worker) on folder's primary.db and replica.db"""
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(folder, 'primary.db')}",
+                      SQLALCHEMY_REPLICA_URIS=[f"sqlite:///{os.path.join(folder, 'replica.db')}"],
+                      DATABASE_REPLICA_MAX_LAG=30, DATABASE_REPLICA_CHECK_INTERVAL=0)
+    return app, init_database(app, db)
+
+def _replicated_app(folder, setup=None):
+    """Primary plus one replica made by copying the primary's file; setup(app) runs before the copy"""
+    primary, replica = os.path.join(folder, 'primary.db'), os.path.join(folder, 'replica.db')
+    app, router = _replica_app(folder)
+    with app.app_context():
+        db.create_all()
+        if setup:
+            setup(app)
+        router.beat()
+    router.writer.dispose()   # Checkpoints the WAL so the copy is complete
+    shutil.copy(primary, replica)
+    with app.app_context():
+        db.session.add(_user('primary_only'))
+        db.session.commit()
+    return app, router, replica
+
+def _usernames():
+    return {user.username for user in User.query.all()}
+
+def test_get_requests_read_from_replica():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, _ = _replicated_app(folder)
+        with app.test_request_context('/api/runners', method='GET'):
+            assert db.session.get_bind(clause=select(User)) is router.replicas[0]
+            assert 'primary_only' not in _usernames()
+            db.session.remove()
+        with app.test_request_context('/api/bookings', method='POST'):
+            assert db.session.get_bind(clause=select(User)) is router.writer
+            assert 'primary_only' in _usernames()
+            db.session.remove()
+        with app.app_context():
+            # Outside requests (jobs, CLI) nothing goes to replicas
+            assert 'primary_only' in _usernames()
+
+def test_writes_make_reads_sticky_to_primary():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, _ = _replicated_app(folder)
+        with app.test_request_context('/api/profile', method='GET'):
+            assert 'primary_only' not in _usernames()
+            db.session.add(_user('written'))
+            db.session.commit()
+            response = router.remember_writes(app.response_class())
+            db.session.remove()
+        cookie = response.headers['Set-Cookie']
+        assert cookie.startswith(STICKY_COOKIE + '=')
+        assert cookie.split(';')[0] == f'{STICKY_COOKIE}={response.headers[STICKY_HEADER]}'
+
+        until = cookie.split(';')[0].split('=')[1]
+        with app.test_request_context('/api/profile', method='GET', headers={'Cookie': f'{STICKY_COOKIE}={until}'}):
+            assert {'primary_only', 'written'} <= _usernames()
+            db.session.remove()
+        expired = f'{STICKY_COOKIE}={time.time() - 1:.3f}'
+        with app.test_request_context('/api/profile', method='GET', headers={'Cookie': expired}):
+            assert 'primary_only' not in _usernames()
+            db.session.remove()
+
+def test_sticky_header_reaches_other_workers():
+    def add_routes(app):
+        @app.route('/users', methods=['POST'])
+        def add_user():
+            db.session.add(_user(request.get_json()['username']))
+            db.session.commit()
+            return {}, 201
+
+        @app.route('/usernames')
+        def usernames():
+            return {'usernames': sorted(_usernames())}
+
+    with tempfile.TemporaryDirectory() as folder:
+        app, _, _ = _replicated_app(folder)
+        other, _ = _replica_app(folder)
+        add_routes(app)
+        add_routes(other)
+
+        # A cross-site SPA gets no cookie back and public GETs carry no token: only the echoed header
+        response = app.test_client().post('/users', json={'username': 'written'})
+        until = response.headers[STICKY_HEADER]
+        client = other.test_client()
+        assert 'written' in client.get('/usernames', headers={STICKY_HEADER: until}).get_json()['usernames']
+        assert 'written' not in client.get('/usernames').get_json()['usernames']
+        # Deadlines beyond one sticky period are ignored
+        forged = {STICKY_HEADER: f'{time.time() + 3600:.3f}'}
+        assert 'written' not in client.get('/usernames', headers=forged).get_json()['usernames']
+
+def test_lagging_replica_falls_back_to_primary():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, replica = _replicated_app(folder)
+        connection = sqlite3.connect(replica)
+        connection.execute('UPDATE replica_heartbeat SET beat_at = ? WHERE id = 1', (time.time() - 60,))
+        connection.commit()
+        connection.close()
+        with app.test_request_context('/api/runners', method='GET'):
+            assert 'primary_only' in _usernames()
+            db.session.remove()
+        assert router.lag[router.replicas[0]] > 30
+        assert router.healthy_replicas() == []
+
+def test_search_runs_on_replica():
+    def setup(app):
+        user = _user('replicated')
+        user.first_name = 'Zebulon'
+        db.session.add(user)
+        db.session.commit()
+        init_search(app)
+        init_message_search(app)
+
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, _ = _replicated_app(folder, setup)
+        with app.test_request_context('/api/users', method='GET'):
+            assert read_connection(db.session).engine is router.replicas[0]
+            assert len(search_users('zebulon')) == 1
+            assert search_messages('hello', user_id=1) == ([], None)
+            db.session.remove()
+
+def test_cache_fills_read_from_primary():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, _ = _replicated_app(folder)
+        ResponseCache(app)
+
+        @app.route('/usernames')
+        @cached_response
+        def usernames():
+            cache_tags('users')
+            return {'usernames': sorted(_usernames())}
+
+        @app.route('/uncached')
+        def uncached():
+            return {'usernames': sorted(_usernames())}
+
+        client = app.test_client()
+        # The replica was copied before primary_only was added; a fill must not store its older rows
+        response = client.get('/usernames')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert 'primary_only' in response.get_json()['usernames']
+        response = client.get('/usernames')
+        assert response.headers['X-Cache'] == 'HIT'
+        assert 'primary_only' in response.get_json()['usernames']
+        # Other GETs still use the replica
+        assert 'primary_only' not in client.get('/uncached').get_json()['usernames']
+
+def test_lag_check_does_not_wait_for_busy_writer():
+    with tempfile.TemporaryDirectory() as folder:
+        app, router, _ = _replicated_app(folder)
+        primary = sqlite3.connect(os.path.join(folder, 'primary.db'))
+        primary.execute('BEGIN EXCLUSIVE')
+        try:
+            start = time.monotonic()
+            with app.test_request_context('/api/runners', method='GET'):
+                assert 'primary_only' not in _usernames()
+                db.session.remove()
+            assert time.monotonic() - start < 1
+        finally:
+            primary.rollback()
+            primary.close()
+
+        # The heartbeat goes through once the writer is free
+        deadline = time.monotonic() + 10
+        while router._beat_lock.locked() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        router.beat_in_background(now=12345.0)
+        while router._beat_lock.locked() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with router.writer.connect() as connection:
+            assert connection.execute(text('SELECT beat_at FROM replica_heartbeat')).scalar() == 12345.0
+
+if __name__ == '__main__':
+    test_pragmas_and_read_only_readers()
+    test_reads_follow_writes_within_a_transaction()
+    test_concurrent_writers_queue_instead_of_failing()
+    test_memory_database_is_left_alone()
+    test_get_requests_read_from_replica()
+    test_writes_make_reads_sticky_to_primary()
+    test_sticky_header_reaches_other_workers()
+    test_lagging_replica_falls_back_to_primary()
+    test_search_runs_on_replica()
+    test_cache_fills_read_from_primary()
+    test_lag_check_does_not_wait_for_busy_writer()
+    print("✅ Database routing tests passed!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import sqlite3
+import tempfile
+import generate_dataset
+
+TABLES = ('user', 'runner', 'runner_services', 'booking', 'review', 'chat_message')
+
+def _generate(path, seed=7):
+    code = generate_dataset.main(['--database-url', f'sqlite:///{path}', '--users', '300', '--runners', '30',
+                                  '--bookings', '1500', '--seed', str(seed), '--batch-size', '400'])
+    assert code == 0
+    connection = sqlite3.connect(path)
+    dump = {table: connection.execute(f'SELECT * FROM "{table}" ORDER BY 1, 2').fetchall() for table in TABLES}
+    connection.close()
+    return dump
+
+def test_dataset_is_deterministic_and_consistent():
+    with tempfile.TemporaryDirectory() as folder:
+        first = _generate(os.path.join(folder, 'a.db'))
+        second = _generate(os.path.join(folder, 'b.db'))
+        other = _generate(os.path.join(folder, 'c.db'), seed=8)
+
+        assert first == second
+        assert first['booking'] != other['booking']
+        assert len(first['user']) == 300 and len(first['runner']) == 30 and len(first['booking']) == 1500
+        assert first['review'] and first['chat_message']
+
+        connection = sqlite3.connect(os.path.join(folder, 'a.db'))
+        # Reviews only for completed bookings, written by the client about the runner
+        assert connection.execute("""
+            SELECT COUNT(*) FROM review r JOIN booking b ON b.id = r.booking_id JOIN runner ru ON ru.id = b.runner_id
+            WHERE b.status != 'completed' OR r.reviewer_id != b.user_id OR r.reviewee_id != ru.user_id
+        """).fetchone()[0] == 0
+        # Denormalized counters match the rows
+        assert connection.execute("""
+            SELECT COUNT(*) FROM runner ru WHERE total_bookings !=
+                (SELECT COUNT(*) FROM booking b WHERE b.runner_id = ru.id AND b.status = 'completed')
+        """).fetchone()[0] == 0
+        connection.close()
+
+def test_generated_rows_load_through_the_orm():
+    from src.models.user import User, Booking, UserRole
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'orm.db')
+        _generate(path)
+        app = generate_dataset.make_app(f'sqlite:///{path}')
+        with app.app_context():
+            assert User.query.filter_by(role=UserRole.RUNNER).count() == 30
+            assert User.query.first().check_password('password123')
+            booking = Booking.query.filter_by(status='completed').first()
+            assert booking.completed_at == booking.end_date > booking.scheduled_date
+
+class RecordingConnection:
+    """Just enough of a PostgreSQL connection for BulkWriter: records COPY and SQL text"""
+
+    def __init__(self):
+        self.statements = []
+        self.dialect = type('Dialect', (), {'name': 'postgresql'})()
+        self.connection = self
+        self.dbapi_connection = self
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, buffer):
+        self.statements.append(sql)
+
+    def close(self):
+        pass
+
+    def exec_driver_sql(self, sql, *args):
+        self.statements.append(sql)
+
+    def commit(self):
+        pass
+
+def test_copy_moves_postgres_sequences():
+    connection = RecordingConnection()
+    writer = generate_dataset.BulkWriter(connection)
+    writer.write('user', ('id', 'username'), [(1, 'a'), (2, 'b')])
+    writer.write('runner_services', ('runner_id', 'service_id'), [(1, 1)])
+    writer.sync_sequences()
+    assert connection.statements[0].startswith('COPY "user" (id, username) FROM STDIN')
+    # Only tables loaded with explicit ids have a sequence to move
+    assert connection.statements[2:] == [
+        "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), MAX(id)) FROM \"user\""]
+
+if __name__ == '__main__':
+    test_dataset_is_deterministic_and_consistent()
+    test_generated_rows_load_through_the_orm()
+    test_copy_moves_postgres_sequences()
+    print("✅ Dataset generator tests passed!")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User
+from src.images import DerivativeCache, VARIANTS_VERSION, variant_urls
+from flask_jwt_extended import create_access_token
+from PIL import Image
+import io
+import json
+import tempfile
+
+def make_png(width=800, height=600, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload_image(client, headers, content):
+    response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                           data=json.dumps({'filename': 'avatar.png', 'size': len(content)}))
+    upload_id = response.get_json()['upload']['id']
+    response = client.patch(f'/api/uploads/{upload_id}', data=content,
+                            headers=dict(headers, **{'Upload-Offset': '0'}))
+    return response.get_json()['upload']['file']
+
+def test_variants_rendered_cached_and_linked():
+    with tempfile.TemporaryDirectory() as folder:
+        app, _ = create_app('testing')
+        app.config.update(UPLOAD_FOLDER=folder, IMAGE_PROCESS_WORKERS=1)
+        with app.app_context():
+            user = User.query.filter_by(username='john_doe').first()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+        with app.test_client() as client:
+            stored = upload_image(client, headers, make_png())
+            client.put('/api/users/profile', headers=headers, content_type='application/json',
+                       data=json.dumps({'profile_image': stored['url']}))
+            profile = client.get('/api/users/profile', headers=headers).get_json()
+            profile = profile.get('user', profile)
+            thumb_url = profile['profile_image_variants']['thumb']
+            assert thumb_url.endswith(f'?v={VARIANTS_VERSION}')
+
+            response = client.get(thumb_url)
+            assert response.status_code == 200
+            assert response.mimetype == 'image/webp'
+            assert 'immutable' in response.headers['Cache-Control']
+            assert Image.open(io.BytesIO(response.data)).size == (96, 96)
+
+            full = Image.open(io.BytesIO(client.get(profile['profile_image_variants']['full']).data))
+            assert full.size == (800, 600)   # never upscaled, aspect kept
+
+            # Second request is a cache hit on disk
+            cached = [name for _, _, names in os.walk(os.path.join(folder, 'derived')) for name in names]
+            assert len(cached) == 2
+            assert client.get(thumb_url).data == response.data
+
+            assert client.get(f"/api/images/{stored['sha256']}/huge").status_code == 404
+
+def test_lru_eviction_respects_budget():
+    with tempfile.TemporaryDirectory() as folder:
+        sources = []
+        for i in range(4):
+            path = os.path.join(folder, f'source{i}.png')
+            with open(path, 'wb') as f:
+                f.write(make_png())
+            sources.append(path)
+
+        cache = DerivativeCache(os.path.join(folder, 'derived'), max_bytes=10 ** 9, workers=0)
+        first = cache.get('aa' * 32, sources[0], 'thumb')
+        one_size = os.path.getsize(first)
+        cache.max_bytes = one_size * 2.5
+
+        second = cache.get('bb' * 32, sources[1], 'thumb')
+        os.utime(first, (1, 1))
+        os.utime(second, (2, 2))
+        cache.get('aa' * 32, sources[0], 'thumb')   # hit refreshes the oldest entry
+        cache.get('cc' * 32, sources[2], 'thumb')
+
+        assert os.path.exists(first)
+        assert not os.path.exists(second)
+
+def test_variant_urls_only_for_images():
+    sha256 = 'ab' * 32
+    assert variant_urls(f'/api/files/{sha256}.pdf') is None
+    assert variant_urls('https://example.com/me.png') is None
+    assert variant_urls(f'/api/files/{sha256}.JPG')['card'] == f'/api/images/{sha256}/card?v={VARIANTS_VERSION}'
+
+def test_broken_pool_is_replaced():
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'source.png')
+        with open(source, 'wb') as f:
+            f.write(make_png())
+        cache = DerivativeCache(os.path.join(folder, 'derived'), max_bytes=10 ** 9, workers=1)
+        cache.get('aa' * 32, source, 'thumb')
+
+        # Worker killed (e.g. by the OOM killer): the next render gets a new pool
+        broken = cache._executor
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        assert os.path.exists(cache.get('bb' * 32, source, 'thumb'))
+        assert cache._executor is not broken
+        cache._executor.shutdown()
+
+if __name__ == '__main__':
+    test_variants_rendered_cached_and_linked()
+    test_lru_eviction_respects_budget()
+    test_variant_urls_only_for_images()
+    test_broken_pool_is_replaced()
+    print("✅ Image variant tests passed!")
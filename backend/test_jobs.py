@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, Job, Notification
+from src.jobs import task, enqueue, claim, process, run_pending, reap_stale
+from src.tasks import count_completed_bookings, queue_notification
+from flask_jwt_extended import create_access_token
+from datetime import datetime, timedelta
+import json
+
+calls = []
+
+@task('test_batch', batch=True)
+def batch_handler(payloads):
+    if any(payload.get('bad') for payload in payloads):
+        raise ValueError('bad payload')
+    calls.append(sorted(payload['n'] for payload in payloads))
+
+@task('test_flaky', max_attempts=2)
+def flaky_handler(payload):
+    raise RuntimeError('still broken')
+
+def test_batch_jobs_run_in_one_call():
+    app, _ = create_app('testing')
+    with app.app_context():
+        calls.clear()
+        for n in range(3):
+            enqueue('test_batch', {'n': n})
+        db.session.commit()
+
+        assert run_pending() == 3
+        assert calls == [[0, 1, 2]]
+        assert Job.query.filter_by(task='test_batch', status='done').count() == 3
+
+def test_bad_payload_does_not_block_batch():
+    app, _ = create_app('testing')
+    with app.app_context():
+        calls.clear()
+        enqueue('test_batch', {'n': 1})
+        bad = enqueue('test_batch', {'n': 2, 'bad': True})
+        db.session.commit()
+
+        run_pending()
+        assert calls == [[1]]
+        bad = db.session.get(Job, bad.id, populate_existing=True)
+        assert bad.status == 'queued' and bad.attempts == 1
+        assert bad.run_at > datetime.utcnow()
+        assert 'bad payload' in bad.last_error
+
+def test_retries_back_off_then_fail():
+    app, _ = create_app('testing')
+    with app.app_context():
+        job = enqueue('test_flaky', {})
+        db.session.commit()
+        job_id = job.id
+
+        run_pending()
+        job = db.session.get(Job, job_id, populate_existing=True)
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert run_pending() == 0   # not due yet
+
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        run_pending()
+        job = db.session.get(Job, job_id, populate_existing=True)
+        assert (job.status, job.attempts) == ('failed', 2)
+
+        result = app.test_cli_runner().invoke(args=['jobs', 'retry', '--all-failed'])
+        assert 'Requeued 1 jobs' in result.output
+
+def test_claimed_jobs_are_not_claimed_twice():
+    app, _ = create_app('testing')
+    with app.app_context():
+        enqueue('test_batch', {'n': 1})
+        db.session.commit()
+
+        rows = claim('worker-a')
+        assert len(rows) == 1
+        assert claim('worker-b') == []
+
+        # Worker died: reaper hands the job back after the visibility timeout
+        Job.query.filter_by(id=rows[0].id).update({'locked_at': datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+        assert reap_stale(300) == 1
+        assert [row.id for row in claim('worker-b')] == [rows[0].id]
+
+def test_reaper_fails_jobs_out_of_attempts():
+    app, _ = create_app('testing')
+    with app.app_context():
+        job = enqueue('test_flaky', {})
+        db.session.commit()
+        job_id = job.id
+
+        for attempt in range(2):
+            assert len(claim('worker-a')) == 1
+            Job.query.filter_by(id=job_id).update({'locked_at': datetime.utcnow() - timedelta(hours=1)})
+            db.session.commit()
+            assert reap_stale(300) == 1
+
+        job = db.session.get(Job, job_id, populate_existing=True)
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert job.finished_at and job.last_error
+        assert claim('worker-a') == []
+
+def test_completed_bookings_counted_once():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner = Runner.query.order_by(Runner.id).first()
+        client_user = User.query.filter(User.id != runner.user_id).first()
+        bookings = [Booking(user_id=client_user.id, runner_id=runner.id, service_id=1, title='Errand',
+                            scheduled_date=datetime(2030, 1, 7, 9 + n), estimated_hours=1, hourly_rate=20.0,
+                            total_amount=20.0, status=status)
+                    for n, status in enumerate(['completed', 'completed', 'accepted'])]
+        db.session.add_all(bookings)
+        db.session.commit()
+        runner_id, before = runner.id, runner.total_bookings or 0
+        payloads = [{'booking_id': booking.id} for booking in bookings]
+
+        # A replayed batch (retry, or a reaped job whose worker had committed) is a no-op
+        for _ in range(2):
+            count_completed_bookings(payloads)
+            db.session.commit()
+        assert db.session.get(Runner, runner_id, populate_existing=True).total_bookings == before + 2
+
+def test_reaped_notification_batch_inserts_once():
+    app, _ = create_app('testing')
+    with app.app_context():
+        user_id = User.query.first().id
+        queue_notification(user_id, 'Replay check', 'Only once', related_id=4242)
+        db.session.commit()
+
+        # Worker A stalls past the visibility timeout; worker B gets the job too and both finish
+        stalled = claim('worker-a')
+        Job.query.filter_by(id=stalled[0].id).update({'locked_at': datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+        assert reap_stale(300) == 1
+        process(claim('worker-b'))
+        process(stalled)
+        assert Notification.query.filter_by(related_id=4242).count() == 1
+
+def test_review_rating_updated_by_worker():
+    app, _ = create_app('testing')
+    with app.app_context():
+        client_user = User(username='client', email='client@example.com', first_name='Cli', last_name='Ent')
+        runner_user = User(username='runner', email='runner@example.com', first_name='Run', last_name='Ner')
+        for user in (client_user, runner_user):
+            user.set_password('password123')
+        db.session.add_all([client_user, runner_user])
+        db.session.commit()
+        runner = Runner(user_id=runner_user.id, hourly_rate=20.0, city='Chicago', country='USA')
+        db.session.add(runner)
+        db.session.commit()
+        booking = Booking(user_id=client_user.id, runner_id=runner.id, service_id=1, title='Errand',
+                          scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                          total_amount=20.0, status='completed')
+        db.session.add(booking)
+        db.session.commit()
+        runner_id, runner_user_id, booking_id = runner.id, runner_user.id, booking.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client_user.id))}'}
+
+    with app.test_client() as client:
+        response = client.post('/api/reviews', headers=headers, content_type='application/json',
+                               data=json.dumps({'booking_id': booking_id, 'reviewee_id': runner_user_id,
+                                                'rating': 4}))
+        assert response.status_code == 201
+
+    with app.app_context():
+        assert Runner.query.get(runner_id).total_reviews == 0   # not yet processed
+        result = app.test_cli_runner().invoke(args=['jobs', 'drain'])
+        assert 'Processed 1 jobs' in result.output
+        runner = Runner.query.get(runner_id)
+        assert (runner.rating, runner.total_reviews) == (4.0, 1)
+
+if __name__ == '__main__':
+    test_batch_jobs_run_in_one_call()
+    test_bad_payload_does_not_block_batch()
+    test_retries_back_off_then_fail()
+    test_claimed_jobs_are_not_claimed_twice()
+    test_reaper_fails_jobs_out_of_attempts()
+    test_completed_bookings_counted_once()
+    test_reaped_notification_batch_inserts_once()
+    test_review_rating_updated_by_worker()
+    print("✅ Job queue tests passed!")
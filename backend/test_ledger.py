@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from src.main import create_app
+from src.models.user import db, User, UserRole, Runner, Booking, Payment, LedgerEntry, RunnerBalance, Payout, PayoutBatch
+from src.booking_state import transition
+from src.jobs import run_pending
+from src.ledger import run_payout_batch, record_booking_earnings, runner_earnings
+
+def complete_booking(runner, client, amount, when=None):
+    booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Errand',
+                      scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=amount,
+                      total_amount=amount, status='in_progress')
+    db.session.add(booking)
+    db.session.commit()
+    transition(booking.id, 'in_progress', booking.version, 'completed')
+    db.session.commit()
+    run_pending()
+    if when:
+        LedgerEntry.query.filter_by(booking_id=booking.id).update({'created_at': when})
+        db.session.commit()
+    return booking
+
+def setup():
+    runner = Runner.query.order_by(Runner.id).first()
+    client = User.query.filter(User.id != runner.user_id, ~User.runner_profile.any(), User.role != UserRole.ADMIN).first()
+    return runner, client
+
+def test_completion_writes_earning_and_fee_once():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = setup()
+        booking = complete_booking(runner, client, 50.0)
+        entries = {entry.entry_type: entry.amount for entry in LedgerEntry.query.filter_by(booking_id=booking.id)}
+        assert entries == {'earning': 50.0, 'fee': -5.0}
+
+        # Replaying the event adds nothing
+        assert record_booking_earnings([booking.id]) == 0
+        assert LedgerEntry.query.filter_by(booking_id=booking.id).count() == 2
+
+def test_payout_batches_only_read_new_entries():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = setup()
+        other = Runner.query.filter(Runner.id != runner.id).first()
+        past = datetime.utcnow() - timedelta(hours=1)
+        complete_booking(runner, client, 100.0, when=past)
+        complete_booking(other, client, 5.0, when=past)
+
+        first = run_payout_batch(settle_seconds=0)
+        db.session.commit()
+        assert first.runner_count == 1 and first.total_amount == 90.0
+        assert db.session.get(RunnerBalance, runner.id).balance == 0.0
+        # Below the minimum: carried forward, not paid
+        assert db.session.get(RunnerBalance, other.id).balance == 4.5
+        assert LedgerEntry.query.filter_by(runner_id=runner.id, entry_type='payout').one().amount == -90.0
+
+        complete_booking(other, client, 10.0, when=past)
+        statements = []
+        capture = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        second = run_payout_batch(settle_seconds=0)
+        db.session.commit()
+        event.remove(db.engine, 'before_cursor_execute', capture)
+        assert second.from_entry_id == first.through_entry_id
+        assert second.runner_count == 1 and second.total_amount == 13.5
+        assert [payout.amount for payout in Payout.query.filter_by(runner_id=other.id)] == [13.5]
+        # The window sum is bounded by the checkpoint, so history is never re-read
+        window = [statement for statement in statements if 'sum(ledger_entry.amount)' in statement]
+        assert len(window) == 1 and 'ledger_entry.id > ?' in window[0]
+
+        # Fresh entries wait for the settle window
+        complete_booking(runner, client, 20.0)
+        assert run_payout_batch(settle_seconds=60) is None
+        third = run_payout_batch(settle_seconds=0)
+        db.session.commit()
+        assert third.from_entry_id == second.through_entry_id and third.total_amount == 18.0
+
+        # Balances always agree with a full recomputation from the ledger
+        for runner_id in (runner.id, other.id):
+            total = sum(entry.amount for entry in LedgerEntry.query.filter_by(runner_id=runner_id))
+            assert round(total, 2) == runner_earnings(runner_id)['balance']
+
+def test_empty_batches_do_not_block_later_ones():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = setup()
+        assert run_payout_batch(settle_seconds=0) is None
+        assert run_payout_batch(settle_seconds=0) is None
+        assert PayoutBatch.query.count() == 0
+
+        complete_booking(runner, client, 100.0, when=datetime.utcnow() - timedelta(hours=1))
+        batch = run_payout_batch(settle_seconds=0)
+        db.session.commit()
+        assert batch.from_entry_id == 0 and batch.total_amount == 90.0
+        # The next batch only folds the payout entries in; after that there is nothing left
+        assert run_payout_batch(settle_seconds=0).runner_count == 0
+        db.session.commit()
+        assert run_payout_batch(settle_seconds=0) is None
+
+def test_refund_and_earnings_endpoint():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = setup()
+        admin = User(username='finance', email='finance@example.com', first_name='Fin', last_name='Ance',
+                     role=UserRole.ADMIN)
+        admin.set_password('password123')
+        db.session.add(admin)
+        db.session.commit()
+        last_month = datetime.utcnow().replace(day=1) - timedelta(days=3)
+        complete_booking(runner, client, 40.0, when=last_month)
+        booking = complete_booking(runner, client, 30.0)
+        payment = Payment(booking_id=booking.id, amount=30.0, status='pending')
+        db.session.add(payment)
+        db.session.commit()
+        payment_id, runner_user_id = payment.id, runner.user_id
+        admin_headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+        runner_headers = {'Authorization': f'Bearer {create_access_token(identity=str(runner_user_id))}'}
+
+    with app.test_client() as http:
+        def settle(status):
+            return http.post(f'/api/admin/payments/{payment_id}/settle', headers=admin_headers,
+                             data=json.dumps({'status': status}), content_type='application/json')
+
+        assert settle('refunded').status_code == 409   # Not collected yet
+        assert settle('completed').status_code == 200
+        assert settle('refunded').status_code == 200
+        assert settle('refunded').status_code == 409
+        assert settle('bogus').status_code == 400
+
+        response = http.get('/api/runners/profile/earnings?period=month&periods=2', headers=runner_headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        previous, current = data['breakdown']
+        assert previous['earnings'] == 40.0 and previous['fees'] == -4.0 and previous['net'] == 36.0
+        assert current['earnings'] == 30.0 and current['refunds'] == -30.0 and current['fees'] == 0.0
+        assert current['net'] == 0.0
+        assert data['balance'] == 36.0 and data['recent_payouts'] == []
+
+        assert http.get('/api/runners/profile/earnings?period=year', headers=runner_headers).status_code == 400
+        assert http.get('/api/runners/profile/earnings', headers=admin_headers).status_code == 404
+
+        response = http.post('/api/admin/payouts', headers=admin_headers)
+        assert response.status_code == 201
+        assert http.get('/api/admin/payouts', headers=admin_headers).get_json()['total'] == 1
+
+if __name__ == '__main__':
+    test_completion_writes_earning_and_fee_once()
+    test_payout_batches_only_read_new_entries()
+    test_empty_batches_do_not_block_later_ones()
+    test_refund_and_earnings_endpoint()
+    print("✅ Ledger tests passed!")
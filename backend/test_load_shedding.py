@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.load_shedding import MemoryStore, PriorityLimiter
+from src.main import create_app
+import json
+
+def test_token_bucket_refills():
+    now = [1000.0]
+    store = MemoryStore(clock=lambda: now[0])
+
+    assert store.consume('login:a', capacity=2, refill_rate=1.0) == 0
+    assert store.consume('login:a', capacity=2, refill_rate=1.0) == 0
+    assert store.consume('login:a', capacity=2, refill_rate=1.0) == 1.0
+    # Other keys have their own bucket
+    assert store.consume('login:b', capacity=2, refill_rate=1.0) == 0
+
+    now[0] += 1.0
+    assert store.consume('login:a', capacity=2, refill_rate=1.0) == 0
+
+def test_limiter_sheds_when_full():
+    limiter = PriorityLimiter(limit=1, max_queue=0)
+    assert limiter.acquire(priority=0, timeout=0.1) == (True, 0)
+
+    admitted, retry_after = limiter.acquire(priority=0, timeout=0.1)
+    assert not admitted
+    assert retry_after > 0
+
+    limiter.release()
+    assert limiter.acquire(priority=0, timeout=0.1)[0]
+
+def test_limiter_admits_by_priority():
+    limiter = PriorityLimiter(limit=1, max_queue=4, target_wait=10)
+    limiter.acquire(priority=0, timeout=1)
+    order = []
+
+    def wait(priority):
+        if limiter.acquire(priority, timeout=5)[0]:
+            order.append(priority)
+            limiter.release()
+
+    threads = [threading.Thread(target=wait, args=(p,)) for p in (3, 1)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while limiter.waiting < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.waiting == 2
+    limiter.release()
+    for t in threads:
+        t.join()
+
+    assert order == [1, 3]
+
+def test_classes_share_one_pool_by_priority():
+    limiter = PriorityLimiter(limit=2, max_queue=8, target_wait=10, class_limits={'admin': 2, 'default': 2})
+    assert limiter.acquire(3, 1, 'admin')[0]
+    assert limiter.acquire(0, 1, 'default')[0]
+    order = []
+
+    def wait(priority, route_class):
+        if limiter.acquire(priority, 5, route_class)[0]:
+            order.append(route_class)
+            limiter.release(route_class)
+
+    threads = [threading.Thread(target=wait, args=args) for args in ((3, 'admin'), (0, 'default'))]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while limiter.waiting < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The admin request queued first, but the freed slot goes to the higher priority class
+    limiter.release('default')
+    for t in threads:
+        t.join()
+    assert order == ['default', 'admin']
+    limiter.release('admin')
+    assert limiter.active == 0
+
+def test_low_priority_shed_first():
+    limiter = PriorityLimiter(limit=1, max_queue=8, target_wait=0.5, class_limits={'admin': 1, 'default': 1})
+    limiter.acquire(0, 1, 'default')
+    limiter.avg_wait = 0.3   # Queueing is building up, but under the default class's target
+    admitted, retry_after = limiter.acquire(3, 0.05, 'admin')
+    assert not admitted and retry_after > 0 and limiter.waiting == 0
+    # The default class still queues (and here times out waiting)
+    assert limiter.acquire(0, 0.05, 'default')[0] is False and limiter.avg_wait < 0.3
+
+def test_login_rate_limited():
+    app, _ = create_app('testing')
+    with app.test_client() as client:
+        login_data = json.dumps({'email': 'nobody@example.com', 'password': 'wrong'})
+        statuses = [
+            client.post('/api/auth/login', data=login_data, content_type='application/json').status_code
+            for _ in range(6)
+        ]
+        assert statuses[:5] == [401] * 5
+        assert statuses[5] == 429
+
+        # The same account can still be tried from another address
+        other_ip = {'REMOTE_ADDR': '198.51.100.7'}
+        assert client.post('/api/auth/login', data=login_data, content_type='application/json',
+                           environ_base=other_ip).status_code == 401
+
+        # One address spraying many accounts hits the per-IP limit
+        spray = [
+            client.post('/api/auth/login', content_type='application/json', environ_base={'REMOTE_ADDR': '203.0.113.9'},
+                        data=json.dumps({'email': f'user{n}@example.com', 'password': 'wrong'})).status_code
+            for n in range(31)
+        ]
+        assert spray[:30] == [401] * 30 and spray[30] == 429
+
+        # Behind the proxy every request comes from its address; clients are told apart by X-Forwarded-For
+        proxy = {'REMOTE_ADDR': '10.0.0.2'}
+        for n in range(31):
+            client.post('/api/auth/login', content_type='application/json', environ_base=proxy,
+                        headers={'X-Forwarded-For': '203.0.113.50'},
+                        data=json.dumps({'email': f'other{n}@example.com', 'password': 'wrong'}))
+        assert client.post('/api/auth/login', data=login_data, content_type='application/json', environ_base=proxy,
+                           headers={'X-Forwarded-For': '198.51.100.99'}).status_code == 401
+        # Only the hop the proxy appended is trusted, not one the client made up
+        assert client.post('/api/auth/login', content_type='application/json', environ_base=proxy,
+                           headers={'X-Forwarded-For': '198.51.100.99, 203.0.113.50'},
+                           data=json.dumps({'email': 'spoof@example.com', 'password': 'wrong'})).status_code == 429
+
+if __name__ == '__main__':
+    test_token_bucket_refills()
+    test_limiter_sheds_when_full()
+    test_limiter_admits_by_priority()
+    test_classes_share_one_pool_by_priority()
+    test_low_priority_shed_first()
+    test_login_rate_limited()
+    print("✅ Load shedding tests passed!")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Job
+from src import mail
+from src.mail import SMTPSink, SMTPPool, queue_email, metrics
+from src.jobs import run_pending
+from email.message import EmailMessage
+
+def configure(app, port):
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_DIGEST_WINDOW=0)
+
+def test_pool_reuses_connections():
+    sink = SMTPSink(port=0).start()
+    try:
+        pool = SMTPPool('127.0.0.1', sink.port, use_tls=False, size=2)
+        for i in range(10):
+            message = EmailMessage()
+            message['From'] = 'a@example.com'
+            message['To'] = 'b@example.com'
+            message['Subject'] = f'Message {i}'
+            message.set_content('hello')
+            pool.send(message)
+        pool.close()
+        assert len(sink.messages) == 10
+        assert sink.connections == 1
+    finally:
+        sink.stop()
+
+def test_events_coalesce_into_digest():
+    sink = SMTPSink(port=0).start()
+    app, _ = create_app('testing')
+    configure(app, sink.port)
+    try:
+        with app.app_context():
+            john = User.query.filter_by(username='john_doe').first()
+            jane = User.query.filter_by(username='jane_smith').first()
+            for title in ('Groceries', 'Dry cleaning', 'Pharmacy'):
+                queue_email(john.id, 'booking_status', title=title, status='accepted')
+            queue_email(jane.id, 'review_prompt', title='Dog walk')
+            db.session.commit()
+
+            sent_before = metrics.sent
+            run_pending()
+            by_recipient = {message['To']: message for message in sink.messages}
+            assert len(sink.messages) == 2
+            assert by_recipient[john.email]['Subject'] == 'You have 3 updates from Urban Assist'
+            assert 'Pharmacy' in by_recipient[john.email].get_payload()
+            assert by_recipient[jane.email]['Subject'] == 'How did "Dog walk" go?'
+            assert metrics.sent - sent_before == 2
+    finally:
+        sink.stop()
+
+def test_failed_delivery_is_requeued():
+    sink = SMTPSink(port=0)
+    port = sink.port
+    sink.server_close()   # nothing listening on this port
+    app, _ = create_app('testing')
+    configure(app, port)
+    with app.app_context():
+        john = User.query.filter_by(username='john_doe').first()
+        queue_email(john.id, 'review_prompt', title='Groceries')
+        db.session.commit()
+
+        run_pending()
+        retry = Job.query.filter_by(task='send_email', status='queued').one()
+        assert retry.payload['attempt'] == 2
+
+def test_error_after_partial_delivery_retries_only_the_rest():
+    sink = SMTPSink(port=0).start()
+    app, _ = create_app('testing')
+    configure(app, sink.port)
+    send, enqueue = mail._send, mail.enqueue
+
+    def send_except_to_jane(pool, message):
+        if message['To'] == 'jane@example.com':
+            return OSError('connection reset')
+        return send(pool, message)
+
+    def broken_enqueue(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    try:
+        with app.app_context():
+            john = User.query.filter_by(username='john_doe').first()
+            jane = User.query.filter_by(username='jane_smith').first()
+            jane.email = 'jane@example.com'
+            queue_email(john.id, 'review_prompt', title='Groceries')
+            queue_email(jane.id, 'review_prompt', title='Dog walk')
+            db.session.commit()
+
+            mail._send, mail.enqueue = send_except_to_jane, broken_enqueue
+            run_pending()
+            assert [message['To'] for message in sink.messages] == [john.email]
+            # John's job is finished; only Jane's is retried
+            jobs = {job.payload['user_id']: job for job in Job.query.filter_by(task='send_email')}
+            assert jobs[john.id].status == 'done'
+            assert jobs[jane.id].status == 'queued' and 'database went away' in jobs[jane.id].last_error
+    finally:
+        mail._send, mail.enqueue = send, enqueue
+        sink.stop()
+
+if __name__ == '__main__':
+    test_pool_reuses_connections()
+    test_events_coalesce_into_digest()
+    test_failed_delivery_is_requeued()
+    test_error_after_partial_delivery_retries_only_the_rest()
+    print("✅ Mail tests passed!")
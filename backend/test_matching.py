@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Runner, Service
+from src.matching import RunnerSnapshot, score_runners, top_k, invalidate_snapshot
+from src.availability import encode_schedule
+from flask_jwt_extended import create_access_token
+from collections import namedtuple
+from datetime import datetime
+import json
+import random
+
+Row = namedtuple('Row', 'id user_id latitude longitude rating total_reviews total_bookings '
+                        'hourly_rate is_available availability_bitmap timezone')
+
+def row(runner_id, **overrides):
+    values = dict(id=runner_id, user_id=runner_id, latitude=41.88, longitude=-87.63, rating=4.5,
+                  total_reviews=20, total_bookings=30, hourly_rate=25.0, is_available=True,
+                  availability_bitmap=None, timezone='UTC')
+    values.update(overrides)
+    return Row(**values)
+
+def test_score_constraints_and_ranking():
+    rows = [
+        row(1),
+        row(2, latitude=42.5),                                   # ~70km away
+        row(3, hourly_rate=100.0),                               # Over budget
+        row(4, is_available=False),
+        row(5, availability_bitmap=encode_schedule({'tuesday': [['09:00', '17:00']]})),
+        row(6, rating=5.0, total_reviews=200, total_bookings=300),
+    ]
+    snapshot = RunnerSnapshot(rows, [(runner_id, 7) for runner_id in range(1, 7)] + [(1, 8)])
+
+    scores, distances = score_runners(snapshot, service_id=7, latitude=41.88, longitude=-87.63,
+                                      start=datetime(2030, 1, 7, 9, 0), hours=2, budget=120)
+    ranked = snapshot.runner_ids[top_k(scores, 10)].tolist()
+    assert ranked == [6, 1, 2]
+    assert distances[0] < 0.01
+
+    scores, _ = score_runners(snapshot, service_id=8)
+    assert snapshot.runner_ids[top_k(scores, 10)].tolist() == [1]
+
+def test_scores_100k_runners():
+    rng = random.Random(42)
+    rows = [row(i, latitude=rng.uniform(25, 45), longitude=rng.uniform(-125, -70),
+                rating=rng.uniform(3, 5), total_reviews=rng.randint(0, 500),
+                hourly_rate=rng.uniform(15, 60)) for i in range(1, 100001)]
+    snapshot = RunnerSnapshot(rows, [(i, 1 + i % 10) for i in range(1, 100001)])
+
+    scores, _ = score_runners(snapshot, service_id=3, latitude=41.88, longitude=-87.63, budget=200, hours=4)
+    best = top_k(scores, 10)
+    assert len(best) == 10
+    assert all(scores[best[i]] >= scores[best[i + 1]] for i in range(9))
+
+def test_match_endpoint_auto_dispatch():
+    app, _ = create_app('testing')
+    invalidate_snapshot()
+    with app.app_context():
+        service_id = Service.query.first().id
+        client = User(username='client', email='client@example.com', first_name='Cli', last_name='Ent')
+        client.set_password('password123')
+        near = User(username='near', email='near@example.com', first_name='Near', last_name='Runner')
+        near.set_password('password123')
+        db.session.add_all([client, near])
+        db.session.commit()
+        runner = Runner(user_id=near.id, hourly_rate=20.0, city='Chicago', country='USA',
+                        latitude=41.88, longitude=-87.63, rating=5.0, total_reviews=100, total_bookings=100)
+        runner.services.append(Service.query.get(service_id))
+        db.session.add(runner)
+        db.session.commit()
+        runner_id = runner.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client.id))}'}
+
+    with app.test_client() as http:
+        payload = {'service_id': service_id, 'latitude': 41.88, 'longitude': -87.63,
+                   'scheduled_date': '2030-01-07T09:00:00Z', 'estimated_hours': 2, 'budget': 100,
+                   'title': 'Groceries', 'auto_dispatch': True}
+        response = http.post('/api/bookings/match', data=json.dumps(payload),
+                             content_type='application/json', headers=headers)
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['matches'][0]['runner_id'] == runner_id
+        assert data['booking']['runner_id'] == runner_id
+
+        # The runner is now booked for that window, so it is no longer offered
+        payload['auto_dispatch'] = False
+        response = http.post('/api/bookings/match', data=json.dumps(payload), content_type='application/json')
+        assert runner_id not in [match['runner_id'] for match in response.get_json()['matches']]
+
+        # Numeric strings are coerced; anything else is rejected before matching
+        response = http.post('/api/bookings/match', content_type='application/json',
+                             data=json.dumps(dict(payload, service_id=str(service_id), budget='100')))
+        assert response.status_code == 200
+        for bad in ({'budget': 'cheap'}, {'service_id': 'groceries'}, {'service_id': 1.5}, {'latitude': 'north'},
+                    {'latitude': 91}, {'longitude': None}, {'max_distance_km': -1}, {'limit': 'all'},
+                    {'estimated_hours': 0}, {'scheduled_date': 20300107}):
+            response = http.post('/api/bookings/match', data=json.dumps(dict(payload, **bad)),
+                                 content_type='application/json')
+            assert response.status_code == 400, bad
+
+        payload.update(auto_dispatch=True, service_id=999999)
+        response = http.post('/api/bookings/match', data=json.dumps(payload),
+                             content_type='application/json', headers=headers)
+        assert response.status_code == 404
+    invalidate_snapshot()
+
+if __name__ == '__main__':
+    test_score_constraints_and_ranking()
+    test_scores_100k_runners()
+    test_match_endpoint_auto_dispatch()
+    print("✅ Matching tests passed!")
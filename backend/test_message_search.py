@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking, ChatMessage, Job
+from src.jobs import run_pending
+
+def setup_conversations():
+    runner = Runner.query.order_by(Runner.id).first()
+    client, outsider = User.query.filter(User.id != runner.user_id, ~User.runner_profile.any())\
+        .order_by(User.id).limit(2).all()
+    bookings = []
+    for user in (client, outsider):
+        booking = Booking(user_id=user.id, runner_id=runner.id, service_id=1, title=f'Groceries for {user.username}',
+                          scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                          total_amount=20.0, status='accepted')
+        db.session.add(booking)
+        bookings.append(booking)
+    db.session.commit()
+
+    def headers(user_id):
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    return bookings, headers(client.id), headers(outsider.id), headers(runner.user_id)
+
+def send(client, booking_id, headers, message):
+    response = client.post(f'/api/bookings/{booking_id}/messages', headers=headers,
+                           data=json.dumps({'message': message}), content_type='application/json')
+    assert response.status_code == 201
+    return response.get_json()['message']['id']
+
+def search(client, headers, query, **params):
+    params = ''.join(f'&{key}={value}' for key, value in params.items())
+    response = client.get(f'/api/messages/search?q={query}{params}', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_search_is_ranked_scoped_and_highlighted():
+    app, _ = create_app('testing')
+    with app.app_context():
+        (booking, other_booking), client_headers, outsider_headers, runner_headers = setup_conversations()
+        booking_id, other_booking_id = booking.id, other_booking.id
+
+    with app.test_client() as client:
+        send(client, booking_id, client_headers, 'Please buy milk & eggs <fresh ones>')
+        send(client, booking_id, runner_headers, 'Milk was sold out, got oat milk instead')
+        send(client, booking_id, client_headers, 'Thanks, see you tomorrow')
+        send(client, other_booking_id, outsider_headers, 'Also milk for me please')
+
+        # Indexed by the job worker, not on the write path
+        assert search(client, client_headers, 'milk')['results'] == []
+        with app.app_context():
+            assert Job.query.filter_by(task='index_chat_messages', status='queued').count() == 4
+            run_pending()
+
+        results = search(client, client_headers, 'milk')['results']
+        assert len(results) == 2
+        # Two mentions outrank one
+        assert results[0]['snippet'].count('<mark>') == 2 and results[0]['sender_id'] != results[1]['sender_id']
+        assert results[1]['snippet'] == 'Please buy <mark>milk</mark> &amp; eggs &lt;fresh ones&gt;'
+        assert results[0]['score'] >= results[1]['score']
+        assert {result['booking_title'] for result in results} == {booking.title}
+
+        # The runner is in both conversations; the outsider only sees their own
+        assert len(search(client, runner_headers, 'milk')['results']) == 3
+        assert len(search(client, runner_headers, 'milk', booking_id=other_booking_id)['results']) == 1
+        assert [r['booking_id'] for r in search(client, outsider_headers, 'milk')['results']] == [other_booking_id]
+        # Prefix matching
+        assert len(search(client, client_headers, 'tomor')['results']) == 1
+
+def test_cursor_pages_through_all_matches():
+    app, _ = create_app('testing')
+    with app.app_context():
+        (booking, _), client_headers, _, runner_headers = setup_conversations()
+        booking_id = booking.id
+
+    with app.test_client() as client:
+        sent = {send(client, booking_id, client_headers, f'parcel number {n}' + ' parcel' * (n % 3))
+                for n in range(7)}
+        with app.app_context():
+            run_pending()
+
+        seen, cursor, scores = [], None, []
+        while True:
+            page = search(client, runner_headers, 'parcel', limit=3, **({'cursor': cursor} if cursor else {}))
+            seen += [result['id'] for result in page['results']]
+            scores += [result['score'] for result in page['results']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen)) and set(seen) == sent
+        assert scores == sorted(scores, reverse=True)
+
+        assert client.get('/api/messages/search?q=parcel&cursor=bogus', headers=runner_headers).status_code == 400
+        assert client.get('/api/messages/search', headers=runner_headers).status_code == 400
+
+def test_edits_and_deletes_update_the_index():
+    app, _ = create_app('testing')
+    with app.app_context():
+        (booking, _), client_headers, _, _ = setup_conversations()
+        booking_id = booking.id
+
+    with app.test_client() as client:
+        first = send(client, booking_id, client_headers, 'Leave it by the blue door')
+        second = send(client, booking_id, client_headers, 'Ring the blue bell')
+        with app.app_context():
+            run_pending()
+            db.session.get(ChatMessage, first).message = 'Leave it by the red door'
+            db.session.delete(db.session.get(ChatMessage, second))
+            db.session.commit()
+            run_pending()
+            assert db.session.execute(text('SELECT count(*) FROM chat_search_index')).scalar() == 1
+        assert search(client, client_headers, 'blue')['results'] == []
+        assert [result['id'] for result in search(client, client_headers, 'red')['results']] == [first]
+
+if __name__ == '__main__':
+    test_search_is_ranked_scoped_and_highlighted()
+    test_cursor_pages_through_all_matches()
+    test_edits_and_deletes_update_the_index()
+    print("✅ Message search tests passed!")
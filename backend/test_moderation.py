@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, UserRole, Runner, Booking, Review
+from flask_jwt_extended import create_access_token
+from datetime import datetime, timedelta
+import json
+
+def setup_reviews():
+    moderator = User(username='mod', email='mod@example.com', first_name='Mo', last_name='Derator',
+                     role=UserRole.MODERATOR)
+    client = User(username='client', email='client@example.com', first_name='Cli', last_name='Ent')
+    runner_user = User(username='runner', email='runner@example.com', first_name='Run', last_name='Ner')
+    for user in (moderator, client, runner_user):
+        user.set_password('password123')
+    db.session.add_all([moderator, client, runner_user])
+    db.session.commit()
+
+    runner = Runner(user_id=runner_user.id, hourly_rate=20.0, city='Chicago', country='USA')
+    db.session.add(runner)
+    db.session.commit()
+    booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Errand',
+                      scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                      total_amount=20.0, status='completed')
+    db.session.add(booking)
+    db.session.commit()
+
+    reviews = []
+    for i, rating in enumerate([5, 5, 1, 1]):
+        review = Review(booking_id=booking.id, reviewer_id=client.id, reviewee_id=runner_user.id,
+                        rating=rating, is_flagged=rating == 1,
+                        created_at=datetime(2030, 1, 1) + timedelta(minutes=i))
+        reviews.append(review)
+    db.session.add_all(reviews)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(moderator.id))}'}
+    return runner.id, [review.id for review in reviews], headers
+
+def test_bulk_hide_recomputes_ratings():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner_id, review_ids, headers = setup_reviews()
+
+    with app.test_client() as client:
+        # Flagged queue pages through the spam reviews newest first
+        data = client.get('/api/admin/reviews/flagged?per_page=1', headers=headers).get_json()
+        assert [review['id'] for review in data['reviews']] == [review_ids[3]]
+        data = client.get(f"/api/admin/reviews/flagged?per_page=1&cursor={data['next_cursor']}",
+                          headers=headers).get_json()
+        assert [review['id'] for review in data['reviews']] == [review_ids[2]]
+        assert data['next_cursor'] is None
+
+        response = client.post('/api/admin/reviews/bulk', headers=headers, content_type='application/json',
+                               data=json.dumps({'action': 'hide', 'review_ids': review_ids[2:]}))
+        assert response.status_code == 200
+        assert response.get_json()['affected'] == 2
+
+    with app.app_context():
+        runner = Runner.query.get(runner_id)
+        assert runner.rating == 5.0
+        assert runner.total_reviews == 2
+        assert Review.query.filter_by(is_flagged=True).count() == 0
+
+    with app.test_client() as client:
+        client.post('/api/admin/reviews/bulk', headers=headers, content_type='application/json',
+                    data=json.dumps({'action': 'delete', 'review_ids': review_ids}))
+
+    with app.app_context():
+        runner = Runner.query.get(runner_id)
+        assert (runner.rating, runner.total_reviews) == (0.0, 0)
+
+def test_bulk_requires_moderator():
+    app, _ = create_app('testing')
+    with app.app_context():
+        client_user = User.query.filter_by(username='john_doe').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client_user.id))}'}
+
+    with app.test_client() as client:
+        response = client.post('/api/admin/reviews/bulk', headers=headers, content_type='application/json',
+                               data=json.dumps({'action': 'hide', 'review_ids': [1]}))
+        assert response.status_code == 403
+
+if __name__ == '__main__':
+    test_bulk_hide_recomputes_ratings()
+    test_bulk_requires_moderator()
+    print("✅ Moderation tests passed!")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from chat_load import RedisStandIn
+from src.main import create_app
+from src.models.user import db, User, Runner, Booking
+from src.presence import MemoryPresenceStore, RedisPresenceStore, RoomCoalescer
+
+def check_store(store, now):
+    assert store.connect(1, 'a', ttl=90) is True
+    assert store.connect(1, 'b', ttl=90) is False     # Second tab
+    assert store.disconnect(1, 'a') is False
+    assert store.lookup([1, 2]) == {1: (True, now[0]), 2: (False, None)}
+    assert store.disconnect(1, 'b') is True
+
+    # A socket whose worker stopped refreshing it expires on its own
+    store.connect(3, 'c', ttl=90)
+    now[0] += 60
+    store.refresh({3: ['c']}, ttl=90)
+    now[0] += 80
+    assert store.lookup([3])[3] == (True, now[0] - 80)
+    now[0] += 20
+    assert store.lookup([3])[3] == (False, now[0] - 100)
+    assert store.connect(3, 'd', ttl=90) is True
+
+def test_memory_store():
+    now = [1000.0]
+    check_store(MemoryPresenceStore(clock=lambda: now[0]), now)
+
+def test_redis_store():
+    server = RedisStandIn().start()
+    try:
+        now = [time.time()]
+        check_store(RedisPresenceStore(server.url, clock=lambda: now[0]), now)
+    finally:
+        server.stop()
+
+def test_coalescer_merges_within_interval():
+    now = [0.0]
+    flushed, spawned = [], []
+    coalescer = RoomCoalescer(1.0, lambda room, updates: flushed.append((room, dict(updates))),
+                              spawn=lambda fn, *args: spawned.append((fn, args)),
+                              sleep=lambda seconds: now.__setitem__(0, now[0] + seconds),
+                              clock=lambda: now[0])
+
+    coalescer.submit('booking_1', ('typing', 5), True)
+    fn, args = spawned.pop()
+    assert args == ('booking_1', 0)   # Leading edge goes out at once
+    fn(*args)
+    assert flushed.pop() == ('booking_1', {('typing', 5): True})
+
+    now[0] += 0.25
+    coalescer.submit('booking_1', ('typing', 5), True)
+    coalescer.submit('booking_1', ('typing', 6), True)
+    coalescer.submit('booking_1', ('typing', 5), False)
+    coalescer.submit('booking_2', ('presence', 5), True)
+    assert len(spawned) == 2
+    (fn, args), other = spawned
+    assert args == ('booking_1', 0.75)
+    fn(*args)
+    assert flushed == [('booking_1', {('typing', 5): False, ('typing', 6): True})]
+
+def setup_booking():
+    runner = Runner.query.order_by(Runner.id).first()
+    client = User.query.filter(User.id != runner.user_id, ~User.runner_profile.any()).first()
+    booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Dry cleaning',
+                      scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                      total_amount=20.0, status='accepted')
+    db.session.add(booking)
+    db.session.commit()
+    return booking.id, client.id, runner.user_id
+
+def received(socket, name, timeout=1.5):
+    """Wait for background emits and return the payloads of one event"""
+    deadline = time.time() + timeout
+    events = []
+    while True:
+        events += socket.get_received()
+        payloads = [event['args'][0] for event in events if event['name'] == name]
+        if payloads or time.time() > deadline:
+            return payloads
+        time.sleep(0.02)
+
+def test_socket_presence_and_typing():
+    app, socketio = create_app('testing')
+    with app.app_context():
+        booking_id, client_id, runner_user_id = setup_booking()
+        client_token = create_access_token(identity=str(client_id))
+        runner_token = create_access_token(identity=str(runner_user_id))
+        stranger = User(username='presence_stranger', email='presence_stranger@example.com',
+                        first_name='Stranger', last_name='User', password_hash='x')
+        db.session.add(stranger)
+        db.session.commit()
+        stranger_id = stranger.id
+
+    runner = socketio.test_client(app, auth={'token': runner_token})
+    runner.emit('join_chat', {'token': runner_token, 'booking_id': booking_id})
+    assert received(runner, 'presence')[0] == {'booking_id': booking_id, 'users': {str(client_id): False}}
+    client = socketio.test_client(app, auth={'token': client_token})
+    client.emit('join_chat', {'token': client_token, 'booking_id': booking_id})
+    assert received(client, 'presence')[0] == {'booking_id': booking_id, 'users': {str(runner_user_id): True}}
+    assert {str(client_id): True} in [payload['users'] for payload in received(runner, 'presence')]
+
+    with app.test_client() as http:
+        headers = {'Authorization': f'Bearer {runner_token}'}
+        data = http.get(f'/api/presence?user_ids={client_id},{runner_user_id},999999', headers=headers).get_json()
+        assert data['presence'][str(client_id)]['online'] and data['presence'][str(client_id)]['last_seen']
+        assert '999999' not in data['presence']
+        # Other signed-in users get runners only, without last seen
+        with app.app_context():
+            stranger_token = create_access_token(identity=str(stranger_id))
+        headers = {'Authorization': f'Bearer {stranger_token}'}
+        data = http.get(f'/api/presence?user_ids={client_id},{runner_user_id}', headers=headers).get_json()
+        assert data['presence'] == {str(runner_user_id): {'online': True}}
+        # Anonymous callers only learn whether runners are online
+        data = http.get(f'/api/presence?user_ids={client_id},{runner_user_id}').get_json()
+        assert data['presence'] == {str(runner_user_id): {'online': True}}
+        assert http.get('/api/presence?user_ids=abc').status_code == 400
+
+    # A burst of keystrokes reaches the room as a couple of merged frames, and
+    # the rate limit drops the rest
+    for _ in range(20):
+        client.emit('typing', {'booking_id': booking_id, 'typing': True})
+    time.sleep(1.2)   # One activity interval
+    frames = received(runner, 'typing')
+    assert 1 <= len(frames) <= 2
+    assert frames[0]['typing'] == {str(client_id): True}
+
+    # Typing into a room the socket has not joined goes nowhere
+    client.emit('typing', {'booking_id': booking_id + 1, 'typing': True})
+
+    client.disconnect()
+    assert {str(client_id): False} in [payload['users'] for payload in received(runner, 'presence', timeout=1.5)]
+    runner.disconnect()
+
+if __name__ == '__main__':
+    test_memory_store()
+    test_redis_store()
+    test_coalescer_merges_within_interval()
+    test_socket_presence_and_typing()
+    print("✅ Presence tests passed!")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+import threading
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from chat_load import RedisStandIn
+from src.main import create_app
+from src.models.user import db, User, Runner, Review, Booking
+from src.ratings import refresh_runner_ratings
+from src.response_cache import MemoryCache, RedisCache, ResponseCache, cache_key
+from src.single_flight import SingleFlight
+
+def test_memory_cache_budget_ttl_and_tags():
+    now = [1000.0]
+    cache = MemoryCache(max_bytes=10, clock=lambda: now[0])
+    cache.set('a', b'aaaa', {'runner:1'}, ttl=60, stale_ttl=30)
+    cache.set('b', b'bbbb', {'runner:2', 'runners'}, ttl=60)
+    assert cache.get('a') == (b'aaaa', 1060.0)
+    # Over budget: the least recently used entry goes
+    cache.set('c', b'cccc', {'runners'}, ttl=60)
+    assert cache.get('b') is None
+    assert cache.get('a')[0] == b'aaaa' and cache.size == 8
+
+    generation = cache.generation()
+    cache.invalidate(['runners'])
+    assert cache.get('c') is None
+    assert cache.get('a')[0] == b'aaaa'
+    assert cache.generation() > generation
+
+    # Past its TTL an entry is stale (still returned) until the stale window ends too
+    now[0] += 61
+    assert cache.get('a') == (b'aaaa', 1060.0)
+    now[0] += 30
+    assert cache.get('a') is None
+    assert cache.size == 0
+
+    assert cache.lock('a', timeout=5) and not cache.lock('a', timeout=5)
+    assert cache.locked('a')
+    cache.unlock('a')
+    assert not cache.locked('a')
+
+def test_redis_backend_with_stand_in():
+    server = RedisStandIn().start()
+    try:
+        cache = RedisCache(server.url)
+        cache.set('a', b'{"id": 1}', {'runner:1', 'runners'}, ttl=60)
+        cache.set('b', b'{"id": 2}', {'runner:2'}, ttl=60)
+        body, fresh_until = cache.get('a')
+        assert body == b'{"id": 1}' and fresh_until > time.time() + 55
+
+        generation = cache.generation()
+        cache.invalidate(['runners', 'city:nowhere'])
+        assert cache.get('a') is None
+        assert cache.get('b')[0] == b'{"id": 2}'
+        assert cache.generation() == generation + 1
+
+        assert cache.lock('b', timeout=5) and not cache.lock('b', timeout=5)
+        cache.unlock('b')
+        assert not cache.locked('b')
+    finally:
+        server.stop()
+
+def _get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.headers['X-Cache'], response.get_json()
+
+def test_runner_responses_invalidated_by_profile_writes():
+    app, _ = create_app('testing')
+    with app.app_context():
+        first = Runner.query.order_by(Runner.id).first()
+        other = Runner.query.filter(Runner.city != first.city).first()
+        first_id, other_id, city, other_city = first.id, other.id, first.city, other.city
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(first.user_id))}'}
+
+    with app.test_client() as client:
+        for url in (f'/api/runners/{first_id}', f'/api/runners/{other_id}', f'/api/runners?city={city}',
+                    f'/api/runners?city={other_city}'):
+            assert _get(client, url)[0] == 'MISS'
+            assert _get(client, url)[0] == 'HIT'
+
+        response = client.put('/api/runners/profile', headers=headers,
+                              data=json.dumps({'bio': 'Fresh bio'}), content_type='application/json')
+        assert response.status_code == 200
+
+        status, data = _get(client, f'/api/runners/{first_id}')
+        assert status == 'MISS' and data['bio'] == 'Fresh bio'
+        assert _get(client, f'/api/runners?city={city}')[0] == 'MISS'
+        # Runners and lists the write cannot touch stay cached
+        assert _get(client, f'/api/runners/{other_id}')[0] == 'HIT'
+        assert _get(client, f'/api/runners?city={other_city}')[0] == 'HIT'
+
+def test_review_writes_and_rating_refresh_invalidate():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner = Runner.query.first()
+        client_user = User.query.filter(User.id != runner.user_id).first()
+        booking = Booking(user_id=client_user.id, runner_id=runner.id, service_id=1, title='Errand',
+                          scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=20.0,
+                          total_amount=20.0, status='completed')
+        db.session.add(booking)
+        db.session.commit()
+        booking_id, client_id, runner_id, reviewee_id = booking.id, client_user.id, runner.id, runner.user_id
+
+    with app.test_client() as client:
+        stats_url = f'/api/reviews/stats/{reviewee_id}'
+        reviews_url = f'/api/reviews?reviewee_id={reviewee_id}'
+        for url in (stats_url, reviews_url, f'/api/runners/{runner_id}'):
+            _get(client, url)
+            assert _get(client, url)[0] == 'HIT'
+
+        with app.app_context():
+            db.session.add(Review(booking_id=booking_id, reviewer_id=client_id, reviewee_id=reviewee_id,
+                                  rating=5, comment='Great'))
+            db.session.commit()
+        status, data = _get(client, stats_url)
+        assert status == 'MISS'
+        assert _get(client, reviews_url)[0] == 'MISS'
+        assert _get(client, f'/api/runners/{runner_id}')[0] == 'HIT'
+
+        # The rating job updates runners with a bulk UPDATE and invalidates explicitly
+        with app.app_context():
+            refresh_runner_ratings([reviewee_id])
+            db.session.commit()
+        assert _get(client, f'/api/runners/{runner_id}')[0] == 'MISS'
+
+def test_bookings_invalidate_availability_lists():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner = Runner.query.order_by(Runner.id).first()
+        runner.availability_bitmap, runner.is_available = None, True   # Free whenever not booked
+        db.session.commit()
+        client_user = User.query.filter(User.id != runner.user_id, ~User.runner_profile.any()).first()
+        runner_id, city = runner.id, runner.city
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client_user.id))}'}
+
+    url = f'/api/runners?available_at=2031-03-04T10:00:00&duration=2&city={city}&per_page=100'
+    listed = lambda data: runner_id in [runner['id'] for runner in data['runners']]
+    with app.test_client() as client:
+        status, data = _get(client, url)
+        assert status == 'MISS' and listed(data)
+        assert _get(client, url)[0] == 'HIT'
+
+        response = client.post('/api/bookings', headers=headers, content_type='application/json',
+                               data=json.dumps({'runner_id': runner_id, 'service_id': 1, 'title': 'Groceries',
+                                                'scheduled_date': '2031-03-04T11:00:00', 'estimated_hours': 1}))
+        assert response.status_code == 201
+        booking_id = response.get_json()['booking']['id']
+        status, data = _get(client, url)
+        assert status == 'MISS' and not listed(data)
+
+        # Cancelling goes through a bulk UPDATE and frees the runner again
+        assert _get(client, url)[0] == 'HIT'
+        response = client.put(f'/api/bookings/{booking_id}/status', headers=headers,
+                              content_type='application/json', data=json.dumps({'status': 'cancelled'}))
+        assert response.status_code == 200
+        status, data = _get(client, url)
+        assert status == 'MISS' and listed(data)
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls, results = [], []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'profile'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('runner:1', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while not flight.in_flight('runner:1'):
+        time.sleep(0.001)
+    assert flight.try_do('runner:1', compute) == (False, None)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+    assert {result for result, _ in results} == {'profile'}
+    assert not flight.in_flight('runner:1')
+
+def test_stale_and_locked_entries():
+    app, _ = create_app('testing')
+    app.config['RESPONSE_CACHE_TTL'] = 0
+    cache = app.extensions['response_cache']
+    cache.init_app(app)   # Re-read the TTL
+    with app.app_context():
+        runner_id = Runner.query.first().id
+    url = f'/api/runners/{runner_id}'
+    with app.test_request_context(url):
+        key = cache_key()
+
+    with app.test_client() as client:
+        assert _get(client, url)[0] == 'MISS'
+        # Expired: the request that gets the fill lock refreshes
+        assert _get(client, url)[0] == 'MISS'
+        # While another worker holds the lock, the stale copy is served
+        assert cache.backend.lock(key, timeout=5)
+        assert _get(client, url)[0] == 'STALE'
+        cache.backend.unlock(key)
+
+        # On a miss, wait for the other worker's fill instead of running the view
+        cache.backend.invalidate([f'runner:{runner_id}'])
+        assert cache.backend.lock(key, timeout=5)
+
+        def other_worker():
+            time.sleep(0.1)
+            cache.backend.set(key, b'{"id": "from other worker"}', {f'runner:{runner_id}'}, ttl=60)
+            cache.backend.unlock(key)
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        status, data = _get(client, url)
+        thread.join()
+        assert status == 'HIT' and data == {'id': 'from other worker'}
+
+def test_memory_backend_needs_single_worker():
+    app, _ = create_app('testing')
+    app.config.update(WEB_CONCURRENCY=4)
+    assert ResponseCache(app).enabled   # Tests share one process
+    app.testing = False
+    assert not ResponseCache(app).enabled
+    app.config.update(WEB_CONCURRENCY=1)
+    assert ResponseCache(app).enabled
+
+    server = RedisStandIn().start()
+    try:
+        app.config.update(WEB_CONCURRENCY=4, RESPONSE_CACHE_URL=server.url)
+        cache = ResponseCache(app)
+        assert cache.enabled and isinstance(cache.backend, RedisCache)
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    test_memory_cache_budget_ttl_and_tags()
+    test_redis_backend_with_stand_in()
+    test_runner_responses_invalidated_by_profile_writes()
+    test_review_writes_and_rating_refresh_invalidate()
+    test_bookings_invalidate_availability_lists()
+    test_single_flight_shares_one_call()
+    test_stale_and_locked_entries()
+    test_memory_backend_needs_single_worker()
+    print("✅ Response cache tests passed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from src.main import create_app
+from src.models.user import db, User, Runner, Review, Booking, AvailabilityException
+
+def setup_runner():
+    runner_user = User(username='overview_runner', email='overview_runner@example.com', first_name='Olive', last_name='Runner')
+    runner_user.set_password('password123')
+    db.session.add(runner_user)
+    db.session.commit()
+    runner = Runner(user_id=runner_user.id, hourly_rate=25.0, city='Denver', country='USA')
+    db.session.add(runner)
+    db.session.commit()
+
+    created = datetime(2030, 1, 1)
+    for index, rating in enumerate([5, 5, 4, 3, 5]):
+        client = User(username=f'overview_client{index}', email=f'overview_client{index}@example.com',
+                      first_name='Client', last_name=str(index))
+        client.set_password('password123')
+        db.session.add(client)
+        db.session.commit()
+        booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Errand',
+                          scheduled_date=datetime(2030, 1, 7, 9), estimated_hours=1, hourly_rate=25.0,
+                          total_amount=25.0, status='completed')
+        db.session.add(booking)
+        db.session.commit()
+        db.session.add(Review(booking_id=booking.id, reviewer_id=client.id, reviewee_id=runner_user.id,
+                              rating=rating, comment=f'Review {index}', created_at=created + timedelta(days=index)))
+    db.session.add(AvailabilityException(runner_id=runner.id, start_date=datetime(2099, 1, 1),
+                                         end_date=datetime(2099, 1, 2), is_available=False))
+    db.session.commit()
+    return runner.id
+
+def test_overview_contents_and_query_count():
+    app, _ = create_app('testing')
+    app.extensions['response_cache'].enabled = False
+    with app.app_context():
+        runner_id = setup_runner()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    with app.test_client() as client:
+        response = client.get(f'/api/runners/{runner_id}/overview?reviews_limit=2')
+        assert response.status_code == 200
+        assert len(statements) == 3
+        data = response.get_json()
+
+        assert data['runner']['id'] == runner_id
+        assert data['runner']['user']['first_name'] == 'Olive'
+        assert data['rating_summary'] == {
+            'total_reviews': 5,
+            'average_rating': 4.4,
+            'rating_distribution': {'1': 0, '2': 0, '3': 1, '4': 1, '5': 3}
+        }
+        assert [review['comment'] for review in data['reviews']] == ['Review 4', 'Review 3']
+        assert data['reviews'][0]['reviewer']['last_name'] == '4'
+        assert len(data['availability']['upcoming_exceptions']) == 1
+
+        # Further pages only carry reviews
+        comments = [review['comment'] for review in data['reviews']]
+        cursor = data['next_cursor']
+        while cursor:
+            statements.clear()
+            page = client.get(f'/api/runners/{runner_id}/overview?reviews_limit=2&cursor={cursor}').get_json()
+            assert len(statements) <= 3 and 'runner' not in page
+            comments += [review['comment'] for review in page['reviews']]
+            cursor = page['next_cursor']
+        assert comments == ['Review 4', 'Review 3', 'Review 2', 'Review 1', 'Review 0']
+
+        assert client.get('/api/runners/999999/overview').status_code == 404
+        assert client.get(f'/api/runners/{runner_id}/overview?cursor=bogus').status_code == 400
+
+        # Out-of-range limits are clamped to 1..50
+        for limit, count in (('0', 1), ('-3', 1), ('500', 5)):
+            response = client.get(f'/api/runners/{runner_id}/overview?reviews_limit={limit}')
+            assert response.status_code == 200
+            assert len(response.get_json()['reviews']) == count
+
+def test_overview_cache_follows_new_reviews():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner_id = setup_runner()
+        runner = db.session.get(Runner, runner_id)
+        review = runner.user.reviews_received.first()
+        review_id, runner_user_id = review.id, runner.user_id
+
+    with app.test_client() as client:
+        url = f'/api/runners/{runner_id}/overview'
+        client.get(url)
+        assert client.get(url).headers['X-Cache'] == 'HIT'
+        with app.app_context():
+            db.session.get(Review, review_id).is_approved = False
+            db.session.commit()
+        response = client.get(url)
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.get_json()['rating_summary']['total_reviews'] == 4
+
+if __name__ == '__main__':
+    test_overview_contents_and_query_count()
+    test_overview_cache_follows_new_reviews()
+    print("✅ Runner overview tests passed!")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, Runner, Service, Booking
+from src.scheduling import find_conflict, next_free_slot
+from flask_jwt_extended import create_access_token
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import json
+
+START = datetime(2030, 1, 7, 9, 0)
+
+def make_runner():
+    user = User(username='runner1', email='runner1@example.com', first_name='Run', last_name='Ner')
+    user.set_password('password123')
+    client = User(username='client1', email='client1@example.com', first_name='Cli', last_name='Ent')
+    client.set_password('password123')
+    db.session.add_all([user, client])
+    db.session.commit()
+    runner = Runner(user_id=user.id, hourly_rate=20.0, city='Chicago', country='USA')
+    db.session.add(runner)
+    db.session.commit()
+    return runner, client
+
+def book(runner, client, start, hours, status='pending'):
+    booking = Booking(user_id=client.id, runner_id=runner.id, service_id=1, title='Errand',
+                      scheduled_date=start, estimated_hours=hours, hourly_rate=20.0,
+                      total_amount=20.0 * hours, status=status)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+def test_find_conflict_and_next_slot():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = make_runner()
+        first = book(runner, client, START, 2)                          # 09:00-11:00
+        book(runner, client, START + timedelta(hours=3), 1)             # 12:00-13:00
+        book(runner, client, START + timedelta(hours=1), 4, 'cancelled')
+
+        assert first.end_date == START + timedelta(hours=2)
+        assert find_conflict(runner.id, START + timedelta(hours=1), START + timedelta(hours=2)).id == first.id
+        # Touching windows do not overlap
+        assert find_conflict(runner.id, START + timedelta(hours=2), START + timedelta(hours=3)) is None
+        assert find_conflict(runner.id, START + timedelta(hours=2), START + timedelta(hours=3, minutes=1)) is not None
+
+        assert next_free_slot(runner.id, START, 1) == START + timedelta(hours=2)
+        assert next_free_slot(runner.id, START, 2) == START + timedelta(hours=4)
+
+def test_create_booking_rejects_overlap():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = make_runner()
+        book(runner, client, START, 2)
+        runner_id = runner.id
+        service_id = Service.query.first().id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client.id))}'}
+
+    with app.test_client() as http:
+        payload = {'runner_id': runner_id, 'service_id': service_id, 'title': 'Groceries',
+                   'scheduled_date': (START + timedelta(hours=1)).isoformat(), 'estimated_hours': 1}
+        response = http.post('/api/bookings', data=json.dumps(payload),
+                             content_type='application/json', headers=headers)
+        assert response.status_code == 409
+        assert response.get_json()['next_available'] == (START + timedelta(hours=2)).isoformat()
+
+        payload['scheduled_date'] = response.get_json()['next_available']
+        response = http.post('/api/bookings', data=json.dumps(payload),
+                             content_type='application/json', headers=headers)
+        assert response.status_code == 201
+
+def test_conflict_check_seeks_the_window_index():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = make_runner()
+        book(runner, client, START, 2)
+        captured = []
+        capture = lambda conn, cursor, statement, parameters, *args: captured.append((statement, parameters))
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        find_conflict(runner.id, START, START + timedelta(hours=1), exclude_booking_id=0)
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+        statement, parameters = captured[-1]
+        plan = ' '.join(row[-1] for row in db.session.connection()
+                        .exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all())
+        # Newest booking first straight from the partial index: no sort step
+        assert 'ix_booking_runner_window' in plan and 'TEMP B-TREE' not in plan
+
+def test_create_booking_locks_the_runner_first():
+    app, _ = create_app('testing')
+    with app.app_context():
+        runner, client = make_runner()
+        runner_id = runner.id
+        service_id = Service.query.first().id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(client.id))}'}
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+
+    with app.test_client() as http:
+        payload = {'runner_id': runner_id, 'service_id': service_id, 'title': 'Groceries',
+                   'scheduled_date': START.isoformat(), 'estimated_hours': 1}
+        assert http.post('/api/bookings', data=json.dumps(payload),
+                         content_type='application/json', headers=headers).status_code == 201
+    # The write lock is held before the overlap check reads the runner's bookings
+    lock = next(i for i, statement in enumerate(statements) if statement.startswith('UPDATE runner SET id = id'))
+    check = next(i for i, statement in enumerate(statements) if 'booking.scheduled_date <' in statement)
+    assert lock < check
+
+if __name__ == '__main__':
+    test_find_conflict_and_next_slot()
+    test_create_booking_rejects_overlap()
+    test_conflict_check_seeks_the_window_index()
+    test_create_booking_locks_the_runner_first()
+    print("✅ Scheduling tests passed!")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine, inspect, text
+from src.models.user import db
+from src.schema import upgrade_schema
+
+def test_upgrade_adds_missing_columns_and_indexes():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # The booking table as deployed before the scheduling and counting columns existed
+        for index in ('ix_booking_runner_window', 'ix_booking_user_upcoming'):
+            connection.execute(text(f'DROP INDEX {index}'))
+        for column in ('end_date', 'version', 'counted_at'):
+            connection.execute(text(f'ALTER TABLE booking DROP COLUMN {column}'))
+        connection.execute(text('ALTER TABLE runner DROP COLUMN timezone'))
+        connection.execute(text("""
+            INSERT INTO booking (id, user_id, runner_id, service_id, title, scheduled_date, estimated_hours,
+                                 hourly_rate, total_amount, status, completed_at)
+            VALUES (1, 1, 1, 1, 'Errand', '2030-01-07 09:00:00', 1.5, 20, 30, 'completed', '2030-01-07 11:00:00'),
+                   (2, 1, 1, 1, 'Errand', '2030-01-08 09:00:00', 2, 20, 40, 'accepted', NULL)
+        """))
+
+    added = upgrade_schema(engine, db.metadata)
+    assert {'booking.end_date', 'booking.version', 'booking.counted_at', 'runner.timezone',
+            'ix_booking_runner_window', 'ix_booking_user_upcoming'} == set(added)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text('SELECT id, end_date, version, counted_at FROM booking ORDER BY id')).all()
+    assert rows[0][1:] == ('2030-01-07 10:30:00', 1, '2030-01-07 11:00:00')
+    assert rows[1][1:] == ('2030-01-08 11:00:00', 1, None)
+    assert 'ix_booking_runner_window' in {index['name'] for index in inspect(engine).get_indexes('booking')}
+
+    # Running again at the next start changes nothing
+    assert upgrade_schema(engine, db.metadata) == []
+
+if __name__ == '__main__':
+    test_upgrade_adds_missing_columns_and_indexes()
+    print("✅ Schema upgrade tests passed!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, UserRole, Runner, Service
+from src.search import search_users
+from flask_jwt_extended import create_access_token
+
+def make_user(username, first_name, last_name, bio=None, services=()):
+    user = User(username=username, email=f'{username}@mail.test', first_name=first_name, last_name=last_name)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    if bio is not None:
+        runner = Runner(user_id=user.id, bio=bio, hourly_rate=20.0, city='Chicago', country='USA')
+        runner.services.extend(services)
+        db.session.add(runner)
+        db.session.commit()
+    return user
+
+def test_prefix_search_and_ranking():
+    app, _ = create_app('testing')
+    with app.app_context():
+        pets = Service.query.filter_by(category='pets').first()
+        walker = make_user('walker', 'Dana', 'Walker', 'Reliable errands and groceries')
+        dogs = make_user('dogs', 'Alex', 'Brown', 'I love walking dogs', [pets])
+        make_user('plainuser', 'Walt', 'Green')
+
+        # Seeded runners get random services, so only look at the users created here
+        created = {walker.id, dogs.id}
+        ids = [user_id for user_id, _ in search_users('walk', runners_only=True) if user_id in created]
+        # Name matches outrank bio/service matches; plain users are excluded from runner search
+        assert ids == [walker.id, dogs.id]
+
+        assert dogs.id in [user_id for user_id, _ in search_users('pet car', runners_only=True)]
+        assert walker.id not in [user_id for user_id, _ in search_users('pet car', runners_only=True)]
+        # Emails are only searchable when asked for
+        assert search_users('mail.test walt', include_email=False) == []
+        assert len(search_users('mail.test walt', include_email=True)) == 1
+
+def test_tied_scores_page_in_a_stable_order():
+    app, _ = create_app('testing')
+    with app.app_context():
+        # Identical documents score the same; pages must still partition them
+        twins = [make_user(f'twin{n}', 'Quillon', 'Twin').id for n in range(7)]
+        pages = [search_users('quillon', limit=3, offset=offset) for offset in (0, 3, 6)]
+        ids = [user_id for page in pages for user_id, _ in page]
+        assert ids == sorted(twins)
+
+def test_index_updates_on_write():
+    app, _ = create_app('testing')
+    with app.app_context():
+        user = make_user('chef', 'Sam', 'Taylor', 'Meal prep')
+        assert search_users('cooking', runners_only=True) == []
+
+        user.runner_profile[0].bio = 'Home cooking and meal prep'
+        db.session.commit()
+        assert [user_id for user_id, _ in search_users('cooking', runners_only=True)] == [user.id]
+
+        user.first_name = 'Samantha'
+        db.session.commit()
+        assert len(search_users('samantha')) == 1
+
+        db.session.delete(user.runner_profile[0])
+        db.session.commit()
+        assert search_users('cooking', runners_only=True) == []
+
+def test_runner_search_endpoint():
+    app, _ = create_app('testing')
+    with app.app_context():
+        make_user('mover', 'Chris', 'Mover', 'Heavy lifting and moving help')
+
+    with app.test_client() as client:
+        data = client.get('/api/runners?q=lift').get_json()
+        assert data['total'] == 1
+        assert data['runners'][0]['user']['username'] == 'mover'
+
+def test_admin_search_filters_and_pages_in_the_index():
+    app, _ = create_app('testing')
+    with app.app_context():
+        admin = make_user('zadmin', 'Ada', 'Min')
+        admin.role = UserRole.ADMIN
+        for n in range(5):
+            user = make_user(f'zebra{n}', 'Zebra', f'Person{n}')
+            user.role = UserRole.RUNNER if n < 2 else UserRole.USER
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+        # Fewer ranked matches kept than there are users: the role filter must not lose any
+        app.config['SEARCH_MAX_RESULTS'] = 2
+
+    with app.test_client() as client:
+        pages = [client.get(f'/api/admin/users?search=zebra&role=user&per_page=2&page={page}', headers=headers)
+                 .get_json() for page in (1, 2)]
+        assert [data['pagination']['total'] for data in pages] == [3, 3]
+        assert pages[0]['pagination']['pages'] == 2
+        names = [user['last_name'] for data in pages for user in data['users']]
+        assert sorted(names) == ['Person2', 'Person3', 'Person4']
+        assert client.get('/api/admin/users?search=zebra&role=RUNNER', headers=headers)\
+            .get_json()['pagination']['total'] == 2
+        assert client.get('/api/admin/users?role=wizard', headers=headers).status_code == 400
+
+if __name__ == '__main__':
+    test_prefix_search_and_ranking()
+    test_tied_scores_page_in_a_stable_order()
+    test_index_updates_on_write()
+    test_runner_search_endpoint()
+    test_admin_search_filters_and_pages_in_the_index()
+    print("✅ Search tests passed!")
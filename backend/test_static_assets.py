@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from flask import Flask
+from src.static_assets import StaticAssets, precompress
+import gzip
+import tempfile
+
+def make_app(folder, debug=False):
+    app = Flask(__name__, static_folder=folder)
+    app.debug = debug
+    assets = StaticAssets(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        return assets.serve(path)
+    return app
+
+def write(folder, rel, content):
+    path = os.path.join(folder, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def test_hashed_assets_are_immutable_and_precompressed():
+    with tempfile.TemporaryDirectory() as folder:
+        script = b'console.log("urban assist");\n' * 200
+        write(folder, 'index.html', b'<html>app</html>')
+        write(folder, 'assets/index-B3x9kQ_a.js', script)
+        assert precompress(folder) == 1
+        app = make_app(folder)
+
+        with app.test_client() as client:
+            response = client.get('/assets/index-B3x9kQ_a.js', headers={'Accept-Encoding': 'gzip, deflate'})
+            assert response.status_code == 200
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'immutable' in response.headers['Cache-Control']
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert gzip.decompress(response.data) == script
+
+            plain = client.get('/assets/index-B3x9kQ_a.js')
+            assert 'Content-Encoding' not in plain.headers
+            assert plain.data == script
+
+def test_index_fallback_revalidates_without_stat():
+    with tempfile.TemporaryDirectory() as folder:
+        write(folder, 'index.html', b'<html>app</html>')
+        write(folder, 'favicon.ico', b'icon')
+        app = make_app(folder)
+
+        # Deleting the files proves requests are served from the startup manifest
+        os.remove(os.path.join(folder, 'index.html'))
+        with app.test_client() as client:
+            response = client.get('/bookings/42')
+            assert response.status_code == 200
+            assert response.data == b'<html>app</html>'
+            assert 'no-cache' in response.headers['Cache-Control']
+
+            etag = response.headers['ETag']
+            assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+            assert client.get('/favicon.ico').data == b'icon'
+
+def test_debug_miss_loads_only_that_file():
+    with tempfile.TemporaryDirectory() as folder:
+        write(folder, 'index.html', b'<html>app</html>')
+        write(folder, 'favicon.ico', b'icon')
+        app = make_app(folder, debug=True)
+        assets = app.extensions['static_assets']
+
+        # A file added after startup is picked up without rescanning the folder
+        os.remove(os.path.join(folder, 'favicon.ico'))
+        write(folder, 'robots.txt', b'User-agent: *')
+        write(folder, 'uploads/secret.txt', b'private')
+        with app.test_client() as client:
+            assert client.get('/robots.txt').data == b'User-agent: *'
+            assert set(assets.manifest) == {'index.html', 'favicon.ico', 'robots.txt'}
+            # Misses outside the served files fall back to the app shell
+            assert client.get('/uploads/secret.txt').data == b'<html>app</html>'
+            assert client.get('/missing.js').data == b'<html>app</html>'
+            assert set(assets.manifest) == {'index.html', 'favicon.ico', 'robots.txt'}
+        assert assets.lookup('../index.html') is None
+
+if __name__ == '__main__':
+    test_hashed_assets_are_immutable_and_precompressed()
+    test_index_fallback_revalidates_without_stat()
+    test_debug_miss_loads_only_that_file()
+    print("✅ Static asset tests passed!")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import create_app
+from src.models.user import db, User, StoredFile
+from flask_jwt_extended import create_access_token
+import fcntl
+import hashlib
+import json
+import tempfile
+
+def setup(upload_folder):
+    app, _ = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = upload_folder
+    with app.app_context():
+        user = User.query.filter_by(username='john_doe').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    return app, headers
+
+def upload(client, headers, content, chunk=1000, filename='photo.png'):
+    response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                           data=json.dumps({'filename': filename, 'size': len(content)}))
+    assert response.status_code == 201
+    upload_id = response.get_json()['upload']['id']
+    offset = 0
+    while offset < len(content):
+        response = client.patch(f'/api/uploads/{upload_id}', data=content[offset:offset + chunk],
+                                headers=dict(headers, **{'Upload-Offset': str(offset)}))
+        assert response.status_code == 200
+        offset = response.get_json()['upload']['offset']
+    return upload_id, response.get_json()['upload']
+
+def test_chunked_upload_resumes_and_dedups():
+    content = os.urandom(5500)
+    with tempfile.TemporaryDirectory() as folder:
+        app, headers = setup(folder)
+        with app.test_client() as client:
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'photo.png', 'size': len(content)}))
+            upload_id = response.get_json()['upload']['id']
+            client.patch(f'/api/uploads/{upload_id}', data=content[:2000],
+                         headers=dict(headers, **{'Upload-Offset': '0'}))
+
+            # Connection dropped: replaying a stale offset is rejected, resume from the server's offset
+            response = client.patch(f'/api/uploads/{upload_id}', data=content[:2000],
+                                    headers=dict(headers, **{'Upload-Offset': '0'}))
+            assert response.status_code == 409
+            offset = client.get(f'/api/uploads/{upload_id}', headers=headers).get_json()['upload']['offset']
+            assert offset == 2000
+            response = client.patch(f'/api/uploads/{upload_id}', data=content[offset:],
+                                    headers=dict(headers, **{'Upload-Offset': str(offset)}))
+            first = response.get_json()['upload']
+            assert first['status'] == 'complete'
+            assert first['file']['sha256'] == hashlib.sha256(content).hexdigest()
+
+            _, second = upload(client, headers, content, chunk=4096)
+            assert second['file']['id'] == first['file']['id']
+
+            # Known hash short-circuits the transfer entirely
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'again.png', 'size': len(content),
+                                                    'sha256': first['file']['sha256']}))
+            assert response.get_json()['deduplicated'] is True
+
+        with app.app_context():
+            assert StoredFile.query.count() == 1
+        objects = [name for _, _, names in os.walk(os.path.join(folder, 'objects')) for name in names]
+        assert objects == [first['file']['sha256']]
+        assert os.listdir(os.path.join(folder, 'partial')) == []
+
+def test_files_served_with_ranges_and_cache_headers():
+    content = b'0123456789' * 100
+    with tempfile.TemporaryDirectory() as folder:
+        app, headers = setup(folder)
+        with app.test_client() as client:
+            _, result = upload(client, headers, content, filename='doc.pdf')
+            url = result['file']['url']
+
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.data == content
+            assert 'immutable' in response.headers['Cache-Control']
+            assert response.mimetype == 'application/pdf'
+            assert response.headers['X-Content-Type-Options'] == 'nosniff'
+            assert response.headers['Content-Disposition'].startswith('attachment')
+
+            response = client.get(url, headers={'Range': 'bytes=10-19'})
+            assert response.status_code == 206
+            assert response.data == content[10:20]
+
+            etag = response.headers['ETag']
+            assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+def test_rejects_oversized_chunks_and_bad_types():
+    with tempfile.TemporaryDirectory() as folder:
+        app, headers = setup(folder)
+        with app.test_client() as client:
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'script.exe', 'size': 10}))
+            assert response.status_code == 400
+
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'a.png', 'size': 10}))
+            upload_id = response.get_json()['upload']['id']
+            response = client.patch(f'/api/uploads/{upload_id}', data=b'x' * 11,
+                                    headers=dict(headers, **{'Upload-Offset': '0'}))
+            assert response.status_code == 400
+
+def test_served_type_comes_from_extension():
+    content = b'<html><script>alert(1)</script></html>'
+    with tempfile.TemporaryDirectory() as folder:
+        app, headers = setup(folder)
+        with app.test_client() as client:
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'avatar.png', 'size': len(content),
+                                                    'content_type': 'text/html'}))
+            assert response.get_json()['upload']['content_type'] == 'image/png'
+            upload_id = response.get_json()['upload']['id']
+            response = client.patch(f'/api/uploads/{upload_id}', data=content,
+                                    headers=dict(headers, **{'Upload-Offset': '0'}))
+            response = client.get(response.get_json()['upload']['file']['url'])
+            assert response.mimetype == 'image/png'
+            assert response.headers['X-Content-Type-Options'] == 'nosniff'
+            assert 'Content-Disposition' not in response.headers or \
+                not response.headers['Content-Disposition'].startswith('attachment')
+
+def test_concurrent_chunk_at_same_offset_is_rejected():
+    content = os.urandom(3000)
+    with tempfile.TemporaryDirectory() as folder:
+        app, headers = setup(folder)
+        with app.test_client() as client:
+            response = client.post('/api/uploads', headers=headers, content_type='application/json',
+                                   data=json.dumps({'filename': 'photo.png', 'size': len(content)}))
+            upload_id = response.get_json()['upload']['id']
+
+            # Another request is mid-write: this one must not touch the partial file
+            path = os.path.join(folder, 'partial', upload_id)
+            with open(path, 'rb') as held:
+                fcntl.flock(held, fcntl.LOCK_EX)
+                response = client.patch(f'/api/uploads/{upload_id}', data=b'x' * 1000,
+                                        headers=dict(headers, **{'Upload-Offset': '0'}))
+                assert response.status_code == 409
+                assert os.path.getsize(path) == 0
+
+            _, result = upload(client, headers, content)
+            assert client.get(result['file']['url']).data == content
+
+if __name__ == '__main__':
+    test_chunked_upload_resumes_and_dedups()
+    test_files_served_with_ranges_and_cache_headers()
+    test_rejects_oversized_chunks_and_bad_types()
+    test_served_type_comes_from_extension()
+    test_concurrent_chunk_at_same_offset_is_rejected()
+    print("✅ Upload tests passed!")
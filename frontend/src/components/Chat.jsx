@@ -2,14 +2,23 @@ import { useState, useEffect, useRef } from 'react'
 import { useAuth } from '../contexts/AuthContext'
 import io from 'socket.io-client'
 
+// Chat payload protocol (backend/src/chat_protocol.py): names are sent once with
+// the history, messages arrive as [id, sender_id, message, created_at_ms, is_read] rows
+const PROTOCOL = 2
+
 const Chat = ({ bookingId, onClose }) => {
-  const { token } = useAuth()
+  const { token, user } = useAuth()
   const [messages, setMessages] = useState([])
   const [newMessage, setNewMessage] = useState('')
   const [isConnected, setIsConnected] = useState(false)
   const [isLoading, setIsLoading] = useState(true)
+  const [counterpartOnline, setCounterpartOnline] = useState(false)
+  const [typingUsers, setTypingUsers] = useState({})
   const socketRef = useRef(null)
   const messagesEndRef = useRef(null)
+  const typingSentRef = useRef(0)
+  const typingTimersRef = useRef({})
+  const namesRef = useRef({})
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -24,7 +33,7 @@ const Chat = ({ bookingId, onClose }) => {
 
     // Initialize socket connection
     socketRef.current = io('http://localhost:5000', {
-      auth: { token }
+      auth: { token, protocol: PROTOCOL }
     })
 
     const socket = socketRef.current
@@ -48,27 +57,77 @@ const Chat = ({ bookingId, onClose }) => {
       setIsLoading(false)
     })
 
+    const fromRow = ([id, senderId, message, createdAt, isRead]) => ({
+      id,
+      sender_id: senderId,
+      sender_name: namesRef.current[senderId] || 'Unknown User',
+      message,
+      created_at: createdAt,
+      is_read: Boolean(isRead)
+    })
+
     socket.on('chat_history', (data) => {
-      setMessages(data.messages)
+      namesRef.current = data.users || {}
+      setMessages(data.users ? data.messages.map(fromRow) : data.messages)
       setIsLoading(false)
     })
 
+    // Every message sent to the room within one server tick, in one frame
+    socket.on('message_batch', (data) => {
+      if (String(data.booking_id) !== String(bookingId)) return
+      setMessages(prev => [...prev, ...data.messages.map(fromRow)])
+    })
+
+    // Servers that only speak the original protocol
     socket.on('new_message', (message) => {
       setMessages(prev => [...prev, message])
     })
 
+    // Presence and typing arrive merged per room, at most about once a second
+    socket.on('presence', (data) => {
+      if (String(data.booking_id) !== String(bookingId)) return
+      Object.entries(data.users).forEach(([userId, online]) => {
+        if (String(userId) !== String(user?.id)) setCounterpartOnline(online)
+      })
+    })
+
+    socket.on('typing', (data) => {
+      if (String(data.booking_id) !== String(bookingId)) return
+      Object.entries(data.typing).forEach(([userId, isTyping]) => {
+        if (String(userId) === String(user?.id)) return
+        clearTimeout(typingTimersRef.current[userId])
+        setTypingUsers(prev => ({ ...prev, [userId]: isTyping }))
+        if (isTyping) {
+          // Typing state lapses unless the sender keeps typing
+          typingTimersRef.current[userId] = setTimeout(() => {
+            setTypingUsers(prev => ({ ...prev, [userId]: false }))
+          }, data.expires_in * 1000)
+        }
+      })
+    })
+
     socket.on('error', (error) => {
       console.error('Socket error:', error)
       setIsLoading(false)
     })
 
     return () => {
+      Object.values(typingTimersRef.current).forEach(clearTimeout)
       if (socket) {
         socket.emit('leave_chat', { booking_id: bookingId })
         socket.disconnect()
       }
     }
-  }, [bookingId, token])
+  }, [bookingId, token, user?.id])
+
+  const notifyTyping = (isTyping) => {
+    if (!socketRef.current || !isConnected) return
+    // A few keystrokes a second only need one event every couple of seconds
+    const now = Date.now()
+    if (isTyping && now - typingSentRef.current < 2000) return
+    typingSentRef.current = isTyping ? now : 0
+    socketRef.current.emit('typing', { booking_id: bookingId, typing: isTyping })
+  }
 
   const sendMessage = (e) => {
     e.preventDefault()
@@ -81,6 +140,7 @@ const Chat = ({ bookingId, onClose }) => {
     })
 
     setNewMessage('')
+    notifyTyping(false)
   }
 
   const formatTime = (timestamp) => {
@@ -108,7 +168,12 @@ const Chat = ({ bookingId, onClose }) => {
       <div className="bg-white rounded-lg w-full max-w-md h-96 flex flex-col">
         {/* Header */}
         <div className="flex items-center justify-between p-4 border-b">
-          <h3 className="text-lg font-semibold">Chat</h3>
+          <div>
+            <h3 className="text-lg font-semibold">Chat</h3>
+            <span className="text-xs text-gray-500">
+              {Object.values(typingUsers).some(Boolean) ? 'Typing…' : counterpartOnline ? 'Online' : 'Offline'}
+            </span>
+          </div>
           <div className="flex items-center space-x-2">
             <div className={`w-2 h-2 rounded-full ${isConnected ? 'bg-green-500' : 'bg-red-500'}`}></div>
             <span className="text-sm text-gray-500">
@@ -167,7 +232,10 @@ const Chat = ({ bookingId, onClose }) => {
             <input
               type="text"
               value={newMessage}
-              onChange={(e) => setNewMessage(e.target.value)}
+              onChange={(e) => {
+                setNewMessage(e.target.value)
+                notifyTyping(e.target.value.length > 0)
+              }}
               placeholder="Type a message..."
               className="flex-1 px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
               disabled={!isConnected}
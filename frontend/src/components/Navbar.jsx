@@ -9,6 +9,7 @@ import {
   DropdownMenuSeparator,
 } from '@/components/ui/dropdown-menu'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Badge } from '@/components/ui/badge'
 import { 
   User, 
@@ -100,7 +101,7 @@ const Navbar = () => {
                   <DropdownMenuTrigger asChild>
                     <Button variant="ghost" className="relative h-8 w-8 rounded-full">
                       <Avatar className="h-8 w-8">
-                        <AvatarImage src={user.profile_image} alt={user.username} />
+                        <AvatarImage src={avatarSrc(user)} alt={user.username} />
                         <AvatarFallback>
                           {user.first_name?.[0]}{user.last_name?.[0]}
                         </AvatarFallback>
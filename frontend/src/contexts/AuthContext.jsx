@@ -1,4 +1,5 @@
 import { createContext, useContext, useState, useEffect, useCallback } from 'react'
+import { apiFetch } from '@/lib/api'
 
 const AuthContext = createContext()
 
@@ -49,7 +50,7 @@ export const AuthProvider = ({ children }) => {
     console.log('DEBUG: Making request to:', url);
     console.log('DEBUG: Headers:', headers);
 
-    const response = await fetch(url, { ...options, headers });
+    const response = await apiFetch(url, { ...options, headers });
 
     console.log('DEBUG: Response status:', response.status);
     console.log('DEBUG: Response headers:', Object.fromEntries(response.headers.entries()));
@@ -125,7 +126,7 @@ export const AuthProvider = ({ children }) => {
     try {
       console.log('DEBUG: Attempting login for email:', email);
       
-      const response = await fetch(`${API_BASE_URL}/auth/login`, {
+      const response = await apiFetch(`${API_BASE_URL}/auth/login`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
@@ -157,7 +158,7 @@ export const AuthProvider = ({ children }) => {
 
   const register = async (userData) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/auth/register`, {
+      const response = await apiFetch(`${API_BASE_URL}/auth/register`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
@@ -252,6 +253,7 @@ export const AuthProvider = ({ children }) => {
     updateProfile,
     getRunners, // Expose new functions
     getBookings, // Expose new functions
+    authFetch, // Authenticated requests for pages with their own endpoints (e.g. dashboards)
     API_BASE_URL // Still useful for other components
   }
 
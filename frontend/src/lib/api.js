@@ -0,0 +1,20 @@
+// fetch() for the API that keeps reads after a write on the primary database.
+// The backend answers writes with X-DB-Primary-Until; sending it back lets any
+// worker skip lagging read replicas until then (cookies don't reach a
+// cross-site API, and public GETs carry no token to remember the user by).
+const STICKY_HEADER = 'X-DB-Primary-Until'
+
+let primaryUntil = null
+
+export async function apiFetch(url, options = {}) {
+  const headers = new Headers(options.headers)
+  if (primaryUntil) {
+    headers.set(STICKY_HEADER, primaryUntil)
+  }
+  const response = await fetch(url, { ...options, headers })
+  const until = response.headers.get(STICKY_HEADER)
+  if (until) {
+    primaryUntil = until
+  }
+  return response
+}
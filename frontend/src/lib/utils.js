@@ -5,3 +5,12 @@ export function cn(...inputs) {
   return twMerge(clsx(inputs))
 }
 
+
+const API_ORIGIN = new URL(import.meta.env.VITE_API_URL || 'http://localhost:5000/api').origin
+
+// Resized server-side variant of an uploaded avatar ('thumb', 'card' or 'full'),
+// falling back to the original URL for external images
+export function avatarSrc(user, variant = 'thumb') {
+  const path = user?.profile_image_variants?.[variant]
+  return path ? `${API_ORIGIN}${path}` : user?.profile_image
+}
@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { apiFetch } from '@/lib/api'
 import { useAuth } from '../contexts/AuthContext'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
@@ -43,7 +44,7 @@ const AdminDashboard = () => {
       setLoading(true)
       
       // Fetch dashboard stats
-      const statsResponse = await fetch(`${API_BASE_URL}/admin/dashboard/stats`, {
+      const statsResponse = await apiFetch(`${API_BASE_URL}/admin/dashboard/stats`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (statsResponse.ok) {
@@ -52,7 +53,7 @@ const AdminDashboard = () => {
       }
 
       // Fetch users
-      const usersResponse = await fetch(`${API_BASE_URL}/admin/users?per_page=10`, {
+      const usersResponse = await apiFetch(`${API_BASE_URL}/admin/users?per_page=10`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (usersResponse.ok) {
@@ -61,7 +62,7 @@ const AdminDashboard = () => {
       }
 
       // Fetch bookings
-      const bookingsResponse = await fetch(`${API_BASE_URL}/admin/bookings?per_page=10`, {
+      const bookingsResponse = await apiFetch(`${API_BASE_URL}/admin/bookings?per_page=10`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (bookingsResponse.ok) {
@@ -70,7 +71,7 @@ const AdminDashboard = () => {
       }
 
       // Fetch reviews
-      const reviewsResponse = await fetch(`${API_BASE_URL}/admin/reviews?per_page=10`, {
+      const reviewsResponse = await apiFetch(`${API_BASE_URL}/admin/reviews?per_page=10`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (reviewsResponse.ok) {
@@ -79,7 +80,7 @@ const AdminDashboard = () => {
       }
 
       // Fetch services
-      const servicesResponse = await fetch(`${API_BASE_URL}/admin/services`, {
+      const servicesResponse = await apiFetch(`${API_BASE_URL}/admin/services`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       if (servicesResponse.ok) {
@@ -96,7 +97,7 @@ const AdminDashboard = () => {
 
   const toggleUserStatus = async (userId) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/admin/users/${userId}/toggle-status`, {
+      const response = await apiFetch(`${API_BASE_URL}/admin/users/${userId}/toggle-status`, {
         method: 'POST',
         headers: { 'Authorization': `Bearer ${token}` }
       })
@@ -111,7 +112,7 @@ const AdminDashboard = () => {
 
   const toggleReviewFlag = async (reviewId) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/admin/reviews/${reviewId}/flag`, {
+      const response = await apiFetch(`${API_BASE_URL}/admin/reviews/${reviewId}/flag`, {
         method: 'POST',
         headers: { 'Authorization': `Bearer ${token}` }
       })
@@ -128,7 +129,7 @@ const AdminDashboard = () => {
     if (!confirm('Are you sure you want to delete this review?')) return
     
     try {
-      const response = await fetch(`${API_BASE_URL}/admin/reviews/${reviewId}`, {
+      const response = await apiFetch(`${API_BASE_URL}/admin/reviews/${reviewId}`, {
         method: 'DELETE',
         headers: { 'Authorization': `Bearer ${token}` }
       })
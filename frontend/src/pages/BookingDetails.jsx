@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { apiFetch } from '@/lib/api'
 import { useParams, useNavigate, Link } from 'react-router-dom'
 import { useAuth } from '../contexts/AuthContext'
 import Chat from '../components/Chat'
@@ -6,6 +7,7 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Alert, AlertDescription } from '@/components/ui/alert'
 import { 
   Calendar,
@@ -35,7 +37,7 @@ const BookingDetails = () => {
 
   const fetchBooking = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/bookings/${id}`, {
+      const response = await apiFetch(`${API_BASE_URL}/bookings/${id}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
@@ -61,13 +63,13 @@ const BookingDetails = () => {
     setError('')
 
     try {
-      const response = await fetch(`${API_BASE_URL}/bookings/${id}/status`, {
+      const response = await apiFetch(`${API_BASE_URL}/bookings/${id}/status`, {
         method: 'PUT',
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ status: newStatus })
+        body: JSON.stringify({ status: newStatus, version: booking.version })
       })
 
       const data = await response.json()
@@ -75,6 +77,10 @@ const BookingDetails = () => {
       if (response.ok) {
         setBooking(data.booking)
       } else {
+        // On a version conflict the server returns the latest booking
+        if (response.status === 409 && data.booking) {
+          setBooking(data.booking)
+        }
         setError(data.error || 'Failed to update booking status')
       }
     } catch (error) {
@@ -349,7 +355,7 @@ const BookingDetails = () => {
                 <div className="flex items-center space-x-4 mb-4">
                   <Avatar className="h-12 w-12">
                     <AvatarImage src={
-                      isRunner ? booking.user?.profile_image : booking.runner?.user?.profile_image
+                      avatarSrc(isRunner ? booking.user : booking.runner?.user)
                     } />
                     <AvatarFallback>
                       {isRunner ? (
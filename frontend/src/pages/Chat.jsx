@@ -5,6 +5,7 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Input } from '@/components/ui/input'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Badge } from '@/components/ui/badge'
 import { 
   Send, 
@@ -149,7 +150,7 @@ const Chat = () => {
               </Button>
               <div className="flex items-center space-x-3">
                 <Avatar className="h-10 w-10">
-                  <AvatarImage src={otherUser?.profile_image} />
+                  <AvatarImage src={avatarSrc(otherUser)} />
                   <AvatarFallback>
                     {otherUser?.first_name?.[0]}{otherUser?.last_name?.[0]}
                   </AvatarFallback>
@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { apiFetch } from '@/lib/api'
 import { useParams, useNavigate } from 'react-router-dom'
 import { useAuth } from '../contexts/AuthContext'
 import { Button } from '@/components/ui/button'
@@ -8,6 +9,7 @@ import { Textarea } from '@/components/ui/textarea'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Alert, AlertDescription } from '@/components/ui/alert'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { 
   Select,
   SelectContent,
@@ -44,7 +46,7 @@ const CreateBooking = () => {
 
   const fetchRunner = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/runners/${runnerId}`)
+      const response = await apiFetch(`${API_BASE_URL}/runners/${runnerId}`)
       const data = await response.json()
 
       if (response.ok) {
@@ -113,7 +115,7 @@ const CreateBooking = () => {
         notes: formData.notes
       }
 
-      const response = await fetch(`${API_BASE_URL}/bookings`, {
+      const response = await apiFetch(`${API_BASE_URL}/bookings`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -316,7 +318,7 @@ const CreateBooking = () => {
               <CardContent>
                 <div className="flex items-center space-x-4 mb-4">
                   <Avatar className="h-12 w-12">
-                    <AvatarImage src={runner.user.profile_image} />
+                    <AvatarImage src={avatarSrc(runner.user)} />
                     <AvatarFallback>
                       {runner.user.first_name[0]}{runner.user.last_name[0]}
                     </AvatarFallback>
@@ -5,6 +5,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Badge } from '@/components/ui/badge'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Textarea } from '@/components/ui/textarea'
 import {
   AlertTriangle,
@@ -221,7 +222,7 @@ const ModeratorDashboard = () => {
                       <div className="flex justify-between items-start">
                         <div className="flex items-center space-x-3">
                           <Avatar className="h-10 w-10">
-                            <AvatarImage src={review.reviewer?.profile_image} />
+                            <AvatarImage src={avatarSrc(review.reviewer)} />
                             <AvatarFallback>
                               {review.reviewer?.first_name?.[0]}{review.reviewer?.last_name?.[0]}
                             </AvatarFallback>
@@ -308,7 +309,7 @@ const ModeratorDashboard = () => {
                       <div className="flex justify-between items-start">
                         <div className="flex items-center space-x-3">
                           <Avatar className="h-10 w-10">
-                            <AvatarImage src={message.sender?.profile_image} />
+                            <AvatarImage src={avatarSrc(message.sender)} />
                             <AvatarFallback>
                               {message.sender?.first_name?.[0]}{message.sender?.last_name?.[0]}
                             </AvatarFallback>
@@ -381,7 +382,7 @@ const ModeratorDashboard = () => {
                       <div className="flex justify-between items-start">
                         <div className="flex items-center space-x-3">
                           <Avatar className="h-10 w-10">
-                            <AvatarImage src={user.profile_image} />
+                            <AvatarImage src={avatarSrc(user)} />
                             <AvatarFallback>
                               {user.first_name?.[0]}{user.last_name?.[0]}
                             </AvatarFallback>
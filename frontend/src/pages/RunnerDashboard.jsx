@@ -8,35 +8,38 @@ import { Link } from 'react-router-dom'
 
 const RunnerDashboard = () => {
   const { user, authFetch, API_BASE_URL } = useAuth()
-  const [pendingBookings, setPendingBookings] = useState([])
-  const [otherBookings, setOtherBookings] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
 
-  useEffect(() => { fetchBookings() }, [])
+  useEffect(() => { fetchSummary() }, [])
 
-  const fetchBookings = async () => {
+  // Counts and the upcoming list come from one summary request instead of paging every booking
+  const fetchSummary = async () => {
     setLoading(true)
     try {
-      const response = await authFetch(`${API_BASE_URL}/bookings?as_runner=true`)
+      const response = await authFetch(`${API_BASE_URL}/dashboard/summary?as_runner=true&upcoming_limit=20`)
       const data = await response.json()
-      if (response.ok) {
-        setPendingBookings((data.bookings || []).filter(b => b.status === 'pending'))
-        setOtherBookings((data.bookings || []).filter(b => b.status !== 'pending'))
-      } else {
-        setPendingBookings([])
-        setOtherBookings([])
-      }
+      setSummary(response.ok ? data : null)
     } catch {
-      setPendingBookings([])
-      setOtherBookings([])
+      setSummary(null)
     } finally {
       setLoading(false)
     }
   }
 
+  const upcoming = summary?.upcoming || []
+  const pendingBookings = upcoming.filter(b => b.status === 'pending')
+  const otherBookings = upcoming.filter(b => b.status !== 'pending')
+  const stats = summary ? [
+    ['Requests', summary.status_counts.pending],
+    ['Active', summary.status_counts.accepted + summary.status_counts.in_progress],
+    ['Completed', summary.status_counts.completed],
+    ['Earned', `$${summary.earnings.completed}`]
+  ] : []
+
   const handleAction = async (bookingId, action) => {
     await authFetch(`${API_BASE_URL}/bookings/${bookingId}/${action}`, { method: 'POST' })
-    fetchBookings()
+    fetchSummary()
   }
 
   const getStatusColor = (status) => {
@@ -55,6 +58,13 @@ const RunnerDashboard = () => {
     <div className="min-h-screen bg-gradient-to-br from-green-50 to-white">
       <div className="max-w-4xl mx-auto px-4 py-8">
         <h1 className="text-3xl font-bold text-green-900 mb-8">Runner Dashboard</h1>
+        {stats.length > 0 && (
+          <div className="grid grid-cols-2 md:grid-cols-4 gap-4 mb-8">
+            {stats.map(([label, value]) => (
+              <Card key={label}><CardContent className="py-4 text-center"><div className="text-2xl font-bold text-green-900">{value}</div><div className="text-sm text-gray-500">{label}</div></CardContent></Card>
+            ))}
+          </div>
+        )}
         <h2 className="text-xl font-semibold mb-4 text-green-800">Incoming Booking Requests</h2>
         {loading ? (
           <div className="flex justify-center py-12"><div className="animate-spin rounded-full h-16 w-16 border-b-2 border-green-600"></div></div>
@@ -67,7 +77,7 @@ const RunnerDashboard = () => {
                 <CardHeader className="flex flex-row items-center justify-between">
                   <div>
                     <CardTitle className="text-lg">{booking.title || 'Booking'}</CardTitle>
-                    <div className="text-sm text-gray-500">from {booking.user?.first_name} {booking.user?.last_name}</div>
+                    <div className="text-sm text-gray-500">from {booking.counterpart?.first_name} {booking.counterpart?.last_name}</div>
                   </div>
                   <Badge className={getStatusColor(booking.status)}>{booking.status}</Badge>
                 </CardHeader>
@@ -87,9 +97,9 @@ const RunnerDashboard = () => {
             ))}
           </div>
         )}
-        <h2 className="text-xl font-semibold mt-10 mb-4 text-green-800">Your Bookings</h2>
+        <h2 className="text-xl font-semibold mt-10 mb-4 text-green-800">Upcoming Bookings</h2>
         {otherBookings.length === 0 ? (
-          <Card><CardContent className="text-center py-8">No other bookings yet.</CardContent></Card>
+          <Card><CardContent className="text-center py-8">No other upcoming bookings.</CardContent></Card>
         ) : (
           <div className="space-y-4">
             {otherBookings.map(booking => (
@@ -97,7 +107,7 @@ const RunnerDashboard = () => {
                 <CardHeader className="flex flex-row items-center justify-between">
                   <div>
                     <CardTitle className="text-lg">{booking.title || 'Booking'}</CardTitle>
-                    <div className="text-sm text-gray-500">from {booking.user?.first_name} {booking.user?.last_name}</div>
+                    <div className="text-sm text-gray-500">from {booking.counterpart?.first_name} {booking.counterpart?.last_name}</div>
                   </div>
                   <Badge className={getStatusColor(booking.status)}>{booking.status}</Badge>
                 </CardHeader>
@@ -5,6 +5,7 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
 import {
   Star,
@@ -29,59 +30,34 @@ const RunnerProfile = () => {
   // Memoize fetchRunnerProfile to ensure stable dependency for useEffect
   const fetchRunnerProfile = useCallback(async () => {
     try {
-      // Use authFetch for this API call
-      const response = await authFetch(`${API_BASE_URL}/runners/${id}`);
+      // One request returns the profile, rating summary, recent reviews and availability
+      const response = await authFetch(`${API_BASE_URL}/runners/${id}/overview`);
       const data = await response.json();
 
       if (response.ok) {
-        setRunner(data);
+        setRunner(data.runner);
+        setReviews(data.reviews);
       } else {
         // Handle specific errors if needed, e.g., if runner not found (404)
         console.error('Failed to fetch runner profile:', data.error || response.statusText);
         setRunner(null); // Explicitly set to null if not found
+        setReviews([]);
       }
     } catch (error) {
       // authFetch would have handled 401/403. This catches network errors or re-thrown errors.
       console.error('Error fetching runner profile:', error);
       setRunner(null); // Ensure runner is null on error
+      setReviews([]);
     } finally {
       setLoading(false);
     }
   }, [id, API_BASE_URL, authFetch]); // Dependencies for useCallback
 
-  // Memoize fetchRunnerReviews
-  const fetchRunnerReviews = useCallback(async (runnerUserId) => {
-    if (!runnerUserId) return; // Ensure runnerUserId is available before fetching reviews
-    try {
-      // Use authFetch for this API call
-      const response = await authFetch(`${API_BASE_URL}/reviews?reviewee_id=${runnerUserId}`);
-      const data = await response.json();
-
-      if (response.ok) {
-        setReviews(data.reviews);
-      } else {
-        console.error('Failed to fetch runner reviews:', data.error || response.statusText);
-        setReviews([]); // Set to empty array on error
-      }
-    } catch (error) {
-      console.error('Error fetching reviews:', error);
-      setReviews([]); // Set to empty array on error
-    }
-  }, [API_BASE_URL, authFetch]); // Dependencies for useCallback
-
   useEffect(() => {
     // When the component mounts or 'id' changes, fetch the runner profile.
-    // fetchRunnerReviews depends on runner.user_id, so it needs to be called after runner is set.
     fetchRunnerProfile();
   }, [fetchRunnerProfile]); // Depend on the memoized fetchRunnerProfile
 
-  useEffect(() => {
-    // Fetch reviews only once runner data is available and stable
-    if (runner && runner.user && runner.user.id) {
-      fetchRunnerReviews(runner.user.id);
-    }
-  }, [runner, fetchRunnerReviews]); // Depend on runner and the memoized fetchRunnerReviews
-
   const renderStars = (rating) => {
     return Array.from({ length: 5 }, (_, i) => (
       <Star
@@ -134,7 +110,7 @@ const RunnerProfile = () => {
           <CardContent className="pt-6">
             <div className="flex flex-col md:flex-row items-start md:items-center space-y-4 md:space-y-0 md:space-x-6">
               <Avatar className="h-24 w-24">
-                <AvatarImage src={runner.user.profile_image} />
+                <AvatarImage src={avatarSrc(runner.user, 'card')} />
                 <AvatarFallback className="text-2xl">
                   {runner.user.first_name[0]}{runner.user.last_name[0]}
                 </AvatarFallback>
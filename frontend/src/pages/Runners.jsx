@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { apiFetch } from '@/lib/api'
 import { Link } from 'react-router-dom'
 import { useAuth } from '../contexts/AuthContext'
 import { Button } from '@/components/ui/button'
@@ -6,6 +7,7 @@ import { Input } from '@/components/ui/input'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { 
   Select,
   SelectContent,
@@ -48,7 +50,7 @@ const Runners = () => {
       if (maxRate) params.append('max_rate', maxRate)
 
       console.log('Fetching runners from:', `${API_BASE_URL}/runners?${params}`)
-      const response = await fetch(`${API_BASE_URL}/runners?${params}`)
+      const response = await apiFetch(`${API_BASE_URL}/runners?${params}`)
       const data = await response.json()
       
       console.log('Runners response:', data)
@@ -71,7 +73,7 @@ const Runners = () => {
   const fetchServices = async () => {
     try {
       console.log('Fetching services from:', `${API_BASE_URL}/services`)
-      const response = await fetch(`${API_BASE_URL}/services`)
+      const response = await apiFetch(`${API_BASE_URL}/services`)
       const data = await response.json()
       
       console.log('Services response:', data)
@@ -193,7 +195,7 @@ const Runners = () => {
               <CardHeader className="pb-4">
                 <div className="flex items-center space-x-4">
                   <Avatar className="h-12 w-12">
-                    <AvatarImage src={runner.user.profile_image} />
+                    <AvatarImage src={avatarSrc(runner.user)} />
                     <AvatarFallback>
                       {runner.user.first_name[0]}{runner.user.last_name[0]}
                     </AvatarFallback>
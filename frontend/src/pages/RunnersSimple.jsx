@@ -1,4 +1,5 @@
 import { useState, useEffect } from 'react'
+import { apiFetch } from '@/lib/api'
 import { useAuth } from '../contexts/AuthContext'
 
 const RunnersSimple = () => {
@@ -17,12 +18,12 @@ const RunnersSimple = () => {
       console.log('Fetching from:', API_BASE_URL)
       
       // Fetch runners
-      const runnersResponse = await fetch(`${API_BASE_URL}/runners?page=1&per_page=12`)
+      const runnersResponse = await apiFetch(`${API_BASE_URL}/runners?page=1&per_page=12`)
       const runnersData = await runnersResponse.json()
       console.log('Runners data:', runnersData)
       
       // Fetch services
-      const servicesResponse = await fetch(`${API_BASE_URL}/services`)
+      const servicesResponse = await apiFetch(`${API_BASE_URL}/services`)
       const servicesData = await servicesResponse.json()
       console.log('Services data:', servicesData)
       
@@ -6,6 +6,7 @@ import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
 import { Textarea } from '@/components/ui/textarea'
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar'
+import { avatarSrc } from '@/lib/utils'
 import { Badge } from '@/components/ui/badge'
 import { Switch } from '@/components/ui/switch'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
@@ -218,7 +219,7 @@ const Settings = () => {
                 <form onSubmit={handleProfileUpdate} className="space-y-6">
                   <div className="flex items-center space-x-6">
                     <Avatar className="h-20 w-20">
-                      <AvatarImage src={user?.profile_image} />
+                      <AvatarImage src={avatarSrc(user, 'card')} />
                       <AvatarFallback className="text-lg">
                         {user?.first_name?.[0]}{user?.last_name?.[0]}
                       </AvatarFallback>
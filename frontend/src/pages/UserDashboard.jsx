@@ -9,29 +9,37 @@ import { Link } from 'react-router-dom'
 
 const UserDashboard = () => {
   const { user, authFetch, API_BASE_URL } = useAuth()
-  const [bookings, setBookings] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
   const [showBookingModal, setShowBookingModal] = useState(false)
   const [runners, setRunners] = useState([])
   const [bookingForm, setBookingForm] = useState({ runnerId: '', service: '', date: '', details: '' })
   const [submitting, setSubmitting] = useState(false)
 
-  useEffect(() => { fetchBookings() }, [])
+  useEffect(() => { fetchSummary() }, [])
 
-  const fetchBookings = async () => {
+  // Counts and the upcoming list come from one summary request instead of paging every booking
+  const fetchSummary = async () => {
     setLoading(true)
     try {
-      const response = await authFetch(`${API_BASE_URL}/bookings`)
+      const response = await authFetch(`${API_BASE_URL}/dashboard/summary?upcoming_limit=20`)
       const data = await response.json()
-      if (response.ok) setBookings(data.bookings)
-      else setBookings([])
+      setSummary(response.ok ? data : null)
     } catch {
-      setBookings([])
+      setSummary(null)
     } finally {
       setLoading(false)
     }
   }
 
+  const upcoming = summary?.upcoming || []
+  const stats = summary ? [
+    ['Pending', summary.status_counts.pending],
+    ['Active', summary.status_counts.accepted + summary.status_counts.in_progress],
+    ['Completed', summary.status_counts.completed],
+    ['Spent', `$${summary.spend.completed}`]
+  ] : []
+
   const openBookingModal = async () => {
     setShowBookingModal(true)
     // Fetch runners for selection
@@ -60,7 +68,7 @@ const UserDashboard = () => {
       if (response.ok) {
         setShowBookingModal(false)
         setBookingForm({ runnerId: '', service: '', date: '', details: '' })
-        fetchBookings()
+        fetchSummary()
       }
     } finally {
       setSubmitting(false)
@@ -69,7 +77,7 @@ const UserDashboard = () => {
 
   const cancelBooking = async (bookingId) => {
     await authFetch(`${API_BASE_URL}/bookings/${bookingId}/cancel`, { method: 'POST' })
-    fetchBookings()
+    fetchSummary()
   }
 
   const getStatusColor = (status) => {
@@ -93,19 +101,26 @@ const UserDashboard = () => {
             <Plus className="h-5 w-5" /> Book a Runner
           </Button>
         </div>
-        <h2 className="text-xl font-semibold mb-4 text-blue-800">Your Bookings</h2>
+        {stats.length > 0 && (
+          <div className="grid grid-cols-2 md:grid-cols-4 gap-4 mb-8">
+            {stats.map(([label, value]) => (
+              <Card key={label}><CardContent className="py-4 text-center"><div className="text-2xl font-bold text-blue-900">{value}</div><div className="text-sm text-gray-500">{label}</div></CardContent></Card>
+            ))}
+          </div>
+        )}
+        <h2 className="text-xl font-semibold mb-4 text-blue-800">Upcoming Bookings</h2>
         {loading ? (
           <div className="flex justify-center py-12"><div className="animate-spin rounded-full h-16 w-16 border-b-2 border-blue-600"></div></div>
-        ) : bookings.length === 0 ? (
-          <Card><CardContent className="text-center py-8">No bookings yet. Click 'Book a Runner' to get started!</CardContent></Card>
+        ) : upcoming.length === 0 ? (
+          <Card><CardContent className="text-center py-8">{summary?.total_bookings ? 'No upcoming bookings.' : "No bookings yet. Click 'Book a Runner' to get started!"}</CardContent></Card>
         ) : (
           <div className="space-y-4">
-            {bookings.map(booking => (
+            {upcoming.map(booking => (
               <Card key={booking.id}>
                 <CardHeader className="flex flex-row items-center justify-between">
                   <div>
                     <CardTitle className="text-lg">{booking.title || 'Booking'}</CardTitle>
-                    <div className="text-sm text-gray-500">with {booking.runner?.user?.first_name} {booking.runner?.user?.last_name}</div>
+                    <div className="text-sm text-gray-500">with {booking.counterpart?.first_name} {booking.counterpart?.last_name}</div>
                   </div>
                   <Badge className={getStatusColor(booking.status)}>{booking.status}</Badge>
                 </CardHeader>